@@ -25,10 +25,16 @@ import signal
 import logging
 import traceback
 import file_parser as FP
+from MotionWise import pm_load
+from MotionWise import pm_plugin
+from MotionWise import pm_capture
+from MotionWise import pm_profile
+from MotionWise import pm_vector
+from MotionWise import pm_checkpoint
 from MotionWise import pm_instrument
 from multiprocessing import Process
 from MotionWise import pm_measurement as PM
-from MotionWise.log_proc import QueueHandler
+from MotionWise.log_proc import configure_process, log_level
 
 TIME_STAMP = "{}".format(time.strftime("%Y-%m-%d_%H-%M-%S"))
 logger = logging.getLogger(__name__)
@@ -59,15 +65,25 @@ class Client(Process):
     statistical values and writes the output files.
     """
     
-    def __init__(self, ra_model, pipe_conn, args, log_queue):
+    def __init__(self, ra_model, pipe_conn, args, log_queue, task_map=None):
         super(Client, self).__init__()
-        self._is_process = not args.csv_file
+        self._task_map = task_map
+        self._profiler = None
+        self._capture_path = None
+        self._preamble = ''
+        # recordings which are read without the RA lib are processed in the
+        # context of the main process
+        self._is_process = not (args.csv_file or 
+                                getattr(args, 'rerender', None) or 
+                                (args.pcap_file and 
+                                 args.pcap_reader == 'native'))
         self._log_queue = log_queue
         self._host = args.host.upper()
         self._pipe_conn = pipe_conn
         self._event_cnt = 0
         self._lost_events = 0
         self._lost_frames = 0
+        self._error = None  # exception which terminated run()
         self._timeout = 0.5 if (args.csv_file or args.pcap_file) else 10
         self._out_path = args.out_path
         self._args = args
@@ -110,6 +126,38 @@ class Client(Process):
             if cmd == "EOF": break
         self._pipe_conn.close()
     
+    def _open_output(self, path, preamble):
+        """
+        @brief Opens an output file and writes the given preamble 
+        """
+        fh = open(path, 'w+')
+        fh.write(preamble)
+        if self._profiler is not None:
+            fh = pm_profile.TimedFile(fh, self._profiler)
+        return fh
+    
+    def _set_runnable_sampling(self, modulus=None, slot=0):
+        """
+        @brief Requests the runnable sampling of the load shedding from the
+               proxy, which drops the events before they are sent
+        """
+        try:
+            self._pipe_conn.send((pm_load.MARKER, modulus, slot))
+        except IOError:
+            pass
+    
+    def _write_capture_stats(self, stats):
+        """
+        @brief Writes the statistics of the RA callback sent by the proxy at
+               the end of the measurement
+        """
+        fh = self._open_output(self._capture_path, self._preamble)
+        try:
+            pm_capture.write(stats, fh)
+        finally:
+            fh.close()
+        logger.info("$c{}".format(pm_capture.summary(stats)))
+    
     def _create_listeners(self):
         """
         @brief Creates listeners for performance measurement instrumentation
@@ -126,53 +174,73 @@ class Client(Process):
         ver_str = "MotionWise_Perf.py v{}, IF-Set {}".format(self._args.version, 
                     self._ra_model.get_IFSET())
         
+        preamble = '{}#generated with {}\n'.format(sep_str, ver_str)
         pre = "{}_MotionWise-PMT".format(TIME_STAMP)
         s_pre = pre + "_statistical-analysis-summary_"   
         t_pre = pre + "_statistical-analysis-trace_" 
         
-        if not (self._args.output_trace_events_off or self._args.csv_file):
-            fh = open(os.path.join(op, pre + '_trace_events.csv'), 'w+')
-            fh.write('{}#generated with {}\n'.format(sep_str, ver_str))
+        # output files which are written during the analysis are not
+        # created if the output is re-rendered from a checkpoint
+        rerender = getattr(self._args, 'rerender', None)
+        self._capture_path = os.path.join(op, pre + '_capture-statistics.csv')
+        self._preamble = preamble
+        
+        if getattr(self._args, 'profile', False) and not rerender:
+            # created first: the time spent writing the other output files
+            # is measured
+            fh = self._open_output(os.path.join(op, pre + '_profile.csv'), 
+                                   preamble)
+            self._profiler = pm_profile.StageProfiler(file_handler=fh)
+            out['profile'] = self._profiler
+        
+        if not (self._args.output_trace_events_off or self._args.csv_file
+                or rerender):
+            fh = self._open_output(os.path.join(op, pre + '_trace_events.csv'), 
+                                   preamble)
             out['trace_log'] = PM.TraceListener(self._host, file_handler = fh)
         
-        fh = open(os.path.join(op, s_pre + 'checkpoint.csv'), 'w+')
-        fh.write('{}#generated with {}\n'.format(sep_str, ver_str))
+        fh = self._open_output(os.path.join(op, s_pre + 'checkpoint.csv'), 
+                               preamble)
         out['chkpoint_summary'] = PM.NonOsListener(self._host, 
             file_handler = fh)
         
-        fh = open(os.path.join(op, s_pre + 'runnable.csv'), 'w+')
-        fh.write('{}#generated with {}\n'.format(sep_str, ver_str))
+        fh = self._open_output(os.path.join(op, s_pre + 'runnable.csv'), 
+                               preamble)
+        partial = [fh]  # summaries which are affected by load shedding
         out['rnbl_summary'] = PM.RunnableListenerSummary(self._host, 
             self._ra_model, file_handler = fh, budget = self._budget, 
             periods = self._periods, sw_layers = self._sw_layers)
         
-        fh = open(os.path.join(op, s_pre + 'task.csv'), 'w+')
-        fh.write('{}#generated with {}\n'.format(sep_str, ver_str))
+        fh = self._open_output(os.path.join(op, s_pre + 'task.csv'), 
+                               preamble)
+        partial.append(fh)
         out['task_summary'] = PM.TaskListenerSummary(self._host, 
             sw_layers = self._sw_layers, file_handler = fh)
         out['task_summary'].load_aph_task_map(self._args.aph_taskmap1, self._args.aph_taskmap2)
         
-        fh = open(os.path.join(op, s_pre + 'sw_layer.csv'), 'w+')
-        fh.write('{}#generated with {}\n'.format(sep_str, ver_str))
+        fh = self._open_output(os.path.join(op, s_pre + 'sw_layer.csv'), 
+                               preamble)
+        partial.append(fh)
         out['sw_layer_summary'] = PM.SwLayerListenerSummary(self._host, 
             sw_layers = self._sw_layers, file_handler=fh)
         out['sw_layer_summary'].load_aph_task_map(self._args.aph_taskmap1, self._args.aph_taskmap2)
         
-        fh = open(os.path.join(op, s_pre + 'aggregated.csv'), 'w+')
-        fh.write('{}#generated with {}\n'.format(sep_str, ver_str))
+        fh = self._open_output(os.path.join(op, s_pre + 'aggregated.csv'), 
+                               preamble)
+        partial.append(fh)
         out['aggr_summary'] = PM.AggregatedListener(self._host, 
             file_handler=fh)
         out['aggr_summary'].load_aph_task_map(self._args.aph_taskmap1, self._args.aph_taskmap2)
         
-        if self._args.trace_statistics:
-            fh = open(os.path.join(op, t_pre + 'runnable.csv'), 'w+')
-            fh.write('{}#generated with {}\n'.format(sep_str, ver_str))
+        if self._args.trace_statistics and not rerender:
+            fh = self._open_output(os.path.join(op, t_pre + 'runnable.csv'), 
+                                   preamble)
             out['rnbl_trace'] = PM.RunnableListenerTrace(self._host, 
                 self._ra_model, file_handler = fh, budget = self._budget, 
                 periods = self._periods, sw_layers = self._sw_layers)
             
-            fh = open(os.path.join(op, t_pre + 'task.csv'), 'w+')
-            fh.write('{}#generated with {}\n'.format(sep_str, ver_str))
+            fh = self._open_output(os.path.join(op, t_pre + 'task.csv'), 
+                                   preamble)
             out['task_trace'] = PM.TaskListenerTrace(self._host, 
                 sw_layers = self._sw_layers, file_handler = fh)
             out['task_trace'].load_aph_task_map(self._args.aph_taskmap1, self._args.aph_taskmap2)
@@ -183,20 +251,138 @@ class Client(Process):
                 logger.warning('could not load driver ID to name mapping '
                                'file {}'.format(self._args.aph_driver_ids))
                                
-            fh = open(os.path.join(op, s_pre + 'driver.csv'), 'w+')
-            fh.write('{}#generated with {}\n'.format(sep_str, ver_str))
+            fh = self._open_output(os.path.join(op, s_pre + 'driver.csv'), 
+                                   preamble)
             out['driver_summary'] = PM.DriverListenerSummary(self._host, 
                 file_handler=fh, driver_map = driver_map)
                 
-            if self._args.trace_statistics:
-                fh = open(os.path.join(op, t_pre + 'driver.csv'), 'w+')
-                fh.write('{}#generated with {}\n'.format(sep_str, ver_str))
+            if self._args.trace_statistics and not rerender:
+                fh = self._open_output(os.path.join(op, t_pre + 'driver.csv'), 
+                                       preamble)
                 out['driver_summary'] = PM.DriverListenerTrace(self._host, 
-                    file_handler = fh, driver_map = driver_map)    
-        
-        
+                    file_handler = fh, driver_map = driver_map)
+
+        if getattr(self._args, 'max_lag', None) and not rerender:
+            fh = self._open_output(os.path.join(op, pre + '_load-shedding.csv'),
+                                   preamble)
+            out['load_shedding'] = pm_load.LoadSheddingListener(self._host, 
+                self._args.max_lag, self._set_runnable_sampling, 
+                out.get('trace_log'), file_handler = fh, 
+                partial_files = partial)
+
+        plugins = getattr(self._args, 'plugins', None)
+        if plugins is not None and not rerender:
+            fh = self._open_output(os.path.join(op, pre + '_plugin-timing.csv'),
+                                   preamble)
+            out['plugins'] = pm_plugin.PluginListener(self._host, 
+                pm_plugin.discover(plugins), self._ra_model, op, pre, preamble,
+                file_handler = fh)
+
+        if self._task_map:
+            # task mapping has been loaded from cache and is not requested
+            # from the host
+            for l in out.itervalues():
+                if hasattr(l, '_task_map_callback'):
+                    for name, _id in self._task_map.iteritems():
+                        l._task_map_callback(host=self._host, task_id=_id,
+                                             task_name=name)
+
         return out
     
+    def _checkpoint_meta(self):
+        host_id = PM.HOSTS[self._host]['id']
+        return { 'host': self._host
+               , 'ifset': self._ra_model.get_IFSET()
+               , 'offline': bool(self._args.csv_file or self._args.pcap_file)
+               , 'time_from': getattr(self._args, 'time_from', None)
+               , 'time_to': getattr(self._args, 'time_to', None)
+               , 'events': self._event_cnt
+               , 'lost_events': self._lost_events
+               , 'zgt': pm_instrument.processed_time(host_id)}
+
+    def _create_checkpointer(self):
+        """
+        @brief Creates the checkpointer if periodic checkpoints are enabled
+        """
+        interval = getattr(self._args, 'checkpoint', None)
+        if interval is None:
+            return None
+        cp = os.path.join(self._out_path, 'checkpoint')
+        if not os.path.isdir(cp):
+            os.mkdir(cp)
+        fn = '{}_MotionWise-PMT_{}{}'.format(TIME_STAMP, self._host, 
+                                             pm_checkpoint.CHECKPOINT_SUFFIX)
+        return pm_checkpoint.Checkpointer(os.path.join(cp, fn), 
+                                          interval or 
+                                          pm_checkpoint.CHECKPOINT_INTERVAL)
+
+    def _restore(self, listener):
+        """
+        @brief Restores the state of a checkpoint given by --resume or 
+               --rerender.
+        
+        @return: number of events of the recording which have already been 
+                 analysed and have to be skipped
+        """
+        path = getattr(self._args, 'rerender', None) or \
+               getattr(self._args, 'resume', None)
+        if not path:
+            return 0
+        state = pm_checkpoint.load(path)
+        meta = state['meta']
+        # the analysis continues seamlessly only if the same recording is 
+        # replayed, a live measurement starts with a new stream of events
+        resume_stream = not getattr(self._args, 'rerender', None) and \
+            meta['offline'] and self._checkpoint_meta()['offline']
+        pm_checkpoint.restore(state, listener, 
+            PM.HOSTS[self._host]['id'] if resume_stream else None)
+        self._event_cnt = meta['events']
+        self._lost_events = meta['lost_events']
+        logger.info("$cstate restored from checkpoint of {} ({} events)"
+                    .format(meta['created'], meta['events']))
+        return meta['events'] if resume_stream else 0
+
+    def _replay_vectorised(self, listener):
+        """
+        @brief Analyses the recording with the vectorised analysis
+
+        @return: False if the recording has to be analysed event by event
+        """
+        try:
+            self._event_cnt = pm_vector.replay(self._args, listener)
+        except pm_vector.Unsupported as e:
+            logger.warning("$cvectorised analysis not possible ({}), the "
+                           "events are analysed one by one".format(e))
+            return False
+        return True
+
+    def _replay_pipeline(self, listener):
+        """
+        @brief Analyses the recording with a pipeline of worker processes. If
+               this is not possible the listeners and hosts are set up again.
+
+        @return: False if the recording has to be analysed by a single process
+        """
+        from MotionWise import pm_pipeline
+        try:
+            self._event_cnt = pm_pipeline.replay(self._args, self._ra_model,
+                                                 listener, self._log_queue)
+        except pm_pipeline.Unsupported as e:
+            logger.warning("$cpipeline analysis not possible ({}), the "
+                           "events are analysed by a single process".format(e))
+            for l in listener.itervalues():
+                l.close()
+            pm_instrument.detach_callbacks()
+            pm_instrument.reset()
+            pm_instrument.sequence_error_callback_add(self._sequence_error_cb)
+            self._event_cnt = 0
+            self._lost_events = 0
+            self._lost_frames = 0
+            listener.clear()
+            listener.update(self._create_listeners())
+            return False
+        return True
+
     def _wait_for_EOF(self, pipe):
         """
         @brief Polls pipe until 'EOF' is received 
@@ -209,10 +395,7 @@ class Client(Process):
     def _configure_logging(self):#
         if self._is_process:
             # configure root logger only if client runs in an own process
-            h = QueueHandler(self._log_queue)
-            root = logging.getLogger()
-            root.addHandler(h)
-            root.setLevel(logging.DEBUG)
+            configure_process(self._log_queue, log_level(self._args))
     
     def flush_pipe(self):
         self.run = self._flush
@@ -227,45 +410,88 @@ class Client(Process):
             pipe = self._pipe_conn
             guard = KeyboardInterruptGuard()   
             listener = self._create_listeners()
+            checkpointer = self._create_checkpointer()
+            skip = self._restore(listener)
             logger.info("$cpress Ctrl-C to stop and write output files")
             time.sleep(0.01) # XXX wait for loc_proc to write last line
             sys.stdout.write('[MotionWise_Perf]: %s\r' % self._status())
             
-            # start loop which to poll for trace events
-            with guard: 
-                while True: 
-                    if pipe.poll():
-                        last_poll = time.time()
-                        item = pipe.recv()
-                        if item != 'EOF':
-                            pm_instrument.receive_event(item)
-                            self._event_cnt += 1
-                            if not self._event_cnt % 1000:
-                                sys.stdout.write('[MotionWise_Perf]: %s\r' 
-                                                 % self._status())
-                        else: 
-                            break # No more data to be received. 
-                    else:
-                        if (time.time() - last_poll) > self._timeout:
-                            # If no event where received during the last x 
-                            # seconds the termination signal is raised
-                            guard.signal_received = True
+            if getattr(self._args, 'rerender', None):
+                # output files are written from the restored measurements
+                pass
+            elif self._args.parallel is not None:
+                # offline replay is split into chunks which are processed by
+                # a pool of worker processes
+                from MotionWise import pm_parallel
+                self._event_cnt, self._lost_events = pm_parallel.replay(
+                    self._args, self._ra_model, listener, self._log_queue)
+            elif getattr(self._args, 'pipeline', None) is not None and \
+                    self._replay_pipeline(listener):
+                # the cores have been processed by worker processes
+                pass
+            elif getattr(self._args, 'vectorised', False) and \
+                    self._replay_vectorised(listener):
+                # the complete recording has been analysed at once
+                pass
+            else:
+                # start loop which to poll for trace events
+                with guard: 
+                    while True: 
+                        if pipe.poll():
+                            last_poll = time.time()
+                            item = pipe.recv()
+                            if type(item) is tuple:
+                                # load, profile or capture statistics
+                                # marker of the proxy
+                                if item[0] == pm_profile.MARKER:
+                                    listener['profile'].marker(*item[1:])
+                                elif item[0] == pm_capture.MARKER:
+                                    self._write_capture_stats(item[1])
+                                else:
+                                    listener['load_shedding'].marker(
+                                        *item[1:])
+                            elif item == 'EOF':
+                                break # No more data to be received. 
+                            elif skip > 0:
+                                # event has been analysed before the 
+                                # checkpoint was taken
+                                skip -= 1
+                            else:
+                                pm_instrument.receive_event(item)
+                                self._event_cnt += 1
+                                if not self._event_cnt % 1000:
+                                    sys.stdout.write('[MotionWise_Perf]: %s\r' 
+                                                     % self._status())
+                                    if checkpointer and checkpointer.due():
+                                        checkpointer.save(listener, 
+                                            PM.HOSTS[self._host]['id'],
+                                            **self._checkpoint_meta())
+                        else:
+                            if (time.time() - last_poll) > self._timeout:
+                                # If no event where received during the last x 
+                                # seconds the termination signal is raised
+                                guard.signal_received = True
                                 
-                    if guard.signal_received:
-                        # termination of program requested 
-                        guard.signal_received = False
-                        if False == self._is_process: 
-                            # Client runs in the context of main process. It 
-                            # exits the while loop to terminate program.
-                            break 
-                        else: 
-                            # Client runs as own process. It notifies the main 
-                            # process that it wants to terminate. 
-                            try: 
-                                pipe.send('EOF')
-                            except IOError: 
-                                pass
-        except Exception: 
+                        if guard.signal_received:
+                            # termination of program requested 
+                            guard.signal_received = False
+                            if False == self._is_process: 
+                                # Client runs in the context of main process. It 
+                                # exits the while loop to terminate program.
+                                break 
+                            else: 
+                                # Client runs as own process. It notifies the main 
+                                # process that it wants to terminate. 
+                                try: 
+                                    pipe.send('EOF')
+                                except IOError: 
+                                    pass
+            if checkpointer:
+                # final state, e.g. for re-rendering of the output files
+                checkpointer.save(listener, PM.HOSTS[self._host]['id'], 
+                                  **self._checkpoint_meta())
+        except Exception as e: 
+            self._error = e
             # XXX exchange with logging call
             logger.error("$cscript has been terminated due to an exception")
             logger.exception(traceback.format_exc())
@@ -23,8 +23,14 @@ import re
 import csv
 import time
 import ctypes
+import timeit
 import logging
 from multiprocessing import Pipe
+from MotionWise import pm_load
+from MotionWise import pm_index
+from MotionWise import pm_capture
+from MotionWise import pm_profile
+from MotionWise import pcap_reader
 from MotionWise.pm_measurement import HOSTS as HOST_MAP
 
 logger = logging.getLogger(__name__)
@@ -35,6 +41,7 @@ class _Model(object):
     def __init__(self, ra_model):
         self._ifset = ra_model.IFSET
         self.id_to_runnable = ra_model.id_to_runnable
+        self.runnable_to_swc = getattr(ra_model, 'runnable_to_swc', {})
         self.SWCID_Map = ra_model.SWCID_Map
         #self.swc_name_to_swc_id = {v:k for k,v in self.SWCID_Map.iteritems()}
         self._swc_name_to_swc_id = {}
@@ -113,6 +120,37 @@ class _CsvConnection(object):
     
     def close(self):
         pass
+
+
+class _PcapConnection(object):
+    """
+    Imitates the behaviour of a multiprocessing.Connection but streams the 
+    trace events of a host from a pcap file without using the RA lib.
+    """
+    
+    def __init__(self, pcap_file, host_id):
+        self._events = pcap_reader.read_events(pcap_file, host_id)
+        self._next = None
+        
+    def poll(self):
+        if self._next is None and self._events is not None:
+            try:
+                self._next = self._events.next()
+            except StopIteration:
+                self._events = None
+        return self._next is not None
+            
+    def recv(self):
+        if not self.poll():
+            raise EOFError
+        item, self._next = self._next, None
+        return item
+    
+    def send(self, item):
+        pass
+    
+    def close(self):
+        self._events = None
  
  
 class Proxy(RA.RA):
@@ -125,25 +163,85 @@ class Proxy(RA.RA):
         RA.RA.__init__(self, init = False)
         self.host_id = HOST_MAP[args.host.upper()]['id']
         self.startup_finished = not args.startup
+        self._sent_cnt = 0
+        self._send_marker = bool(getattr(args, 'max_lag', None))
+        # runnable events dropped by load shedding
+        self._shedder = pm_load.RunnableShedder() if self._send_marker \
+                        else None
+        self._cb_time = 0.0
+        self._cb_cnt = 0
+        # statistics of the RA callback, None if the events are not received
+        # from the RA library or the statistics are disabled
+        self.capture_stats = None
+        self._cb = self._forward_cb
                   
-        if not args.csv_file:
+        if args.time_from or args.time_to:
+            # replay of a time window of a recording
+            self.parent_conn = _CsvConnection(None)
+            self.child_conn = pm_index.WindowConnection(
+                args.csv_file or args.pcap_file, self.host_id, 
+                args.time_from, args.time_to)
+            self._forward_event = True
+        elif args.pcap_file and args.pcap_reader == 'native':
+            self.parent_conn = _CsvConnection(None)
+            if getattr(args, 'parallel', None) is None:
+                self.child_conn = _PcapConnection(args.pcap_file, self.host_id)
+            else:
+                # recording is read by the worker processes of the client
+                self.child_conn = _CsvConnection(None)
+            self._forward_event = True
+        elif not (args.csv_file or args.batch or args.rerender or 
+                  args.synthesize):
             self.parent_conn, self.child_conn = Pipe()
-            self.tracelog_callback_add(self._recv_cb)
+            if getattr(args, 'capture_stats', True):
+                self.capture_stats = pm_capture.CaptureStats()
+                self._cb = self._recv_cb
+            if getattr(args, 'profile', False):
+                self.tracelog_callback_add(self._profiled_recv_cb)
+            else:
+                self.tracelog_callback_add(self._cb)
             self._forward_event = bool(args.pcap_file)
         else: 
             self.parent_conn = _CsvConnection(None)
-            self.child_conn = _CsvConnection(args.csv_file)
+            if args.parallel is None:
+                self.child_conn = _CsvConnection(args.csv_file)
+            else:
+                # recording is read by the worker processes of the client
+                self.child_conn = _CsvConnection(None)
             self._forward_event = True
         
     def _recv_cb(self, ptr):
+        start = pm_capture._clock()
+        msg = ctypes.cast(ptr, ctypes.POINTER(RA.Ra_TraceLog_Message))[0]
+        status, event_type = self._forward(msg)
+        self.capture_stats.add(msg.host_id, msg.entry_type, event_type, 
+                               status, msg.zgt_stamp, start)
+
+    def _forward_cb(self, ptr):
         msg = ctypes.cast(ptr, ctypes.POINTER(RA.Ra_TraceLog_Message))[0]
+        self._forward(msg)
+
+    def _forward(self, msg):
+        """
+        @brief Converts the message to a dictionary and sends it to the client
+        
+        @return: (pm_capture status, event type of trace messages)
+        """
         data = ctypes.cast(msg.data, ctypes.POINTER(RA.Ra_TraceLog_TraceData))
+        event_type = None
 
         # copy elements of object to dictionary
         _buffer = {}
         _buffer["host"] = msg.host_id  
         if msg.host_id != self.host_id:
-            return 
+            return pm_capture.OTHER_HOST, event_type
+        if msg.entry_type == 3 and self._shedder is not None and \
+                self._forward_event:
+            trace = data[0]
+            event_type = trace.event_type
+            if self._shedder.drop(trace.core_id, event_type, trace.event_data,
+                                  msg.msg_count):
+                return pm_capture.SHED, event_type
             
         _buffer["swc"] = msg.component_id
         _buffer["zgt"] = msg.zgt_stamp
@@ -151,7 +249,7 @@ class Proxy(RA.RA):
         if msg.entry_type == 3:
             _buffer["core"] = data[0].core_id
             _buffer["data"] = data[0].event_data
-            _buffer["type"] = data[0].event_type
+            _buffer["type"] = event_type = data[0].event_type
             
             if not self.startup_finished:
                 if _buffer["type"] < 2:
@@ -171,19 +269,66 @@ class Proxy(RA.RA):
                     _buffer["data"] = string
                 _buffer["type"] = 0xFF
                 _buffer["count"]  = ''
-            else: return 
-        else: return
+            else: return pm_capture.DISCARDED, event_type
+        else: return pm_capture.DISCARDED, event_type
         
         try:
             if msg.entry_type == 1 or self._forward_event: 
+                if self._shedder is not None and self._shedder.shed:
+                    _buffer["shed"] = self._shedder.take()
                 self.parent_conn.send(_buffer)
+                self._sent_cnt += 1
+                if self._send_marker and \
+                        not self._sent_cnt % pm_load.MARKER_INTERVAL:
+                    self.parent_conn.send((pm_load.MARKER, time.time(), 
+                                           self._sent_cnt))
+                return pm_capture.FORWARDED, event_type
         except IOError:
             # is excepted in the case the connection is already closed
-            pass  
+            return pm_capture.CLOSED, event_type
+        return pm_capture.DISCARDED, event_type
+      
+    def _profiled_recv_cb(self, ptr):
+        """
+        @brief Measures the time spent in the RA callback and sends it in a 
+               profile marker every pm_profile.MARKER_INTERVAL events
+        """
+        start = timeit.default_timer()
+        self._cb(ptr)
+        self._cb_time += timeit.default_timer() - start
+        self._cb_cnt += 1
+        if self._forward_event and \
+                not self._cb_cnt % pm_profile.MARKER_INTERVAL:
+            try:
+                self.parent_conn.send((pm_profile.MARKER, time.time(), 
+                                       self._sent_cnt, self._cb_time, 
+                                       self._cb_cnt))
+            except IOError:
+                pass
       
     def get_ra_model(self):
         return _Model(self.ra_model)
 
+    def set_runnable_sampling(self, modulus=None, slot=0):
+        """
+        @brief Sets the runnable sampling of the load shedding, i.e. the 
+               runnable events which are dropped before they are sent to the
+               client (see pm_load.RunnableShedder)
+        """
+        if self._shedder is not None:
+            self._shedder.set_sampling(modulus, slot)
+
+    def get_capture_stats(self):
+        """
+        @brief Returns the statistics of the RA callback (see pm_capture)
+        
+        @return: dictionary, None if the events are not received from the RA
+                 library
+        """
+        if self.capture_stats is None:
+            return None
+        return self.capture_stats.snapshot()
+
     def receiving_start(self, delay=0):
         self._forward_event = False
         RA.RA.receiving_start(self)
@@ -50,6 +50,9 @@ import array
 import logging
 import inspect
 import time
+import timeit
+import hashlib
+import json
 try :
     import queue
 except :
@@ -180,6 +183,9 @@ def Std_ReturnType (result, func, arguments):
     @return { `str` }
     """
 
+    if _telemetry is not None :
+        _return_code.value = result
+
     if result != RA_E_OK:
         _warning( "'%s' return value received for function call '%s%s'" % \
                   ( result, func.__name__, arguments )
@@ -347,18 +353,15 @@ def ctypes_array_to_string( array
     assert( type(seperator) is unicode or \
             type(seperator) is str        )
 
-    result = ""
-    first  = True
-    for e in array :
-        if  stop is not None \
-        and stop == e :
-            break
-        if first :
-            result = "%s%s" % (result, convert( e ),)
-            first  = False
-        else :
-            result = "%s%s%s" % (result, seperator, convert( e ),)
-    return result
+    # the elements are collected and joined once, the concatenation of the
+    # partial results is quadratic in the length of the array
+    elements = list( array )
+    if stop is not None :
+        try :
+            elements = elements[ : elements.index( stop ) ]
+        except ValueError :
+            pass
+    return "" + seperator.join( [ convert( e ) for e in elements ] )
 # end def
 
 def ctypes_string_to_array( string
@@ -399,6 +402,76 @@ def ctypes_string_to_array( string
         return tuple( [ ctor( cast( i ) ) for i in string.split( seperator )] )
 # end def
 
+INJECT_HEADER_SIZE = 4    # Middleware header in front of an injected frame
+INJECT_BUFFER_SIZE = 1536 # initial buffer size of RA.inject_frames()
+
+def _byte_source( data ) :
+    """!
+    @private
+    @brief Returns the source of a memmove() for the bytes of data
+
+    Byte strings, bytearrays, byte memoryviews, `array.array` and ctypes
+    arrays with 1 byte elements are used as they are, lists of integers are
+    converted with bytearray(), values outside of 0..255 are truncated like
+    by `ctypes.c_uint8`.
+
+    @param data : `bytes`, `bytearray`, `memoryview`, `array.array`,
+    `ctypes.Array` or `list` <br>
+    bytes
+
+    @return (`object`, `int`) source which can be passed to ctypes.memmove()
+    and the number of bytes
+    """
+
+    if isinstance( data, bytes ) :
+        return data, len( data )
+    if isinstance( data, ctypes.Array ) \
+    and ctypes.sizeof( data._type_ ) == 1 :
+        return data, len( data )
+    if isinstance( data, array.array ) and data.itemsize == 1 :
+        return data.buffer_info()[ 0 ], len( data )
+    if isinstance( data, memoryview ) and data.itemsize == 1 :
+        data = data.tobytes()
+        return data, len( data )
+    if isinstance( data, basestring ) :
+        data = bytearray( ord( c ) & 0xFF for c in data )
+    elif not isinstance( data, bytearray ) :
+        if isinstance( data, ( int, long ) ) :
+            raise TypeError( "object of type '%s' has no len()"
+                           % type( data ).__name__ )
+        try :
+            data = bytearray( data )
+        except ValueError :
+            data = bytearray( e & 0xFF for e in data )
+    if not data :
+        return b"", 0
+    return ( ctypes.c_char * len( data ) ).from_buffer( data ), len( data )
+# end def _byte_source
+
+def _byte_array( data, offset = 0, size = None ) :
+    """!
+    @private
+    @brief Copies data into a new `ctypes.c_uint8` array
+
+    @param data : see _byte_source() <br>
+    bytes to be copied
+
+    @param offset : `int` <br>
+    number of zero bytes in front of data
+
+    @param size : `int` <br>
+    minimum size of the array
+
+    @return `ctypes.c_uint8` array
+    """
+
+    source, n = _byte_source( data )
+    result = ( ctypes.c_uint8 * max( offset + n, size or 0 ) )()
+    if n :
+        ctypes.memmove( ctypes.addressof( result ) + offset, source, n )
+    return result
+# end def _byte_array
+
 
 
 #-------------------------------------------------------------------------------
@@ -914,6 +987,24 @@ class Ra_TraceLog_TraceData (ctypes.Structure):
             , ("event_data"  , ctypes.c_uint64)
             ]
 
+# data of the Ra_TraceLog_Message entry types with their string fields
+# (field, length field or None if NUL terminated) for the batched delivery
+# (see ra_ring.TraceLogDelivery)
+RA_TRACELOG_DATA = \
+    { 1 : ( Ra_TraceLog_LogNotCodedData
+          , [ ("string", "string_length")
+            , ("parameters", "parameters_length")
+            , ("reconstructed_string", None)
+            ]
+          )
+    , 2 : ( Ra_TraceLog_LogCodedData
+          , [ ("parameters", "parameters_length")
+            , ("reconstructed_string", None)
+            ]
+          )
+    , 3 : ( Ra_TraceLog_TraceData, [] )
+    }
+
 
 # Type used for reporting PIE profiling data
 class Ra_ProfilingData (object):
@@ -1196,6 +1287,382 @@ class Ra_LogAndReplayConfig( ctypes.Structure ) :
 
 
 
+#-------------------------------------------------------------------------------
+# Remote Access compiled type converters
+#-------------------------------------------------------------------------------
+
+# The conversion between Python values (dictionaries, lists, numbers) and
+# ctypes instances is compiled once per ctypes type into a specialised
+# function, which is cached. The converters have the semantics of
+# Function._factory (`factory`), RA.as_ctype_instance (`ctype`) and
+# RA.as_python_instance (`python`). Flat arrays of integers and floats are
+# copied with ctypes.memmove from/to an array.array, values which the array
+# module does not accept (e.g. strings, None, out of range integers which
+# ctypes truncates) fall back to the conversion of the single elements.
+
+_INT_TYPES   = ( ctypes.c_byte, ctypes.c_ubyte
+               , ctypes.c_short, ctypes.c_ushort
+               , ctypes.c_int, ctypes.c_uint
+               , ctypes.c_long, ctypes.c_ulong
+               , ctypes.c_longlong, ctypes.c_ulonglong
+               )
+_FLOAT_TYPES = ( ctypes.c_float, ctypes.c_double, ctypes.c_longdouble )
+_CONVERTERS  = { "factory" : {}, "ctype" : {}, "python" : {} }
+
+def _array_codes( ) :
+    codes = set()
+    for code in str( "bBhHiIlLqQfd" ) :
+        try :
+            array.array( code )
+        except ValueError :
+            continue
+        codes.add( code )
+    return codes
+# end def _array_codes
+
+_ARRAY_CODES = _array_codes()
+
+
+def _is_fundamental( t ) :
+    """!
+    @brief Checks if t is a fundamental ctypes type, whose instances are
+           converted to Python values by ctypes, e.g. when read from a
+           structure field
+    """
+    return t.__bases__[0] is ctypes._SimpleCData
+# end def _is_fundamental
+
+
+def _array_code( t ) :
+    """!
+    @brief Returns the array module type code with the memory layout of the
+           ctypes type t, None if there is none
+    """
+    if not issubclass( t, _INT_TYPES + _FLOAT_TYPES ) :
+        return None
+    code = t._type_
+    if code not in _ARRAY_CODES \
+    or array.array( code ).itemsize != ctypes.sizeof( t ) :
+        return None
+    return code
+# end def _array_code
+
+
+def _copy_array( t, result, v, code ) :
+    """!
+    @brief Copies the values v to the beginning of the ctypes array result
+
+    @return `bool` False if the values cannot be copied as a whole
+    """
+    try :
+        a = array.array( code, v[ : t._length_ ] )
+    except ( TypeError, ValueError, OverflowError ) :
+        return False
+    if a :
+        ctypes.memmove( result, a.buffer_info()[ 0 ], len( a ) * a.itemsize )
+    return True
+# end def _copy_array
+
+
+def _converter( kind, t ) :
+    """!
+    @brief Returns the cached converter of kind for the ctypes type t
+
+    The returned function converts a value to a ctypes instance of t
+    (`factory`, `ctype`) or a ctypes instance of t to a Python value
+    (`python`).
+    """
+    cache = _CONVERTERS[ kind ]
+    conv  = cache.get( t )
+    if conv is None :
+        if kind == "python" :
+            conv = _compile_python( t )
+        else :
+            conv, pure = _compile_value( kind, t )
+            if kind == "factory" :
+                plain = _INT_TYPES + ( ctypes.c_float, )
+            else :
+                plain = _INT_TYPES + _FLOAT_TYPES
+            if issubclass( t, plain ) and _is_fundamental( t ) :
+                # the value converter returns plain Python values
+                conv = _instance( t, conv )
+        cache[ t ] = conv
+    return conv
+# end def _converter
+
+
+def _instance( t, conv ) :
+    def convert( v ) :
+        return t( conv( v ) )
+    return convert
+# end def _instance
+
+
+def _compile_value( kind, t ) :
+    """!
+    @brief Compiles the conversion of a value to a ctypes type t
+
+    The returned function returns a value which can be assigned to a field
+    or an element of type t, i.e. a plain Python value for fundamental
+    ctypes types.
+
+    @return `(function, bool)` the converter and whether the conversion of
+            the default (0 for `factory`, None for `ctype`) results in zero
+            memory without side effects
+    """
+    if issubclass( t, ctypes.Structure ) :
+        return _compile_struct( kind, t )
+    if issubclass( t, ctypes.Array ) :
+        return _compile_array( kind, t )
+    if kind == "factory" :
+        return _compile_factory_primitive( t )
+    return _compile_ctype_primitive( t )
+# end def _compile_value
+
+
+def _compile_struct( kind, t ) :
+    fields = []
+    for fn, ft in t._fields_ :
+        conv, pure = _compile_value( kind, ft )
+        fields.append( ( fn, conv, pure ) )
+    defaults = [ ( fn, conv ) for fn, conv, pure in fields if not pure ]
+    pure     = not defaults
+
+    if kind == "factory" :
+        def convert( v ) :
+            result = t()
+            if isinstance( v, dict ) :
+                for fn, conv, pure in fields :
+                    if fn in v :
+                        setattr( result, fn, conv( v[ fn ] ) )
+                    elif not pure :
+                        setattr( result, fn, conv( 0 ) )
+            else :
+                for fn, conv in defaults :
+                    setattr( result, fn, conv( 0 ) )
+            return result
+    else :
+        def convert( v ) :
+            result = t()
+            if hasattr( v, "get" ) :
+                for fn, conv, pure in fields :
+                    x = v.get( fn )
+                    if x is not None or not pure :
+                        setattr( result, fn, conv( x ) )
+            else :
+                for fn, conv in defaults :
+                    setattr( result, fn, conv( None ) )
+            return result
+    return convert, pure
+# end def _compile_struct
+
+
+def _compile_array( kind, t ) :
+    n          = t._length_
+    conv, pure = _compile_value( kind, t._type_ )
+    code       = _array_code( t._type_ ) if _is_fundamental( t._type_ ) else None
+    # element values which are copied unchanged by as_ctype_instance, missing
+    # float elements raise a TypeError
+    floats     = code in ( "f", "d" )
+    accept     = ( int, float ) if floats else ( int, )
+
+    if kind == "factory" :
+        def convert( v ) :
+            result = t()
+            if isinstance( v, list ) :
+                if code is not None and _copy_array( t, result, v, code ) :
+                    return result
+                m = min( len( v ), n )
+                for i in xrange( m ) :
+                    result[ i ] = conv( v[ i ] )
+                if not pure :
+                    for i in xrange( m, n ) :
+                        result[ i ] = conv( 0 )
+            elif not pure :
+                for i in xrange( n ) :
+                    result[ i ] = conv( 0 )
+            return result
+    else :
+        def convert( v ) :
+            if v is None :
+                if code is not None :
+                    return t()
+                v = t()
+            result = t()
+            if code is not None and isinstance( v, ( list, tuple ) ) \
+            and ( not floats or len( v ) >= n ) \
+            and all( type( x ) in accept for x in v ) \
+            and _copy_array( t, result, v, code ) :
+                if floats and 0 in v :
+                    # as_ctype_instance converts -0.0 to 0.0
+                    for i in xrange( n ) :
+                        if v[ i ] == 0 :
+                            result[ i ] = 0.0
+                return result
+            for i in xrange( n ) :
+                try :
+                    vi = v[ i ]
+                except IndexError :
+                    vi = None
+                result[ i ] = conv( vi )
+            return result
+    return convert, pure
+# end def _compile_array
+
+
+def _compile_factory_primitive( t ) :
+    if not issubclass( t, _INT_TYPES + ( ctypes.c_float, ) ) :
+        def convert( v ) :
+            # PPA: this should not be triggered!
+            assert( 0 )
+            return t()
+        return convert, False
+
+    def value( v ) :
+        if isinstance( v, basestring ) and v.endswith( ".0" ) :
+            v = v[ : -2 ]
+        if v is None :
+            v = 0
+        return v
+
+    if _is_fundamental( t ) :
+        return value, True
+
+    def convert( v ) :
+        return t( value( v ) )
+    return convert, False
+# end def _compile_factory_primitive
+
+
+def _compile_ctype_primitive( t ) :
+    if issubclass( t, _FLOAT_TYPES ) :
+        def value( v ) :
+            if isinstance( v, basestring ) and v.endswith( ".0" ) :
+                v = v[ : -2 ]
+            return float( v ) or 0.0
+        # float( None ) raises a TypeError
+        pure = False
+    elif issubclass( t, _INT_TYPES ) :
+        def value( v ) :
+            if isinstance( v, basestring ) and v.endswith( ".0" ) :
+                v = v[ : -2 ]
+            if v is None or not isinstance( v, int ) :
+                return 0
+            return v
+        pure = True
+    else :
+        def convert( v ) :
+            return t( v or 0 )
+        return convert, False
+
+    if _is_fundamental( t ) :
+        return value, pure
+
+    def convert( v ) :
+        return t( value( v ) )
+    return convert, False
+# end def _compile_ctype_primitive
+
+
+def _compile_python( t ) :
+    """!
+    @brief Compiles the conversion of a ctypes instance of t to a Python
+           value: dictionaries for structures, lists for arrays
+    """
+    if not isinstance( t, type ) \
+    or not issubclass( t, ( ctypes.Structure, ctypes.Array ) ) :
+        def convert( v ) :
+            return v.value
+        return convert
+
+    if issubclass( t, ctypes.Structure ) :
+        fields = [ ( fn, _python_field( ft ) ) for fn, ft in t._fields_ ]
+        def convert( v ) :
+            result = dict () # use ordered dict ???
+            for fn, conv in fields :
+                result[ fn ] = conv( getattr( v, fn ) )
+            return result
+        return convert
+
+    code = _array_code( t._type_ )
+    if code is not None :
+        # fundamental elements and subclasses with the same memory layout
+        def convert( v ) :
+            return array.array( code, ctypes.string_at( ctypes.addressof( v )
+                                                      , ctypes.sizeof( v )
+                                                      ) ).tolist()
+        return convert
+
+    conv = _python_field( t._type_ )
+    def convert( v ) :
+        return [ conv( vi ) for vi in v ]
+    return convert
+# end def _compile_python
+
+
+def _python_field( t ) :
+    """!
+    @brief Returns the conversion of a field or element value of type t
+    """
+    if issubclass( t, ctypes._SimpleCData ) and _is_fundamental( t ) :
+        # ctypes has already converted the value
+        return lambda v : v
+    if issubclass( t, ( ctypes.Structure, ctypes.Array ) ) :
+        return _converter( "python", t )
+    return _as_python_value
+# end def _python_field
+
+
+def _as_python_value( v ) :
+    if isinstance( v, ctypes._Pointer ) :
+        v = v.contents
+    return _converter( "python", type( v ) )( v )
+# end def _as_python_value
+
+
+def benchmark_converters( types, number = 100 ) :
+    """!
+    @brief Measures the converters of the given ctypes structure and array
+           types
+
+    The Python value of an instance with all fields set to 1 is converted
+    to a ctypes instance (`factory`, `ctype`) and back (`python`).
+
+    @param types : `list` <br>
+    ctypes types to be measured
+
+    @param number : `int` <br>
+    conversions per measurement
+
+    @return `list` of ( type name, size [bytes], compile time [us],
+            factory [us], ctype [us], python [us] )
+    """
+    result = []
+    for t in types :
+        start = time.time()
+        for kind in ( "factory", "ctype", "python" ) :
+            _CONVERTERS[ kind ].pop( t, None )
+            _converter( kind, t )
+        compiled = ( time.time() - start ) * 1e6
+
+        instance = t()
+        ctypes.memset( ctypes.addressof( instance ), 1, ctypes.sizeof( instance ) )
+        value    = _converter( "python", t )( instance )
+        times    = []
+        for kind, arg in [ ( "factory", value )
+                         , ( "ctype"  , value )
+                         , ( "python" , instance )
+                         ] :
+            conv  = _converter( kind, t )
+            start = time.time()
+            for i in xrange( number ) :
+                conv( arg )
+            times.append( ( time.time() - start ) * 1e6 / number )
+        result.append( ( t.__name__, ctypes.sizeof( t ), compiled ) + tuple( times ) )
+    return result
+# end def benchmark_converters
+
+
 #-------------------------------------------------------------------------------
 # Remote Access helper classes and functions
 #-------------------------------------------------------------------------------
@@ -1254,7 +1721,7 @@ class Function (object) :
             params = [ params ]
 
         for (pt, pn) in self.parameters :
-            arg = self._factory( pt, params[ index ] )
+            arg = _converter( "factory", pt )( params[ index ] )
             arg = ctypes.cast( ctypes.addressof(arg), self.fct.argtypes[ index ] )
             parameters.append( arg )
             index = index + 1
@@ -1264,56 +1731,214 @@ class Function (object) :
 
 
     def _factory( self, t, v ) :
-        default = 0
-        result  = t()
-        if issubclass( t, ctypes.Structure ) :
-            # we got a structure
-            for fn, ft in t._fields_ :
-                #print( "    {%s} %s" % (fn, ft) )
-                x = None
-                if isinstance( v, dict ) and fn in v :
-                    x = self._factory( ft, v[ fn ] )
-                else :
-                    x = self._factory( ft, default )
-                setattr( result, fn, x )
-
-        elif issubclass( t, ctypes.Array ) :
-            # we got a array
-            for i in xrange( t._length_ ) :
-                #print( "    [%s] %s" % ( i, t._type_ ) )
-                x = None
-                if isinstance( v, list ) and i < len( v ) :
-                    x = self._factory( t._type_, v[ i ] )
-                else :
-                    x = self._factory( t._type_, default )
-                result[ i ] = x
-
-        elif issubclass( t, ( ctypes.c_byte, ctypes.c_ubyte
-                            , ctypes.c_short, ctypes.c_ushort
-                            , ctypes.c_int, ctypes.c_uint
-                            , ctypes.c_long, ctypes.c_ulong
-                            , ctypes.c_longlong, ctypes.c_ulonglong
-                            , ctypes.c_float
-                            ) ) :
-            #print( "%s : %s" % ( v, t ) )
-
-            # we got a primitive data type
-            if isinstance( v, basestring ) and v.endswith (".0") :
-                v = v [:-2]
-            x = v
-            if x is None :
-                x = default
-
-            result = t( x )
+        return _converter( "factory", t )( v )
+    # end def
+# end class Function
 
-        else :
-            # PPA: this should not be triggered!
-            assert( 0 )
 
+
+#-------------------------------------------------------------------------------
+# Remote Access shared library call telemetry
+#-------------------------------------------------------------------------------
+
+RA_API_TELEMETRY_BUCKETS = 24   # upper limit of the last bucket 2^23 us
+
+_telemetry   = None             # RA_API_Telemetry if enabled
+_return_code = threading.local()
+_clock       = timeit.default_timer
+
+def _return_type_name( code ) :
+    name = _RA_E_OK.get_name( code )
+    if isinstance( name, basestring ) :
+        return name
+    return "%s" % ( code, )
+# end def _return_type_name
+
+
+class RA_API_Telemetry( object ) :
+    """!
+    @brief Call counts, latencies and error codes of the RA shared library calls
+
+    Records every call of a RA_API function: the number of calls, the calls
+    skipped by the wrapper (no library call, e.g. replay_wait() without a
+    replay), the latency of the library call as histogram with the buckets
+    [0, 1), [1, 2), [2, 4), ... us, the returned Std_ReturnType codes
+    other than OK and the exceptions.
+
+    @param slow_ms : `float` <br>
+    calls taking at least slow_ms milliseconds are logged, None to disable
+    """
+
+    def __init__( self, slow_ms = None ) :
+        self.slow_ms   = slow_ms
+        self.functions = dict()
+        self._lock     = threading.Lock()
+        self._start    = time.time()
+    # end def __init__
+
+    def _entry( self, name, fname ) :
+        entry = self.functions.get( name )
+        if entry is None :
+            entry = self.functions[ name ] = \
+                { "function" : fname
+                , "calls"    : 0
+                , "skipped"  : 0
+                , "errors"   : 0
+                , "codes"    : dict()
+                , "total"    : 0.0
+                , "max"      : 0.0
+                , "buckets"  : [ 0 ] * RA_API_TELEMETRY_BUCKETS
+                }
+        return entry
+    # end def _entry
+
+    def skipped( self, name, fname ) :
+        with self._lock :
+            self._entry( name, fname )[ "skipped" ] += 1
+    # end def skipped
+
+    def record( self, name, fname, seconds, code = None, error = None ) :
+        """!
+        @brief Accounts a library call
+
+        @param seconds : `float` <br>
+        duration of the call
+
+        @param code : `int` <br>
+        Std_ReturnType code, None if the function has no error checking
+
+        @param error : `str` <br>
+        name of the exception raised by the call
+        """
+
+        us = int( seconds * 1e6 )
+        with self._lock :
+            entry = self._entry( name, fname )
+            entry[ "calls" ] += 1
+            entry[ "total" ] += seconds
+            if seconds > entry[ "max" ] :
+                entry[ "max" ] = seconds
+            entry[ "buckets" ][ min( us.bit_length(), RA_API_TELEMETRY_BUCKETS - 1 ) ] += 1
+            if code is not None and code != RA_E_OK :
+                key = _return_type_name( code )
+                entry[ "codes" ][ key ] = entry[ "codes" ].get( key, 0 ) + 1
+                entry[ "errors" ] += 1
+            elif error is not None :
+                entry[ "codes" ][ error ] = entry[ "codes" ].get( error, 0 ) + 1
+                entry[ "errors" ] += 1
+        if  self.slow_ms is not None \
+        and seconds * 1e3 >= self.slow_ms :
+            _warning( "slow RA API call '%s' (%s): %.3f ms", name, fname, seconds * 1e3 )
+    # end def record
+
+    @staticmethod
+    def _percentile( entry, p ) :
+        limit = entry[ "calls" ] * p / 100.0
+        n     = 0
+        for i, c in enumerate( entry[ "buckets" ] ) :
+            n += c
+            if n >= limit :
+                return min( 1 << i, entry[ "max" ] * 1e6 )
+        return entry[ "max" ] * 1e6
+    # end def _percentile
+
+    def snapshot( self ) :
+        """!
+        @brief Current statistics
+
+        @return `dict` function name -> `dict` with calls, skipped, errors,
+        codes (code name -> count), mean, p50, p99 and max [us] and the
+        histogram buckets
+        """
+
+        result = dict()
+        with self._lock :
+            for name, entry in self.functions.items() :
+                calls = entry[ "calls" ]
+                result[ name ] = \
+                    { "function" : entry[ "function" ]
+                    , "calls"    : calls
+                    , "skipped"  : entry[ "skipped" ]
+                    , "errors"   : entry[ "errors" ]
+                    , "codes"    : dict( entry[ "codes" ] )
+                    , "mean"     : entry[ "total" ] * 1e6 / calls if calls else None
+                    , "p50"      : self._percentile( entry, 50 ) if calls else None
+                    , "p99"      : self._percentile( entry, 99 ) if calls else None
+                    , "max"      : entry[ "max" ] * 1e6
+                    , "buckets"  : list( entry[ "buckets" ] )
+                    }
         return result
-    # end def
-# end class Function
+    # end def snapshot
+
+    def dump( self, file = None ) :
+        """!
+        @brief Prints the statistics as table, sorted by the total call time
+
+        @param file : `file` <br>
+        output file, None for stderr
+        """
+
+        fmt  = lambda v : "-" if v is None else "%.1f" % v
+        rows = sorted( self.snapshot().items()
+                     , key = lambda i : - ( i[1][ "mean" ] or 0 ) * i[1][ "calls" ] )
+        out  = file or sys.stderr
+        print( "RA API telemetry (%.1fs)" % ( time.time() - self._start, ), file = out )
+        print( "%-32s %8s %8s %8s %10s %10s %10s %10s  %s"
+             % ( "function", "calls", "skipped", "errors", "mean[us]", "p50[us]"
+               , "p99[us]", "max[us]", "codes" ), file = out )
+        for name, s in rows :
+            print( "%-32s %8d %8d %8d %10s %10s %10s %10s  %s"
+                 % ( name, s[ "calls" ], s[ "skipped" ], s[ "errors" ]
+                   , fmt( s[ "mean" ] ), fmt( s[ "p50" ] ), fmt( s[ "p99" ] )
+                   , fmt( s[ "max" ] )
+                   , ", ".join( "%s=%s" % kv for kv in sorted( s[ "codes" ].items() ) ) )
+                 , file = out )
+    # end def dump
+# end class RA_API_Telemetry
+
+
+def telemetry_enable( slow_ms = None, at_exit = False ) :
+    """!
+    @brief Enables the telemetry of the RA shared library calls
+
+    @param slow_ms : `float` <br>
+    calls taking at least slow_ms milliseconds are logged, None to disable
+
+    @param at_exit : `bool` <br>
+    print the statistics at the exit of the interpreter
+
+    @return `RA_API_Telemetry`
+    """
+
+    global _telemetry
+    if _telemetry is None :
+        _telemetry = RA_API_Telemetry( slow_ms )
+        if at_exit :
+            atexit.register( lambda t = _telemetry : t.dump() )
+    else :
+        _telemetry.slow_ms = slow_ms
+    return _telemetry
+# end def telemetry_enable
+
+def telemetry_disable( ) :
+    """!
+    @brief Disables the telemetry of the RA shared library calls
+
+    @return `RA_API_Telemetry`, `None` the telemetry recorded so far
+    """
+
+    global _telemetry
+    telemetry, _telemetry = _telemetry, None
+    return telemetry
+# end def telemetry_disable
+
+def telemetry( ) :
+    """!
+    @return `RA_API_Telemetry`, `None` if the telemetry is disabled
+    """
 
+    return _telemetry
+# end def telemetry
 
 
 #-------------------------------------------------------------------------------
@@ -1353,6 +1978,8 @@ def RA_API( fname, etype = None, rtype = None, atype = None) :
 
     def _init( func ):
 
+        api_name = fname
+
         RA_API_Data[ "RAlib" + func.__name__ ] = \
             ( fname
             , etype
@@ -1432,6 +2059,8 @@ def RA_API( fname, etype = None, rtype = None, atype = None) :
             arguments = func( self, *args, **kwargs )
 
             if arguments is None :
+                if _telemetry is not None :
+                    _telemetry.skipped( function_key, api_name )
                 return
 
             assert( function_key in RA_API_Data and \
@@ -1449,12 +2078,16 @@ def RA_API( fname, etype = None, rtype = None, atype = None) :
                            , RA_API_Data[ function_key ]
                            , arguments, level=9997 )
 
-            # PPA: improve this with better and generic error handling!!!
-            try:
-                result = function_obj( *arguments )
-            except RA_Error as e:
-                print( str(e) )
-                sys.exit(1)
+            telemetry = _telemetry
+            if telemetry is not None :
+                result = _call_timed( telemetry, function_key, api_name, function_obj, arguments )
+            else :
+                # PPA: improve this with better and generic error handling!!!
+                try:
+                    result = function_obj( *arguments )
+                except RA_Error as e:
+                    print( str(e) )
+                    sys.exit(1)
 
             self._verbose( "[%s]: result = %s", func.__name__, result, level=9996 )
 
@@ -1463,6 +2096,430 @@ def RA_API( fname, etype = None, rtype = None, atype = None) :
     return _init
 
 
+def _call_timed( telemetry, name, fname, function_obj, arguments ) :
+    """!
+    @private
+    @brief Calls a RA shared library function and records it in the telemetry
+    """
+
+    _return_code.value = None
+    start = _clock()
+    try:
+        result = function_obj( *arguments )
+    except RA_Error as e:
+        telemetry.record( name, fname, _clock() - start, e.result )
+        print( str(e) )
+        sys.exit(1)
+    except Exception as e:
+        telemetry.record( name, fname, _clock() - start, error = type( e ).__name__ )
+        raise
+    telemetry.record( name, fname, _clock() - start, _return_code.value )
+    return result
+# end def _call_timed
+
+
+#-------------------------------------------------------------------------------
+# Contract header registry
+#-------------------------------------------------------------------------------
+
+RA_CONTRACT_INDEX         = ".Ra_Type.index"
+RA_CONTRACT_INDEX_VERSION = 2
+# value types of the index entries (see ContractHeaders._index_entry)
+RA_CONTRACT_INDEX_FIELDS  = \
+    { "path"          : basestring
+    , "stamp"         : tuple
+    , "hash"          : basestring
+    , "functions"     : list
+    , "types"         : list
+    , "ids"           : list
+    , "element_to_id" : dict
+    , "host"          : basestring
+    , "swc_to_frames" : dict
+    , "frame_to_swcs" : dict
+    }
+
+def _index_encode( value ) :
+    """!
+    @private
+    @brief Converts a value of the contract header index to JSON data
+
+    Dictionaries, tuples and sets are tagged, so that _index_decode() restores
+    them including dictionary keys which are not strings.
+    """
+
+    if isinstance( value, dict ) :
+        return { "dict" : [ [ _index_encode( k ), _index_encode( v ) ]
+                            for k, v in value.items() ] }
+    if isinstance( value, tuple ) :
+        return { "tuple" : [ _index_encode( v ) for v in value ] }
+    if isinstance( value, ( set, frozenset ) ) :
+        return { "set" : [ _index_encode( v ) for v in value ] }
+    if isinstance( value, list ) :
+        return [ _index_encode( v ) for v in value ]
+    if value is None or isinstance( value, ( basestring, bool, int, long, float ) ) :
+        return value
+    raise TypeError( "%r cannot be stored in the contract header index" % ( value, ) )
+# end def _index_encode
+
+def _index_decode( data ) :
+    """!
+    @private
+    @brief Restores a value encoded by _index_encode()
+
+    @exception ValueError if the data has not been created by _index_encode()
+    """
+
+    if isinstance( data, list ) :
+        return [ _index_decode( v ) for v in data ]
+    if isinstance( data, dict ) :
+        if len( data ) != 1 :
+            raise ValueError( "invalid contract header index" )
+        tag, items = list( data.items() )[ 0 ]
+        if not isinstance( items, list ) :
+            raise ValueError( "invalid contract header index" )
+        if tag == "dict" :
+            if not all( isinstance( i, list ) and len( i ) == 2 for i in items ) :
+                raise ValueError( "invalid contract header index" )
+            return dict( ( _index_decode( k ), _index_decode( v ) ) for k, v in items )
+        if tag == "tuple" :
+            return tuple( _index_decode( v ) for v in items )
+        if tag == "set" :
+            return set( _index_decode( v ) for v in items )
+        raise ValueError( "invalid contract header index" )
+    if sys.version_info.major == 2 and isinstance( data, unicode ) :
+        try :
+            return data.encode( "ascii" )
+        except UnicodeError :
+            return data
+    return data
+# end def _index_decode
+
+def _valid_index_entry( swc, entry ) :
+    """!
+    @private
+    @brief Checks the structure of an entry of the contract header index
+    """
+
+    return isinstance( swc, basestring ) \
+       and isinstance( entry, dict ) \
+       and all( isinstance( entry.get( k ), t )
+                for k, t in RA_CONTRACT_INDEX_FIELDS.items() ) \
+       and len( entry[ "stamp" ] ) == 2 \
+       and all( isinstance( f, tuple ) and len( f ) == 2
+                and isinstance( f[ 0 ], basestring ) and isinstance( f[ 1 ], list )
+                for f in entry[ "functions" ] )
+# end def _valid_index_entry
+
+def _user_cache_dir( ) :
+    """!
+    @private
+    @brief Returns the cache folder of the user, None if it cannot be created
+           or is writable by other users
+    """
+
+    base = os.environ.get( "LOCALAPPDATA" ) \
+        or pjoin( os.path.expanduser( "~" ), ".cache" )
+    path = pjoin( base, "MotionWise" )
+    try :
+        if not os.path.isdir( path ) :
+            os.makedirs( path, 0o700 )
+        st = os.lstat( path )
+    except OSError :
+        return None
+    if hasattr( os, "getuid" ) :
+        import stat
+        if  not stat.S_ISDIR( st.st_mode ) \
+        or st.st_uid != os.getuid() \
+        or st.st_mode & ( stat.S_IWGRP | stat.S_IWOTH ) :
+            return None
+    return path
+# end def _user_cache_dir
+
+class _LazyDict( dict ) :
+    """!
+    @private
+    @brief Dictionary which loads the contract header defining a missing key
+
+    @param owners : `dict` <br>
+    key -> SW-C name of the contract header defining the key
+
+    @param load : `function` <br>
+    loads the contract header of a SW-C name
+    """
+
+    def __init__( self, owners, load ) :
+        dict.__init__( self )
+        self._owners = owners
+        self._load   = load
+    # end def __init__
+
+    def _resolve( self, key ) :
+        try :
+            swc = self._owners.get( key )
+        except TypeError :
+            return False
+        if swc is None :
+            return False
+        self._load( swc )
+        return dict.__contains__( self, key )
+    # end def _resolve
+
+    def __missing__( self, key ) :
+        if self._resolve( key ) :
+            return dict.__getitem__( self, key )
+        raise KeyError( key )
+    # end def __missing__
+
+    def __contains__( self, key ) :
+        return dict.__contains__( self, key ) or self._resolve( key )
+    # end def __contains__
+
+    def get( self, key, default = None ) :
+        if dict.__contains__( self, key ) or self._resolve( key ) :
+            return dict.__getitem__( self, key )
+        return default
+    # end def get
+# end class _LazyDict
+
+
+class ContractHeaders( object ) :
+    """!
+    @brief Lazy registry of the SW-C contract headers
+
+    The contract header Ra_Type.py of a SW-C is only imported on the first
+    access to one of its transmit functions or types. The names of the
+    functions and types, the data element IDs and the frame mappings of all
+    SW-Cs are kept in a persistent JSON index (RA_CONTRACT_INDEX in the
+    contract header folder, in the cache folder of the user if it is not
+    writable). The index only contains data, its entries are validated and
+    only refer to the Ra_Type.py of their SW-C in the contract header folder.
+    An entry
+    of the index is valid as long as the modification time and size or the
+    SHA-1 hash of its Ra_Type.py do not change, otherwise the contract header
+    is imported once to update the entry.
+
+    @param ra : `RA` <br>
+    RA instance the contract headers are registered with
+
+    @param contract_dir : `str` <br>
+    contract header folder
+
+    @param swcs : `list` <br>
+    SW-C names in the order of registration
+    """
+
+    def __init__( self, ra, contract_dir, swcs ) :
+        self._ra            = ra
+        self._dir           = contract_dir
+        self._swcs          = swcs
+        self._lock          = threading.RLock()
+        self.entries        = collections.OrderedDict()
+        self.loaded         = set()
+        self.function_owner = dict()
+        self.type_owner     = dict()
+        self.id_owner       = dict()
+        self.indexed        = 0
+        self.index_file     = pjoin( contract_dir, RA_CONTRACT_INDEX )
+    # end def __init__
+
+    @staticmethod
+    def _stamp( path ) :
+        st = os.stat( path )
+        return ( st.st_mtime, st.st_size )
+    # end def _stamp
+
+    @staticmethod
+    def _hash( path ) :
+        with open( path, "rb" ) as f :
+            return hashlib.sha1( f.read() ).hexdigest()
+    # end def _hash
+
+    def _index_files( self ) :
+        files    = [ self.index_file ]
+        user_dir = _user_cache_dir()
+        if user_dir is not None :
+            files.append \
+                ( pjoin
+                    ( user_dir
+                    , "%s_%s" % ( RA_CONTRACT_INDEX.lstrip( "." )
+                                , hashlib.sha1( os.path.abspath( self._dir ).encode( "utf-8" ) )
+                                      .hexdigest()[ : 12 ]
+                                )
+                    )
+                )
+        return files
+    # end def _index_files
+
+    def _read_index( self ) :
+        for path in self._index_files() :
+            try :
+                with open( path, "rb" ) as f :
+                    index = json.loads( f.read().decode( "utf-8" ) )
+                if  not isinstance( index, dict ) \
+                or index.get( "version" ) != RA_CONTRACT_INDEX_VERSION :
+                    continue
+                entries = _index_decode( index[ "entries" ] )
+            except ( IOError, OSError, ValueError, KeyError, TypeError ) :
+                continue
+            if not isinstance( entries, dict ) :
+                continue
+            self.index_file = path
+            return dict \
+                ( ( swc, entry ) for swc, entry in entries.items()
+                  if  _valid_index_entry( swc, entry )
+                  and entry[ "path" ] == pjoin( self._dir, swc, "Ra_Type.py" )
+                )
+        return {}
+    # end def _read_index
+
+    def _write_index( self ) :
+        try :
+            data = json.dumps \
+                ( { "version" : RA_CONTRACT_INDEX_VERSION
+                  , "entries" : _index_encode( dict( self.entries ) )
+                  }
+                , sort_keys = True
+                )
+        except ( TypeError, ValueError ) as e :
+            self._ra._verbose( "contract header index not written: %s", e, level = 1 )
+            return False
+        for path in self._index_files() :
+            tmp = "%s.%s" % ( path, os.getpid() )
+            try :
+                with open( tmp, "wb" ) as f :
+                    f.write( data.encode( "utf-8" ) )
+                if os.path.exists( path ) :
+                    os.remove( path )
+                os.rename( tmp, path )
+                self.index_file = path
+                return True
+            except ( IOError, OSError ) :
+                if os.path.exists( tmp ) :
+                    try :
+                        os.remove( tmp )
+                    except OSError :
+                        pass
+        return False
+    # end def _write_index
+
+    def _import( self, swc, path ) :
+        return _load_module_attr \
+            ( path
+            , [ "_" + swc + "_functions"
+              , swc + "_swc_host_name"
+              , swc + "_swc_to_frames"
+              , swc + "_frame_to_swcs"
+              , "ID2Type_Map"
+              , "element_to_id"
+              ]
+            )
+    # end def _import
+
+    def _index_entry( self, swc, path, stamp, digest ) :
+        """!
+        @brief Imports the contract header of a SW-C and returns its index entry
+        """
+
+        result = self._import( swc, path )
+        if result is None :
+            return None
+        functions = []
+        types     = set()
+        for name, parameters, aliases in result[ "_" + swc + "_functions" ] :
+            functions.append( ( name, list( aliases ) ) )
+            for pt, pn in parameters :
+                types.add( pn )
+                types.add( pt.__name__ )
+        return { "path"          : path
+               , "stamp"         : stamp
+               , "hash"          : digest
+               , "functions"     : functions
+               , "types"         : sorted( types )
+               , "ids"           : list( result[ "ID2Type_Map" ] )
+               , "element_to_id" : dict( result[ "element_to_id" ] )
+               , "host"          : result[ swc + "_swc_host_name" ]
+               , "swc_to_frames" : result[ swc + "_swc_to_frames" ]
+               , "frame_to_swcs" : result[ swc + "_frame_to_swcs" ]
+               }
+    # end def _index_entry
+
+    def scan( self ) :
+        """!
+        @brief Reads the index and updates the entries of changed contract headers
+
+        @return `int` number of imported contract headers
+        """
+
+        cached  = self._read_index()
+        changed = False
+        for swc in self._swcs :
+            path = pjoin( self._dir, swc, "Ra_Type.py" )
+            if not ( os.path.isfile( path ) and os.access( path, os.R_OK ) ) :
+                changed = changed or swc in cached
+                continue
+            stamp = self._stamp( path )
+            entry = cached.get( swc )
+            if entry is None or entry[ "path" ] != path :
+                entry = None
+            elif entry[ "stamp" ] != stamp :
+                digest = self._hash( path )
+                if entry[ "hash" ] == digest :
+                    entry[ "stamp" ] = stamp
+                    changed          = True
+                else :
+                    entry = None
+            if entry is None :
+                entry = self._index_entry( swc, path, stamp, self._hash( path ) )
+                if entry is None :
+                    continue
+                self.indexed = self.indexed + 1
+                changed      = True
+            self.entries[ swc ] = entry
+
+        for swc, entry in self.entries.items() :
+            for name, aliases in entry[ "functions" ] :
+                for n in [ name ] + [ a for a in aliases if a ] :
+                    self.function_owner.setdefault( n, swc )
+            for name in entry[ "types" ] :
+                self.type_owner[ name ] = swc
+            for i in entry[ "ids" ] :
+                self.id_owner[ i ] = swc
+
+        if changed or len( cached ) != len( self.entries ) :
+            self._write_index()
+        return self.indexed
+    # end def scan
+
+    def load( self, swc ) :
+        """!
+        @brief Imports the contract header of a SW-C and registers it
+
+        @return `bool` True if the contract header has been imported now
+        """
+
+        with self._lock :
+            if swc in self.loaded or swc not in self.entries :
+                return False
+            self.loaded.add( swc )
+            path   = self.entries[ swc ][ "path" ]
+            self._ra._verbose( "load contract header '%s'", path, level = 1 )
+            result = self._import( swc, path )
+            if result is not None :
+                self._ra._register_contract_header( swc, result, self.id_owner )
+            return True
+    # end def load
+
+    def preload( self ) :
+        """!
+        @brief Imports all contract headers
+        """
+
+        for swc in self.entries :
+            self.load( swc )
+    # end def preload
+# end class ContractHeaders
+
+
 #-------------------------------------------------------------------------------
 # Remote Access wrapper class
 #-------------------------------------------------------------------------------
@@ -1562,6 +2619,7 @@ class RA (object) :
         self.TYPES          = dict ()
         self.CALLBACK_TYPES = dict()
         self.bdl_hooks = []
+        self.bdl_buffers = {}
 
         _print( "RA.py v%s", __version__ )
 
@@ -1586,6 +2644,10 @@ class RA (object) :
             else :
                 self.verbose = ra_verbose_lvl
 
+        # manage telemetry option
+        if args.ra_telemetry is not None :
+            telemetry_enable( args.ra_telemetry or None, at_exit = True )
+
         # hidden option --ra-devel [ RA_LIB_DIR ]
         #
         # provide default path settings for --ra-contract and --ra-model
@@ -1596,7 +2658,12 @@ class RA (object) :
         ra_contract_dir = None
         lib_name_dbg    = ""
 
-        if "site-package" in __file__ :
+        if args.ra_sim is not None :
+            # simulated RA library, see ra_sim.py
+            ra_model_file   = args.ra_model
+            if os.path.isdir( args.ra_contract ) :
+                ra_contract_dir = args.ra_contract
+        elif "site-package" in __file__ :
             ra_model_file   = pjoin (__file__, "..", "RA_Model.py")
             ra_lib_dir      = pjoin (__file__, "..", "bin")
             ra_contract_dir = pjoin (__file__, "..", "Contract_Header")
@@ -1613,7 +2680,7 @@ class RA (object) :
                 , "Contract_Header" 
                 )
 
-        if self.verbose > 0 :
+        if self.verbose > 0 and ra_lib_dir :
             ra_lib_dir = pjoin( ra_lib_dir, "debug" )
             lib_name_dbg = "_dbg"
 
@@ -1644,20 +2711,37 @@ class RA (object) :
 
         lib_name = "libRA_%s%s%s.%s" % ( lib_name_sys, lib_name_bit, lib_name_dbg, lib_name_ext )
 
-        ra_lib_file = pjoin( ra_lib_dir, lib_name )
-        self._verbose( "load shared library '" + ra_lib_file + "'" )
-        try :
-            #if lib_name_sys == "win" :
-            self._lib = ctypes.CDLL( ra_lib_file )
-            #else :
-            #    self._lib = ctypes.CDLL( ra_lib_file, mode = ctypes.RTLD_GLOBAL )
-        except OSError :
-            #import pdb; pdb.set_trace()
+        self.sim = None
+        if args.ra_sim is not None :
+            from MotionWise import ra_sim
+            self._verbose( "simulate shared library, scenario '%s'", args.ra_sim )
+            _warning( "*** RA library SIMULATED, no hardware is accessed "
+                      "(scenario '%s'%s) ***"
+                    , args.ra_sim or "default"
+                    , ", set by environment variable RA_SIM"
+                      if args.ra_sim == os.environ.get( "RA_SIM" ) else ""
+                    )
+            try :
+                self.sim = self._lib = ra_sim.SimLib( self, args.ra_sim )
+            except ( IOError, ValueError ) as e :
+                parser.error( "could not load RA simulation scenario '%s': %s" % ( args.ra_sim, e ) )
+        else :
+            ra_lib_file = pjoin( ra_lib_dir, lib_name )
+            self._verbose( "load shared library '" + ra_lib_file + "'" )
+            try :
+                #if lib_name_sys == "win" :
+                self._lib = ctypes.CDLL( ra_lib_file )
+                #else :
+                #    self._lib = ctypes.CDLL( ra_lib_file, mode = ctypes.RTLD_GLOBAL )
+            except OSError :
+                #import pdb; pdb.set_trace()
 
-            parser.error( "could not load shared library '%s'" % (ra_lib_file,) )
+                parser.error( "could not load shared library '%s'" % (ra_lib_file,) )
 
         # register some additional callback function data types from Ra.h
         self.callbacks = collections.defaultdict (lambda : collections.defaultdict (list))
+        # ra_ring.Delivery objects of the batched callbacks
+        self.deliveries = collections.OrderedDict()
         self._verbose( "initialize RA callback functions" )
 
         # PPA: this function gets transformed into function decorators
@@ -1686,6 +2770,8 @@ class RA (object) :
         self._swc_to_frames = dict()
         self._frame_to_swcs = dict()
         self._element_to_id = dict()
+        self._contract_headers = None
+        _error_cnt             = 0
 
         # load SW-C specific contract header information regarding the RA transmit functions
         # Note that this is optional an not needed for use cases such as configuring the logging
@@ -1706,104 +2792,9 @@ class RA (object) :
                 self._swc_name_to_swc_id[ key ] = val
                 self._swc_id_to_swc_name[ val ] = key
 
-            _error_cnt          = 0
-            no_contract_headers = True
+            _error_cnt = self._init_contract_headers( ra_contract_dir )
 
-            for swc in self._swc_name_to_swc_id :
-                _swc_key = str( swc )
-
-                swc = _swc_key
-                _s2h = swc + "_swc_host_name"
-                _s2f = swc + "_swc_to_frames"
-                _f2s = swc + "_frame_to_swcs"
-                _id2t = "ID2Type_Map"
-                _e2i = "element_to_id"
-
-                _transmit_func = "_" + swc + "_functions"
-
-                swc_file = pjoin( ra_contract_dir, swc, "Ra_Type.py" )
-                swc_attr =  [ _transmit_func
-                            , _s2h
-                            , _s2f
-                            , _f2s
-                            , _id2t
-                            , _e2i
-                            ]
-
-                # load the SW-C functions from the Contract Header Ra_Type.py
-                result = _load_module_attr( swc_file, swc_attr )
-
-                # if it is None, the file does not exists and we continue
-                if result is None :
-                    continue
-                else :
-                    no_contract_headers = False
-
-                for _swc_attr in swc_attr :
-                    self._verbose( "loaded from '%s' the attribute '%s'"
-                                , os.path.basename( swc_file )
-                                , _swc_attr
-                                , level=999 )
-
-                self.ra_model.ID2Type_Map = dict(self.ra_model.ID2Type_Map.items() + result[_id2t].items())
-
-                for k,v in result[ _e2i ].iteritems() :
-                    if k in self._element_to_id :
-                        _v = self._element_to_id[ k ]
-                        if v != _v :
-                            _error( "element ID of '%s' is defined with different values '%s' and '%s' ", k,v,_v )
-                        else :
-                            continue
-
-                    self._verbose( "%s -> %s", k, v, level=10000 )
-                    self._element_to_id[ k ] = v
-
-
-                # :::... SWC to host mapping ...:::
-                if _swc_key not in self._swc_to_host :
-                    self._swc_to_host[ _swc_key ] = set()
-                self._swc_to_host[ _swc_key ] = result[ _s2h ]
-
-                # :::... SWC to FRAME mapping and vice versa ...:::
-                for sid, fids in result[ _s2f ].iteritems() :
-                    if sid not in self._swc_to_frames :
-                        self._swc_to_frames[ sid ] = ( set(), set() )
-                    for recv_or_send in [ 0, 1 ] :
-                        for f in fids[ recv_or_send ] :
-                            for item in list(result[ _f2s ][f][recv_or_send]) :
-                                if list(item)[1] == True:
-                                    self._swc_to_frames[ sid ][ recv_or_send ].add( f )
-
-                for fid, sids in result[ _f2s ].iteritems() :
-                    if fid not in self._frame_to_swcs :
-                        self._frame_to_swcs[ fid ] = ( set(), set() )
-                    for recv_or_send in [ 0, 1 ] :
-                        for s in sids[ recv_or_send ] :
-                            self._frame_to_swcs[ fid ][ recv_or_send ].add( s[0] )
-
-                # :::... TRANSMIT FUNCTIONS LOADING ...:::
-                # add the SW-C functions to the self._FUNCTIONS member
-                for name, parameters, aliases in result[ _transmit_func ] :
-
-                    fct = Function( self, name, aliases, swc, *parameters )
-
-                    if not hasattr( fct, "signature" ) :
-                        _error_cnt = _error_cnt + 1
-                        continue
-
-                    found = False
-                    for f in self._FUNCTIONS :
-                        if str(f) == str(fct) :
-                            found = True
-                            break
-
-                    if not found :
-                        self._FUNCTIONS.append (fct)
-                        setattr(self, name, fct)
-                        for a in aliases :
-                            if a :
-                                setattr(self, a, fct)
-            if no_contract_headers :
+            if not self._contract_headers.entries :
                 _error ( "No contract headers found! "
                          "(Did you move the installer before running it?)"
                        )
@@ -1826,6 +2817,221 @@ class RA (object) :
 
     # end def __init__
 
+    def __getattr__( self, name ) :
+        # transmit functions of contract headers which are not loaded yet
+        registry = self.__dict__.get( "_contract_headers" )
+        if registry is not None and not name.startswith( "__" ) :
+            swc = registry.function_owner.get( name )
+            if swc is not None :
+                registry.load( swc )
+                if name in self.__dict__ :
+                    return self.__dict__[ name ]
+        raise AttributeError( "'%s' object has no attribute '%s'"
+                            % ( type( self ).__name__, name ) )
+    # end def __getattr__
+
+    def _init_contract_headers( self, ra_contract_dir ) :
+        """!
+        @private
+        @brief Reads the contract header index of all SW-Cs
+
+        The element IDs and the SW-C/frame mappings are taken from the index,
+        the transmit functions and types are loaded on demand (see
+        ContractHeaders).
+
+        @return `int` number of transmit functions missing in the RA library
+        """
+
+        start    = time.time()
+        registry = ContractHeaders( self, ra_contract_dir, list( self._swc_name_to_swc_id ) )
+        registry.scan()
+
+        self.TYPES                = _LazyDict( registry.type_owner, registry.load )
+        self.ra_model.ID2Type_Map = _LazyDict( registry.id_owner,   registry.load )
+
+        _error_cnt = 0
+        for swc, entry in registry.entries.items() :
+            for k,v in entry[ "element_to_id" ].iteritems() :
+                if k in self._element_to_id :
+                    _v = self._element_to_id[ k ]
+                    if v != _v :
+                        _error( "element ID of '%s' is defined with different values '%s' and '%s' ", k,v,_v )
+                    else :
+                        continue
+
+                self._verbose( "%s -> %s", k, v, level=10000 )
+                self._element_to_id[ k ] = v
+
+            # :::... SWC to host mapping ...:::
+            self._swc_to_host[ swc ] = entry[ "host" ]
+
+            # :::... SWC to FRAME mapping and vice versa ...:::
+            for sid, fids in entry[ "swc_to_frames" ].iteritems() :
+                if sid not in self._swc_to_frames :
+                    self._swc_to_frames[ sid ] = ( set(), set() )
+                for recv_or_send in [ 0, 1 ] :
+                    for f in fids[ recv_or_send ] :
+                        for item in list(entry[ "frame_to_swcs" ][f][recv_or_send]) :
+                            if list(item)[1] == True:
+                                self._swc_to_frames[ sid ][ recv_or_send ].add( f )
+
+            for fid, sids in entry[ "frame_to_swcs" ].iteritems() :
+                if fid not in self._frame_to_swcs :
+                    self._frame_to_swcs[ fid ] = ( set(), set() )
+                for recv_or_send in [ 0, 1 ] :
+                    for s in sids[ recv_or_send ] :
+                        self._frame_to_swcs[ fid ][ recv_or_send ].add( s[0] )
+
+            # the transmit functions are checked without loading the contract header
+            for name, aliases in entry[ "functions" ] :
+                if not hasattr( self._lib, name ) :
+                    _error( "RA lib does not contain contract header function '%s'", name, abort = False )
+                    _error_cnt = _error_cnt + 1
+
+        self._contract_headers = registry
+        self._verbose( "contract header index '%s': %s SW-Cs, %s imported, %.3fs"
+                     , registry.index_file, len( registry.entries )
+                     , registry.indexed, time.time() - start )
+        return _error_cnt
+    # end def _init_contract_headers
+
+    def _register_contract_header( self, swc, result, id_owner ) :
+        """!
+        @private
+        @brief Registers the transmit functions and types of a contract header
+
+        @param result : `dict` <br>
+        attributes of the contract header Ra_Type.py
+
+        @param id_owner : `dict` <br>
+        element ID -> SW-C defining its type
+        """
+
+        for k, v in result[ "ID2Type_Map" ].iteritems() :
+            if id_owner.get( k ) == swc :
+                dict.__setitem__( self.ra_model.ID2Type_Map, k, v )
+
+        # :::... TRANSMIT FUNCTIONS LOADING ...:::
+        # add the SW-C functions to the self._FUNCTIONS member
+        for name, parameters, aliases in result[ "_" + swc + "_functions" ] :
+
+            fct = Function( self, name, aliases, swc, *parameters )
+
+            if not hasattr( fct, "signature" ) :
+                continue
+
+            found = False
+            for f in self._FUNCTIONS :
+                if str(f) == str(fct) :
+                    found = True
+                    break
+
+            if not found :
+                self._FUNCTIONS.append (fct)
+                setattr(self, name, fct)
+                for a in aliases :
+                    if a :
+                        setattr(self, a, fct)
+    # end def _register_contract_header
+
+    def get_telemetry( self ) :
+        """!
+        @brief Get the telemetry of the RA shared library calls
+
+        @return `dict` see RA_API_Telemetry.snapshot(), `None` if the telemetry
+        is disabled (see telemetry_enable() and the option --ra-telemetry)
+        """
+
+        telemetry = _telemetry
+        if telemetry is None :
+            return None
+        return telemetry.snapshot()
+    # end def get_telemetry
+
+    def _delivery_add( self, key, callback, ring, batch, data_type = None ) :
+        """!
+        @private
+        @brief Creates the batched delivery of a callback
+
+        @param key : `tuple` <br>
+        key of the delivery in self.deliveries
+
+        @param ring : `int` <br>
+        number of slots of the ring buffer
+
+        @param data_type : `ctypes type` <br>
+        type of the data element, `None` for Ra_TraceLog_Message
+
+        @return `function` to be registered at the RA library
+        """
+
+        from MotionWise import ra_ring
+
+        self._delivery_remove( key )
+        name = "ra-delivery-%s" % ( "-".join( str( k ) for k in key[:-1] ), )
+        if data_type is None :
+            delivery = ra_ring.TraceLogDelivery \
+                ( Ra_TraceLog_Message, RA_TRACELOG_DATA, callback
+                , slots = ring, batch = batch, name = name
+                )
+        else :
+            delivery = ra_ring.DataDelivery \
+                ( data_type, callback, slots = ring, batch = batch, name = name )
+        self.deliveries[key] = delivery
+        self._verbose( "batched delivery '%s' with %d slots of %d bytes"
+                     , name, ring, delivery.stats()["slot_size"] )
+        return delivery.produce
+    # end def _delivery_add
+
+    def _delivery_remove( self, key ) :
+        """!
+        @private
+        @brief Stops the batched delivery of a callback after the remaining
+               frames have been delivered
+        """
+
+        delivery = self.deliveries.pop( key, None )
+        if delivery is not None :
+            delivery.stop()
+            self._verbose( "batched delivery '%s' stopped: %s"
+                         , key[:-1], delivery.stats() )
+    # end def _delivery_remove
+
+    def get_delivery_stats( self ) :
+        """!
+        @brief Get the statistics of the batched callback deliveries
+
+        @return `dict` {(kind, ID, callback name) or ("tracelog"|"log",
+        callback name): `dict`} see ra_ring.Delivery.stats(), e.g. occupancy,
+        max_occupancy and overflows of the ring buffer. The callback name is
+        extended by "#<n>" if several callbacks have the same name.
+        """
+
+        result = {}
+        for key, delivery in list( self.deliveries.items() ) :
+            name = getattr( key[-1], "__name__", None ) or repr( key[-1] )
+            k = key[:-1] + ( name, )
+            n = 1
+            while k in result :
+                n = n + 1
+                k = key[:-1] + ( "%s#%d" % ( name, n ), )
+            result[k] = delivery.stats()
+        return result
+    # end def get_delivery_stats
+
+    def preload( self ) :
+        """!
+        @brief Load all contract headers
+
+        The contract headers are loaded on the first access to one of their
+        transmit functions or types. This function loads all of them, e.g.
+        for tools which iterate over all functions or types.
+        """
+
+        if self._contract_headers is not None :
+            self._contract_headers.preload()
+    # end def preload
+
 
     def _deinit( self ) :
         # self.stop_receive_thread
@@ -1855,10 +3061,11 @@ class RA (object) :
         """!
         @brief Get the transmit functions
 
-        This function returns all loaded transmit functions.
+        This function returns all transmit functions.
 
         @return `dict`
         """
+        self.preload()
         return self._FUNCTIONS
     # end def
 
@@ -1905,6 +3112,7 @@ class RA (object) :
 
         @return `dict`
         """
+        self.preload()
         return self.ra_model.ID2Type_Map
     # end def
 
@@ -2258,7 +3466,7 @@ class RA (object) :
     # , [ Ra_Kind, ctypes.c_uint32, Ra_Data_Cb ]
     )
     # PPA: function is not ready yet!
-    def callback_add( self, id, function, type = None, kind = 0 ) :
+    def callback_add( self, id, function, type = None, kind = 0, ring = 0, batch = False ) :
         """!
         @brief Register a callback function for a specific frame kind and ID
 
@@ -2266,6 +3474,11 @@ class RA (object) :
         and use Ra_<SWC>_<Port>_<Element> as ID. Have a look at <B>Ra_Distributor_Ids.h</B>
         for a list of all available IDs.
 
+        With ring > 0 the function is not called by the receive thread of the
+        RA library: the data element is copied into a ring buffer and the
+        function is called by a separate thread (see ra_ring.DataDelivery and
+        get_delivery_stats()).
+
 
         @param id : `int` <br>
         either data element ID for data exchange frames, otherwise it is the frame ID
@@ -2278,6 +3491,14 @@ class RA (object) :
         @param kind : `Ra_Kind` <br>
         specifies the frame kind 
 
+        @param ring : `int` <br>
+        number of slots of the ring buffer of the batched delivery, 0 calls
+        the function directly
+
+        @param batch : `bool` <br>
+        call the function with the list of pointers of the buffered frames
+        instead of once per frame (only with ring > 0)
+
 
         @return `Ra_Kind`, `int`, `Ra_Data_Cb`
 
@@ -2295,7 +3516,11 @@ class RA (object) :
             self.CALLBACK_TYPES [type] = ctypes.CFUNCTYPE \
                 (None, ctypes.POINTER (type))
 
-        c_fct  = self.CALLBACK_TYPES [type] (function)
+        if ring :
+            c_fct = self.CALLBACK_TYPES [type] \
+                ( self._delivery_add( ( kind, id, function ), function, ring, batch, type ) )
+        else :
+            c_fct = self.CALLBACK_TYPES [type] (function)
 
         # we need to keep a reference to the c_fct object to avoid that
         # python garbage collects it which would case a problem once
@@ -2337,6 +3562,7 @@ class RA (object) :
         for cb, c_fct in self.callbacks [kind] [id] :
             if cb is function :
                 self._callback_remove( kind, id, c_fct )
+        self._delivery_remove( ( kind, id, function ) )
     # end def
 
     @RA_API \
@@ -3382,7 +4608,7 @@ class RA (object) :
     , Std_ReturnType, ctypes.c_uint8
     , [ ctypes.CFUNCTYPE( None, ctypes.c_void_p ) ]
     )
-    def tracelog_callback_add( self, callback ) :
+    def tracelog_callback_add( self, callback, ring = 0, batch = False ) :
         """!
         @brief Specify a callback for incoming logging/tracing messages
 
@@ -3396,22 +4622,30 @@ class RA (object) :
         Ra_TraceLog_Message structure which contains either a Ra_TraceLog_LogData, 
         a Ra_TraceLog_TraceData or a Ra_TraceLog_MemDumpData
 
+        @param ring : `int` <br>
+        number of slots of the ring buffer of the batched delivery: the
+        messages are copied into the ring buffer and the callback is called
+        by a separate thread (see ra_ring.TraceLogDelivery), 0 calls the
+        callback directly from the receive thread of the RA library
+
+        @param batch : `bool` <br>
+        call the callback with the list of the buffered messages instead of
+        once per message (only with ring > 0)
+
         @return `int`
 
         @see C shared library equivalent Ra_TraceLog_Callback_Add() in Ra.h
         """
 
-        c_fct = self.CALLBACK_TYPES ["Ra_TraceLog_Cb"] (callback)
+        function = callback
+        if ring :
+            function = self._delivery_add( ( "tracelog", callback ), callback, ring, batch )
+        c_fct = self.CALLBACK_TYPES ["Ra_TraceLog_Cb"] (function)
         self.callbacks[3][5].append( (callback, c_fct) )
         return [ c_fct ]
     # end def
 
 
-    @RA_API \
-    ( "Ra_TraceLog_Callback_Remove"
-    , Std_ReturnType, ctypes.c_uint8
-    , [ ctypes.CFUNCTYPE( None, ctypes.c_void_p ) ]
-    )
     def tracelog_callback_remove( self, callback = None ) :
         """!
         @brief Removes the logging/tracing callback
@@ -3442,6 +4676,26 @@ class RA (object) :
                 #self.callbacks[3][5].remove( c )
                 break
 
+        result = self._tracelog_callback_remove( c_fct )
+        # the library does not call the callback any more
+        self._delivery_remove( ( "tracelog", callback ) )
+        return result
+    # end def
+
+
+    @RA_API \
+    ( "Ra_TraceLog_Callback_Remove"
+    , Std_ReturnType, ctypes.c_uint8
+    , [ ctypes.CFUNCTYPE( None, ctypes.c_void_p ) ]
+    )
+    def _tracelog_callback_remove( self, c_fct ) :
+        """!
+        @private
+        @brief Removes the logging/tracing callback from the RA library
+
+        @see tracelog_callback_remove()
+        """
+
         return [ c_fct ]
     # end def
 
@@ -3451,7 +4705,7 @@ class RA (object) :
     , Std_ReturnType, ctypes.c_uint8
     , [ ctypes.CFUNCTYPE( None, ctypes.c_void_p ) ]
     )
-    def log_callback_add( self, callback ) :
+    def log_callback_add( self, callback, ring = 0, batch = False ) :
         """!
         @brief Specify a callback for incoming logging messages
 
@@ -3464,21 +4718,27 @@ class RA (object) :
         a logging function which returns a pointer to a Ra_TraceLog_Message
         structure which contains only Ra_TraceLog_LogData
 
+        @param ring : `int` <br>
+        number of slots of the ring buffer of the batched delivery, 0 calls
+        the callback directly (see tracelog_callback_add())
+
+        @param batch : `bool` <br>
+        call the callback with the list of the buffered messages
+
         @return `int`
 
         @see C shared library equivalent Ra_Log_Callback_Add() in Ra.h
         """
 
-        c_fct = self.CALLBACK_TYPES ["Ra_TraceLog_Cb"] (callback)
+        function = callback
+        if ring :
+            function = self._delivery_add( ( "log", callback ), callback, ring, batch )
+        c_fct = self.CALLBACK_TYPES ["Ra_TraceLog_Cb"] (function)
         self.callbacks[3][5].append( (callback, c_fct) )
         return [ c_fct ]
     # end def
 
 
-    @RA_API \
-    ( "Ra_Log_Callback_Remove"
-    , Std_ReturnType, ctypes.c_uint8
-    )
     def log_callback_remove( self ) :
         """!
         @brief Removes the logging callback
@@ -3493,6 +4753,26 @@ class RA (object) :
         @see C shared library equivalent Ra_Log_Callback_Remove() in Ra.h
         """
 
+        result = self._log_callback_remove()
+        # the library does not call the callback any more
+        for key in [ k for k in self.deliveries if k[0] == "log" ] :
+            self._delivery_remove( key )
+        return result
+    # end def
+
+
+    @RA_API \
+    ( "Ra_Log_Callback_Remove"
+    , Std_ReturnType, ctypes.c_uint8
+    )
+    def _log_callback_remove( self ) :
+        """!
+        @private
+        @brief Removes the logging callback from the RA library
+
+        @see log_callback_remove()
+        """
+
         return []
     # end def
 
@@ -3566,10 +4846,11 @@ class RA (object) :
         @brief Internal test function to simulate an incoming frame
         """
         header = struct.pack(b"I", ((msg_counter << 24) | (kind << 20) | ID))
-        frame = (ctypes.c_uint8 * (len(header) + len(payload))) \
-                    (*(ord(b) for b in header + payload))
+        frame = _byte_array (payload, len(header))
+        ctypes.memmove (frame, header, len(header))
         # we need a pointer with an offset of 4 bytes for the Ra_Forward_Frame function
-        payload_pointer = (ctypes.c_uint8 * len(payload)).from_buffer (frame, 4)
+        payload_pointer = (ctypes.c_uint8 * (len(frame) - len(header))) \
+                              .from_buffer (frame, len(header))
 
         return [ ctypes.cast( payload_pointer, ctypes.POINTER( ctypes.c_uint8 ))
                , ctypes.c_uint8 (counter_status)
@@ -3591,8 +4872,9 @@ class RA (object) :
         (header + payload, which is the UDP PlayLoad) to the distributing
         mechanism and callback function evaluation.
 
-        @param data : `list` <br>
-        a pointer to the start of the Middleware frame
+        @param data : `list`, `bytes`, `bytearray` or `ctypes.Array` <br>
+        a pointer to the start of the Middleware frame, a bytearray or
+        ctypes array is passed without copy
 
         @return `list`
 
@@ -3601,9 +4883,13 @@ class RA (object) :
 
         # this function wraps and supersedes `Ra_Forward_Frame` -
         # `data` is the whole frame ( =  header + payload)
-        data_pointer = (ctypes.c_uint8 * len(data)) ()
-        for i, e in enumerate (data) :
-            data_pointer [i] = ctypes.c_uint8 (e)
+        if isinstance (data, ctypes.Array) \
+        and ctypes.sizeof (data._type_) == 1 :
+            data_pointer = data
+        elif isinstance (data, bytearray) and data :
+            data_pointer = (ctypes.c_uint8 * len(data)).from_buffer (data)
+        else :
+            data_pointer = _byte_array (data)
         return [ctypes.cast (data_pointer, ctypes.POINTER( ctypes.c_uint8 ))]
     # end def
 
@@ -3632,7 +4918,7 @@ class RA (object) :
         @param kind : `Ra_Kind` <br>
         specifies the frame kind
 
-        @param data : `list` <br>
+        @param data : `list`, `bytes` or `bytearray` <br>
         a pointer to the Middleware frame of insertion
 
 
@@ -3642,20 +4928,106 @@ class RA (object) :
         """
 
         #      |<--MWheader-->|<-- payload
-        data = [ 0, 0, 0, 0 ] + data
+        data_arr = _byte_array( data, INJECT_HEADER_SIZE )
 
-        data_arr = (ctypes.c_uint8 * len( data ))()
+        return [ ctypes.c_uint32( ID )
+               , ctypes.c_uint8( kind )
+               , ctypes.cast( data_arr, ctypes.POINTER( ctypes.c_uint8 ))
+               , ctypes.c_uint16( len( data_arr ) )
+               ]
+    # end def
 
-        for i in range( len( data ) ) :
-            data_arr[i] = data[i]
+    @RA_API \
+    ( "Ra_Inject_Frame"
+    , None, None
+    , [ ctypes.c_uint32
+      , ctypes.c_uint8
+      , ctypes.POINTER( ctypes.c_uint8 )
+      , ctypes.c_uint16
+      ]
+    )
+    def _inject_frame_buffer ( self, ID, kind, buffer, length ) :
+        """!
+        @private
+        @brief Ra_Inject_Frame() with a prepared buffer, see inject_frames()
+        """
 
         return [ ctypes.c_uint32( ID )
                , ctypes.c_uint8( kind )
-               , ctypes.cast( data_arr, ctypes.POINTER( ctypes.c_uint8 ))
-               , ctypes.c_uint16( len( data ) )
+               , buffer
+               , ctypes.c_uint16( length )
                ]
     # end def
 
+    def inject_frames ( self, frames, rate = None ) :
+        """!
+        @brief Test function to send a sequence of BE ETH frames
+
+        Bulk version of _inject_frame(): the frames are copied into one
+        preallocated buffer (which grows with the largest frame) and passed
+        to Ra_Inject_Frame() without further conversion. Every frame is
+        recorded as call of _inject_frame_buffer in the telemetry.
+
+        @param frames : iterable of (`int`, `Ra_Kind`, data) <br>
+        ID, kind and data of the frames, data as for _inject_frame()
+
+        @param rate : `float` <br>
+        frames per second the injection is limited to, None for as fast as
+        possible
+
+        @return `dict` with the number of frames and bytes, the duration [s]
+        and the achieved frames per second
+        """
+
+        capacity = 0
+        buffer   = pointer = None
+        inject   = None
+        count    = size = 0
+        start    = time.time()
+        for ID, kind, data in frames :
+            source, n = _byte_source( data )
+            length    = INJECT_HEADER_SIZE + n
+            if length > capacity :
+                capacity = max( length, 2 * capacity, INJECT_BUFFER_SIZE )
+                buffer   = ( ctypes.c_uint8 * capacity )()
+                pointer  = ctypes.cast( buffer, ctypes.POINTER( ctypes.c_uint8 ) )
+            else :
+                # the header may have been written by the library
+                ctypes.memset( buffer, 0, INJECT_HEADER_SIZE )
+            if n :
+                ctypes.memmove( ctypes.addressof( buffer ) + INJECT_HEADER_SIZE
+                              , source, n )
+            if inject is None :
+                # the first call loads the shared library function
+                self._inject_frame_buffer( ID, kind, pointer, length )
+                inject = RA_API_Data[ "_inject_frame_buffer" ]
+            elif _telemetry is not None :
+                # the direct calls are recorded like the calls of the wrapper
+                _call_timed( _telemetry, "_inject_frame_buffer"
+                           , "Ra_Inject_Frame", inject
+                           , ( ID, kind, pointer, length ) )
+            else :
+                inject( ID, kind, pointer, length )
+            count += 1
+            size  += n
+            if rate :
+                delay = start + count / rate - time.time()
+                if delay > 0 :
+                    time.sleep( delay )
+        duration = time.time() - start
+        result   = { "frames"        : count
+                   , "bytes"         : size
+                   , "seconds"       : duration
+                   , "frames_per_s"  : count / duration if duration > 0 else None
+                   }
+        self._verbose( "injected %d frames (%d bytes) in %.3fs: %s frames/s"
+                     , count, size, duration
+                     , "%.0f" % result[ "frames_per_s" ]
+                       if result[ "frames_per_s" ] else "n/a"
+                     , level = 1 )
+        return result
+    # end def inject_frames
+
 
 
 
@@ -3687,8 +5059,9 @@ class RA (object) :
         @param swc_id : `int` <br>
         the BDL ID of the SWC which should receive the data block
 
-        @param data : `list` <br>
-        a pointer to the data block size of data block in bytes `c_uint32`
+        @param data : `list`, `bytes`, `bytearray` or `ctypes.Array` <br>
+        the data block, a ctypes array with 1 byte elements is passed without
+        copy
 
         @param callback_function : `Ra_Data_Cb` <br>
         a pointer to function which will be called after the block data download has been finished
@@ -3700,25 +5073,29 @@ class RA (object) :
         @see C shared library equivalent Ra_Config_BDLDownload() in Ra.h
         """
 
-        cast = ( lambda x : int( x ) )
-
-        if isinstance( data, basestring ) \
-        or isinstance( data, str ) :
-            cast = ( lambda x : ord( x ) )
-
-        length = len( data )
-
-        data_arr = (ctypes.c_uint8 * length)()
-        for i in range( length ) :
-            data_arr[i] = cast( data[i] )
+        if isinstance( data, ctypes.Array ) \
+        and ctypes.sizeof( data._type_ ) == 1 :
+            data_arr = data
+        else :
+            data_arr = _byte_array( data )
+        length = ctypes.sizeof( data_arr )
 
         data_ptr = ctypes.cast( data_arr, ctypes.POINTER( ctypes.c_uint8 ))
         data_ptr = ctypes.cast( data_ptr, ctypes.POINTER( ctypes.c_void_p ))
 
-        c_fct = self.CALLBACK_TYPES[ "Ra_Download_Cb" ]( callback_function )
+        # the library reads the data block until the callback is called
+        key = id( data_arr )
+        self.bdl_buffers[ key ] = data_arr
+
+        def _callback( ret ) :
+            self.bdl_buffers.pop( key, None )
+            callback_function( ret )
+        # end def
+
+        c_fct = self.CALLBACK_TYPES[ "Ra_Download_Cb" ]( _callback )
         self.bdl_hooks.append( c_fct )
 
-        self._verbose( "BDL: download: id=%s, length=%s, data=%s, data_arr=%s" % (swc_id, length, data, data_arr) )
+        self._verbose( "BDL: download: id=%s, length=%s", swc_id, length )
 
         return \
         [ ctypes.c_uint16( swc_id )
@@ -3819,43 +5196,31 @@ class RA (object) :
         @param timeout : predefined to 3.0 <br>
 
 
-        @return `list`
+        @return `ctypes.c_uint8` array, None if the upload failed
 
         @see config_bdl_upload()
         @see C shared library equivalent Ra_Config_BDLTriggerUpload() in Ra.h
         """
 
         result = queue.Queue( 1 )
-        data   = None
-        length = None
 
         def _callback( ret, _data, _length ) :
-            if ret == 0 :
-                result.put( True )
+            # the data block is only valid during the callback
+            if ret == 0 and ( _data or not _length ) :
+                data = ( ctypes.c_uint8 * _length )()
+                if _length :
+                    ctypes.memmove( data, _data, _length )
+                result.put( data )
             else :
-                result.put( False )
-
-            data     = _data
-            length   = _length
+                result.put( None )
         # end def
 
         self.config_bdl_upload( swc_id, _callback )
 
         try :
-            result = result.get( True, timeout )
+            return result.get( True, timeout )
         except queue.Empty :
             return None
-
-        if length is None \
-        or result is not None :
-            return None
-
-        class Data( ctypes.Structure ) :
-            _fields_ = [ ( "data", ctypes.c_uint8 * length ) ]
-
-        data = ctypes.cast( data, ctypes.POINTER( Data ) )
-
-        return data.contents.data
     # end def
 
     @RA_API( "Ra_Config_BDLReset"
@@ -4083,60 +5448,45 @@ class RA (object) :
     #--------------------------------------------------------------------------
 
 
+    def benchmark_converters( self, count = 10, number = 100 ) :
+        """!
+        @brief Measures the converters of the largest contract header types
+               and prints the results
+
+        @param count : `int` <br>
+        number of measured types
+
+        @param number : `int` <br>
+        conversions per measurement
+
+        @return `list` see benchmark_converters()
+        """
+        self.preload()
+        types = set( t for t in self.TYPES.values()
+                     if isinstance( t, type )
+                     and issubclass( t, ( ctypes.Structure, ctypes.Array ) ) )
+        types = sorted( types, key = ctypes.sizeof, reverse = True )[ : count ]
+        result = benchmark_converters( types, number )
+        _print( "%-40s %8s %10s %10s %10s %10s"
+              , "type", "bytes", "compile", "factory", "ctype", "python" )
+        for r in result :
+            _print( "%-40s %8d %8.0fus %8.1fus %8.1fus %8.1fus", *r )
+        return result
+    # end def benchmark_converters
+
     @classmethod
     def as_ctype_instance (cls, type, v) :
-        if issubclass (type, ctypes.Structure) :
-            if v is None :
-                v = type()
-            return cls._as_ctype_struct (type, v)
-        elif issubclass (type, ctypes.Array) :
-            if v is None :
-                v = type()
-            return cls._as_ctype_array (type, v)
-        elif issubclass (type, (ctypes.c_float, ctypes.c_double, ctypes.c_longdouble)):
-            if isinstance (v, basestring) and v.endswith (".0") :
-                v = v [:-2]
-            return type (float (v) or 0.0)
-        elif issubclass (type, ( ctypes.c_byte, ctypes.c_ubyte
-                               , ctypes.c_short, ctypes.c_ushort
-                               , ctypes.c_int, ctypes.c_uint
-                               , ctypes.c_long, ctypes.c_ulong
-                               , ctypes.c_longlong, ctypes.c_ulonglong
-                               )):
-            if isinstance (v, basestring) and v.endswith (".0") :
-                v = v [:-2]
-
-            if v is None or not isinstance( v, int ) :
-                return type( 0 )
-            else :
-                return type( v )
-        return type (v or 0)
+        return _converter( "ctype", type )( v )
     # end def as_ctype_instance
 
     @classmethod
     def _as_ctype_struct (cls, type, v) :
-        values = []
-        for fn, ft in type._fields_ :
-            if hasattr( v, "get" ) :
-                values.append( cls.as_ctype_instance( ft, v.get (fn) ) )
-            else :
-                values.append( cls.as_ctype_instance( ft, None ) )
-        return type (* values)
+        return _converter( "ctype", type )( v )
     # end def _as_ctype_struct
 
     @classmethod
     def _as_ctype_array (cls, type, v) :
-        result = []
-        for i in xrange (type._length_) :
-            if v is not None :
-                try :
-                    vi = v [i]
-                except IndexError :
-                    vi = None
-                result.append (cls.as_ctype_instance( type._type_, vi ) )
-            else :
-                result.append( cls.as_ctype_instance( type._type_, None ) )
-        return type (* result)
+        return _converter( "ctype", type )( v )
     # end def _as_ctype_array
 
     @classmethod
@@ -4145,27 +5495,17 @@ class RA (object) :
             v = cls.TYPES [v] ()
         if isinstance (v, ctypes._Pointer) :
             v = v.contents
-        if isinstance (v, ctypes.Structure) :
-            return cls._as_python_dict (v)
-        if isinstance (v, ctypes.Array) :
-            return cls._as_python_sequence (v)
-        return v.value
+        return _converter( "python", type( v ) )( v )
     # end def as_python_instance
 
     @classmethod
     def _as_python_dict (cls, v) :
-        result = dict () # use ordered dict ???
-        for fn, ft in v._fields_ :
-            result [fn] = cls.as_python_instance (getattr (v, fn))
-        return result
+        return _converter( "python", type( v ) )( v )
     # end def _as_python_dict
 
     @classmethod
     def _as_python_sequence (cls, v) :
-        result = []
-        for vi in v :
-            result.append (cls.as_python_instance (vi))
-        return result
+        return _converter( "python", type( v ) )( v )
     # end def _as_python_sequence
 
 # end class RA
@@ -4228,6 +5568,39 @@ def RA_Args( parser ) :
         , default = ""
         , help   = argparse.SUPPRESS
         )
+
+    ra_args.add_argument \
+        ( "--ra-telemetry"
+        , metavar = "SLOW_MS"
+        , nargs   = "?"
+        , type    = float
+        , const   = 0.0
+        , default = None
+        , help    = "record the latency and the errors of the RA library calls "
+                    "and print them at exit, log calls taking at least SLOW_MS "
+                    "milliseconds"
+        )
+
+    ra_args.add_argument \
+        ( "--ra-sim"
+        , metavar = "SCENARIO"
+        , nargs   = "?"
+        , const   = ""
+        , default = os.environ.get( "RA_SIM" ) or None
+        , help    = "use the simulated RA library instead of the hardware, "
+                    "SCENARIO is a JSON scenario, a pcap/pcapng or a trace CSV "
+                    "file (see ra_sim.py), default: environment variable RA_SIM "
+                    "if it is not empty"
+        )
+
+    # measure the type converters of the N largest contract header types
+    parser.add_argument \
+        ( "--ra-bench-converters"
+        , metavar = "N"
+        , type    = int
+        , default = 0
+        , help   = argparse.SUPPRESS
+        )
 # end def
 
 
@@ -4256,6 +5629,10 @@ if __name__ == "__main__" :
 
     ra = RA( parser, args ) #, False )
 
+    if args.ra_bench_converters :
+        ra.benchmark_converters( args.ra_bench_converters )
+        sys.exit(0)
+
     #ra.init( "pcap" )
 
     #ra.receiving_start()
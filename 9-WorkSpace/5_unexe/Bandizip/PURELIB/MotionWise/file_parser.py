@@ -15,6 +15,8 @@ import re
 import csv
 import xml.etree.ElementTree as ET
 
+TRACE_CSV_QUOTE = b"#"
+
 
 def parse_entity_sw_layers(sw_layers_file):
     sep = b","
@@ -209,6 +211,29 @@ def load_driver_name_map(driver_map_file):
     return out
 
 
+def parse_trace_csv_layout(csv_file):
+    """
+    @brief Determines separator, column names and the file offset of the first
+           data row of a trace event CSV file
+    """
+    sep = b","
+    regex = re.compile(r"#HEADER[ ]*")
+
+    with open(csv_file, 'rb') as f:
+        offset = 0
+        for i, l in enumerate(iter(f.readline, b'')):
+            offset += len(l)
+            if i == 0 and l.startswith('sep'):
+                # get seperator
+                sep = b"{}".format(l.split('=')[-1][0])
+            elif l.startswith("#HEADER"):
+                line = regex.sub('', l)
+                fields = csv.reader([line], delimiter=sep, 
+                                    quotechar=TRACE_CSV_QUOTE).next()
+                return sep, [x.strip() for x in fields], offset
+    raise ValueError('header not defined in {}'.format(csv_file))
+
+
 __version__ = "$Revision: 38070 $".split()[1]
     
 if __name__ == '__main__':
@@ -15,9 +15,74 @@
 # Revision Dates
 # --
 
+import re
 import sys
+import json
+import time
 import signal
 import logging
+import threading
+import multiprocessing.util
+
+LOG_FORMATS = ['text', 'jsonl']
+BATCH_SIZE = 100          # records sent to the log process at once
+FLUSH_INTERVAL = 1.0      # maximum delay of a buffered record [s]
+RATE_LIMIT = 10           # similar records logged per RATE_INTERVAL
+RATE_INTERVAL = 10.0      # [s]
+# numbers are ignored when records are compared
+_NUMBERS = re.compile(r'0x[0-9a-fA-F]+|\d+')
+
+
+def log_level(args):
+    """
+    @brief Returns the log level selected by the command line arguments of
+           MotionWise_Perf (default: warning)
+    """
+    for name in ['debug', 'info', 'warning', 'error']:
+        if getattr(args, 'log_' + name, False):
+            return getattr(logging, name.upper())
+    return logging.WARN
+
+
+def source_level(level):
+    """
+    @brief Returns the level of the root logger of a process for the log
+           level: records for the console and the file ($c, $f) are logged
+           with level info or higher regardless of the log level
+    """
+    return min(level, logging.INFO)
+
+
+def configure_process(queue, level=logging.DEBUG):
+    """
+    @brief Sends the log records of the process to the log process
+
+    @return: handler of the root logger
+    """
+    h = QueueHandler(queue, level)
+    root = logging.getLogger()
+    root.addHandler(h)
+    root.setLevel(source_level(level))
+    return h
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line.
+    """
+
+    def format(self, record):
+        out = { 'time': round(record.created, 6)
+              , 'level': record.levelname
+              , 'name': record.name
+              , 'process': record.processName
+              , 'message': record.getMessage()}
+        suppressed = getattr(record, 'suppressed', None)
+        if suppressed:
+            out['suppressed'] = suppressed
+        if record.exc_text:
+            out['exc_text'] = record.exc_text
+        return json.dumps(out, sort_keys=True)
 
 
 class ConsoleFilter(logging.Filter):
@@ -32,11 +97,12 @@ class ConsoleFilter(logging.Filter):
         return False
 
 
-def log_listener(queue, level, out_file):
+def log_listener(queue, level, out_file, log_format='text'):
     """
     This is the listener process top-level loop: wait for logging events
-    (LogRecords)on the queue and handle them, quit when you get a None for a 
-    LogRecord.
+    (lists of LogRecords) on the queue and handle them, quit when you get a
+    None. The log file is written as text or as JSON lines (log_format
+    'jsonl').
     """
     signal.signal(signal.SIGINT, signal.SIG_IGN)
     detailed = logging.Formatter(datefmt='%Y-%m-%d,%H:%M:%S', 
@@ -53,24 +119,17 @@ def log_listener(queue, level, out_file):
     
     if out_file is not None: 
         fh = logging.FileHandler(out_file, 'a')
-        fh.setFormatter(detailed)
+        fh.setFormatter(JsonFormatter() if log_format == 'jsonl' else detailed)
         root.addHandler(fh)
     
     while True:
         try:
-            record = queue.get()
+            records = queue.get()
             # We send this as a sentinel to tell the listener to quit.
-            if record is None: 
+            if records is None: 
                 break
-            logger = logging.getLogger(record.name)
-            
-            # $c -> record is written to console and file, level is ignored
-            # $f -> record is written to file, level is ignored
-            record.msg = str(record.msg)
-            if record.levelno >= level or (record.msg[0:2] in ['$c', '$f']):
-                if record.msg[0:2] == '$f':
-                    record.msg = record.msg[2:]
-                logger.handle(record) 
+            for record in records:
+                _handle(record, level)
         except (KeyboardInterrupt, SystemExit):
             raise
         except:
@@ -78,39 +137,186 @@ def log_listener(queue, level, out_file):
             traceback.print_exc(file=sys.stderr)
 
 
+def _handle(record, level):
+    logger = logging.getLogger(record.name)
+
+    # $c -> record is written to console and file, level is ignored
+    # $f -> record is written to file, level is ignored
+    record.msg = str(record.msg)
+    if record.levelno >= level or (record.msg[0:2] in ['$c', '$f']):
+        if record.msg[0:2] == '$f':
+            record.msg = record.msg[2:]
+        logger.handle(record)
+
+
 class QueueHandler(logging.Handler):
     """
     This is a logging handler which sends events to a multiprocessing queue.
-    
-    The plan is to add it to Python 3.2, but this can be copy pasted into
-    user code for use with earlier Python versions.
+
+    Records below the log level are dropped before they are sent, except for
+    console and file records ($c, $f). Similar records, i.e. records of the
+    same logger and level whose messages differ only in numbers, are logged
+    RATE_LIMIT times per RATE_INTERVAL, the number of suppressed records is
+    reported with the next record after the interval. The records are sent
+    as lists of up to BATCH_SIZE records, at the latest FLUSH_INTERVAL after
+    they have been logged (flush timer), console records and errors are sent
+    immediately. The remaining records are sent when the process exits.
     """
 
-    def __init__(self, queue):
+    def __init__(self, queue, level=logging.DEBUG, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL):
         """
         Initialise an instance, using the passed queue.
         """
         logging.Handler.__init__(self)
         self.queue = queue
-        
+        self.log_level = level
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._buffer = []
+        self._timer = None
+        self._similar = {}
+        self._register()
+        multiprocessing.util.register_after_fork(self, QueueHandler._after_fork)
+
+    def _register(self):
+        # flush before the queue is closed at the exit of the process
+        multiprocessing.util.Finalize(self, self.close, exitpriority=20)
+
+    def _after_fork(self):
+        # the records of the parent process are sent by the parent
+        self._buffer = []
+        self._timer = None
+        self._similar = {}
+        self._register()
+
+    def _limit(self, record):
+        """
+        @brief Applies the rate limit to the record
+
+        @return: records to be sent
+        """
+        key = (record.name, record.levelno, _NUMBERS.sub('#', record.msg))
+        now = record.created
+        entry = self._similar.get(key)
+        if entry is None or now - entry[0] >= RATE_INTERVAL:
+            out = []
+            if entry is not None and entry[2]:
+                out.append(self._summary(entry))
+            self._similar[key] = [now, 1, 0, None]
+            out.append(record)
+            return out
+        entry[1] += 1
+        if entry[1] <= RATE_LIMIT:
+            return [record]
+        entry[2] += 1
+        entry[3] = record
+        return []
+
+    def _summary(self, entry):
+        """
+        @brief Creates the record reporting the suppressed similar records
+        """
+        start, _, suppressed, last = entry
+        summary = logging.makeLogRecord(last.__dict__)
+        summary.msg = "{} ({} similar messages suppressed in {:.1f}s)".format(
+            last.msg, suppressed, last.created - start)
+        summary.suppressed = suppressed
+        return summary
+
     def emit(self, record):
         """
         Emit a record.
-        Writes the LogRecord to the queue.
+        Adds the LogRecord to the buffer which is written to the queue.
         """
         try:
+            # records below the log level are dropped before they are
+            # formatted
+            console = str(record.msg)[0:2] in ['$c', '$f']
+            if record.levelno < self.log_level and not console:
+                return
+            # merge the arguments and the traceback into the message, they
+            # might not be picklable
+            record.msg = record.getMessage()
+            record.args = None
             ei = record.exc_info
             if ei:
                 dummy = self.format(record) # just to get traceback text into record.exc_text
                 record.exc_info = None  # not needed any more
-            self.queue.put_nowait(record)
+            records = [record] if console else self._limit(record)
+            if not records:
+                return
+            self._buffer.extend(records)
+            if console or record.levelno >= logging.ERROR or \
+                    len(self._buffer) >= self._batch_size:
+                self._send()
+            elif self._timer is None:
+                self._timer = threading.Timer(self._flush_interval,
+                                              self._timed_flush)
+                self._timer.daemon = True
+                self._timer.start()
         except (KeyboardInterrupt, SystemExit):
             raise
         except:
             self.handleError(record)
 
+    def _send(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._buffer:
+            self.queue.put_nowait(self._buffer)
+        self._buffer = []
+
+    def flush(self):
+        """
+        Writes the buffered records to the queue.
+        """
+        self.acquire()
+        try:
+            self._send()
+        finally:
+            self.release()
+
+    def _timed_flush(self):
+        """
+        Flush timer: writes the buffered records to the queue.
+        """
+        try:
+            self.flush()
+        except (IOError, AssertionError, ValueError):
+            # the queue has already been closed
+            pass
+
+    def close(self):
+        """
+        Writes the buffered records and the summaries of the suppressed
+        records to the queue.
+        """
+        self.acquire()
+        try:
+            for entry in self._similar.itervalues():
+                if entry[2]:
+                    self._buffer.append(self._summary(entry))
+            self._similar = {}
+            self._send()
+        except (IOError, AssertionError, ValueError):
+            # the queue has already been closed
+            pass
+        finally:
+            self.release()
+        logging.Handler.close(self)
+
 
 __version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'QueueHandler'
+          , 'JsonFormatter'
+          , 'ConsoleFilter'
+          , 'log_listener'
+          , 'log_level'
+          , 'source_level'
+          , 'configure_process'
+          , 'LOG_FORMATS']
 
 if __name__ == '__main__':
     pass
@@ -0,0 +1,424 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    pcap_reader.py
+#
+# Purpose
+#    Native reader for MotionWise trace events recorded to pcap files
+#
+# Revision Dates
+# --
+
+"""
+Native reader for MotionWise trace events recorded to pcap/pcapng files.
+
+The UDP payload of a recorded packet is a middleware frame as passed to
+Ra_Distribute_Frame(): a 32 bit header (msg_counter << 24 | kind << 20 | ID)
+followed by the frame payload. Trace/log frames (kind RA_DEV_KIND, ID 5)
+contain a sequence of entries. Each entry starts with the fields of
+Ra_TraceLog_Message followed by the fields of Ra_TraceLog_TraceData (trace
+entries) or Ra_TraceLog_LogNotCodedData (log entries).
+
+The events are returned as dictionaries in the format sent by the Proxy, so
+they can be passed directly to pm_instrument.receive_event(). The text of log
+entries is passed on as the remote-access library passes reconstructed_string:
+as NUL terminated string. Entries with parameters can not be reconstructed and
+are ignored.
+"""
+
+import struct
+import logging
+
+logger = logging.getLogger(__name__)
+
+# pcap file format
+PCAP_MAGIC_US = 0xA1B2C3D4
+PCAP_MAGIC_NS = 0xA1B23C4D
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+PCAPNG_OPT_ENDOFOPT = 0
+PCAPNG_IF_TSRESOL = 9
+PCAPNG_TICKS_DEFAULT = 1000000 # if_tsresol not present: microseconds
+
+# link layer types
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = (0x8100, 0x88A8)
+IPPROTO_UDP = 17
+UDP_HEADER_LEN = 8
+
+# middleware frame
+FRAME_HEADER = struct.Struct(b"<I")
+TRACELOG_KIND = 3 # RA_DEV_KIND
+TRACELOG_ID = 5
+
+# entries of a trace/log frame
+ENTRY_TYPE_LOG_TEXT = 1
+ENTRY_TYPE_LOG_CODED = 2
+ENTRY_TYPE_TRACE = 3
+TRACELOG_MESSAGE = struct.Struct(b"<BBBQB")  # entry_type, host_id,
+                                             # component_id, zgt_stamp, msg_count
+TRACE_DATA = struct.Struct(b"<BBQ")          # core_id, event_type, event_data
+LOG_NOT_CODED = struct.Struct(b"<BB")        # log_option, string_length
+LOG_CODED = struct.Struct(b"<BBB")           # log_option, string_code,
+                                             # parameters_length
+
+TASK_MAP_PREFIXES = (b'$SSH_TM', b'$SRH_TM')
+
+_pcap_record = {b'<': struct.Struct(b"<IIII"), b'>': struct.Struct(b">IIII")}
+_pcapng_block = {b'<': struct.Struct(b"<II"), b'>': struct.Struct(b">II")}
+_u16be = struct.Struct(b">H")
+
+
+class PcapError(Exception):
+    pass
+
+
+def _read_pcap(f, offset, byte_order, link_type, resolution):
+    """
+    @brief Yields (position, time stamp, link type, packet data) of the
+           packets of a classic pcap file starting at the given file offset.
+    """
+    record = _pcap_record[byte_order]
+    read = f.read
+    f.seek(offset)
+    while True:
+        header = read(record.size)
+        if len(header) < record.size:
+            return
+        sec, frac, incl_len, _ = record.unpack(header)
+        data = read(incl_len)
+        if len(data) < incl_len:
+            logger.warning("truncated packet at end of pcap file")
+            return
+        yield (('pcap', offset, byte_order, link_type, resolution)
+              , sec + frac * resolution, link_type, data)
+        offset += record.size + incl_len
+
+
+def _idb_interface(body, byte_order):
+    """
+    @brief Returns (link type, time stamp ticks per second) of the interface
+           described by the body of an interface description block
+    """
+    link_type = struct.unpack(byte_order + b"H", body[:2])[0]
+    ticks = PCAPNG_TICKS_DEFAULT
+    option = struct.Struct(byte_order + b"HH")
+    offset = 8
+    while offset + option.size <= len(body):
+        code, length = option.unpack_from(body, offset)
+        offset += option.size
+        if code == PCAPNG_OPT_ENDOFOPT:
+            break
+        if code == PCAPNG_IF_TSRESOL and length >= 1:
+            tsresol = ord(body[offset])
+            if tsresol & 0x80:
+                ticks = 2 ** (tsresol & 0x7F)
+            else:
+                ticks = 10 ** tsresol
+        offset += length + (-length % 4)
+    return link_type, ticks
+
+
+def _read_pcapng(f, offset, byte_order, interfaces):
+    """
+    @brief Yields (position, time stamp, link type, packet data) of the
+           packets of a pcapng file starting at the given file offset.
+           The time stamps of enhanced packet blocks are scaled by the
+           if_tsresol of their interface.
+
+    @param interfaces: (link type, ticks per second) of the interfaces
+                       described so far in the current section
+    """
+    interfaces = list(interfaces)
+    read = f.read
+    f.seek(offset)
+    block = read(8)
+    while len(block) == 8:
+        block_type, block_len = _pcapng_block[byte_order].unpack(block)
+        if block_type == PCAPNG_SHB:
+            body = read(4)
+            if struct.unpack(b"<I", body)[0] == PCAPNG_BYTE_ORDER_MAGIC:
+                byte_order = b'<'
+            else:
+                byte_order = b'>'
+            block_len = _pcapng_block[byte_order].unpack(block)[1]
+            read(block_len - 12)
+            interfaces = []
+        else:
+            body = read(block_len - 8)
+            if len(body) < block_len - 8:
+                logger.warning("truncated block at end of pcapng file")
+                return
+            position = ('pcapng', offset, byte_order, tuple(interfaces))
+            if block_type == PCAPNG_IDB:
+                interfaces.append(_idb_interface(body, byte_order))
+            elif block_type == PCAPNG_EPB:
+                if_id, ts_high, ts_low, cap_len = struct.unpack(
+                    byte_order + b"IIII", body[:16])
+                link_type, ticks = interfaces[if_id]
+                yield (position, ((ts_high << 32) | ts_low) / float(ticks)
+                      , link_type, body[20:20 + cap_len])
+            elif block_type == PCAPNG_SPB:
+                orig_len = struct.unpack(byte_order + b"I", body[:4])[0]
+                cap_len = min(orig_len, block_len - 16)
+                yield position, None, interfaces[0][0], body[4:4 + cap_len]
+        offset += block_len
+        block = read(8)
+
+
+def read_packets(pcap_file, position=None):
+    """
+    @brief Yields the recorded packets of a pcap or pcapng file
+
+    @param pcap_file: path to pcap or pcapng file
+    @param position: position of a packet as returned by a previous call.
+                     Reading starts at this packet. None: start of file
+    @return: generator of (position, time stamp [s], link type, packet data)
+    """
+    with open(pcap_file, 'rb') as f:
+        if position is not None:
+            if position[0] == 'pcap':
+                packets = _read_pcap(f, *position[1:])
+            else:
+                packets = _read_pcapng(f, *position[1:])
+        else:
+            header = f.read(24)
+            if len(header) < 24:
+                raise PcapError("{} is not a pcap file".format(pcap_file))
+            for byte_order in (b'<', b'>'):
+                magic = struct.unpack(byte_order + b"I", header[:4])[0]
+                if magic in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+                    break
+            else:
+                if struct.unpack(b"<I", header[:4])[0] != PCAPNG_SHB:
+                    raise PcapError("{} is not a pcap file".format(pcap_file))
+                magic = None
+            if magic is None:
+                packets = _read_pcapng(f, 0, b'<', ())
+            else:
+                link_type = struct.unpack(byte_order + b"I", header[20:24])[0]
+                resolution = 1e-6 if magic == PCAP_MAGIC_US else 1e-9
+                packets = _read_pcap(f, 24, byte_order, link_type, resolution)
+        for packet in packets:
+            yield packet
+
+
+def udp_payload(link_type, data):
+    """
+    @brief Extracts the payload of an IPv4/UDP packet
+
+    @return: UDP payload or None if the packet is not an unfragmented
+             IPv4/UDP packet
+    """
+    if link_type == LINKTYPE_ETHERNET:
+        offset = 12
+        ether_type = _u16be.unpack_from(data, offset)[0]
+        while ether_type in ETHERTYPE_VLAN:
+            offset += 4
+            ether_type = _u16be.unpack_from(data, offset)[0]
+        offset += 2
+    elif link_type == LINKTYPE_LINUX_SLL:
+        ether_type = _u16be.unpack_from(data, 14)[0]
+        offset = 16
+    elif link_type in (LINKTYPE_RAW, LINKTYPE_IPV4):
+        ether_type = ETHERTYPE_IPV4
+        offset = 0
+    else:
+        return None
+
+    if ether_type != ETHERTYPE_IPV4 or len(data) < offset + 20:
+        return None
+    version_ihl = ord(data[offset])
+    if version_ihl >> 4 != 4 or ord(data[offset + 9]) != IPPROTO_UDP:
+        return None
+    if _u16be.unpack_from(data, offset + 6)[0] & 0x3FFF:
+        # more fragments flag or fragment offset set
+        logger.debug("fragmented IPv4 packet ignored")
+        return None
+    offset += (version_ihl & 0x0F) * 4
+    udp_len = _u16be.unpack_from(data, offset + 4)[0]
+    return data[offset + UDP_HEADER_LEN:offset + udp_len]
+
+
+def reconstructed_string(string, parameters):
+    """
+    @brief Returns the text of a not coded log entry as the remote-access
+           library returns it in reconstructed_string
+
+    @return: None if the text contains parameters, their encoding is only
+             known to the library
+    """
+    if parameters:
+        return None
+    return string.split(b'\0', 1)[0]
+
+
+def parse_frame(frame, host_id=None):
+    """
+    @brief Decodes the entries of a middleware trace/log frame. Frames of
+           other kinds and IDs are ignored.
+
+    @param frame: middleware frame (UDP payload)
+    @param host_id: only entries of the given host are returned (None: all)
+    @return: list of event dictionaries with the fields host, swc, zgt, count,
+             core, type and data
+    """
+    if len(frame) < FRAME_HEADER.size:
+        return []
+    header = FRAME_HEADER.unpack_from(frame)[0]
+    if (header >> 20) & 0x0F != TRACELOG_KIND or header & 0xFFFFF != TRACELOG_ID:
+        return []
+
+    events = []
+    offset = FRAME_HEADER.size
+    end = len(frame)
+    msg_size = TRACELOG_MESSAGE.size
+    trace_size = TRACE_DATA.size
+    while offset + msg_size <= end:
+        entry_type, host, swc, zgt, count = \
+            TRACELOG_MESSAGE.unpack_from(frame, offset)
+        offset += msg_size
+        if entry_type == ENTRY_TYPE_TRACE:
+            if offset + trace_size > end:
+                break
+            core, event_type, data = TRACE_DATA.unpack_from(frame, offset)
+            offset += trace_size
+            if host_id is None or host == host_id:
+                events.append({ 'host': host, 'swc': swc, 'zgt': zgt
+                              , 'count': count, 'core': core
+                              , 'type': event_type, 'data': data})
+        elif entry_type == ENTRY_TYPE_LOG_TEXT:
+            _, length = LOG_NOT_CODED.unpack_from(frame, offset)
+            offset += LOG_NOT_CODED.size
+            string = frame[offset:offset + length]
+            offset += length
+            n_params = ord(frame[offset:offset + 1] or b'\0')
+            parameters = frame[offset + 1:offset + 1 + n_params]
+            offset += 1 + n_params
+            if host_id is not None and host != host_id:
+                continue
+            text = reconstructed_string(string, parameters)
+            if text is None:
+                if string.startswith(TASK_MAP_PREFIXES):
+                    logger.warning("task map log entry with parameters "
+                                   "ignored")
+                continue
+            if text.startswith(TASK_MAP_PREFIXES):
+                events.append({ 'host': host, 'swc': swc, 'zgt': zgt
+                              , 'count': '', 'core': 0, 'type': 0xFF
+                              , 'data': text})
+        elif entry_type == ENTRY_TYPE_LOG_CODED:
+            offset += LOG_CODED.size + ord(frame[offset + 2:offset + 3] or b'\0')
+        else:
+            logger.debug("unknown entry type {} in trace frame".format(entry_type))
+            break
+    return events
+
+
+def read_events(pcap_file, host_id=None):
+    """
+    @brief Yields the trace and log events recorded to a pcap/pcapng file
+
+    @param pcap_file: path to pcap or pcapng file
+    @param host_id: only events of the given host are returned (None: all)
+    @return: generator of event dictionaries as sent by the Proxy
+    """
+    for _, _, _, events in read_frames(pcap_file, host_id):
+        for event in events:
+            yield event
+
+
+def read_frames(pcap_file, host_id=None, position=None):
+    """
+    @brief Yields the decoded trace/log frames recorded to a pcap/pcapng file
+
+    @param position: position of a packet as returned by a previous call.
+                     Reading starts at this packet. None: start of file
+    @return: generator of (position, time stamp [s], frame header, events)
+             for every frame which contains events
+    """
+    for position, ts, link_type, data in read_packets(pcap_file, position):
+        try:
+            payload = udp_payload(link_type, data)
+        except (struct.error, IndexError):
+            logger.debug("invalid packet ignored")
+            continue
+        if payload:
+            events = parse_frame(payload, host_id)
+            if events:
+                yield position, ts, FRAME_HEADER.unpack_from(payload)[0], events
+
+
+def pack_frame(events, msg_counter=0):
+    """
+    @brief Builds a middleware trace/log frame containing the given events.
+           It is the inverse of parse_frame() and used to create synthetic
+           recordings.
+
+    @param events: event dictionaries as returned by parse_frame()
+    """
+    parts = [FRAME_HEADER.pack(((msg_counter & 0xFF) << 24)
+                               | (TRACELOG_KIND << 20) | TRACELOG_ID)]
+    for e in events:
+        if e['type'] == 0xFF:
+            string = e['data']
+            parts.append(TRACELOG_MESSAGE.pack(ENTRY_TYPE_LOG_TEXT, e['host']
+                                               , e['swc'], e['zgt'], 0))
+            parts.append(LOG_NOT_CODED.pack(0, len(string)))
+            parts.append(string)
+            parts.append(b'\0') # no parameters
+        else:
+            parts.append(TRACELOG_MESSAGE.pack(ENTRY_TYPE_TRACE, e['host']
+                                               , e['swc'], e['zgt'], e['count']))
+            parts.append(TRACE_DATA.pack(e['core'], e['type'], e['data']))
+    return b''.join(parts)
+
+
+def write_pcap(pcap_file, frames, port=50000):
+    """
+    @brief Writes middleware frames as Ethernet/IPv4/UDP packets to a classic
+           pcap file
+
+    @param frames: iterable of (time stamp [s], frame)
+    """
+    with open(pcap_file, 'wb') as f:
+        f.write(struct.pack(b"<IHHiIII", PCAP_MAGIC_US, 2, 4, 0, 0, 65535,
+                            LINKTYPE_ETHERNET))
+        for ts, frame in frames:
+            udp = struct.pack(b">HHHH", port, port, UDP_HEADER_LEN + len(frame),
+                              0) + frame
+            ip = struct.pack(b">BBHHHBBH4s4s", 0x45, 0, 20 + len(udp), 0,
+                             0x4000, 64, IPPROTO_UDP, 0, b'\xc0\xa8\x01\x01',
+                             b'\xc0\xa8\x01\x02') + udp
+            packet = b'\x02' * 6 + b'\x04' * 6 + struct.pack(b">H",
+                     ETHERTYPE_IPV4) + ip
+            sec = int(ts)
+            f.write(struct.pack(b"<IIII", sec, int((ts - sec) * 1e6),
+                                len(packet), len(packet)))
+            f.write(packet)
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'PcapError'
+          , 'read_packets'
+          , 'udp_payload'
+          , 'parse_frame'
+          , 'reconstructed_string'
+          , 'read_events'
+          , 'read_frames'
+          , 'pack_frame'
+          , 'write_pcap']
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,374 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    pm_batch.py
+#
+# Purpose
+#    Batch analysis of recordings with a consolidated comparison report
+#
+# Revision Dates
+# --
+
+"""
+Batch analysis of recordings with a consolidated comparison report.
+
+The recordings (trace event CSV files or pcap files read by the native
+reader) are analysed by a pool of worker processes. Every worker creates one
+client, i.e. the model and the schedule information are loaded only once per
+worker. The output files of a recording are written to a subfolder named
+after the recording. Finally the statistical analysis summaries of all
+recordings are merged into one comparison file per summary type, which
+contains the measurements of all recordings side by side and their deltas
+against a baseline recording. The columns of recordings whose analysis failed
+contain FAILED.
+"""
+
+import os
+import re
+import csv
+import copy
+import glob
+import logging
+import multiprocessing
+from MotionWise import pm_instrument
+from MotionWise import pm_measurement as PM
+from MotionWise.log_proc import configure_process, log_level
+from MotionWise.MotionWise_perf_client import Client, TIME_STAMP
+from MotionWise.MotionWise_perf_proxy import _CsvConnection, _PcapConnection
+
+logger = logging.getLogger(__name__)
+
+RECORDING_SUFFIXES = ('.csv', '.pcap', '.pcapng')
+# summaries which are compared and their key columns
+SUMMARY_KEYS = [ ('runnable', ['core', 'swc', 'runnable'])
+               , ('task', ['core', 'name'])
+               , ('sw_layer', ['core', 'SW_layer'])
+               , ('driver', ['core', 'name'])
+               , ('aggregated', ['host', 'core'])]
+_CORE_COLUMN = re.compile(r'_core_(\d+)_')
+FAILED = 'FAILED'
+
+_client = None
+
+
+class _Job(object):
+
+    def __init__(self, **args):
+        self.__dict__.update(args)
+
+
+class _EofConnection(object):
+    """
+    Returns 'EOF' after the last event of a recording, i.e. the client stops
+    without waiting for the receive timeout.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def poll(self):
+        return True
+
+    def recv(self):
+        return self._conn.recv() if self._conn.poll() else 'EOF'
+
+    def send(self, item):
+        pass
+
+    def close(self):
+        self._conn.close()
+
+
+class BatchClient(Client):
+    """
+    Client which analyses several recordings one after the other in the
+    calling process
+    """
+
+    def __init__(self, ra_model, args):
+        super(BatchClient, self).__init__(ra_model, None, args, None)
+        self._is_process = False
+
+    def analyse(self, args):
+        """
+        @brief Analyses the recording args.csv_file or args.pcap_file (read by
+               the native reader) and writes the output files to
+               args.out_path
+
+        @return: number of trace events, number of lost trace events
+        @raise Exception: exception which terminated the analysis
+        """
+        pm_instrument.detach_callbacks()
+        pm_instrument.reset()
+        self._args = args
+        self._out_path = args.out_path
+        self._event_cnt = 0
+        self._lost_events = 0
+        self._lost_frames = 0
+        self._error = None
+        if args.csv_file:
+            conn = _CsvConnection(args.csv_file)
+        else:
+            conn = _PcapConnection(args.pcap_file,
+                                   PM.HOSTS[args.host.upper()]['id'])
+        self._pipe_conn = _EofConnection(conn)
+        self.run()
+        if self._error is not None:
+            raise self._error
+        return self._event_cnt, self._lost_events
+
+
+def find_recordings(spec):
+    """
+    @brief Returns the recordings of a batch as list of (label, path).
+
+    spec is either a directory, of which all recordings are analysed, or a
+    manifest file with one recording per line. A line of a manifest contains
+    the path of a recording relative to the manifest, optionally preceded by
+    a label and '=', e.g. "baseline = runs/0815.pcap". Lines starting with #
+    are ignored.
+    """
+    out = []
+    if os.path.isdir(spec):
+        for fn in sorted(os.listdir(spec)):
+            if os.path.splitext(fn)[1].lower() in RECORDING_SUFFIXES:
+                out.append((os.path.splitext(fn)[0], os.path.join(spec, fn)))
+    else:
+        base = os.path.dirname(os.path.abspath(spec))
+        with open(spec, 'r') as f:
+            for l in f:
+                l = l.strip()
+                if not l or l.startswith('#'):
+                    continue
+                m = re.match(r'^([\w.-]+)\s*=\s*(.+)$', l)
+                label, path = m.groups() if m else (None, l)
+                path = os.path.join(base, path)
+                label = label or os.path.splitext(os.path.basename(path))[0]
+                out.append((label, path))
+
+    # labels are used as folder names and column titles
+    seen = {}
+    for i, (label, path) in enumerate(out):
+        if label in seen:
+            seen[label] += 1
+            out[i] = ('{}_{}'.format(label, seen[label]), path)
+        else:
+            seen[label] = 0
+    return out
+
+
+def _init_worker(args, ra_model, log_queue):
+    global _client
+    root = logging.getLogger()
+    if log_queue is not None and not root.handlers:
+        configure_process(log_queue, log_level(args))
+    _client = BatchClient(ra_model, args)
+
+
+def _run_job(job):
+    try:
+        cnt, lost = _client.analyse(job.args)
+        return job.label, cnt, lost, None
+    except Exception as e:
+        logger.error("analysis of {} failed".format(job.path))
+        return job.label, 0, 0, '{}: {}'.format(type(e).__name__, e)
+
+
+def _read_summary(path):
+    """
+    @brief Reads a statistical analysis summary file
+
+    @return: list of column names, list of rows
+    """
+    with open(path, 'rb') as f:
+        for l in iter(f.readline, b''):
+            if l.startswith(b'#HEADER'):
+                header = l[len(b'#HEADER'):].strip().split(PM.DELIMITER)
+                rows = [r for r in csv.reader(f, delimiter=PM.DELIMITER) if r]
+                return header, rows
+    return [], []
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _measurements(path, keys):
+    """
+    @brief Returns the measurements of a summary file as dictionary
+           (key, measurement) -> value. Per-core columns of the aggregated
+           summary are split into a core key and the measurement name.
+    """
+    header, rows = _read_summary(path)
+    out = {}
+    for r in rows:
+        d = dict(zip(header, r))
+        for col, value in d.iteritems():
+            if col in keys:
+                continue
+            core = ''
+            m = _CORE_COLUMN.search(col)
+            if m and 'core' not in header:
+                core = m.group(1)
+                col = col[:m.start()] + '_' + col[m.end():]
+            key = tuple(core if k == 'core' and k not in d else d.get(k, '')
+                        for k in keys)
+            if _to_float(value) is not None or value == '':
+                out[(key, col)] = value
+    return out
+
+
+def _summary_file(out_path, kind):
+    files = glob.glob(os.path.join(out_path, 'output',
+                      '*_statistical-analysis-summary_{}.csv'.format(kind)))
+    return sorted(files)[-1] if files else None
+
+
+def report(results, baseline, out_dir, preamble='', failed=None):
+    """
+    @brief Writes one comparison file per summary type.
+
+    @param results: list of (label, output directory of the recording)
+    @param baseline: label of the recording the deltas are computed against
+    @param failed: dictionary label -> error of the recordings whose analysis
+                   failed. Their columns and all deltas against a failed
+                   baseline contain FAILED.
+    @return: list of written files
+    """
+    failed = failed or {}
+    written = []
+    labels = [label for label, _ in results]
+    others = [label for label in labels if label != baseline]
+    preamble += ''.join("#failed {}: {}\n".format(l, failed[l])
+                        for l in labels if l in failed)
+    for kind, keys in SUMMARY_KEYS:
+        data = {}
+        for label, out_path in results:
+            fn = _summary_file(out_path, kind)
+            if fn is not None and label not in failed:
+                data[label] = _measurements(fn, keys)
+        if not data:
+            continue
+        rows = sorted(set().union(*[d.iterkeys() for d in data.itervalues()]))
+        path = os.path.join(out_dir, '{}_MotionWise-PMT_batch-comparison_{}.csv'
+                            .format(TIME_STAMP, kind))
+        with open(path, 'wb') as f:
+            f.write(preamble)
+            header = keys + ['measurement'] + labels + \
+                     ['delta_{}'.format(l) for l in others]
+            f.write("#HEADER {}\n".format(PM.DELIMITER.join(header)))
+            writer = csv.writer(f, delimiter=PM.DELIMITER, lineterminator='\n')
+            for key, measurement in rows:
+                values = [data.get(l, {}).get((key, measurement), '')
+                          for l in labels]
+                if not any(values):
+                    continue
+                values = [FAILED if l in failed else v
+                          for l, v in zip(labels, values)]
+                base = _to_float(data.get(baseline, {}).get((key, measurement)))
+                deltas = []
+                for l in others:
+                    v = _to_float(data.get(l, {}).get((key, measurement)))
+                    if l in failed or baseline in failed:
+                        deltas.append(FAILED)
+                    else:
+                        deltas.append('' if v is None or base is None
+                                      else '{:f}'.format(v - base))
+                writer.writerow(list(key) + [measurement] + values + deltas)
+        written.append(path)
+    return written
+
+
+def run(args, ra_model, log_queue=None):
+    """
+    @brief Analyses all recordings given by args.batch and writes the
+           comparison report.
+
+    @param args: command line arguments of MotionWise_Perf. args.parallel is
+                 the number of worker processes (None or 0: number of CPUs).
+    @param ra_model: RA model as returned by Proxy.get_ra_model()
+    @param log_queue: queue to which the workers send their log records
+    @return: list of (label, number of events, number of lost events, error)
+    """
+    recordings = find_recordings(args.batch)
+    if not recordings:
+        logger.error("$cno recordings found in {}".format(args.batch))
+        return []
+    labels = [label for label, _ in recordings]
+    baseline = args.baseline or labels[0]
+    if baseline not in labels:
+        logger.error("$cbaseline {} is not part of the batch".format(baseline))
+        return []
+
+    pcap = [path for _, path in recordings
+            if not path.lower().endswith('.csv')]
+    if pcap and args.pcap_reader != 'native':
+        logger.error("$cbatch analysis of pcap-files requires --pcap-reader "
+                     "native ({})".format(pcap[0]))
+        return []
+
+    out_dir = os.path.join(args.out_path, 'output',
+                           '{}_MotionWise-PMT_batch'.format(TIME_STAMP))
+    jobs = []
+    for label, path in recordings:
+        a = copy.copy(args)
+        a.batch = None
+        a.parallel = None
+        a.csv_file = path if path.lower().endswith('.csv') else None
+        a.pcap_file = None if a.csv_file else path
+        a.out_path = os.path.join(out_dir, label)
+        os.makedirs(a.out_path)
+        jobs.append(_Job(label=label, path=path, args=a))
+
+    processes = min(len(jobs), args.parallel or multiprocessing.cpu_count())
+    logger.info("$canalysing {} recordings with {} processes"
+                .format(len(jobs), processes))
+    results = []
+    pool = multiprocessing.Pool(processes, _init_worker,
+                                (args, ra_model, log_queue))
+    try:
+        for label, cnt, lost, error in pool.imap(_run_job, jobs):
+            if error is None:
+                logger.info("$c{}: {} trace events, {} lost".format(label, cnt,
+                                                                   lost))
+            else:
+                logger.error("$c{}: analysis failed ({})".format(label, error))
+            results.append((label, cnt, lost, error))
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    failed = dict((label, error) for label, _, _, error in results
+                  if error is not None)
+    if baseline in failed:
+        logger.error("$canalysis of the baseline {} failed, the comparison "
+                     "files contain no deltas".format(baseline))
+    preamble = "#generated with MotionWise_Perf.py v{}, IF-Set {}\n" \
+               "#baseline {}\n".format(args.version, ra_model.get_IFSET(),
+                                        baseline)
+    if args.msexcel_compat:
+        preamble = 'sep={}\n'.format(PM.DELIMITER) + preamble
+    files = report([(j.label, j.args.out_path) for j in jobs], baseline,
+                   out_dir, preamble, failed)
+    logger.info("$c{} comparison files written to {}".format(len(files),
+                                                             out_dir))
+    return results
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'BatchClient'
+          , 'find_recordings'
+          , 'report'
+          , 'run']
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,323 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    pm_bench.py
+#
+# Purpose
+#    Performance benchmark of the analysis stages and output configurations
+#
+# Revision Dates
+# --
+
+"""
+Performance benchmark of the analysis stages and output configurations.
+
+The throughput (trace events per second) and the peak memory are measured
+for one recording, e.g. a synthetic recording of pm_synth, at every stage of
+the analysis
+
+  read      the events are read from the recording
+  decode    + the events are decoded
+  reorder   + sequence check and ZGT reordering of the host
+  cores     + state machines of the tasks, runnables and drivers
+
+and for the complete analysis with every output configuration (summary,
+trace-events, trace-statistics, drivers, vectorised, pipeline). The trace
+event output file is only written for pcap files and the vectorised analysis
+requires NumPy, the other configurations are skipped.
+
+Every run is executed in a new process, i.e. the peak memory (maximum
+resident set size) of the runs is independent. Of the pipeline analysis only
+the memory of the main process is measured. The fastest of the repeated
+runs of a measurement is reported. The results are written as JSON file
+together with the versions of the tool and the platform. If the results of
+a previous benchmark are given, the relative throughput and peak memory of
+every measurement are added, e.g. to compare two versions of the tool with
+the same recording.
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import shutil
+import logging
+import platform
+import tempfile
+import multiprocessing
+from MotionWise import pm_batch
+from MotionWise import pm_instrument
+from MotionWise import pm_measurement as PM
+from MotionWise.log_proc import configure_process, log_level
+from MotionWise.pm_instrument.trace import DictTrace
+from MotionWise.MotionWise_perf_proxy import _CsvConnection, _PcapConnection
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+BENCH_VERSION = 1
+BENCH_REPEAT = 3
+STAGES = ['read', 'decode', 'reorder', 'cores']
+# output configurations and the options they set
+CONFIGURATIONS = [ ('summary', {})
+                 , ('trace-events', {'output_trace_events_off': False})
+                 , ('trace-statistics', {'trace_statistics': True})
+                 , ('drivers', {'trace_drivers': True})
+                 , ('vectorised', {'vectorised': True})
+                 , ('pipeline', {'pipeline': 0})]
+# options of MotionWise_Perf which are reset for the measurements
+_NEUTRAL = { 'output_trace_events_off': True, 'trace_statistics': False
+           , 'trace_drivers': False, 'vectorised': False, 'pipeline': None
+           , 'parallel': None, 'batch': None, 'plugins': None
+           , 'checkpoint': None, 'resume': None, 'rerender': None
+           , 'max_lag': None, 'time_from': None, 'time_to': None
+           , 'pcap_reader': 'native'}
+
+
+def _peak_memory():
+    """
+    @return: peak resident set size of the process [bytes], None if it is
+             not available on the platform
+    """
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == 'darwin' else rss * 1024
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+    except (ImportError, AttributeError):
+        return None
+
+
+def _discard(trace_event):
+    pass
+
+
+def _run_stage(name, args, host_id):
+    """
+    @return: number of events processed by the analysis up to the stage
+    """
+    pm_instrument.detach_callbacks()
+    pm_instrument.reset()
+    if args.csv_file:
+        conn = _CsvConnection(args.csv_file)
+    else:
+        conn = _PcapConnection(args.pcap_file, host_id)
+    if name == 'reorder':
+        pm_instrument.set_core_dispatch(host_id, _discard)
+    cnt = 0
+    while conn.poll():
+        item = conn.recv()
+        if name == 'decode':
+            DictTrace(item)
+        elif name != 'read':
+            pm_instrument.receive_event(item)
+        cnt += 1
+    return cnt
+
+
+def _measure(conn, name, args, ra_model, host_id, log_queue):
+    """
+    @brief Runs one measurement in a worker process and sends (events,
+           seconds, memory at start, peak memory) or the error
+    """
+    root = logging.getLogger()
+    if log_queue is not None and not root.handlers:
+        configure_process(log_queue, log_level(args))
+    # progress output of the client
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        base = _peak_memory()
+        if name in STAGES:
+            start = time.time()
+            cnt = _run_stage(name, args, host_id)
+        else:
+            os.makedirs(args.out_path)
+            client = pm_batch.BatchClient(ra_model, args)
+            start = time.time()
+            cnt, _ = client.analyse(args)
+        conn.send(('done', (cnt, time.time() - start, base, _peak_memory())))
+    except Exception as e:
+        logger.exception("benchmark {} failed".format(name))
+        conn.send(('error', '{}'.format(e)))
+    finally:
+        conn.close()
+
+
+def _run(name, args, ra_model, host_id, log_queue):
+    parent_conn, child_conn = multiprocessing.Pipe(False)
+    p = multiprocessing.Process(target=_measure, args=(child_conn, name, args,
+                                ra_model, host_id, log_queue))
+    p.start()
+    child_conn.close()
+    try:
+        status, value = parent_conn.recv()
+    except EOFError:
+        status, value = 'error', 'worker process terminated'
+    p.join()
+    return status, value
+
+
+def measurements(args):
+    """
+    @brief Returns the measurements which are possible for the recording as
+           list of (name, kind, options)
+    """
+    out = [(name, 'stage', {}) for name in STAGES]
+    for name, options in CONFIGURATIONS:
+        if name == 'trace-events' and args.csv_file:
+            continue
+        if name == 'vectorised' and numpy is None:
+            continue
+        out.append((name, 'output', options))
+    return out
+
+
+def compare(results, previous):
+    """
+    @brief Compares the results with the results of a previous benchmark
+
+    @return: list of {name, throughput, peak_memory} with the ratios of the
+             current to the previous values of every common measurement
+    """
+    before = dict((m['name'], m) for m in previous['measurements'])
+    out = []
+    for m in results['measurements']:
+        p = before.get(m['name'])
+        if p is None:
+            continue
+        entry = {'name': m['name'], 'throughput': None, 'peak_memory': None}
+        for key, ratio in [('events_per_s', 'throughput'),
+                           ('peak_memory', 'peak_memory')]:
+            if m[key] and p[key]:
+                entry[ratio] = round(float(m[key]) / p[key], 4)
+        out.append(entry)
+    return out
+
+
+def load(path):
+    """
+    @brief Reads the results of a benchmark
+
+    @raise ValueError: if the file does not contain benchmark results
+    """
+    try:
+        with open(path, 'r') as f:
+            results = json.load(f)
+    except ValueError:
+        raise ValueError("{} is not a benchmark result file".format(path))
+    if not isinstance(results, dict) or \
+            results.get('version') != BENCH_VERSION:
+        raise ValueError("{} is not a benchmark result file".format(path))
+    return results
+
+
+def run(args, ra_model, path, repeat=BENCH_REPEAT, baseline=None,
+        log_queue=None, synthetic=None):
+    """
+    @brief Benchmarks the analysis of the recording given by args.csv_file
+           or args.pcap_file and writes the results to the JSON file path
+
+    @param args: command line arguments of MotionWise_Perf
+    @param repeat: number of runs of every measurement
+    @param baseline: JSON file of a previous benchmark the results are
+                     compared with
+    @param synthetic: generator options if the recording is synthetic
+    @return: results as written to the file
+    """
+    previous = load(baseline) if baseline else None
+    host_str = args.host.upper()
+    host_id = PM.HOSTS[host_str]['id']
+    recording = args.csv_file or args.pcap_file
+    results = { 'version': BENCH_VERSION
+              , 'created': time.strftime('%Y-%m-%d %H:%M:%S')
+              , 'tool': args.version
+              , 'pm_instrument': pm_instrument.version()
+              , 'python': platform.python_version()
+              , 'platform': platform.platform()
+              , 'cpus': multiprocessing.cpu_count()
+              , 'recording': { 'path': os.path.abspath(recording)
+                             , 'size': os.path.getsize(recording)
+                             , 'host': host_str
+                             , 'synthetic': synthetic}
+              , 'repeat': repeat
+              , 'measurements': []}
+    if previous and previous['recording']['size'] != \
+            results['recording']['size']:
+        logger.warning("$cthe baseline {} has been measured with a different "
+                       "recording".format(baseline))
+
+    tmp = tempfile.mkdtemp(prefix='pm_bench_')
+    try:
+        for i, (name, kind, options) in enumerate(measurements(args)):
+            a = copy.copy(args)
+            a.__dict__.update(_NEUTRAL)
+            a.__dict__.update(options)
+            m = { 'name': name, 'kind': kind, 'events': None
+                , 'seconds': None, 'events_per_s': None
+                , 'peak_memory': None, 'memory_increase': None
+                , 'error': None}
+            for j in xrange(repeat):
+                a.out_path = os.path.join(tmp, '{}_{}'.format(i, j))
+                status, value = _run(name, a, ra_model, host_id, log_queue)
+                if status != 'done':
+                    m['error'] = value
+                    break
+                cnt, seconds, base, peak = value
+                if m['seconds'] is None or seconds < m['seconds']:
+                    m['events'] = cnt
+                    m['seconds'] = round(seconds, 4)
+                    m['events_per_s'] = round(cnt / max(seconds, 1e-6), 1)
+                m['peak_memory'] = max(m['peak_memory'], peak)
+                if base is not None and peak is not None:
+                    m['memory_increase'] = max(m['memory_increase'],
+                                               peak - base)
+            results['measurements'].append(m)
+            if m['error'] is None:
+                logger.info("$c{:<16} {:>10.0f} events/s, peak memory {}"
+                            .format(name, m['events_per_s'], '{:.1f}MB'.format(
+                                m['peak_memory'] / 1e6) if m['peak_memory']
+                                else 'n/a'))
+            else:
+                logger.error("$c{}: benchmark failed ({})".format(name,
+                                                                 m['error']))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if previous:
+        results['baseline'] = { 'path': os.path.abspath(baseline)
+                              , 'tool': previous.get('tool')
+                              , 'created': previous.get('created')
+                              , 'ratios': compare(results, previous)}
+        for r in results['baseline']['ratios']:
+            logger.info("$c{:<16} throughput x{}, peak memory x{}".format(
+                r['name'], r['throughput'], r['peak_memory']))
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    logger.info("$cbenchmark results written to {}".format(path))
+    return results
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'run'
+          , 'load'
+          , 'compare'
+          , 'measurements'
+          , 'STAGES'
+          , 'CONFIGURATIONS']
+
+if __name__ == '__main__':
+    pass
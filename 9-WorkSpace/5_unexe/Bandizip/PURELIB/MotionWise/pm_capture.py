@@ -0,0 +1,230 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    pm_capture.py
+#
+# Purpose
+#    Throughput and latency statistics of the RA capture path
+#
+# Revision Dates
+# --
+
+"""
+Throughput and latency statistics of the RA capture path.
+
+The proxy accounts every record delivered by the RA library to its trace
+log callback:
+
+  records    number of records per host, entry type (1: log not coded,
+             2: log coded, 3: trace, ...) and event type of trace records
+  forwarded  number of records sent to the client
+  dropped    number of records which are not sent, per reason
+             (host: other host, discarded: not required by the analysis,
+             e.g. log messages other than the task mapping or events before
+             the receiving has been started, closed: pipe to the client
+             closed)
+  callback   histogram of the duration of the callback [us]
+  latency    histogram of the arrival latency [us]
+
+The arrival latency is the difference between the wall-clock time at the
+arrival of a record in Python and its ZGT, relative to the minimum of this
+difference of the host, i.e. the delay of a record compared to the fastest
+record. The ZGT is not synchronised with the clock of the PC, so this is the
+variation of the latency (e.g. queueing in the RA library or a blocked
+callback), not its absolute value.
+
+The histograms use powers of two as bucket limits. The statistics are
+available at any time with CaptureStats.snapshot(). At the end of a
+measurement the proxy sends the snapshot with MARKER to the client, which
+writes it to the file *_capture-statistics.csv and logs a summary. A high
+callback duration or latency together with a low analysis lag (see
+pm_profile) means that the capture side is the bottleneck. The accounting
+costs about 3us per record, it is disabled with --no-capture-stats.
+"""
+
+import time
+import timeit
+from MotionWise.pm_measurement import DELIMITER
+
+MARKER = 'CS'
+FORWARDED = 'forwarded'
+OTHER_HOST = 'host'         # record of another host
+DISCARDED = 'discarded'     # record which is not analysed
+CLOSED = 'closed'           # connection to the client closed
+SHED = 'shed'   # runnable event dropped by load shedding (see pm_load)
+DROPPED = [OTHER_HOST, DISCARDED, CLOSED, SHED]
+HISTOGRAM_BUCKETS = 32    # upper limit of the last bucket 2^31 us
+
+_clock = timeit.default_timer
+
+
+class Histogram(object):
+    """
+    Histogram of durations [us] with the buckets [0, 1), [1, 2), [2, 4), ...
+    """
+
+    def __init__(self):
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def add(self, us):
+        us = int(us) if us > 0 else 0
+        self.buckets[min(us.bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.sum += us
+        if us > self.max:
+            self.max = us
+
+    def percentile(self, p):
+        """
+        @return: upper limit of the bucket which contains the p-th
+                 percentile [us], None if the histogram is empty
+        """
+        if not self.count:
+            return None
+        limit = self.count * p / 100.0
+        n = 0
+        for i, c in enumerate(self.buckets):
+            n += c
+            if n >= limit:
+                return min(1 << i, self.max)
+        return self.max
+
+    def snapshot(self):
+        return { 'count': self.count
+               , 'mean': round(float(self.sum) / self.count, 3)
+                         if self.count else None
+               , 'p50': self.percentile(50)
+               , 'p90': self.percentile(90)
+               , 'p99': self.percentile(99)
+               , 'max': self.max
+               , 'buckets': list(self.buckets)}
+
+
+class CaptureStats(object):
+    """
+    Counters and histograms of the RA trace log callback
+    """
+
+    def __init__(self):
+        self._start = time.time()
+        self._last = None
+        self._records = {}
+        self._dropped = dict.fromkeys(DROPPED, 0)
+        self._offsets = {}
+        self.callback = Histogram()
+        self.latency = Histogram()
+
+    def add(self, host, entry_type, event_type, status, zgt, start):
+        """
+        @brief Accounts a record delivered by the RA library
+
+        @param event_type: event type of trace records, None otherwise
+        @param status: FORWARDED or the reason why the record is dropped
+        @param zgt: ZGT of the record [us]
+        @param start: time of the call of the callback (_clock())
+        """
+        now = time.time()
+        key = (host, entry_type, event_type)
+        entry = self._records.get(key)
+        if entry is None:
+            entry = self._records[key] = [0, 0]
+        entry[0] += 1
+        if status == FORWARDED:
+            entry[1] += 1
+        else:
+            self._dropped[status] += 1
+        if zgt:
+            offset = now * 1e6 - zgt
+            minimum = self._offsets.get(host)
+            if minimum is None or offset < minimum:
+                self._offsets[host] = minimum = offset
+            self.latency.add(offset - minimum)
+        self._last = now
+        self.callback.add((_clock() - start) * 1e6)
+
+    def snapshot(self):
+        """
+        @return: dictionary with the current statistics
+        """
+        duration = max((self._last or self._start) - self._start, 1e-6)
+        records = []
+        total = forwarded = 0
+        for (host, entry_type, event_type), (n, f) in \
+                sorted(self._records.iteritems()):
+            records.append({ 'host': host, 'entry_type': entry_type
+                           , 'event_type': event_type, 'records': n
+                           , 'forwarded': f
+                           , 'records_per_s': round(n / duration, 1)})
+            total += n
+            forwarded += f
+        return { 'duration': round(duration, 3)
+               , 'records': total
+               , 'forwarded': forwarded
+               , 'records_per_s': round(total / duration, 1)
+               , 'dropped': dict(self._dropped)
+               , 'per_type': records
+               , 'callback': self.callback.snapshot()
+               , 'latency': self.latency.snapshot()}
+
+
+def summary(snapshot):
+    """
+    @return: one line summary of a snapshot
+    """
+    cb = snapshot['callback']
+    lat = snapshot['latency']
+    fmt = lambda v: 'n/a' if v is None else '{}'.format(v)
+    return ("capture: {} records ({:.0f}/s), forwarded {}, dropped {}, "
+            "callback mean {}us p99 {}us max {}us, latency p99 {}us max {}us"
+            .format(snapshot['records'], snapshot['records_per_s'],
+                    snapshot['forwarded'], ', '.join('{} {}'.format(k, v)
+                        for k, v in sorted(snapshot['dropped'].iteritems())),
+                    fmt(cb['mean']), fmt(cb['p99']), cb['max'],
+                    fmt(lat['p99']), lat['max']))
+
+
+def write(snapshot, file_handler):
+    """
+    @brief Writes a snapshot as CSV file: one row per host, entry type and
+           event type followed by the histograms
+    """
+    fmt = lambda v: '' if v is None else '{}'.format(v)
+    file_handler.write("#HEADER ")
+    file_handler.write(DELIMITER.join(['host', 'entry_type', 'event_type',
+        'records', 'forwarded', 'records_per_s']))
+    file_handler.write("\n")
+    for r in snapshot['per_type']:
+        file_handler.write(DELIMITER.join([fmt(r['host']),
+            fmt(r['entry_type']), fmt(r['event_type']), fmt(r['records']),
+            fmt(r['forwarded']), fmt(r['records_per_s'])]))
+        file_handler.write("\n")
+    file_handler.write("#dropped {}\n".format(DELIMITER.join(
+        '{}={}'.format(k, v) for k, v in sorted(
+            snapshot['dropped'].iteritems()))))
+    names = ['count', 'mean', 'p50', 'p90', 'p99', 'max']
+    file_handler.write("#HEADER ")
+    file_handler.write(DELIMITER.join(['histogram'] + names + ['<{}us'.format(
+        1 << i) for i in xrange(HISTOGRAM_BUCKETS)]))
+    file_handler.write("\n")
+    for name in ['callback', 'latency']:
+        h = snapshot[name]
+        file_handler.write(DELIMITER.join(['{}[us]'.format(name)] +
+            [fmt(h[n]) for n in names] + [fmt(b) for b in h['buckets']]))
+        file_handler.write("\n")
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'CaptureStats'
+          , 'Histogram'
+          , 'summary'
+          , 'write'
+          , 'MARKER']
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,135 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    pm_checkpoint.py
+#
+# Purpose
+#    Checkpoints of the analysis state
+#
+# Revision Dates
+# --
+
+"""
+Checkpoints of the analysis state.
+
+A checkpoint contains the processing state of the monitored host (task,
+runnable and driver state machines, sequence and ZGT reorder buffers), the
+accumulated measurements of all summary listeners and the state of their
+samplers. It is used to
+
+  - resume an interrupted measurement: the accumulated measurements are
+    restored. In the offline mode the events which have already been
+    analysed are skipped and the host state is restored as well.
+  - re-render the output files with a different budget, period or SW layer
+    configuration without analysing the events again.
+"""
+
+import os
+import time
+import logging
+import cPickle
+from MotionWise import pm_instrument
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_SUFFIX = '.pmchk'
+CHECKPOINT_VERSION = 1
+CHECKPOINT_INTERVAL = 60    # default interval of periodic checkpoints [s]
+
+
+def collect(listeners, host_id, **meta):
+    """
+    @brief Returns the analysis state as picklable dictionary
+
+    @param meta: additional information stored with the state, e.g. number of
+                 analysed events
+    """
+    meta['created'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    return { 'version': CHECKPOINT_VERSION
+           , 'meta': meta
+           , 'host_state': pm_instrument.get_state(host_id)
+           , 'listeners': {k: l.get_state() for k, l in listeners.iteritems()
+                           if hasattr(l, 'get_state')}
+           , 'samplers': {k: l._sampler._last_update_time
+                          for k, l in listeners.iteritems()
+                          if hasattr(l, '_sampler')}}
+
+
+def save(path, state):
+    """
+    @brief Writes a checkpoint. The previous checkpoint is replaced only after
+           the new one has been written completely.
+    """
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        cPickle.dump(state, f, cPickle.HIGHEST_PROTOCOL)
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp, path)
+
+
+def load(path):
+    """
+    @brief Reads a checkpoint
+
+    @raise ValueError: if the file is not a valid checkpoint
+    """
+    try:
+        with open(path, 'rb') as f:
+            state = cPickle.load(f)
+    except (EOFError, cPickle.UnpicklingError, AttributeError, ImportError):
+        raise ValueError("{} is not a valid checkpoint".format(path))
+    if not isinstance(state, dict) or \
+            state.get('version') != CHECKPOINT_VERSION:
+        raise ValueError("{} is not a valid checkpoint".format(path))
+    return state
+
+
+def restore(state, listeners, host_id=None):
+    """
+    @brief Restores the accumulated measurements of the given (new)
+           listeners. If host_id is given the processing state of the host
+           and the state of the samplers are restored as well, i.e. the
+           analysis continues with the event following the checkpoint.
+    """
+    for k, s in state['listeners'].iteritems():
+        if k in listeners:
+            listeners[k].merge_state(s)
+    if host_id is not None:
+        pm_instrument.set_state(host_id, state['host_state'])
+        for k, t in state['samplers'].iteritems():
+            if k in listeners:
+                listeners[k]._sampler._last_update_time = t
+
+
+class Checkpointer(object):
+    """
+    Writes a checkpoint file at a regular interval
+    """
+
+    def __init__(self, path, interval=CHECKPOINT_INTERVAL):
+        self.path = path
+        self._interval = interval
+        self._next = time.time() + interval
+
+    def due(self):
+        return time.time() >= self._next
+
+    def save(self, listeners, host_id, **meta):
+        save(self.path, collect(listeners, host_id, **meta))
+        self._next = time.time() + self._interval
+        logger.debug("checkpoint written to {}".format(self.path))
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'Checkpointer'
+          , 'collect'
+          , 'save'
+          , 'load'
+          , 'restore']
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,595 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    pm_index.py
+#
+# Purpose
+#    Seekable time index for recorded trace events
+#
+# Revision Dates
+# --
+
+"""
+Seekable time index for recorded trace events (pcap and trace event CSV).
+
+The index is built by replaying the recording once with all callbacks muted.
+At regular intervals of the ZGT a checkpoint is stored which contains the
+position in the file of the next event, the wall-clock time (pcap only) and a
+snapshot of the processing state of the host. The index is written as sidecar
+file next to the recording.
+
+The sidecar file is JSON. The snapshots of the host state are serialized by
+pm_instrument.get_state() and are only restored if the message authentication
+code of the index matches. It is computed with a key which is private to the
+user (stored in the user's cache folder), so an index which has been written
+by another user is not used but rebuilt.
+
+A time window of the recording can then be replayed by restoring the snapshot
+of the last checkpoint in front of the window and replaying the recording from
+the stored file position on.
+"""
+
+import os
+import csv
+import json
+import time
+import zlib
+import hmac
+import base64
+import bisect
+import hashlib
+import logging
+from MotionWise import pm_instrument
+from MotionWise import pcap_reader
+from MotionWise import file_parser as FP
+
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = '.pmidx'
+INDEX_VERSION = 3
+INDEX_KEY = 'pmidx.key'         # file of the key of the index MAC in the
+                                # user's cache folder
+INDEX_KEY_SIZE = 32
+CHECKPOINT_INTERVAL = 10000000  # distance of checkpoints [us]
+LOOKAHEAD_EVENTS = 2000         # events replayed after a window to flush the
+                                # sequence and ZGT reorder buffers
+CSV_FIELDS = ['zgt', 'count', 'host', 'core', 'type', 'swc', 'rid', 'data']
+
+
+class _CsvSource(object):
+    """
+    Trace event CSV file. Positions are file offsets of rows.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.sep, self.fields, self.start = FP.parse_trace_csv_layout(path)
+
+    def events(self, position=None):
+        """
+        @brief Yields (position of next event, wall-clock time, event) of all
+               events starting at the given position.
+        """
+        offset = [self.start if position is None else position]
+        with open(self.path, 'rb') as f:
+            f.seek(offset[0])
+
+            def lines():
+                for l in iter(f.readline, b''):
+                    offset[0] += len(l)
+                    yield l
+
+            fields = self.fields
+            for r in csv.reader(lines(), delimiter=self.sep,
+                                quotechar=FP.TRACE_CSV_QUOTE):
+                if r:
+                    yield offset[0], None, dict(zip(fields, r))
+
+    @staticmethod
+    def position(data):
+        """
+        @brief Returns the position read from an index file
+
+        @exception ValueError if the data is not a position of a CSV file
+        """
+        if not isinstance(data, (int, long)) or isinstance(data, bool) \
+                or data < 0:
+            raise ValueError("invalid CSV position {!r}".format(data))
+        return data
+
+    def write(self, path, events):
+        with open(path, 'wb') as f:
+            f.write(b"#HEADER {}\n".format(self.sep.join(CSV_FIELDS)))
+            writer = csv.writer(f, delimiter=self.sep,
+                                quotechar=FP.TRACE_CSV_QUOTE, lineterminator='\n')
+            for _, e in events:
+                writer.writerow([e.get(k, '') for k in CSV_FIELDS])
+
+
+class _PcapSource(object):
+    """
+    Recorded pcap/pcapng file. Positions are tuples of the position of a
+    packet and the number of events of the packet which have been read.
+    """
+
+    def __init__(self, path, host_id):
+        self.path = path
+        self.host_id = host_id
+
+    def events(self, position=None):
+        """
+        @brief Yields (position of next event, wall-clock time, event) of all
+               events starting at the given position.
+        """
+        packet, skip = position if position is not None else (None, 0)
+        for packet, ts, _, events in pcap_reader.read_frames(self.path,
+                                                     self.host_id, packet):
+            for i in xrange(skip, len(events)):
+                yield (packet, i + 1), ts, events[i]
+            skip = 0
+
+    @staticmethod
+    def position(data):
+        """
+        @brief Returns the position read from an index file, JSON lists are
+               converted back to tuples
+
+        @exception ValueError if the data is not a position of a pcap file
+        """
+        try:
+            packet, skip = data
+            kind, offset, byte_order = packet[:3]
+            if byte_order not in ('<', '>') or not _is_uint(offset) \
+                    or not _is_uint(skip):
+                raise ValueError
+            if kind == 'pcap':
+                link_type, resolution = packet[3:]
+                if not _is_uint(link_type) or resolution not in (1e-6, 1e-9):
+                    raise ValueError
+                packet = ('pcap', offset, str(byte_order), link_type,
+                          resolution)
+            elif kind == 'pcapng':
+                interfaces, = packet[3:]
+                interfaces = tuple((link_type, ticks) for link_type, ticks
+                                   in interfaces)
+                if not all(_is_uint(v) for i in interfaces for v in i):
+                    raise ValueError
+                packet = ('pcapng', offset, str(byte_order), interfaces)
+            else:
+                raise ValueError
+        except (ValueError, TypeError):
+            raise ValueError("invalid pcap position {!r}".format(data))
+        return packet, skip
+
+    def write(self, path, events):
+        def frames():
+            for i, (ts, e) in enumerate(events):
+                yield ts or 0.0, pcap_reader.pack_frame([e], i)
+        pcap_reader.write_pcap(path, frames())
+
+
+def _is_uint(value):
+    return isinstance(value, (int, long)) and not isinstance(value, bool) \
+        and value >= 0
+
+
+def _index_key():
+    """
+    @brief Returns the key of the message authentication code of the index
+           files of the user, None if there is no private cache folder
+    """
+    from MotionWise import RA
+    user_dir = RA._user_cache_dir()
+    if user_dir is None:
+        return None
+    path = os.path.join(user_dir, INDEX_KEY)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except OSError:
+        pass
+    else:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(os.urandom(INDEX_KEY_SIZE))
+    try:
+        with open(path, 'rb') as f:
+            key = f.read()
+    except IOError:
+        return None
+    return key if len(key) == INDEX_KEY_SIZE else None
+
+
+def _mac(key, data):
+    return hmac.new(key, json.dumps(data, sort_keys=True, encoding='latin-1'),
+                    hashlib.sha256).hexdigest()
+
+
+def _task_map_event(event):
+    """
+    @brief Returns a task mapping log event read from an index file, the
+           strings are converted back to byte strings
+
+    @exception ValueError if the data is not an event
+    """
+    if not isinstance(event, dict) or \
+            not all(isinstance(k, basestring) for k in event):
+        raise ValueError("invalid task map event {!r}".format(event))
+    out = {}
+    for k, v in event.iteritems():
+        if isinstance(v, unicode):
+            v = v.encode('latin-1')
+        elif not isinstance(v, (str, int, long)):
+            raise ValueError("invalid task map event {!r}".format(event))
+        out[str(k)] = v
+    return out
+
+
+def parse_wall_clock(spec):
+    """
+    @brief Converts a wall-clock time to seconds since epoch
+
+    @param spec: @seconds since epoch or local time YYYY-mm-ddTHH:MM:SS[.f]
+    @return: None if spec is not a wall-clock time
+    """
+    if spec.startswith('@'):
+        return float(spec[1:])
+    if 'T' not in spec:
+        return None
+    date, _, fraction = spec.partition('.')
+    seconds = time.mktime(time.strptime(date, '%Y-%m-%dT%H:%M:%S'))
+    return seconds + (float('0.' + fraction) if fraction else 0.0)
+
+
+def check_time(spec):
+    """
+    @brief Checks the syntax of a time specification (see Index.parse_time())
+
+    @exception ValueError if the time specification is invalid
+    """
+    if spec is None:
+        return
+    spec = spec.strip()
+    try:
+        if parse_wall_clock(spec) is None:
+            float(spec[:-1]) if spec.endswith('s') else int(spec)
+    except ValueError:
+        raise ValueError("invalid time '{}': expected a ZGT in us, seconds "
+                         "with suffix 's', a local time YYYY-mm-ddTHH:MM:SS "
+                         "or @seconds since epoch".format(spec))
+
+
+def open_source(path, host_id):
+    """
+    @brief Returns the source of the events of a trace event CSV or pcap file.
+           Its events() method yields (position of next event, wall-clock
+           time, event) starting at a position returned before.
+    """
+    if path.lower().endswith('.csv'):
+        return _CsvSource(path)
+    return _PcapSource(path, host_id)
+
+
+class Index(object):
+    """
+    Time index of a recording.
+
+    The checkpoints are sorted by their ZGT. Each checkpoint is a tuple
+    (ZGT, wall-clock time, position, compressed snapshot of the host state).
+    The ZGT of a checkpoint is the newest time stamp of all events which have
+    been passed on to the callbacks before the snapshot was taken.
+    """
+
+    def __init__(self, path, host_id):
+        self.path = path
+        self.host_id = host_id
+        self.start = None
+        # (wall-clock time, ZGT of the event) at the start and at the
+        # checkpoints (pcap only)
+        self.wall_clock = []
+        self.end = None
+        self.checkpoints = []
+        self.task_map = []  # log events containing the task ID to name mapping
+        self._zgt = []
+        self._wall = []
+
+    def _stamp(self):
+        st = os.stat(self.path)
+        return [st.st_size, int(st.st_mtime)]
+
+    def build(self, interval=CHECKPOINT_INTERVAL):
+        """
+        @brief Scans the recording once and creates the checkpoints
+        """
+        source = open_source(self.path, self.host_id)
+        pm_instrument.reset()
+        pm_instrument.mute_callbacks(True)
+        self.checkpoints = [(-1, None, None, None)]
+        self.task_map = []
+        self.wall_clock = []
+        self.start = None
+        next_cp = None
+        try:
+            for position, wall, event in source.events():
+                if int(event['host']) != self.host_id:
+                    continue
+                if int(event['type']) == 0xFF:
+                    self.task_map.append(event)
+                pm_instrument.receive_event(event)
+                zgt = pm_instrument.processed_time(self.host_id)
+                if zgt <= 0:
+                    continue
+                if wall is not None and (next_cp is None or zgt >= next_cp):
+                    self.wall_clock.append((wall, int(event['zgt'])))
+                if next_cp is None:
+                    self.start = zgt
+                    next_cp = zgt + interval
+                elif zgt >= next_cp:
+                    state = zlib.compress(pm_instrument.get_state(self.host_id))
+                    self.checkpoints.append((zgt, wall, position, state))
+                    next_cp = (zgt // interval + 1) * interval
+                self.end = zgt
+        finally:
+            pm_instrument.mute_callbacks(False)
+            pm_instrument.reset()
+        self._update()
+        logger.info("$cindex with {} checkpoints created for {}"
+                    .format(len(self.checkpoints), self.path))
+
+    def _update(self):
+        self._zgt = [c[0] for c in self.checkpoints]
+        self._wall = sorted(self.wall_clock)
+
+    def save(self, index_file=None):
+        """
+        @brief Writes the index to the sidecar file. Nothing is written if
+               the user has no private key for the index files.
+
+        @return: False if the index has not been written
+        """
+        key = _index_key()
+        if key is None:
+            logger.debug("no private cache folder, index of {} not written"
+                         .format(self.path))
+            return False
+        data = { 'stamp': self._stamp()
+               , 'host': self.host_id
+               , 'start': self.start
+               , 'wall_clock': self.wall_clock
+               , 'end': self.end
+               , 'task_map': self.task_map
+               , 'checkpoints': [[zgt, wall, position,
+                                  base64.b64encode(state) if state else None]
+                                 for zgt, wall, position, state
+                                 in self.checkpoints]}
+        with open(index_file or self.path + INDEX_SUFFIX, 'wb') as f:
+            json.dump({'version': INDEX_VERSION, 'mac': _mac(key, data)
+                      , 'index': data}, f, encoding='latin-1')
+        return True
+
+    def load(self, index_file=None):
+        """
+        @brief Loads the index from the sidecar file
+
+        @return: False if there is no valid index for the recording
+        """
+        key = _index_key()
+        if key is None:
+            return False
+        try:
+            with open(index_file or self.path + INDEX_SUFFIX, 'rb') as f:
+                d = json.load(f)
+            if not isinstance(d, dict) or d.get('version') != INDEX_VERSION:
+                return False
+            data = d['index']
+            if not isinstance(data, dict) or not isinstance(d['mac'],
+                                                            basestring) \
+                    or not hmac.compare_digest(str(d['mac']), _mac(key, data)):
+                logger.warning("index {} has not been written by this user, "
+                               "it is rebuilt".format(f.name))
+                return False
+            if data['host'] != self.host_id or data['stamp'] != self._stamp():
+                return False
+            checkpoints = self._checkpoints(data['checkpoints'])
+            task_map = [_task_map_event(e) for e in data['task_map']]
+            wall_clock = [(float(wall), int(zgt))
+                          for wall, zgt in data['wall_clock']]
+            start, end = data['start'], data['end']
+        except (IOError, ValueError, TypeError, KeyError) as e:
+            logger.debug("invalid index of {}: {}".format(self.path, e))
+            return False
+        self.start = start
+        self.wall_clock = wall_clock
+        self.end = end
+        self.task_map = task_map
+        self.checkpoints = checkpoints
+        self._update()
+        return True
+
+    def _checkpoints(self, data):
+        """
+        @brief Converts the checkpoints read from the index file
+
+        @exception ValueError if the checkpoints are invalid
+        """
+        position = open_source(self.path, self.host_id).position
+        checkpoints = [(-1, None, None, None)]
+        if not isinstance(data, list) or not data or \
+                list(data[0]) != [-1, None, None, None]:
+            raise ValueError("invalid checkpoints")
+        for zgt, wall, pos, state in data[1:]:
+            if not isinstance(zgt, (int, long)) or zgt < checkpoints[-1][0] \
+                    or not isinstance(wall, (float, int, long, type(None))) \
+                    or not isinstance(state, basestring):
+                raise ValueError("invalid checkpoint")
+            checkpoints.append((zgt, wall, position(pos),
+                                base64.b64decode(state)))
+        return checkpoints
+
+    def find(self, zgt):
+        """
+        @brief Returns the last checkpoint in front of the given time stamp
+        """
+        return self.checkpoints[max(0, bisect.bisect_left(self._zgt, zgt) - 1)]
+
+    def find_wall_clock(self, wall):
+        """
+        @brief Returns the ZGT of a wall-clock time (seconds since epoch, pcap
+               only). It is mapped relative to the last checkpoint recorded
+               before the given time.
+
+        @exception ValueError if the recording has no wall-clock times
+        """
+        if not self._wall:
+            raise ValueError("wall-clock times are only supported for pcap "
+                             "files")
+        i = max(0, bisect.bisect_right(self._wall, (wall, float('inf'))) - 1)
+        cp_wall, cp_zgt = self._wall[i]
+        return cp_zgt + int(round((wall - cp_wall) * 1000000))
+
+    def parse_time(self, spec):
+        """
+        @brief Converts a time specification to a ZGT. Plain numbers are
+               absolute ZGT values [us], numbers with suffix 's' are seconds
+               relative to the start of the recording. Wall-clock times
+               (pcap only) are given as local time YYYY-mm-ddTHH:MM:SS[.f]
+               or as @seconds since epoch.
+
+        @exception ValueError if the time specification is invalid
+        """
+        if spec is None:
+            return None
+        check_time(spec)
+        spec = spec.strip()
+        wall = parse_wall_clock(spec)
+        if wall is not None:
+            return self.find_wall_clock(wall)
+        if spec.endswith('s'):
+            return self.start + int(float(spec[:-1]) * 1000000)
+        return int(spec)
+
+    def events(self, lo=None, hi=None):
+        """
+        @brief Yields (wall-clock time, event) from the last checkpoint in
+               front of lo until LOOKAHEAD_EVENTS events after hi.
+        """
+        source = open_source(self.path, self.host_id)
+        position = None if lo is None else self.find(lo)[2]
+        behind = 0
+        for _, wall, event in source.events(position):
+            if int(event['host']) != self.host_id:
+                continue
+            if hi is not None and int(event['zgt']) >= hi:
+                behind += 1
+                if behind > LOOKAHEAD_EVENTS:
+                    return
+            yield wall, event
+
+
+def open_index(path, host_id, refresh=False):
+    """
+    @brief Loads the index of a recording. If there is no valid index it is
+           created and written to the sidecar file.
+    """
+    index = Index(path, host_id)
+    if refresh or not index.load():
+        logger.info("$cindexing {}".format(path))
+        index.build()
+        try:
+            index.save()
+        except IOError:
+            logger.warning("index file could not be written for {}"
+                           .format(path))
+    return index
+
+
+class WindowConnection(object):
+    """
+    Imitates the behaviour of a multiprocessing.Connection and streams the
+    events of a time window [lo, hi) of a recording.
+
+    The task mapping log events are sent first. Before the first trace event
+    is returned the host state is restored from the checkpoint in front of the
+    window and the callbacks are restricted to the window.
+    """
+
+    def __init__(self, path, host_id, time_from=None, time_to=None):
+        self._index = open_index(path, host_id)
+        self._host_id = host_id
+        self._lo = self._index.parse_time(time_from)
+        self._hi = self._index.parse_time(time_to)
+        self._pending = list(self._index.task_map)
+        self._events = None
+        self._next = None
+        logger.info("$creplaying ZGT window [{}, {})".format(self._lo, self._hi))
+
+    def _start(self):
+        state = self._index.find(self._lo)[3] if self._lo is not None else None
+        if state is not None:
+            pm_instrument.set_state(self._host_id, zlib.decompress(state))
+        pm_instrument.set_window(self._lo, self._hi)
+        self._events = (e for _, e in self._index.events(self._lo, self._hi)
+                        if int(e['type']) != 0xFF)
+
+    def poll(self):
+        if self._next is None:
+            if self._pending:
+                self._next = self._pending.pop(0)
+            else:
+                if self._events is None:
+                    self._start()
+                try:
+                    self._next = self._events.next()
+                except StopIteration:
+                    pass
+        return self._next is not None
+
+    def recv(self):
+        if not self.poll():
+            raise EOFError
+        item, self._next = self._next, None
+        return item
+
+    def send(self, item):
+        pass
+
+    def close(self):
+        pm_instrument.set_window()
+
+
+def extract(path, host_id, out_path, time_from=None, time_to=None):
+    """
+    @brief Writes the events of a time window of a recording to a new
+           recording of the same format.
+
+    The sub-recording contains the task mapping log events and all events
+    from the last checkpoint in front of the window on, so that the state
+    machines are warmed up when the window is reached.
+
+    @return: number of written events
+    """
+    index = open_index(path, host_id)
+    lo = index.parse_time(time_from)
+    hi = index.parse_time(time_to)
+    first = index.find(lo)[1] if lo is not None else None
+    events = [(first, e) for e in index.task_map]
+    events.extend((w, e) for w, e in index.events(lo, hi)
+                  if int(e['type']) != 0xFF)
+    open_source(path, host_id).write(out_path, events)
+    logger.info("$c{} events of ZGT window [{}, {}) written to {}"
+                .format(len(events), lo, hi, out_path))
+    return len(events)
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'Index'
+          , 'check_time'
+          , 'parse_wall_clock'
+          , 'open_source'
+          , 'open_index'
+          , 'WindowConnection'
+          , 'extract']
+
+if __name__ == '__main__':
+    pass
@@ -32,9 +32,28 @@ class Callback(object):
     event_received_callback_fun = []
     zgt_correction_callback_fun = []
     zgt_error_callback_fun = []
+    # host name -> (list of trace events, size, function called when the list
+    # contains size events), see interface.receive_event_collector_add()
+    event_collectors = {}
+    muted = False
+    # stage profiler (see interface.set_profiler())
+    profiler = None
 
 
 def invoke(name, signal):
+    if Callback.muted: return
+    profiler = Callback.profiler
+    if profiler is not None:
+        profiler.callbacks += len(Callback.__dict__[name])
+        if profiler.active:
+            stage = profiler.switch('listeners')
+            _invoke(name, signal)
+            profiler.switch(stage)
+            return
+    _invoke(name, signal)
+
+
+def _invoke(name, signal):
     for func in Callback.__dict__[name]:
         try: 
             func(**signal)
@@ -50,5 +69,28 @@ def attach(name, fun):
         Callback.__dict__[name].append(fun)
 
 
+def detach(name, fun):
+    if fun in Callback.__dict__[name]:
+        Callback.__dict__[name].remove(fun)
+
+
+def mute(state):
+    """
+    @brief Suppresses (state = True) or releases (state = False) the
+           invocation of all registered callback functions.
+    """
+    Callback.muted = state
+
+
+def detach_all():
+    """
+    @brief Removes all registered callback functions.
+    """
+    for k, v in Callback.__dict__.items():
+        if k.endswith('_callback_fun'):
+            del v[:]
+    Callback.event_collectors.clear()
+
+
 if __name__ == '__main__':
     pass
\ No newline at end of file
@@ -12,6 +12,7 @@
 #
 # --
 
+import cPickle
 import trace
 import pmcalc
 import constants
@@ -23,7 +24,9 @@ import traceback
 __version__ = "$Revision: 80204 $".split()[1]
 __all__ = [ 'receive_event_callback_add'
           , 'receive_event'
+          , 'receive_task_map'
           , 'task_map_callback_add'
+          , 'task_map_callback_remove'
           , 'sequence_error_callback_add'
           , 'runnable_activation_callback_add'
           , 'runnable_netto_rt_callback_add'
@@ -40,11 +43,25 @@ __all__ = [ 'receive_event_callback_add'
           , 'zgt_error_callback_add'
           , 'runnable_overhead_callback_add'
           , 'reset'
+          , 'set_window'
+          , 'set_core_dispatch'
+          , 'process_core_event'
+          , 'reset_cores'
+          , 'set_profiler'
+          , 'receive_event_callback_remove'
+          , 'receive_event_collector_add'
+          , 'receive_event_collector_remove'
+          , 'detach_callbacks'
+          , 'mute_callbacks'
+          , 'get_state'
+          , 'set_state'
+          , 'processed_time'
           , 'version']
 
 
 lock = threading.Lock()
 logger = logging.getLogger('MotionWise.pm_instrument.interface')
+_profiler = None
 hosts = { 1: pmcalc.Host(3, 'APH')
         , 2: pmcalc.Host(8, 'SSH')
         , 3: pmcalc.Host(8, 'SRH')}
@@ -65,6 +82,116 @@ def reset():
     hosts[3] = pmcalc.Host(8, 'SRH')
 
 
+def set_window(lo=None, hi=None):
+    """
+    @brief Restricts the callbacks of all hosts to events with a time stamp 
+           within [lo, hi). Calling the function without arguments removes the
+           restriction. 
+    
+    @param lo: Lower bound of the window in us. None means unbounded.
+    @param hi: Upper bound of the window in us (excluded). None means unbounded.
+    """
+    with lock:
+        for h in hosts.itervalues():
+            h.set_window(lo, hi)
+
+
+def set_core_dispatch(host_id, fun=None):
+    """
+    @brief Passes the trace events of a host on to fun after the sequence 
+           check and the ZGT reordering instead of processing them by the state
+           machines of its cores. A reset of the cores is passed on as None. 
+           Calling the function without fun removes the redirection. 
+    
+    @param fun: Unary function accepting a trace event or None. It is called 
+                while the lock of the module is held.
+    """
+    with lock:
+        hosts[host_id].set_dispatch(fun)
+
+
+def process_core_event(trace_event):
+    """
+    @brief Processes a trace event which has been passed on by the function
+           registered with set_core_dispatch() (e.g. in another process) by 
+           the state machines of the cores of its host
+    """
+    with lock:
+        hosts[trace_event.host].process_core_event(trace_event)
+
+
+def reset_cores(host_id):
+    """
+    @brief Resets the state machines of all cores of a host
+    """
+    with lock:
+        hosts[host_id].reset()
+
+
+def set_profiler(profiler=None):
+    """
+    @brief Registers a stage profiler (see MotionWise.pm_profile) which 
+           measures the time spent in the stages of receive_event() for a
+           sample of the trace events and counts the invoked callbacks. 
+           Calling the function without profiler removes it.
+    
+    @param profiler: object with the attributes 'active' and 'callbacks' and
+                     the methods sample(), switch(stage) and stop(zgt, host)
+    """
+    global _profiler
+    with lock:
+        _profiler = profiler
+        pmcalc.profiler = profiler
+        callback.Callback.profiler = profiler
+
+
+def detach_callbacks():
+    """
+    @brief Removes all registered callback functions
+    """
+    callback.detach_all()
+
+
+def mute_callbacks(state):
+    """
+    @brief Suppresses (state = True) or releases (state = False) the invocation
+           of all registered callback functions. Events are still processed by 
+           the state machines of the hosts.
+    """
+    with lock:
+        callback.mute(state)
+
+
+def get_state(host_id):
+    """
+    @brief Returns a snapshot of the complete processing state of a host, i.e.
+           the state of all task, runnable and driver state machines and the 
+           content of the sequence and ZGT reorder buffers.
+    
+    @param host_id: ID of the host
+    @return: serialized state (string) to be passed to set_state()
+    """
+    with lock:
+        return cPickle.dumps(hosts[host_id], cPickle.HIGHEST_PROTOCOL)
+
+
+def set_state(host_id, state):
+    """
+    @brief Restores the processing state of a host from a snapshot returned by
+           get_state()
+    """
+    with lock:
+        hosts[host_id] = cPickle.loads(state)
+
+
+def processed_time(host_id):
+    """
+    @brief Returns the newest time stamp (us) of all trace events of a host 
+           which have been passed on to the callbacks so far.
+    """
+    return hosts[host_id]._max_zgt
+
+
 def receive_event(event_data):
     """
     @brief Receives a logging/tracing message and passes its on to the 
@@ -73,19 +200,46 @@ def receive_event(event_data):
     @param event_data: Next event of the trace stream. Can be in raw format as 
            provided by the RA lib or a dictionary. In the case of a dictionary 
            following fields are required: count, core, data, swc, zgt, host, 
-           type
+           type. The optional field shed contains the sequence counters of 
+           the trace events of the host which have been dropped on purpose in
+           front of the event (see pm_load.RunnableShedder). 
     """
     with lock:
         event = None
+        shed = None
+        profiler = _profiler
+        if profiler is not None and profiler.sample():
+            profiler.switch('decode')
         if isinstance(event_data, dict):
             event = trace.DictTrace (event_data)
+            shed = event_data.get('shed')
         else:
             event = trace.RawTrace (event_data)
         try:    
+            if profiler is not None and profiler.active:
+                profiler.switch('reorder')
+            if shed:
+                hosts[event.host].skip(shed)
             hosts[event.host].process(event)
         except KeyError: 
             logger.exception(traceback.format_exc())
             logger.warning("wrong host ID received: {}".format(event.host))
+        finally:
+            if profiler is not None and profiler.active:
+                profiler.stop(event.time, hosts.get(event.host))
+
+
+def receive_task_map(event_data):
+    """
+    @brief Passes a logging message containing task ID to name mapping on to 
+           its host. In contrast to receive_event() the event received 
+           callbacks are not invoked. 
+    
+    @param event_data: dictionary with the fields of receive_event()
+    """
+    with lock:
+        event = trace.DictTrace(event_data)
+        hosts[event.host]._task_name_id_mapping(event)
 
 
 def receive_event_callback_add(fun):
@@ -100,6 +254,37 @@ def receive_event_callback_add(fun):
     callback.attach('event_received_callback_fun', fun)
 
 
+def receive_event_callback_remove(fun):
+    """
+    @brief Removes a callback function registered with 
+           receive_event_callback_add()
+    """
+    callback.detach('event_received_callback_fun', fun)
+
+
+def receive_event_collector_add(host_str, events, size, fun):
+    """
+    @brief Appends the trace events of a host which are passed on to the 
+           event received callbacks to a list. In contrast to a callback no 
+           function is called per event. 
+    
+    @param host_str: name of the host, e.g. 'SSH'
+    @param events: list to which the trace events (see trace.Trace) are 
+                   appended
+    @param size: fun is called when the list contains size events
+    @param fun: function without arguments which is expected to empty the 
+                list. It is called while the lock of the module is held.
+    """
+    callback.Callback.event_collectors[host_str] = (events, size, fun)
+
+
+def receive_event_collector_remove(host_str):
+    """
+    @brief Removes the collector registered with receive_event_collector_add()
+    """
+    callback.Callback.event_collectors.pop(host_str, None)
+
+
 def task_map_callback_add(fun):
     """
     @brief Registers a callback function. Callback is triggered every time
@@ -109,6 +294,14 @@ def task_map_callback_add(fun):
                 dictionary has the following fields: host, mapping
     """
     callback.attach('task_id_name_callback_fun', fun)
+
+
+def task_map_callback_remove(fun):
+    """
+    @brief Removes a callback function registered with 
+           task_map_callback_add()
+    """
+    callback.detach('task_id_name_callback_fun', fun)
     
     
 def sequence_error_callback_add(fun):
@@ -24,10 +24,28 @@ STATE_RUNNING = 1
 STATE_PREEMPTED = 2
 STATE_DELAYED = 3
 logger = logging.getLogger('MotionWise.pm_instrument.pmcalc')
+# stage profiler (see interface.set_profiler())
+profiler = None
+
+
+class SkippedEvent(object):
+    """
+    Placeholder of a trace event which has been dropped on purpose in front of
+    the analysis (see Host.skip())
+    """
+    __slots__ = ('seq',)
+
+    def __init__(self, seq):
+        self.seq = seq
 
 
 class Host(object):
     
+    # stage of a pipeline to which the processed trace events are passed on 
+    # instead of the cores (class attribute: states pickled by older versions
+    # do not contain it)
+    _dispatch = None
+    
     def __init__(self, number_of_cores, name):
         self._cores = [Core(i, self) for i in xrange(0, number_of_cores)]
         self._name = name
@@ -39,8 +57,53 @@ class Host(object):
         self._zgt_correction = 0
         self._tm_current_cnt = 0
         self._tm_expected_cnt = 0
+        self._window = None
+    
+    def set_window(self, lo=None, hi=None):
+        """
+        @brief Restricts the invocation of callbacks to events with a time stamp
+               within [lo, hi). 
+        
+        Events outside of the window are still processed by the state machines 
+        but do not trigger any callbacks. This is used to warm up the state of 
+        a host in front of a chunk of a recording which is processed in 
+        parallel to other chunks. Errors which are not caused by the currently 
+        processed event are assigned to the window of the newest event 
+        processed so far. 
+        
+        @param lo: Lower bound of the window. None means unbounded. 
+        @param hi: Upper bound of the window (excluded). None means unbounded.
+        """
+        if lo is None and hi is None:
+            self._window = None
+            callback.mute(False)
+        else:
+            self._window = (lo, hi)
+    
+    def set_dispatch(self, fun=None):
+        """
+        @brief Passes the trace events which have passed the sequence check 
+               and the ZGT reordering on to fun instead of the state machines 
+               of the cores. 
+        
+        This is used to process the cores in other processes. A reset of the
+        cores is passed on as None. 
+        
+        @param fun: Unary function accepting a trace event or None. None means
+                    that the events are processed by the cores of the host.
+        """
+        self._dispatch = fun
+    
+    def _mute(self, time_stamp):
+        lo, hi = self._window
+        callback.mute((lo is not None and time_stamp < lo) or 
+                      (hi is not None and time_stamp >= hi))
     
     def process(self, trace_event_in):
+        if self._window is not None:
+            self._mute(trace_event_in.time if trace_event_in.is_log 
+                       else self._max_zgt)
+            
         if trace_event_in.is_log: 
             try: 
                 if 'task_id_name' == EVENT_MAP[trace_event_in.type]:
@@ -56,7 +119,25 @@ class Host(object):
         if trace_event is None: 
             # buffer is not full yet
             return
+        self._process_sequenced(trace_event)
+    
+    def skip(self, seqs):
+        """
+        @brief Passes the sequence counters of trace events which have been 
+               dropped on purpose, e.g. by load shedding, to the sequence 
+               check. They are not reported as lost. 
         
+        @param seqs: sequence counters in the order the events were received
+        """
+        for seq in seqs:
+            trace_event = self._add_to_sequence_buffer(SkippedEvent(seq))
+            if trace_event is not None:
+                self._process_sequenced(trace_event)
+    
+    def _process_sequenced(self, trace_event):
+        """
+        @brief Processes a trace event which has passed the sequence check
+        """
         if trace_event.time == 0xFFFFFFFFFFFF:
             # invalid time stamp detected
             callback.invoke('zgt_error_callback_fun', 
@@ -64,7 +145,7 @@ class Host(object):
                 ,'zgt': trace_event.time
                 ,'info': 'invalid ZGT received'})
             logger.warning("invalid ZGT received")
-            for c in self._cores: c.reset()
+            self.reset()
             return
         
         if EVENT_MAP[trace_event.type] == 'zgt_correction':
@@ -86,18 +167,46 @@ class Host(object):
                     {'host': self._name
                     ,'zgt': trace_event.time
                     ,'info': 'ZGT jump'})
-                for c in self._cores: c.reset()
+                self.reset()
 
+        if self._window is not None:
+            self._mute(trace_event.time)
         trace_event.trigger_callback()
+        collector = callback.Callback.event_collectors.get(self._name)
+        if collector is not None and not callback.Callback.muted:
+            collector[0].append(trace_event)
+            if len(collector[0]) >= collector[1]:
+                collector[2]()
         self._max_zgt = max(self._max_zgt, trace_event.time)
         if trace_event.sequence_gap > 0:
             self._sequence_error(trace_event.sequence_gap, trace_event.time)
             return
         
+        if self._dispatch is not None:
+            # the cores are processed by the next stage of a pipeline
+            self._dispatch(trace_event)
+            return
+        if profiler is not None and profiler.active:
+            profiler.switch('cores')
+        self.process_core_event(trace_event)
+
+    def process_core_event(self, trace_event):
+        """
+        @brief Passes a trace event which has passed the sequence check and
+               the ZGT reordering on to the state machines of its core.
+        """
         core = self._cores[trace_event.core]
         fun = getattr(core, EVENT_MAP[trace_event.type])
         fun(**{'trace': trace_event, 'time': trace_event.time})
 
+    def queue_depths(self):
+        """
+        @return: number of trace events in the sequence buffer and in the ZGT
+                 reorder buffer
+        """
+        return (self._sequence_cnt_buffer_size, 
+                sum(1 for e in self._zgt_buffer if e is not None))
+
     def _init_sequence_buffer(self):
         self._sequence_cnt_buffer_max = 20
         self._sequence_cnt_ptr = None
@@ -117,10 +226,10 @@ class Host(object):
         
         @param trace_event: Trace event to be added to the buffer. 
         @return: Returns the oldest trace event in the buffer or None if the 
-                 buffer is not full. The returned trace events have a field 
-                 'sequence_gap' indicating the number of lost events since the 
-                 last event has been received. If the gap is 0 no events have 
-                 been lost. 
+                 buffer is not full or the oldest entry is a SkippedEvent. The
+                 returned trace events have a field 'sequence_gap' indicating
+                 the number of lost events since the last event has been 
+                 received. If the gap is 0 no events have been lost. 
         """
         out = None
 
@@ -138,7 +247,10 @@ class Host(object):
             out = self._sequence_cnt_buffer[self._sequence_cnt_ptr]
             self._sequence_cnt_buffer[self._sequence_cnt_ptr] = None
 
-            if out is not None: 
+            if out.__class__ is SkippedEvent:
+                # lost events in front of it are reported with the next event
+                out = None
+            elif out is not None: 
                 out.sequence_gap = self._sequence_cnt_gap
                 self._sequence_cnt_gap = 0  
             else:
@@ -175,7 +287,7 @@ class Host(object):
                 {'host': self._name
                 ,'zgt': trace_event.time
                 ,'info': 'big time gap'})
-            for c in self._cores: c.reset()
+            self.reset()
             logger.debug("for {} tried to add non increasing time stamp "
                          "to zgt reorder buffer {}"
                          .format(self._name, trace_event.time))
@@ -217,6 +329,8 @@ class Host(object):
                  'msg_expected': self._tm_expected_cnt})
 
     def reset(self):
+        if self._dispatch is not None:
+            self._dispatch(None)
         for c in self._cores: 
             c.reset()
 
@@ -149,5 +149,24 @@ class DictTrace (Trace):
             self.data = _buffer["data"]
 
 
+class TupleTrace (Trace):
+    """
+    Trace event which has already passed the sequence check and the ZGT 
+    reordering of its host, e.g. in the front stage of a pipeline
+    """
+    
+    def __init__(self, host, time, core, _type, swc_id, data):
+        self.host = host
+        self.time = time
+        self.core = core
+        self.type = _type
+        self.swc_id = swc_id
+        self.data = data
+        self.seq = 0
+        self.is_trace = True
+        self.is_log = False
+        getattr(self, '_{}'.format(EVENT_MAP[self.type]))(self.data)
+
+
 if __name__ == '__main__':
     pass
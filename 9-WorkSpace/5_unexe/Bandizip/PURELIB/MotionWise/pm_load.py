@@ -0,0 +1,293 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    pm_load.py
+#
+# Purpose
+#    Adaptive load shedding of the live analysis
+#
+# Revision Dates
+# --
+
+"""
+Adaptive load shedding of the live analysis.
+
+The proxy inserts a marker with the current time and the number of
+forwarded trace events into the event stream at regular intervals. The
+client measures the time the marker has been waiting in the pipe (analysis
+lag) and estimates the number of queued events from the receive rate. If
+the lag exceeds the configured budget the analysis is degraded step by
+step:
+
+    level 0: full analysis
+    level 1: output of the trace event file suspended
+    level 2, 3, 4: runnable events sampled per runnable (1/2, 1/4, 1/8 of
+             the runnables in turns), task events are processed completely
+
+The runnable events are sampled by the proxy (see RunnableShedder) in front
+of the conversion and the pipe to the client. The sequence counters of the
+dropped events are sent along with the next forwarded event, so that the
+sequence check of the client does not report them as lost.
+
+Every decision is recorded with the ZGT and wall-clock range it applies to,
+so that runnable statistics of affected ranges can be scaled or flagged as
+partial. The runtime of runnables which are not sampled is accounted to the
+overhead of the neighbouring sampled runnables, i.e. overhead measurements
+of these ranges are too high. The summary files which contain runnable or
+overhead statistics are marked as partial.
+"""
+
+import time
+import logging
+from MotionWise import pm_instrument
+from MotionWise.pm_measurement import DELIMITER, HOSTS
+
+logger = logging.getLogger(__name__)
+
+MARKER = 'RX'
+MARKER_INTERVAL = 1000    # trace events between two markers
+ESCALATE_AFTER = 1.0      # time the budget has to be exceeded [s]
+RECOVER_AFTER = 10.0      # time the lag has to be low to step back [s]
+RECOVER_RATIO = 0.25      # lag below RECOVER_RATIO * budget is low
+ROTATE_INTERVAL = 1.0     # time after which the sampled runnables change [s]
+
+# (trace event output, runnable sampling modulus) per level
+LEVELS = [(True, 1), (False, 1), (False, 2), (False, 4), (False, 8)]
+PARTIAL_NOTE = "#partial: runnable events have been sampled due to overload, " \
+               "runnable and overhead statistics are incomplete (see " \
+               "*_load-shedding.csv)\n"
+
+
+class RunnableShedder(object):
+    """
+    Drops the events of the runnables which are not sampled in front of the
+    analysis. Only start events are dropped on their own, a stop event is
+    dropped if the start event of the runnable has been dropped, i.e.
+    runnables which are running when the sampling changes are completed.
+    """
+
+    def __init__(self):
+        self.shed = []          # sequence counters of the dropped events
+        self._sampling = None
+        self._dropped = set()   # (core, runnable ID) of dropped start events
+
+    def set_sampling(self, modulus=None, slot=0):
+        """
+        @brief Restricts the runnable events to the runnables with
+               ID % modulus == slot. None or 1 means that all runnables are
+               passed on.
+        """
+        if not modulus or modulus <= 1:
+            self._sampling = None
+        else:
+            self._sampling = (modulus, slot % modulus)
+
+    def drop(self, core, event_type, data, count):
+        """
+        @brief Decides on a trace event. The sequence counter of a dropped
+               event is appended to shed.
+
+        @return: True if the event is dropped
+        """
+        if event_type > 1 or (self._sampling is None and not self._dropped):
+            return False
+        rid = (data >> 48) & 0xFFFF
+        if event_type == 0:
+            if self._sampling is None or \
+                    rid % self._sampling[0] == self._sampling[1]:
+                self._dropped.discard((core, rid))
+                return False
+            self._dropped.add((core, rid))
+        elif (core, rid) in self._dropped:
+            self._dropped.remove((core, rid))
+        else:
+            return False
+        self.shed.append(count)
+        return True
+
+    def take(self):
+        """
+        @return: sequence counters of the events dropped since the last call
+        """
+        out, self.shed = self.shed, []
+        return out
+
+
+class LoadController(object):
+    """
+    Decides on the shedding level based on the analysis lag. The level is
+    raised by one if the lag exceeds the budget for ESCALATE_AFTER seconds
+    and lowered by one if it stays below RECOVER_RATIO * budget for
+    RECOVER_AFTER seconds.
+    """
+
+    def __init__(self, max_lag, max_level=len(LEVELS) - 1):
+        self.max_lag = max_lag
+        self.max_level = max_level
+        self.level = 0
+        self._over_since = None
+        self._under_since = None
+
+    def update(self, now, lag):
+        """
+        @return: new level or None if the level is unchanged
+        """
+        if lag > self.max_lag:
+            self._under_since = None
+            if self._over_since is None:
+                self._over_since = now
+            elif now - self._over_since >= ESCALATE_AFTER \
+                    and self.level < self.max_level:
+                self._over_since = now
+                self.level += 1
+                return self.level
+        elif lag < self.max_lag * RECOVER_RATIO:
+            self._over_since = None
+            if self._under_since is None:
+                self._under_since = now
+            elif now - self._under_since >= RECOVER_AFTER and self.level > 0:
+                self._under_since = now
+                self.level -= 1
+                return self.level
+        else:
+            self._over_since = None
+            self._under_since = None
+        return None
+
+
+class LoadSheddingListener(object):
+    """
+    Applies the decisions of a LoadController to the analysis and writes the
+    time ranges of all levels other than 0 to the output file.
+    """
+
+    def __init__(self, host_str, max_lag, sampling, trace_listener=None,
+                 file_handler=None, partial_files=()):
+        """
+        @param sampling: function(modulus=None, slot=0) which sets the
+                         runnable sampling of the RunnableShedder of the
+                         proxy
+        @param partial_files: summary files which are marked as partial when
+                              runnable events are sampled the first time.
+                              Their content must not have been written yet.
+        """
+        self._host = HOSTS[host_str]['id']
+        self._controller = LoadController(max_lag)
+        self._trace_listener = trace_listener
+        self._file_handler = file_handler
+        self._sampling = sampling
+        self._partial_files = list(partial_files)
+        self._ranges = []
+        self._current = None  # [level, zgt, wall, max lag, max depth]
+        self._slot = 0
+        self._last_rotate = None
+        self._last_marker = None
+
+    def marker(self, sent_time, sent_cnt, now=None):
+        """
+        @brief Processes a marker of the proxy
+
+        @param sent_time: time the marker has been sent [s since epoch]
+        @param sent_cnt: number of trace events forwarded by the proxy
+        """
+        now = time.time() if now is None else now
+        lag = max(0.0, now - sent_time)
+        depth = 0
+        if self._last_marker is not None:
+            dt = now - self._last_marker[0]
+            if dt > 0:
+                depth = int(lag * (sent_cnt - self._last_marker[1]) / dt)
+        self._last_marker = (now, sent_cnt)
+
+        if self._current is not None:
+            self._current[3] = max(self._current[3], lag)
+            self._current[4] = max(self._current[4], depth)
+        level = self._controller.update(now, lag)
+        if level is not None:
+            self._apply(level, now, lag, depth)
+        elif LEVELS[self._controller.level][1] > 1 and \
+                now - self._last_rotate >= ROTATE_INTERVAL:
+            self._slot += 1
+            self._last_rotate = now
+            self._sampling(LEVELS[self._controller.level][1], self._slot)
+
+    def _apply(self, level, now, lag, depth):
+        trace_output, modulus = LEVELS[level]
+        zgt = pm_instrument.processed_time(self._host)
+        self._close_range(zgt, now)
+        if level > 0:
+            self._current = [level, zgt, now, lag, depth]
+        if self._trace_listener is not None:
+            if trace_output:
+                self._trace_listener.resume()
+            else:
+                self._trace_listener.suspend()
+        self._last_rotate = now
+        self._sampling(modulus, self._slot)
+        if modulus > 1:
+            for fh in self._partial_files:
+                fh.write(PARTIAL_NOTE)
+            self._partial_files = []
+        logger.warning("$canalysis lag {:.1f}s: load shedding level {} ({})"
+                       .format(lag, level, self.describe(level)))
+
+    def _close_range(self, zgt, now):
+        if self._current is not None:
+            level, zgt_from, wall_from, lag, depth = self._current
+            self._ranges.append((level, zgt_from, zgt, wall_from, now, lag,
+                                 depth))
+            self._current = None
+
+    @staticmethod
+    def describe(level):
+        trace_output, modulus = LEVELS[level]
+        if level == 0:
+            return 'full analysis'
+        if modulus == 1:
+            return 'trace event output suspended'
+        return 'runnable events sampled 1/{}'.format(modulus)
+
+    def write(self):
+        self._close_range(pm_instrument.processed_time(self._host), time.time())
+        self._sampling()
+        if self._file_handler is None:
+            return
+        self._file_handler.write("#HEADER ")
+        self._file_handler.write(DELIMITER.join(
+            [ 'level', 'description', 'trace_output', 'runnable_sampling'
+            , 'from_zgt[us]', 'to_zgt[us]', 'from', 'to', 'max_lag[s]'
+            , 'max_queued_events']))
+        self._file_handler.write("\n")
+        fmt = lambda t: time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t))
+        for level, zgt_from, zgt_to, wall_from, wall_to, lag, depth \
+                in self._ranges:
+            trace_output, modulus = LEVELS[level]
+            self._file_handler.write(DELIMITER.join(
+                [ '{}'.format(level), self.describe(level)
+                , '{}'.format(int(trace_output)), '{}'.format(modulus)
+                , '{}'.format(zgt_from), '{}'.format(zgt_to)
+                , fmt(wall_from), fmt(wall_to), '{:.3f}'.format(lag)
+                , '{}'.format(depth)]))
+            self._file_handler.write("\n")
+        if any(LEVELS[r[0]][1] > 1 for r in self._ranges):
+            logger.warning("$crunnable and overhead statistics are partial: "
+                           "runnable events have been sampled due to "
+                           "overload")
+
+    def close(self):
+        if self._file_handler is not None:
+            self._file_handler.close()
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'LoadController'
+          , 'LoadSheddingListener'
+          , 'RunnableShedder'
+          , 'MARKER'
+          , 'MARKER_INTERVAL']
+
+if __name__ == '__main__':
+    pass
@@ -29,6 +29,7 @@ import file_parser as FP
 logger = logging.getLogger('MotionWise.pm_measurement')
 
 DELIMITER = ','
+SAMPLE_RATE = 1000000
 IDLE_TASK_PATTERN = {'APH': 'Task_Idle', 'SSH': 'tIdleTask', 'SRH': '#@!$'} 
 HOSTS = {'APH': {'name': 'ApplicationHost', 'id': 1, 'cores': 3}
         ,'SRH': {'name': 'SurroundHost', 'id': 3, 'cores': 8}
@@ -50,6 +51,25 @@ def _div(dividend, divisor, op='int'):
     return out
 
 
+def _merge_meas(meas, other):
+    """
+    @brief Merges the statistical values of the accumulator other into the 
+           accumulator meas. Both accumulators are dictionaries with the fields
+           cnt, min, max and sum. 
+    """
+    if 0 == other['cnt']:
+        return
+    if 0 == meas['cnt']:
+        meas['max'] = other['max']
+        meas['min'] = other['min']
+        meas['sum'] = other['sum']
+    else:
+        meas['sum'] += other['sum']
+        meas['max'] = max(other['max'], meas['max'])
+        meas['min'] = min(other['min'], meas['min'])
+    meas['cnt'] += other['cnt']
+
+
 def _overrides(interface_class):
     def overrider(method):
         assert(method.__name__ in dir(interface_class))
@@ -59,7 +79,7 @@ def _overrides(interface_class):
 
 class Sampler(object):
     
-    def __init__(self, host_str, callback_fun, sample_rate = 1000000):
+    def __init__(self, host_str, callback_fun, sample_rate = SAMPLE_RATE):
         self._host = HOSTS[host_str]['id']
         self._last_update_time = None
         self._sample_rate = sample_rate
@@ -102,6 +122,15 @@ class TraceListener(object):
                 string = (self.pattern.format(host=host, data=data, **signal))
                 self._file_handler.write(string)
 
+    def suspend(self):
+        """
+        @brief Stops writing trace events to the output file
+        """
+        pm_instrument.receive_event_callback_remove(self._event_received_cb)
+
+    def resume(self):
+        pm_instrument.receive_event_callback_add(self._event_received_cb)
+
     def close(self):
         with self._lock:
             if sys.stdout != self._file_handler:
@@ -221,6 +250,26 @@ class RunnableListenerSummary(object):
             meas['max'] = max(max_rt, meas['max'])
         meas['cnt'] += 1
 
+    def get_state(self):
+        """
+        @brief Returns the accumulated measurements as picklable dictionary
+        """
+        return {'runnables': self._runnable_measurements}
+
+    def merge_state(self, state):
+        """
+        @brief Merges measurements returned by get_state() of another listener 
+               into the measurements of this listener. The state of later parts
+               of a recording has to be merged after the earlier ones.
+        """
+        for k, v in state['runnables'].iteritems():
+            r = self._get_runnable(k)
+            if 0 == r['gross']['cnt'] and v['gross']['cnt'] > 0:
+                r['swc'] = v['swc']
+                r['core'] = v['core']
+            for m in ['period', 'netto', 'gross', 'overhead']:
+                _merge_meas(r[m], v[m])
+
     def _meas_to_dict(self, r, m):
         d = {}
         d['entity'] = 'RUNNABLE'
@@ -362,6 +411,7 @@ class TaskListenerSummary(object):
         self._file_handler = file_handler
         self._aph_task_to_core_map = {}
         self._task_name_map = {}
+        self._tm_task_name_map = {} # names received in task map messages
         self._task_measurements = {}
         self._sw_layers = sw_layers
         self._error_cnt_sample = [0, 0, 0]
@@ -441,6 +491,7 @@ class TaskListenerSummary(object):
     def _task_map_callback(self, host, task_id, task_name, **signal):
         if host != self._host_str: return
         self._task_name_map[task_id] = task_name
+        self._tm_task_name_map[task_id] = task_name
 
     def _pm_stack_peak_cb(self, host, peak, core, **signal):
         if host != self._host_str: return
@@ -467,6 +518,41 @@ class TaskListenerSummary(object):
     def _zgt_error_cb(self, **signal):
         self._error_cnt_sample[2] += 1
 
+    def get_state(self):
+        """
+        @brief Returns the accumulated measurements as picklable dictionary
+        """
+        return { 'tasks': self._task_measurements
+               , 'task_name_map': self._tm_task_name_map
+               , 'sample_cnt': self._sample_cnt
+               , 'error_cnt_sample': self._error_cnt_sample}
+
+    def merge_state(self, state):
+        """
+        @brief Merges measurements returned by get_state() of another listener 
+               into the measurements of this listener. The state of later parts
+               of a recording has to be merged after the earlier ones.
+        """
+        for k, v in state['tasks'].iteritems():
+            task = self._get_task(k)
+            if v['core'] != '':
+                task['core'] = v['core']
+            if 0 < v['stack_cnt']:
+                if 0 < task['stack_cnt']:
+                    task['stack_peak'] = max(task['stack_peak'], v['stack_peak'])
+                else:
+                    task['stack_peak'] = v['stack_peak']
+                task['stack_cnt'] += v['stack_cnt']
+            for m in ['runtime', 'overhead']:
+                _merge_meas(task[m], v[m])
+                task[m]['sample'] = v[m]['sample']
+        # only names of task map messages are merged, the static and default
+        # names are the same for all listeners
+        self._task_name_map.update(state['task_name_map'])
+        self._tm_task_name_map.update(state['task_name_map'])
+        self._sample_cnt += state['sample_cnt']
+        self._error_cnt_sample = list(state['error_cnt_sample'])
+
     def _meas_to_dict(self, k, m):
         d = {}
         d['entity'] = 'TASK'
@@ -687,6 +773,22 @@ class SwLayerListenerSummary(TaskListenerSummary):
                 m['runtime']['sample'] = 0
                 m['overhead']['sample'] = 0 
 
+    @_overrides(TaskListenerSummary)
+    def get_state(self):
+        state = TaskListenerSummary.get_state(self)
+        state['sw_layers'] = self._sw_layer_measurement
+        return state
+
+    @_overrides(TaskListenerSummary)
+    def merge_state(self, state):
+        TaskListenerSummary.merge_state(self, state)
+        for c, v in state['sw_layers'].iteritems():
+            for k, m in v.iteritems():
+                layer = self._get_sw_layer(k, c)
+                for n in ['runtime', 'overhead']:
+                    _merge_meas(layer[n], m[n])
+                    layer[n]['sample'] = m[n]['sample']
+
     @_overrides(TaskListenerSummary)
     def _write_header(self):
         self._file_handler.write("#HEADER ")
@@ -773,6 +875,19 @@ class NonOsListener(object):
         if host != self._host_str: return
         self._checkpoints.append(signal)
 
+    def get_state(self):
+        """
+        @brief Returns the received checkpoints as picklable dictionary
+        """
+        return {'checkpoints': self._checkpoints}
+
+    def merge_state(self, state):
+        """
+        @brief Appends the checkpoints returned by get_state() of another 
+               listener. 
+        """
+        self._checkpoints.extend(state['checkpoints'])
+
     def write(self):
         self._file_handler.write("#HEADER ")
         self._file_handler.write(DELIMITER.join(
@@ -850,6 +965,34 @@ class AggregatedListener(TaskListenerSummary):
                 meas['cnt'] += 1
             meas['sample'] = 0
     
+    @_overrides(TaskListenerSummary)
+    def get_state(self):
+        state = TaskListenerSummary.get_state(self)
+        state.update({ 'cores': self._core_overhead
+                     , 'state_error': self._state_error
+                     , 'sequence_error': self._sequence_error
+                     , 'zgt_error': self._zgt_error
+                     , 'event_cnt': self._event_cnt
+                     , 'start_time': self._start_time
+                     , 'current_time': self._current_time})
+        return state
+
+    @_overrides(TaskListenerSummary)
+    def merge_state(self, state):
+        TaskListenerSummary.merge_state(self, state)
+        for k, v in state['cores'].iteritems():
+            c = self._get_core(k)
+            _merge_meas(c, v)
+            c['sample'] = v['sample']
+        self._state_error += state['state_error']
+        self._sequence_error += state['sequence_error']
+        self._zgt_error += state['zgt_error']
+        if state['event_cnt'] > 0:
+            if self._start_time == 0:
+                self._start_time = state['start_time']
+            self._current_time = state['current_time']
+        self._event_cnt += state['event_cnt']
+
     @_overrides(TaskListenerSummary)
     def _state_error_cb(self, host, **signal):
         if host != self._host_str: return
@@ -988,6 +1131,25 @@ class DriverListenerSummary(object):
             meas['min'] = min(netto_rt, meas['min'])
         meas['cnt'] += 1
 
+    def get_state(self):
+        """
+        @brief Returns the accumulated measurements as picklable dictionary
+        """
+        return {'drivers': self._driver_measurements}
+
+    def merge_state(self, state):
+        """
+        @brief Merges measurements returned by get_state() of another listener 
+               into the measurements of this listener. The state of later parts
+               of a recording has to be merged after the earlier ones.
+        """
+        for k, v in state['drivers'].iteritems():
+            d = self._get_driver(k)
+            if 0 == d['gross']['cnt'] and v['gross']['cnt'] > 0:
+                d['core'] = v['core']
+            for m in ['period', 'netto', 'gross']:
+                _merge_meas(d[m], v[m])
+
     def _meas_to_dict(self, r, m):
         d = {}
         d['entity'] = 'DRIVER'
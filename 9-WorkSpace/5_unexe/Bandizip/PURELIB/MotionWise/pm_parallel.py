@@ -0,0 +1,329 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    pm_parallel.py
+#
+# Purpose
+#    Parallel offline replay of recorded trace events
+#
+# Revision Dates
+# --
+
+"""
+Parallel offline replay of recorded trace events (trace event CSV files and
+pcap files read by the native reader).
+
+The recording is scanned once by the sequence check and the ZGT reordering of
+pm_instrument, without the state machines of the cores, in order to determine
+the exact sample boundaries of the statistical analysis. The recording is
+split into chunks at these boundaries (preferably at ZGT gaps at which the
+hosts are reset anyway). Every chunk is processed by a worker process of a
+multiprocessing.Pool. In front of each chunk the task map messages found so
+far are passed on and a warm-up part of the recording is replayed with all
+callbacks muted in order to rebuild the state of the cores, the tasks and the
+runnables. The accumulated measurements of the listeners of all chunks are
+merged in chronological order by the listeners of the calling process. The
+results are the same as those of a sequential replay.
+
+Recordings with less than 2 * MIN_CHUNK_ROWS events of the host are not
+split, they are replayed as one chunk by one worker.
+"""
+
+import os
+import shutil
+import logging
+import tempfile
+import multiprocessing
+from MotionWise import pm_instrument
+from MotionWise import pm_measurement as PM
+from MotionWise import pm_index
+from MotionWise.log_proc import configure_process, log_level
+from MotionWise.MotionWise_perf_client import Client
+
+logger = logging.getLogger(__name__)
+
+ZGT_GAP = 1000000           # time gap which causes a reset of all cores [us]
+WARMUP_ROWS = 50000         # rows replayed in front of a chunk
+LOOKAHEAD_ROWS = 2000       # rows replayed after a chunk to flush the buffers
+OFFSET_STRIDE = 1000        # distance of rows with known file position
+CHUNKS_PER_PROCESS = 2
+MIN_CHUNK_ROWS = 4 * WARMUP_ROWS
+
+_client = None
+
+
+class _Chunk(object):
+
+    def __init__(self, **args):
+        self.__dict__.update(args)
+
+
+class _Scan(object):
+    """
+    Result of the scan of a recording: number of rows (events of the host),
+    list of (row, zgt, is_gap) for each sample boundary, file positions of
+    every OFFSET_STRIDE-th row and the task map messages as (row, event).
+    """
+
+    def __init__(self, rows, boundaries, positions, task_map):
+        self.rows = rows
+        self.boundaries = boundaries
+        self.positions = positions
+        self.task_map = task_map
+
+
+class _ChunkClient(Client):
+    """
+    Client which writes its output into temporary part files which are
+    appended to the output files of the calling process.
+    """
+
+    def _open_output(self, path, preamble):
+        return open(os.path.join(self._part_dir, os.path.basename(path)), 'w+')
+
+
+def _skip_cores(trace_event):
+    pass
+
+
+def _scan(path, host_id, sample_rate=PM.SAMPLE_RATE):
+    """
+    @brief Scans a recording once and determines the rows at which the
+           samplers of the listeners are triggered.
+
+    The events are passed through the sequence check and the ZGT reorder
+    buffer of the host, the processing of the cores is skipped. Only the
+    receive event callbacks of the scan are registered.
+
+    @return: _Scan
+    """
+    host_str = [k for k, v in PM.HOSTS.iteritems() if v['id'] == host_id][0]
+    pm_instrument.detach_callbacks()
+    pm_instrument.reset()
+    pm_instrument.set_core_dispatch(host_id, _skip_cores)
+
+    boundaries = []
+    positions = []
+    task_map = []
+    current = {'row': 0, 'zgt': None}   # row read, last event passed on
+
+    def sample(last_update_time, dt):
+        zgt = last_update_time + dt
+        is_gap = current['zgt'] is not None and zgt - current['zgt'] > ZGT_GAP
+        boundaries.append((current['row'], zgt, is_gap))
+
+    def received(host, zgt, **signal):
+        if host == host_id:
+            current['zgt'] = zgt
+
+    # the sampler has to see an event before the time of the previous one
+    # is updated
+    PM.Sampler(host_str, sample, sample_rate)
+    pm_instrument.receive_event_callback_add(received)
+
+    row = 0
+    position = None
+    try:
+        for next_position, _, event in \
+                pm_index.open_source(path, host_id).events():
+            if int(event['host']) == host_id:
+                if 0 == row % OFFSET_STRIDE:
+                    positions.append(position)
+                if int(event['type']) == 0xFF:
+                    task_map.append((row, event))
+                current['row'] = row
+                pm_instrument.receive_event(event)
+                row += 1
+            position = next_position
+    finally:
+        pm_instrument.set_core_dispatch(host_id)
+        pm_instrument.detach_callbacks()
+        pm_instrument.reset()
+    return _Scan(row, boundaries, positions, task_map)
+
+
+def _scan_job(job):
+    return _scan(*job)
+
+
+def _split(rows, boundaries, count):
+    """
+    @brief Selects the sample boundaries at which the recording is split into
+           count chunks of about the same size. Sample boundaries at ZGT gaps
+           are preferred.
+
+    @return: list of (row, zgt) of the selected cut points
+    """
+    cuts = []
+    size = rows / float(count)
+    for k in xrange(1, count):
+        target = k * size
+        candidates = [b for b in boundaries
+                      if abs(b[0] - target) <= 0.1 * size
+                      and (not cuts or b[0] > cuts[-1][0])]
+        if not candidates:
+            continue
+        gaps = [b for b in candidates if b[2]]
+        best = min(gaps or candidates, key=lambda b: abs(b[0] - target))
+        cuts.append((best[0], best[1]))
+    return cuts
+
+
+def _rows(path, host_id, positions, start, stop):
+    """
+    @brief Yields the events of the host in the rows [start, stop) of a
+           recording
+    """
+    row = start - start % OFFSET_STRIDE
+    for _, _, event in pm_index.open_source(path, host_id).events(
+            positions[start // OFFSET_STRIDE]):
+        if int(event['host']) != host_id:
+            continue
+        if row >= stop:
+            break
+        if row >= start:
+            yield event
+        row += 1
+
+
+def _init_worker(args, ra_model, log_queue):
+    global _client
+    root = logging.getLogger()
+    if log_queue is not None and not root.handlers:
+        configure_process(log_queue, log_level(args))
+    _client = _ChunkClient(ra_model, None, args, None)
+
+
+def _run_chunk(chunk):
+    """
+    @brief Processes one chunk of the recording with a new set of hosts and
+           listeners.
+
+    @return: listener states, paths of part files and number of lost events
+    """
+    pm_instrument.detach_callbacks()
+    pm_instrument.reset()
+    _client._part_dir = tempfile.mkdtemp(dir=chunk.tmp_dir)
+    _client._lost_events = 0
+    listeners = _client._create_listeners()
+    pm_instrument.sequence_error_callback_add(_client._sequence_error_cb)
+    samplers = [l._sampler for l in listeners.itervalues()
+                if hasattr(l, '_sampler')]
+
+    # task map messages in front of the warm-up part
+    for row, event in chunk.task_map:
+        if row < chunk.start:
+            pm_instrument.receive_task_map(event)
+
+    if chunk.lo is not None:
+        for s in samplers: s._last_update_time = chunk.lo
+
+    pm_instrument.set_window(chunk.lo, chunk.hi)
+    try:
+        for event in _rows(chunk.path, chunk.host, chunk.positions,
+                           chunk.start, chunk.stop):
+            pm_instrument.receive_event(event)
+    finally:
+        pm_instrument.set_window()
+
+    if chunk.hi is not None:
+        # the first event of the next chunk closes the last sample
+        for s in samplers: s._event_received_cb(host=chunk.host, zgt=chunk.hi)
+
+    states = {}
+    parts = {}
+    for k, l in listeners.iteritems():
+        if hasattr(l, 'get_state'):
+            states[k] = l.get_state()
+        parts[k] = l._file_handler.name
+        l.close()
+    return states, parts, _client._lost_events
+
+
+def _append_part(file_handler, part):
+    """
+    @brief Appends the rows following the header of a part file
+    """
+    with open(part, 'r') as f:
+        for l in iter(f.readline, ''):
+            if l.startswith('#HEADER'):
+                shutil.copyfileobj(f, file_handler)
+                break
+
+
+def replay(args, ra_model, listeners, log_queue=None):
+    """
+    @brief Replays the recording args.csv_file or args.pcap_file in parallel
+           and merges the results into the given listeners.
+
+    @param args: command line arguments of MotionWise_Perf. args.parallel is
+                 the number of worker processes (0: number of CPUs).
+    @param ra_model: RA model as returned by Proxy.get_ra_model()
+    @param listeners: listeners as returned by Client._create_listeners()
+    @param log_queue: queue to which the workers send their log records
+    @return: number of replayed rows and number of lost events
+    """
+    host_id = PM.HOSTS[args.host.upper()]['id']
+    path = args.csv_file or args.pcap_file
+    processes = args.parallel or multiprocessing.cpu_count()
+    tmp_dir = tempfile.mkdtemp(prefix='MotionWise-PMT_',
+                               dir=os.path.join(args.out_path, 'output'))
+
+    lost_events = 0
+    pool = multiprocessing.Pool(processes, _init_worker,
+                                (args, ra_model, log_queue))
+    try:
+        # the scan changes the state of pm_instrument, hence it is done by a
+        # worker process
+        scan = pool.apply(_scan_job, ((path, host_id),))
+        rows = scan.rows
+        count = max(1, min(processes * CHUNKS_PER_PROCESS,
+                           rows // MIN_CHUNK_ROWS))
+        if count == 1:
+            logger.info("$crecording too short to be split, replaying it "
+                        "in one chunk")
+        cuts = _split(rows, scan.boundaries, count)
+
+        chunks = []
+        bounds = [(0, None)] + cuts + [(rows, None)]
+        for i in xrange(0, len(bounds) - 1):
+            start = max(0, bounds[i][0] - WARMUP_ROWS)
+            chunks.append(_Chunk( path = path
+                                , positions = scan.positions
+                                , task_map = [t for t in scan.task_map
+                                              if t[0] < start]
+                                , host = host_id
+                                , tmp_dir = tmp_dir
+                                , lo = bounds[i][1]
+                                , hi = bounds[i + 1][1]
+                                , start = start
+                                , stop = min(rows, bounds[i + 1][0] +
+                                                   LOOKAHEAD_ROWS)))
+        logger.info("$creplaying {} chunks with {} processes"
+                    .format(len(chunks), processes))
+
+        for states, parts, lost in pool.imap(_run_chunk, chunks):
+            for k, l in listeners.iteritems():
+                if k in states:
+                    l.merge_state(states[k])
+                if k in parts:
+                    _append_part(l._file_handler, parts[k])
+            lost_events += lost
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return rows, lost_events
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = ['replay']
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,440 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    pm_pipeline.py
+#
+# Purpose
+#    Pipeline analysis of a recording with one worker process per core
+#
+# Revision Dates
+# --
+
+"""
+Pipeline analysis of a recording with one worker process per core.
+
+The front stage runs in the calling process. It reads the recording and
+passes the events through the sequence check and the ZGT reordering of the
+host. The events which would be processed by the cores are routed by their
+core ID to worker processes, each of them owning the task, runnable and
+driver state machines of its cores and the listeners fed by them. Resets of
+the cores (lost events, ZGT errors) and the sample boundaries of the
+statistical analysis are passed on to all workers as markers in the event
+stream.
+
+Per sample interval the workers return the CPU time and overhead of their
+tasks. The calling process merges them and computes the task, SW layer and
+aggregated CPU load from the merged intervals, taking into account the
+errors and task names known at the sample boundary. Runnable, driver,
+checkpoint and stack measurements are merged at the end in the order in
+which they have been created, so the output files are identical to the
+ones of the single process analysis.
+
+A state error resets the cores of all workers. As the workers are not
+synchronised the pipeline analysis is stopped in this case and Unsupported
+is raised, i.e. the recording has to be analysed by a single process.
+"""
+
+import csv
+import logging
+import itertools
+import traceback
+import multiprocessing
+from MotionWise import pcap_reader
+from MotionWise import pm_instrument
+from MotionWise import file_parser as FP
+from MotionWise import pm_measurement as PM
+from MotionWise.log_proc import configure_process, log_level
+from MotionWise.MotionWise_perf_client import Client
+from MotionWise.pm_instrument.trace import TupleTrace
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 2000           # events sent to a worker at once
+_RESET = ('r',)             # marker: reset of all cores
+_TICK = ('t',)              # marker: sample boundary of the listeners
+
+
+class Unsupported(Exception):
+    """
+    Raised if the recording cannot be analysed by the pipeline
+    """
+    pass
+
+
+class _StateError(Exception):
+    pass
+
+
+class _Stamped(dict):
+    """
+    Dictionary which records the position in the event stream at which a key
+    has been added
+    """
+
+    def __init__(self, stamp):
+        dict.__init__(self)
+        self._stamp = stamp
+        self.stamps = {}
+
+    def __setitem__(self, key, value):
+        if key not in self.stamps:
+            self.stamps[key] = self._stamp()
+        dict.__setitem__(self, key, value)
+
+
+class _Worker(object):
+    """
+    Processes the events of some cores of the host with the state machines and
+    listeners of its own process
+    """
+
+    def __init__(self, args, ra_model):
+        pm_instrument.detach_callbacks()
+        pm_instrument.reset()
+        host = args.host.upper()
+        client = Client(ra_model, None, args, None)
+        self._host_id = PM.HOSTS[host]['id']
+        self._pos = 0
+        self._cnt = 0
+        self._ticks = []
+        self._checkpoints = []
+        self._first_gross = {'runnables': {}, 'drivers': {}}
+
+        self._rnbl = PM.RunnableListenerSummary(host, ra_model,
+            budget = client._budget, periods = client._periods,
+            sw_layers = client._sw_layers, file_handler = None)
+        self._rnbl._runnable_measurements = _Stamped(self._stamp)
+        self._task = PM.TaskListenerSummary(host,
+            sw_layers = client._sw_layers, file_handler = None)
+        self._task.load_aph_task_map(args.aph_taskmap1, args.aph_taskmap2)
+        self._task._task_measurements = _Stamped(self._stamp)
+        self._drv = None
+        if args.trace_drivers:
+            self._drv = PM.DriverListenerSummary(host, file_handler = None)
+            self._drv._driver_measurements = _Stamped(self._stamp)
+        pm_instrument.runnable_gross_rt_callback_add(self._rnbl_gross_rt_cb)
+        pm_instrument.driver_gross_rt_callback_add(self._driver_gross_rt_cb)
+        pm_instrument.checkpoint_callback_add(self._checkpoint_cb)
+        pm_instrument.state_error_callback_add(self._state_error_cb)
+
+    def _stamp(self):
+        self._cnt += 1
+        return (self._pos, self._cnt)
+
+    def _rnbl_gross_rt_cb(self, id, **signal):
+        if id not in self._first_gross['runnables']:
+            self._first_gross['runnables'][id] = self._stamp()
+
+    def _driver_gross_rt_cb(self, id, **signal):
+        if id not in self._first_gross['drivers']:
+            self._first_gross['drivers'][id] = self._stamp()
+
+    def _checkpoint_cb(self, host, **signal):
+        self._checkpoints.append((self._stamp(), signal))
+
+    def _state_error_cb(self, zgt, **signal):
+        raise _StateError("state error @{}".format(zgt))
+
+    def _tick(self):
+        """
+        @brief Collects the CPU time and overhead of all tasks since the last
+               sample boundary
+        """
+        tasks = self._task._task_measurements
+        items = []
+        for k, m in tasks.iteritems():
+            items.append((tasks.stamps[k], k, m['core'],
+                          m['runtime']['sample'], m['overhead']['sample']))
+            m['runtime']['sample'] = 0
+            m['overhead']['sample'] = 0
+        self._ticks.append(items)
+
+    def _measurements(self, meas, kind):
+        return [(meas.stamps[k], self._first_gross[kind].get(k), k, v)
+                for k, v in meas.iteritems()]
+
+    def run(self, conn):
+        host_id = self._host_id
+        while True:
+            batch = conn.recv()
+            if batch is None:
+                break
+            for item in batch:
+                if len(item) > 1:
+                    self._pos = item[0]
+                    pm_instrument.process_core_event(
+                        TupleTrace(host_id, *item[1:]))
+                elif item == _RESET:
+                    pm_instrument.reset_cores(host_id)
+                else:
+                    self._tick()
+
+        tasks = self._task._task_measurements
+        return { 'ticks': self._ticks
+               , 'tasks': [ (tasks.stamps[k], k, m['core'], m['stack_cnt']
+                            , m['stack_peak']) for k, m in tasks.iteritems()]
+               , 'runnables': self._measurements(
+                    self._rnbl._runnable_measurements, 'runnables')
+               , 'drivers': self._measurements(
+                    self._drv._driver_measurements, 'drivers')
+                    if self._drv is not None else []
+               , 'checkpoints': self._checkpoints}
+
+
+def _run_worker(conn, args, ra_model, log_queue):
+    root = logging.getLogger()
+    if log_queue is not None and not root.handlers:
+        configure_process(log_queue, log_level(args))
+    try:
+        conn.send(('done', _Worker(args, ra_model).run(conn)))
+    except _StateError as e:
+        conn.send(('abort', '{}'.format(e)))
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+class _Ticks(object):
+    """
+    Records the sample boundaries of a listener in the front stage. The
+    measurement is updated when the intervals of the workers have been
+    merged.
+    """
+
+    def __init__(self, listener):
+        self._listener = listener
+        self._update = listener._update_measurement
+        self._names = None
+        self.ticks = []
+        listener._sampler._callback_fun = self._record
+
+    def _record(self, zgt, dt):
+        l = self._listener
+        if self._names != l._task_name_map:
+            self._names = dict(l._task_name_map)
+        self.ticks.append((zgt, dt, l._error_cnt_sample, self._names))
+        l._error_cnt_sample = [0, 0, 0]
+
+    def apply(self, i, items):
+        """
+        @brief Updates the measurement of the i-th sample boundary with the
+               merged intervals of the workers
+        """
+        l = self._listener
+        zgt, dt, errors, names = self.ticks[i]
+        for _, k, core, runtime, overhead in items:
+            task = l._get_task(k)
+            task['core'] = core
+            task['runtime']['sample'] += runtime
+            task['overhead']['sample'] += overhead
+        current = l._error_cnt_sample, l._task_name_map
+        l._error_cnt_sample, l._task_name_map = errors, names
+        try:
+            self._update(zgt, dt)
+        finally:
+            l._error_cnt_sample, l._task_name_map = current
+
+    def close(self):
+        self._listener._sampler._callback_fun = self._update
+
+
+class _FrontStage(object):
+    """
+    Routes the events processed by the host to the workers
+    """
+
+    def __init__(self, host_str, conns, cores):
+        self._conns = conns
+        self._route = [c % len(conns) for c in xrange(0, cores)]
+        self._batches = [[] for _ in conns]
+        self._pos = 0
+        self._sampler = PM.Sampler(host_str, self._tick)
+
+    def _send(self, w, batch):
+        conn = self._conns[w]
+        try:
+            conn.send(batch)
+        except IOError:
+            # the worker has terminated, its last message is checked below
+            pass
+        if conn.poll():
+            _check(conn.recv())
+
+    def _marker(self, marker):
+        for b in self._batches:
+            b.append(marker)
+
+    def _tick(self, zgt, dt):
+        self._marker(_TICK)
+
+    def dispatch(self, event):
+        self._pos += 1
+        if event is None:
+            self._marker(_RESET)
+            return
+        w = self._route[event.core]
+        b = self._batches[w]
+        b.append((self._pos, event.time, event.core, event.type, event.swc_id,
+                  event.data))
+        if len(b) >= BATCH_SIZE:
+            self._batches[w] = []
+            self._send(w, b)
+
+    def finish(self):
+        pm_instrument.receive_event_callback_remove(
+            self._sampler._event_received_cb)
+        for w in xrange(0, len(self._conns)):
+            if self._batches[w]:
+                self._send(w, self._batches[w])
+            self._send(w, None)
+
+
+def _check(msg):
+    """
+    @brief Checks a message of a worker
+
+    @return: result of the worker
+    """
+    kind, value = msg
+    if kind == 'abort':
+        raise Unsupported(value)
+    if kind == 'error':
+        raise RuntimeError("pipeline worker failed:\n{}".format(value))
+    if kind != 'done':
+        raise RuntimeError("unexpected message {} of worker".format(kind))
+    return value
+
+
+def _events(args, host_id):
+    """
+    @brief Yields the events of the recording as dictionaries
+    """
+    if args.csv_file:
+        sep, fields, offset = FP.parse_trace_csv_layout(args.csv_file)
+        with open(args.csv_file, 'rb') as f:
+            f.seek(offset)
+            for r in csv.reader(f, delimiter=sep,
+                                quotechar=FP.TRACE_CSV_QUOTE):
+                if r:
+                    yield dict(zip(fields, r))
+    else:
+        for event in pcap_reader.read_events(args.pcap_file, host_id):
+            yield event
+
+
+def _merge(listeners, ticks, results):
+    """
+    @brief Merges the results of the workers into the listeners
+    """
+    for i, intervals in enumerate(zip(*[r['ticks'] for r in results])):
+        items = sorted(itertools.chain(*intervals))
+        for t in ticks:
+            t.apply(i, items)
+
+    tasks = [l for l in listeners.itervalues()
+             if isinstance(l, PM.TaskListenerSummary)]
+    for _, k, core, cnt, peak in sorted(itertools.chain(
+            *[r['tasks'] for r in results])):
+        for l in tasks:
+            task = l._get_task(k)
+            task['core'] = core
+            if 0 < cnt:
+                if 0 < task['stack_cnt']:
+                    task['stack_peak'] = max(task['stack_peak'], peak)
+                else:
+                    task['stack_peak'] = peak
+                task['stack_cnt'] += cnt
+
+    for key, kind, get in [ ('rnbl_summary', 'runnables', '_get_runnable')
+                          , ('driver_summary', 'drivers', '_get_driver')]:
+        if key not in listeners:
+            continue
+        l = listeners[key]
+        entries = sorted(itertools.chain(*[r[kind] for r in results]))
+        # keys are created in the order of the single process analysis,
+        # core and SWC are taken from the first gross runtime
+        for _, _, k, _ in entries:
+            getattr(l, get)(k)
+        for _, _, k, v in sorted(entries,
+                                 key=lambda e: (e[1] is None, e[1], e[0])):
+            l.merge_state({kind: {k: v}})
+
+    if 'chkpoint_summary' in listeners:
+        listeners['chkpoint_summary'].merge_state({'checkpoints':
+            [s for _, s in sorted(itertools.chain(
+                *[r['checkpoints'] for r in results]))]})
+
+
+def replay(args, ra_model, listeners, log_queue=None):
+    """
+    @brief Analyses the recording args.csv_file or args.pcap_file with a
+           pipeline of worker processes and merges the results into the given
+           listeners.
+
+    @param args: command line arguments of MotionWise_Perf. args.pipeline is
+                 the number of worker processes (0: one per core, at most the
+                 number of CPUs).
+    @param ra_model: RA model as returned by Proxy.get_ra_model()
+    @param listeners: listeners as returned by Client._create_listeners()
+    @param log_queue: queue to which the workers send their log records
+    @return: number of replayed events
+    @raise Unsupported: if a state error has been detected. The listeners
+                        and the hosts have been fed with a part of the
+                        recording already.
+    """
+    host_str = args.host.upper()
+    host_id = PM.HOSTS[host_str]['id']
+    cores = PM.HOSTS[host_str]['cores']
+    processes = min(cores, args.pipeline or multiprocessing.cpu_count())
+    logger.info("$canalysing {} cores with {} worker processes"
+                .format(cores, processes))
+
+    ticks = [_Ticks(l) for l in listeners.itervalues()
+             if isinstance(l, PM.TaskListenerSummary)]
+    conns = []
+    workers = []
+    for _ in xrange(0, processes):
+        conn, child = multiprocessing.Pipe()
+        p = multiprocessing.Process(target=_run_worker,
+                                    args=(child, args, ra_model, log_queue))
+        p.daemon = True
+        p.start()
+        child.close()
+        conns.append(conn)
+        workers.append(p)
+
+    cnt = 0
+    front = _FrontStage(host_str, conns, cores)
+    pm_instrument.set_core_dispatch(host_id, front.dispatch)
+    try:
+        for event in _events(args, host_id):
+            pm_instrument.receive_event(event)
+            cnt += 1
+        front.finish()
+        results = [_check(c.recv()) for c in conns]
+        for p in workers:
+            p.join()
+    except:
+        for p in workers:
+            p.terminate()
+        raise
+    finally:
+        pm_instrument.set_core_dispatch(host_id)
+        for t in ticks:
+            t.close()
+        for c in conns:
+            c.close()
+    _merge(listeners, ticks, results)
+    return cnt
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'replay'
+          , 'Unsupported']
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,405 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    pm_plugin.py
+#
+# Purpose
+#    Plugin interface for custom analyses of the trace events
+#
+# Revision Dates
+# --
+
+"""
+Plugin interface for custom analyses of the trace events.
+
+A plugin is a subclass of Plugin. Plugins are discovered in the files and
+directories given by --plugin and in the entry point group
+'motionwise.pm_plugins' of installed packages. A plugin module either lists
+its plugin classes in PLUGINS or all subclasses of Plugin defined in the
+module are used.
+
+Example:
+
+    from MotionWise.pm_plugin import Plugin
+
+    class RunnableStarts(Plugin):
+        name = 'runnable_starts'
+        event_types = ['start_runnable']
+        batch_size = 10000
+
+        def on_start(self, context):
+            self._fh = context.open_output('runnable-starts')
+            self._cnt = 0
+
+        def on_batch(self, columns):
+            self._cnt += len(columns['zgt'])
+
+        def on_finish(self):
+            self._fh.write('{}\\n'.format(self._cnt))
+
+The trace events of the monitored host are collected in one buffer for all
+plugins. on_batch() receives the events of the subscribed event types as
+columns (zgt, count, core, type, swc, data, rid). If NumPy is installed the
+columns are NumPy arrays, otherwise lists. rid is -1 for events which are
+not related to a runnable. The events are collected by pm_instrument without
+a Python call per event. Batches are passed on when batch_size events have
+been collected and at the end of the measurement. A batch is split at the
+end of every interval in front of the on_interval() call, i.e. on_interval()
+is called when the batch containing the end of the interval is passed on.
+on_event() is called for every event and should only be used if batches are
+not suitable. Log events (task mapping) are not part of the batches; the task
+names are available in context.task_names.
+"""
+
+import os
+import imp
+import time
+import bisect
+import logging
+from MotionWise import pm_instrument
+from MotionWise.pm_measurement import DELIMITER, HOSTS
+from MotionWise.pm_instrument.constants import EVENT_MAP
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = 'motionwise.pm_plugins'
+COLUMNS = ['zgt', 'count', 'core', 'type', 'swc', 'data', 'rid']
+_DTYPES = ['int64', 'int64', 'int16', 'int16', 'int32', 'uint64', 'int32']
+_EVENT_IDS = {v: k for k, v in EVENT_MAP.iteritems()}
+INTERVAL_BATCH_SIZE = 10000  # batch size if no plugin has an on_batch() hook
+
+_discovered = {}
+
+
+class Plugin(object):
+    """
+    Base class of plugins. All hooks are optional.
+
+    name:        name of the plugin (default: class name)
+    hosts:       host names (e.g. ['SSH']) the plugin is used for, None: all
+    event_types: event type IDs or names (see EVENT_MAP) passed to on_event()
+                 and on_batch(), None: all
+    batch_size:  number of events after which on_batch() is called
+    interval:    interval of on_interval() calls [us] (ZGT), None: no calls
+    """
+    name = None
+    hosts = None
+    event_types = None
+    batch_size = 10000
+    interval = None
+
+    def on_start(self, context):
+        pass
+
+    def on_finish(self):
+        pass
+
+
+class Context(object):
+    """
+    Information about the measurement passed to Plugin.on_start()
+    """
+
+    def __init__(self, host_str, ra_model, out_path, prefix, preamble):
+        self.host = host_str
+        self.host_id = HOSTS[host_str]['id']
+        self.ra_model = ra_model
+        self.out_path = out_path
+        self.task_names = {}
+        self._prefix = prefix
+        self._preamble = preamble
+        self._files = []
+
+    def open_output(self, name):
+        """
+        @brief Creates an output file <time stamp>_MotionWise-PMT_<name>.csv
+               in the output folder. The file is closed at the end of the
+               measurement.
+        """
+        fh = open(os.path.join(self.out_path, '{}_{}.csv'.format(self._prefix,
+                                                                 name)), 'w+')
+        fh.write(self._preamble)
+        self._files.append(fh)
+        return fh
+
+    def close(self):
+        for fh in self._files:
+            fh.close()
+
+
+def _load_module(path):
+    name = 'pm_plugin_{}'.format(
+        os.path.splitext(os.path.basename(path))[0].replace('-', '_'))
+    return imp.load_source(name, path)
+
+
+def _plugin_classes(module):
+    classes = getattr(module, 'PLUGINS', None)
+    if classes is None:
+        classes = [v for v in vars(module).itervalues()
+                   if isinstance(v, type) and issubclass(v, Plugin)
+                   and v is not Plugin and v.__module__ == module.__name__]
+    return classes
+
+
+def discover(paths=()):
+    """
+    @brief Returns the plugin classes of the given files and directories and
+           of the entry point group ENTRY_POINT_GROUP.
+    """
+    key = tuple(paths)
+    if key in _discovered:
+        return _discovered[key]
+    classes = []
+    for path in filter(None, paths):
+        if os.path.isdir(path):
+            files = [os.path.join(path, fn) for fn in sorted(os.listdir(path))
+                     if fn.endswith('.py') and not fn.startswith('_')]
+        else:
+            files = [path]
+        for fn in files:
+            try:
+                classes.extend(_plugin_classes(_load_module(fn)))
+            except Exception:
+                logger.exception("plugin {} could not be loaded".format(fn))
+    try:
+        import pkg_resources
+        for ep in pkg_resources.iter_entry_points(ENTRY_POINT_GROUP):
+            try:
+                obj = ep.load()
+                classes.extend(_plugin_classes(obj) if not isinstance(obj, type)
+                               else [obj])
+            except Exception:
+                logger.exception("plugin {} could not be loaded"
+                                 .format(ep.name))
+    except ImportError:
+        pass
+    _discovered[key] = classes
+    return classes
+
+
+class _Timing(object):
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+
+
+class PluginListener(object):
+    """
+    Dispatches the trace events of a host to the plugins and measures the
+    time spent in each hook of every plugin.
+    """
+
+    def __init__(self, host_str, plugin_classes, ra_model, out_path, prefix,
+                 preamble, file_handler=None):
+        self._host_str = host_str
+        self._host = HOSTS[host_str]['id']
+        self._file_handler = file_handler
+        self._context = Context(host_str, ra_model, out_path, prefix, preamble)
+        self._plugins = []
+        for cls in plugin_classes:
+            if cls.hosts is not None and host_str not in cls.hosts:
+                continue
+            try:
+                self._plugins.append(cls())
+            except Exception:
+                logger.exception("plugin {} could not be created"
+                                 .format(cls.__name__))
+        self._timing = {}
+        self._events = []
+        self._batch_size = None
+        self._next_interval = None
+        self._intervals = {}
+        self._on_event = {}
+
+        for p in list(self._plugins):
+            if not self._call(p, 'on_start', self._context):
+                self._plugins.remove(p)
+                continue
+            types = None if p.event_types is None else \
+                set(_EVENT_IDS.get(t, t) for t in p.event_types)
+            p._pm_types = types
+            if hasattr(p, 'on_event'):
+                for t in (types if types is not None else EVENT_MAP.keys()):
+                    self._on_event.setdefault(t, []).append(p)
+            if hasattr(p, 'on_batch'):
+                self._batch_size = min(self._batch_size or p.batch_size,
+                                       p.batch_size)
+            if p.interval:
+                self._intervals[p] = None
+        if self._plugins:
+            logger.info("$cplugins: {}".format(', '.join(
+                self._name(p) for p in self._plugins)))
+            if self._on_event:
+                pm_instrument.receive_event_callback_add(
+                    self._event_received_cb)
+            if self._batch_size or self._intervals:
+                pm_instrument.receive_event_collector_add(host_str,
+                    self._events, self._batch_size or INTERVAL_BATCH_SIZE,
+                    self._flush)
+            pm_instrument.task_map_callback_add(self._task_map_callback)
+
+    @staticmethod
+    def _name(plugin):
+        return plugin.name or plugin.__class__.__name__
+
+    def _call(self, plugin, hook, *args):
+        """
+        @brief Calls a hook of a plugin. Exceptions are logged, the plugin is
+               not called again.
+
+        @return: False if the plugin failed
+        """
+        return self._guarded(plugin, hook, lambda: getattr(plugin, hook)(*args))
+
+    def _guarded(self, plugin, hook, fun):
+        """
+        @brief Calls fun on behalf of a hook of a plugin, see _call()
+        """
+        t = self._timing.setdefault((self._name(plugin), hook), _Timing())
+        start = time.time()
+        try:
+            fun()
+            return True
+        except Exception:
+            logger.exception("plugin {} failed in {}".format(self._name(plugin),
+                                                             hook))
+            self._disable(plugin)
+            return False
+        finally:
+            t.calls += 1
+            t.total += time.time() - start
+
+    def _disable(self, plugin):
+        if plugin in self._plugins:
+            self._plugins.remove(plugin)
+        self._intervals.pop(plugin, None)
+        for v in self._on_event.itervalues():
+            if plugin in v:
+                v.remove(plugin)
+
+    def _task_map_callback(self, host, task_id, task_name, **signal):
+        if host != self._host_str: return
+        self._context.task_names[task_id] = task_name
+
+    def _event_received_cb(self, host, type, **signal):
+        if host != self._host or type == 0xFF:
+            return
+        for p in self._on_event.get(type, ()):
+            self._call(p, 'on_event', dict(signal, host=host, type=type))
+
+    def _interval(self, zgt):
+        for p, last in self._intervals.items():
+            if zgt - last >= p.interval:
+                self._call(p, 'on_interval', last, zgt - last)
+                self._intervals[p] = zgt
+        if self._intervals:
+            self._next_interval = min(last + p.interval for p, last
+                                      in self._intervals.iteritems())
+        else:
+            self._next_interval = None
+
+    def _flush(self):
+        """
+        @brief Passes the collected events on to the on_batch() hooks. The
+               events are split at the end of every interval.
+        """
+        if not self._events:
+            return
+        rows = [(e.time, e.seq, e.core, e.type, e.swc_id, e.data,
+                 e.__dict__.get('rnbl_id', -1)) for e in self._events]
+        del self._events[:]
+        start = 0
+        if self._intervals:
+            zgt = [r[0] for r in rows]
+            if self._next_interval is None:
+                for p in self._intervals:
+                    self._intervals[p] = zgt[0]
+                self._next_interval = zgt[0] + min(p.interval
+                                                   for p in self._intervals)
+            while self._next_interval is not None:
+                end = bisect.bisect_left(zgt, self._next_interval, start)
+                if end >= len(zgt):
+                    break
+                self._batch(rows[start:end])
+                start = end
+                self._interval(zgt[end])
+        self._batch(rows[start:])
+
+    def _batch(self, rows):
+        """
+        @brief Passes rows of events on to the on_batch() hooks. The rows are
+               converted to columns by the first hook.
+        """
+        if not rows:
+            return
+        columns = []
+
+        def on_batch(p):
+            if not columns:
+                columns.extend(zip(*rows))
+                if numpy is not None:
+                    columns[:] = [numpy.array(c, dtype=d)
+                                  for c, d in zip(columns, _DTYPES)]
+            if p._pm_types is None:
+                batch = dict(zip(COLUMNS, columns))
+            elif numpy is not None:
+                mask = numpy.in1d(columns[3], list(p._pm_types))
+                if not mask.any():
+                    return
+                batch = {k: c[mask] for k, c in zip(COLUMNS, columns)}
+            else:
+                idx = [i for i, t in enumerate(columns[3]) if t in p._pm_types]
+                if not idx:
+                    return
+                batch = {k: [c[i] for i in idx] for k, c in zip(COLUMNS,
+                                                                columns)}
+            p.on_batch(batch)
+
+        for p in list(self._plugins):
+            if hasattr(p, 'on_batch'):
+                self._guarded(p, 'on_batch', lambda: on_batch(p))
+
+    def write(self):
+        pm_instrument.receive_event_collector_remove(self._host_str)
+        self._flush()
+        for p in list(self._plugins):
+            self._call(p, 'on_finish')
+        self._context.close()
+        if self._file_handler is None or not self._timing:
+            return
+        self._file_handler.write("#HEADER ")
+        self._file_handler.write(DELIMITER.join(
+            ['plugin', 'hook', 'calls', 'total_time[s]', 'avg_time[us]']))
+        self._file_handler.write("\n")
+        for (name, hook), t in sorted(self._timing.iteritems()):
+            self._file_handler.write(DELIMITER.join(
+                [ name, hook, '{}'.format(t.calls), '{:.6f}'.format(t.total)
+                , '{:.1f}'.format(t.total * 1e6 / t.calls)]))
+            self._file_handler.write("\n")
+            logger.info("plugin {} {}: {} calls, {:.3f}s".format(
+                name, hook, t.calls, t.total))
+
+    def close(self):
+        if self._file_handler is not None:
+            self._file_handler.close()
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'Plugin'
+          , 'Context'
+          , 'PluginListener'
+          , 'discover'
+          , 'COLUMNS']
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,286 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    pm_profile.py
+#
+# Purpose
+#    Profiling of the analysis stages and of the analysis lag
+#
+# Revision Dates
+# --
+
+"""
+Profiling of the analysis stages and of the analysis lag.
+
+The time spent by the client in the stages
+
+  decode     decoding of the received trace events
+  reorder    sequence check and ZGT reordering
+  cores      task, runnable and driver state machines
+  listeners  callbacks of the listeners (statistics, plugins)
+  output     writing of the output files
+  receive    everything else, i.e. receiving the events from the pipe and
+             waiting for them
+
+is measured for every SAMPLE_INTERVAL-th trace event and extrapolated to all
+events. The number of invoked callbacks is counted for all events. In the
+live mode the proxy measures the time spent in the RA callback and inserts a
+marker with the current time into the event stream at regular intervals, from
+which the time the events have been waiting in the pipe and the number of
+queued events are estimated (see pm_load).
+
+The lag of the analysis behind the host is the increase of the difference
+between the wall-clock time and the ZGT of the analysed events relative to
+its minimum. It is 0 as long as the analysis keeps up with the host (and
+always for recordings, which are analysed faster than real time).
+
+A breakdown of the stages, the maximum lag and the queue depths is written to
+the file *_profile.csv for every interval of PROFILE_INTERVAL seconds and
+for the complete measurement.
+"""
+
+import time
+import timeit
+from MotionWise import pm_instrument
+from MotionWise.pm_measurement import DELIMITER
+
+MARKER = 'PF'
+MARKER_INTERVAL = 1000    # trace events between two markers of the proxy
+SAMPLE_INTERVAL = 64      # every n-th trace event is timed
+PROFILE_INTERVAL = 10.0   # interval of the stage breakdown [s]
+STAGES = ['decode', 'reorder', 'cores', 'listeners', 'output']
+
+_clock = timeit.default_timer
+
+
+class _Interval(object):
+
+    def __init__(self, wall, events, callbacks, ra_time, ra_cnt):
+        self.wall = wall
+        self.events = events
+        self.callbacks = callbacks
+        self.ra_time = ra_time
+        self.ra_cnt = ra_cnt
+        self.sampled = 0
+        self.times = dict.fromkeys(STAGES, 0.0)
+        self.zgt_lag = 0.0
+        self.pipe_lag = None
+        self.pipe_depth = None
+
+
+class StageProfiler(object):
+    """
+    Measures the stages of the analysis of a host and writes the stage
+    breakdown. The profiler is registered with pm_instrument when it is
+    created and removed by close().
+    """
+
+    def __init__(self, file_handler=None, sample_interval=SAMPLE_INTERVAL,
+                 interval=PROFILE_INTERVAL):
+        self.active = False
+        self.callbacks = 0
+        self._file_handler = file_handler
+        self._sample_interval = sample_interval
+        self._interval = interval
+        self._events = 0
+        self._stage = None
+        self._t = 0.0
+        self._zgt = None
+        self._depths = (None, None)
+        self._min_offset = None
+        self._ra_time = 0.0
+        self._ra_cnt = 0
+        self._last_marker = None
+        self._cnt = 0
+        now = time.time()
+        self._start = now
+        self._next = now + interval
+        self._current = _Interval(now, 0, 0, 0.0, 0)
+        self._total = _Interval(now, 0, 0, 0.0, 0)
+        # duration of a switch() call, which is not accounted to the stages
+        self._overhead = 0.0
+        start = _clock()
+        for _ in xrange(1000):
+            self.switch(None)
+        self._overhead = (_clock() - start) / 1000
+        if self._file_handler is not None:
+            self._file_handler.write("#HEADER ")
+            self._file_handler.write(DELIMITER.join(
+                [ 'interval', 'wall_time[s]', 'zgt', 'events', 'events_per_s'
+                , 'callbacks_per_event', 'zgt_lag_max[ms]'
+                , 'pipe_lag_max[ms]', 'pipe_depth_max', 'sequence_buffer'
+                , 'reorder_buffer', 'ra_callback[us/event]']
+                + ['{}[us/event]'.format(s) for s in STAGES + ['receive']]
+                + ['{}[%]'.format(s) for s in STAGES + ['receive']]))
+            self._file_handler.write("\n")
+        pm_instrument.set_profiler(self)
+
+    def sample(self):
+        """
+        @brief Called for every received trace event
+
+        @return: True if the stages of the event are timed
+        """
+        self._events += 1
+        self.active = not self._events % self._sample_interval
+        return self.active
+
+    def switch(self, stage):
+        """
+        @brief Accounts the time since the last switch to the current stage
+               and continues with stage
+
+        @return: previous stage
+        """
+        now = _clock()
+        if self._stage is not None:
+            self._current.times[self._stage] += now - self._t - self._overhead
+        prev, self._stage, self._t = self._stage, stage, now
+        return prev
+
+    def stop(self, zgt, host=None):
+        """
+        @brief Called at the end of the processing of a timed event
+        """
+        self.switch(None)
+        self.active = False
+        self._current.sampled += 1
+        now = time.time()
+        if zgt:
+            offset = now - zgt / 1e6
+            if self._min_offset is None or offset < self._min_offset:
+                self._min_offset = offset
+            self._current.zgt_lag = max(self._current.zgt_lag,
+                                        offset - self._min_offset)
+            self._zgt = zgt
+        if host is not None:
+            self._depths = host.queue_depths()
+        if now >= self._next:
+            self._write_interval(now)
+
+    def marker(self, sent_time, sent_cnt, ra_time, ra_cnt, now=None):
+        """
+        @brief Processes a marker of the proxy
+
+        @param sent_time: time the marker has been sent [s since epoch]
+        @param sent_cnt: number of trace events forwarded by the proxy
+        @param ra_time: time spent in the RA callback [s]
+        @param ra_cnt: number of RA callbacks
+        """
+        now = time.time() if now is None else now
+        lag = max(0.0, now - sent_time)
+        depth = 0
+        if self._last_marker is not None:
+            dt = now - self._last_marker[0]
+            if dt > 0:
+                depth = int(lag * (sent_cnt - self._last_marker[1]) / dt)
+        self._last_marker = (now, sent_cnt)
+        self._current.pipe_lag = max(self._current.pipe_lag, lag)
+        self._current.pipe_depth = max(self._current.pipe_depth, depth)
+        self._ra_time = ra_time
+        self._ra_cnt = ra_cnt
+
+    def _close_interval(self, now):
+        """
+        @brief Adds the current interval to the total and starts a new one
+
+        @return: closed interval
+        """
+        c = self._current
+        c.events = self._events - c.events
+        c.callbacks = self.callbacks - c.callbacks
+        c.ra_time = self._ra_time - c.ra_time
+        c.ra_cnt = self._ra_cnt - c.ra_cnt
+        c.wall = now - c.wall
+        t = self._total
+        t.sampled += c.sampled
+        for s in STAGES:
+            t.times[s] += c.times[s]
+        t.zgt_lag = max(t.zgt_lag, c.zgt_lag)
+        t.pipe_lag = max(t.pipe_lag, c.pipe_lag)
+        t.pipe_depth = max(t.pipe_depth, c.pipe_depth)
+        self._current = _Interval(now, self._events, self.callbacks,
+                                  self._ra_time, self._ra_cnt)
+        self._next = now + self._interval
+        return c
+
+    def _write_row(self, label, i, now):
+        if self._file_handler is None:
+            return
+        n = float(max(i.events, 1))
+        scale = i.events / float(i.sampled) if i.sampled else 0.0
+        times = [i.times[s] * scale for s in STAGES]
+        times.append(max(0.0, i.wall - sum(times)))
+        wall = max(i.wall, 1e-9)
+        fmt = lambda v, f='{:.3f}': '' if v is None else f.format(v)
+        row = [ label, '{:.3f}'.format(now - self._start)
+              , fmt(self._zgt, '{}'), '{}'.format(i.events)
+              , '{:.1f}'.format(i.events / wall)
+              , '{:.2f}'.format(i.callbacks / n), '{:.3f}'.format(
+                  i.zgt_lag * 1e3)
+              , fmt(None if i.pipe_lag is None else i.pipe_lag * 1e3)
+              , fmt(i.pipe_depth, '{}'), fmt(self._depths[0], '{}')
+              , fmt(self._depths[1], '{}')
+              , fmt(i.ra_time * 1e6 / i.ra_cnt if i.ra_cnt else None,
+                    '{:.2f}')]
+        row += ['{:.2f}'.format(t * 1e6 / n) for t in times]
+        row += ['{:.2f}'.format(t * 100 / wall) for t in times]
+        self._file_handler.write(DELIMITER.join(row))
+        self._file_handler.write("\n")
+
+    def _write_interval(self, now):
+        i = self._close_interval(now)
+        if i.events:
+            self._cnt += 1
+            self._write_row('{}'.format(self._cnt), i, now)
+
+    def write(self):
+        now = time.time()
+        self._write_interval(now)
+        t = self._total
+        t.events = self._events
+        t.callbacks = self.callbacks
+        t.ra_time = self._ra_time
+        t.ra_cnt = self._ra_cnt
+        t.wall = now - self._start
+        self._write_row('total', t, now)
+
+    def close(self):
+        pm_instrument.set_profiler(None)
+        if self._file_handler is not None:
+            self._file_handler.close()
+
+
+class TimedFile(object):
+    """
+    Output file whose write() calls are accounted to the output stage
+    """
+
+    def __init__(self, file_handler, profiler):
+        self._file_handler = file_handler
+        self._profiler = profiler
+
+    def write(self, string):
+        p = self._profiler
+        if p.active:
+            stage = p.switch('output')
+            self._file_handler.write(string)
+            p.switch(stage)
+        else:
+            self._file_handler.write(string)
+
+    def __getattr__(self, name):
+        return getattr(self._file_handler, name)
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'StageProfiler'
+          , 'TimedFile'
+          , 'MARKER'
+          , 'MARKER_INTERVAL']
+
+if __name__ == '__main__':
+    pass
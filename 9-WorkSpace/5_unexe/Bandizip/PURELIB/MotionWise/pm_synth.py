@@ -0,0 +1,450 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    pm_synth.py
+#
+# Purpose
+#    Deterministic generator of synthetic trace event recordings
+#
+# Revision Dates
+# --
+
+"""
+Deterministic generator of synthetic trace event recordings.
+
+The workload of a host is derived from its schedule generation info and the
+RA model: every task of the schedule is released periodically on its core
+with the shortest period of its runnables, runnables with a longer period are
+executed by every n-th job of their task. Tasks are scheduled with fixed
+rate monotonic priorities, i.e. a released task preempts a running task with
+a longer period. The net runtime of a runnable is drawn from a distribution
+relative to its WCET. Optionally drivers are executed at the start of the
+jobs of the tasks they are assigned to, the stack peaks of the tasks are
+reported, the releases are delayed by a random jitter, the events of the
+cores arrive out of ZGT order and bursts of events are lost (gaps of the
+sequence counter).
+
+The same options and seed always produce the same recording. The recording
+is written as trace event CSV file (*.csv) or as pcap file, which can be
+analysed like real recordings, e.g. by the benchmark suite (see pm_bench).
+"""
+
+import heapq
+import random
+import logging
+from MotionWise import pcap_reader
+from MotionWise.pm_measurement import DELIMITER, HOSTS, IDLE_TASK_PATTERN
+
+logger = logging.getLogger(__name__)
+
+START_ZGT = 1000000     # ZGT of the first trace event [us]
+FRAME_EVENTS = 40       # trace events per frame of a pcap file
+TASK_MAP_PAIRS = 4      # task ID/name pairs per task mapping log message
+
+# net runtime of a runnable as fraction of its WCET
+RUNTIME_DISTRIBUTIONS = { 'constant': lambda r: 0.5
+                        , 'uniform': lambda r: r.uniform(0.1, 0.9)
+                        , 'normal': lambda r: r.gauss(0.5, 0.1)
+                        , 'exponential': lambda r: r.expovariate(2.0)}
+
+# generator options and their default values
+OPTIONS = { 'seconds': 60.0         # length of the recording [s]
+          , 'seed': 0               # seed of the random number generators
+          , 'runtime': 'normal'     # runtime distribution (see above)
+          , 'jitter': 50            # max. release jitter of the tasks [us]
+          , 'reorder': 100          # max. delay of the events [us]
+          , 'loss': 0.0             # probability of a burst of lost events
+          , 'burst': 5              # max. number of events of a burst
+          , 'drivers': 0            # number of drivers
+          , 'driver_rate': 0.5      # probability of a driver call per job
+          , 'stack_rate': 0.01}     # probability of a stack peak per job
+
+_START_RUNNABLE = 0
+_STOP_RUNNABLE = 1
+_TASK_SWITCH = 2
+_START_DRIVER = 4
+_STOP_DRIVER = 5
+_PM_STACK_PEAK = 10
+_LOG = 0xFF
+
+
+def parse_options(strings):
+    """
+    @brief Converts KEY=VALUE strings to generator options. The values are
+           converted to the type of the default value.
+
+    @raise ValueError: if an option is unknown or its value is invalid
+    """
+    out = {}
+    for s in strings:
+        key, sep, value = s.partition('=')
+        key = key.strip().replace('-', '_')
+        if not sep or key not in OPTIONS:
+            raise ValueError("invalid generator option '{}', valid options "
+                             "are {}".format(s, ', '.join(sorted(OPTIONS))))
+        out[key] = type(OPTIONS[key])(value.strip())
+    if out.get('runtime', OPTIONS['runtime']) not in RUNTIME_DISTRIBUTIONS:
+        raise ValueError("unknown runtime distribution '{}'"
+                         .format(out['runtime']))
+    return out
+
+
+class _Task(object):
+
+    def __init__(self, name, core, period):
+        self.id = None
+        self.name = name
+        self.core = core
+        self.period = period
+        # (runnable ID, SW-C ID, WCET [us], period [us])
+        self.runnables = []
+        self.drivers = []
+        self.stack = 1024
+
+
+class Workload(object):
+    """
+    Tasks, runnables and drivers of a host derived from the schedule
+    generation info
+    """
+
+    def __init__(self, host_str, ra_model, gen_info, task_map=None,
+                 drivers=0):
+        """
+        @param gen_info: schedule generation info as returned by
+                         file_parser.parse_schedule_generation_info_file()
+        @param task_map: static task ID to name mapping of the host (APH),
+                         {id: {'name': ..., 'core': ...}}. Without a static
+                         mapping the task IDs are assigned by the generator
+                         and the mapping is sent as log messages.
+        @param drivers: number of drivers, which are assigned to the tasks
+                        round robin
+        """
+        self.host_str = host_str
+        self.host_id = HOSTS[host_str]['id']
+        self.static_task_map = task_map is not None
+        self.tasks = {}         # core -> list of tasks
+        self.idle = {}          # core -> ID of the idle task
+        self.task_names = {}    # task ID -> name
+        rnbl_ids = dict((v, k) for k, v in
+                        ra_model.id_to_runnable.iteritems())
+        rnbl_swc = getattr(ra_model, 'runnable_to_swc', {})
+        tasks = {}
+        for name, info in sorted(gen_info.iteritems()):
+            if name not in rnbl_ids:
+                logger.debug("runnable {} is not part of the model".format(
+                    name))
+                continue
+            rid = rnbl_ids[name]
+            period = int(info['period'])
+            t = tasks.get(info['task'])
+            if t is None:
+                t = tasks[info['task']] = _Task(info['task'], info['core'],
+                                                period)
+            t.period = min(t.period, period)
+            t.runnables.append((rid, ra_model.SWCID_Map.get(
+                rnbl_swc.get(rid), 0), int(info['wcet']), period))
+        if not tasks:
+            raise ValueError("no runnables of host {} found in the schedule "
+                             "generation info".format(host_str))
+
+        if self.static_task_map:
+            ids = dict((v['name'], k) for k, v in task_map.iteritems())
+        else:
+            ids = {}
+        next_id = 1
+        for t in sorted(tasks.itervalues(), key=lambda t: (t.core, t.name)):
+            if t.name in ids:
+                t.id = ids[t.name]
+            elif self.static_task_map:
+                logger.debug("task {} is not part of the task map".format(
+                    t.name))
+                continue
+            else:
+                t.id = next_id
+                next_id += 1
+            self.tasks.setdefault(t.core, []).append(t)
+            self.task_names[t.id] = t.name
+        for core in sorted(self.tasks):
+            name = '{}_C{}'.format(IDLE_TASK_PATTERN[host_str], core)
+            if name not in ids:
+                ids[name] = next_id
+                next_id += 1
+            self.idle[core] = ids[name]
+            self.task_names[ids[name]] = name
+
+        ordered = [t for c in sorted(self.tasks) for t in self.tasks[c]]
+        for d in xrange(min(drivers, 256)):
+            ordered[d % len(ordered)].drivers.append(d)
+
+    def task_map_messages(self):
+        """
+        @brief Returns the log messages which map the task IDs to names
+        """
+        if self.static_task_map:
+            return []
+        prefix = '${}_TM'.format(self.host_str)
+        pairs = ['{}|{}'.format(k, v) for k, v in
+                 sorted(self.task_names.iteritems())]
+        out = ['{}PRE|{}'.format(prefix, len(pairs))]
+        for i in xrange(0, len(pairs), TASK_MAP_PAIRS):
+            out.append('{}|{}'.format(prefix, '|'.join(
+                pairs[i:i + TASK_MAP_PAIRS])))
+        return out
+
+
+class _Job(object):
+
+    __slots__ = ('steps', 'pos', 'left')
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.pos = 0
+        self.left = 0
+
+
+class _CoreSimulation(object):
+    """
+    Fixed priority preemptive scheduling of the tasks of a core
+    """
+
+    def __init__(self, core, tasks, idle_id, rng, options):
+        # rate monotonic priorities: index 0 is the highest priority
+        self._tasks = sorted(tasks, key=lambda t: (t.period, t.name))
+        self._core = core
+        self._idle = idle_id
+        self._rng = rng
+        self._runtime = RUNTIME_DISTRIBUTIONS[options['runtime']]
+        self._jitter = options['jitter']
+        self._driver_rate = options['driver_rate']
+        self._stack_rate = options['stack_rate']
+        self._activations = [0] * len(self._tasks)
+        # the stack peaks are kept per simulation, the workload is not changed
+        self._stack = [t.stack for t in self._tasks]
+
+    def _job(self, i):
+        """
+        @return: steps of the i-th task as (type, data, SW-C ID, CPU time
+                 until the next step)
+        """
+        r = self._rng
+        task = self._tasks[i]
+        n = self._activations[i]
+        self._activations[i] += 1
+        steps = []
+        if task.drivers and r.random() < self._driver_rate:
+            data = r.choice(task.drivers) << 56
+            steps.append((_START_DRIVER, data, 0, r.randint(5, 50)))
+            steps.append((_STOP_DRIVER, data, 0, r.randint(1, 5)))
+        for rid, swc, wcet, period in task.runnables:
+            if n % max(1, int(round(float(period) / task.period))):
+                continue
+            runtime = min(max(self._runtime(r), 0.01), 1.0) * wcet
+            steps.append((_START_RUNNABLE, rid << 48, swc,
+                          max(1, int(runtime))))
+            steps.append((_STOP_RUNNABLE, rid << 48, swc, r.randint(1, 10)))
+        if r.random() < self._stack_rate:
+            self._stack[i] = min(self._stack[i] + r.randint(0, 512),
+                                 0xFFFFFFFF)
+            steps.append((_PM_STACK_PEAK, (task.id << 32) | self._stack[i],
+                          0, 1))
+        return _Job(steps)
+
+    def events(self, start, end):
+        """
+        @brief Yields the trace events of the core between start and end as
+               (zgt, core, type, data, SW-C ID). Every event takes 1 us, i.e.
+               the ZGTs of the events of a core are unique.
+        """
+        r = self._rng
+        tasks = self._tasks
+        core = self._core
+        releases = []
+        for i, t in enumerate(tasks):
+            nominal = start + r.randint(0, t.period - 1)
+            releases.append((nominal, i, nominal))
+        heapq.heapify(releases)
+        ready = {}
+        running = self._idle
+        t = start
+        while t < end:
+            while releases[0][0] <= t:
+                _, i, nominal = heapq.heappop(releases)
+                if i not in ready:
+                    ready[i] = self._job(i)
+                # else: the previous job overruns, the activation is lost
+                nominal += tasks[i].period
+                heapq.heappush(releases, (nominal + r.randint(0,
+                    self._jitter), i, nominal))
+            i = min(ready) if ready else None
+            new = self._idle if i is None else tasks[i].id
+            if new != running:
+                yield t, core, _TASK_SWITCH, (running << 32) | new, 0
+                running = new
+                t += 1
+            elif i is None:
+                t = max(t, releases[0][0])
+            elif ready[i].left:
+                # the job runs until it is finished or preempted
+                job = ready[i]
+                t_next = releases[0][0]
+                if t + job.left <= t_next:
+                    t += job.left
+                    job.left = 0
+                else:
+                    job.left -= t_next - t
+                    t = t_next
+            elif ready[i].pos == len(ready[i].steps):
+                del ready[i]
+            else:
+                job = ready[i]
+                _type, data, swc, job.left = job.steps[job.pos]
+                job.pos += 1
+                yield t, core, _type, data, swc
+                t += 1
+
+
+class Generator(object):
+    """
+    Generates the trace events of a workload
+    """
+
+    def __init__(self, workload, **options):
+        """
+        @param options: see OPTIONS
+        """
+        self._workload = workload
+        self._options = dict(OPTIONS)
+        self._options.update(options)
+
+    def events(self):
+        """
+        @brief Yields the events in the order of their arrival as dictionaries
+               (see pcap_reader.parse_frame()). The sequence counter of the
+               lost events is skipped.
+        """
+        o = self._options
+        w = self._workload
+        r = random.Random(o['seed'])
+        end = START_ZGT + int(o['seconds'] * 1e6)
+        cores = [_CoreSimulation(c, w.tasks[c], w.idle[c],
+                                 random.Random(r.getrandbits(32)), o).events(
+                                 START_ZGT, end) for c in sorted(w.tasks)]
+        for msg in w.task_map_messages():
+            yield { 'zgt': START_ZGT - 1, 'count': 0, 'host': w.host_id
+                  , 'core': 0, 'type': _LOG, 'swc': 0, 'rid': ''
+                  , 'data': msg}
+
+        count = 0
+        lost = 0
+        for zgt, core, _type, data, swc in self._arrivals(heapq.merge(*cores),
+                                                          r):
+            count = (count + 1) & 0xFF
+            if not lost and o['loss'] and r.random() < o['loss']:
+                lost = r.randint(1, o['burst'])
+            if lost:
+                lost -= 1
+                continue
+            yield { 'zgt': zgt, 'count': count, 'host': w.host_id
+                  , 'core': core, 'type': _type, 'swc': swc
+                  , 'rid': data >> 48 if _type < 2 else '', 'data': data}
+
+    def _arrivals(self, events, r):
+        """
+        @brief Every event is delayed by up to 'reorder' us. The events are
+               passed on in the order of their delayed ZGTs.
+        """
+        reorder = self._options['reorder']
+        delayed = []
+        for e in events:
+            heapq.heappush(delayed, (e[0] + r.randint(0, reorder), e))
+            while delayed and delayed[0][0] <= e[0]:
+                yield heapq.heappop(delayed)[1]
+        while delayed:
+            yield heapq.heappop(delayed)[1]
+
+
+def write_csv(path, events, preamble=''):
+    """
+    @brief Writes events in the format of the trace event output file
+
+    @return: number of written events
+    """
+    pattern = '{{zgt}}{d}{{count}}{d}{{host}}{d}{{core}}{d}{{type}}{d}'\
+              '{{swc}}{d}{{rid}}{d}{{data}}\n'.format(d=DELIMITER)
+    n = 0
+    with open(path, 'w') as f:
+        f.write(preamble)
+        f.write("#HEADER ")
+        f.write(DELIMITER.join([ 'zgt', 'count', 'host', 'core', 'type'
+                               , 'swc', 'rid', 'data']))
+        f.write("\n")
+        for e in events:
+            if e['type'] != _LOG:
+                e = dict(e, data='0x{:x}'.format(e['data']))
+            f.write(pattern.format(**e))
+            n += 1
+    return n
+
+
+def write_pcap(path, events):
+    """
+    @brief Writes events as middleware frames of FRAME_EVENTS events to a
+           pcap file
+
+    @return: number of written events
+    """
+    cnt = [0]
+
+    def frames():
+        batch = []
+        msg_counter = 0
+        for e in events:
+            batch.append(e)
+            if len(batch) == FRAME_EVENTS:
+                yield e['zgt'] / 1e6, pcap_reader.pack_frame(batch,
+                                                             msg_counter)
+                cnt[0] += len(batch)
+                msg_counter += 1
+                batch = []
+        if batch:
+            yield batch[-1]['zgt'] / 1e6, pcap_reader.pack_frame(batch,
+                                                                 msg_counter)
+            cnt[0] += len(batch)
+
+    pcap_reader.write_pcap(path, frames())
+    return cnt[0]
+
+
+def generate(path, host_str, ra_model, gen_info, task_map=None, preamble='',
+             **options):
+    """
+    @brief Writes a synthetic recording of the host. Files with the suffix
+           .csv are written as trace event files, all others as pcap files.
+
+    @param options: see OPTIONS
+    @return: number of written events
+    """
+    workload = Workload(host_str, ra_model, gen_info, task_map,
+                        options.get('drivers', OPTIONS['drivers']))
+    events = Generator(workload, **options).events()
+    if path.lower().endswith('.csv'):
+        return write_csv(path, events, preamble)
+    return write_pcap(path, events)
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'Workload'
+          , 'Generator'
+          , 'generate'
+          , 'parse_options'
+          , 'write_csv'
+          , 'write_pcap'
+          , 'OPTIONS'
+          , 'RUNTIME_DISTRIBUTIONS']
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,876 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    pm_vector.py
+#
+# Purpose
+#    Vectorised offline analysis of recorded trace events
+#
+# Revision Dates
+# --
+
+"""
+Vectorised offline analysis of recorded trace events.
+
+Instead of passing every event through the state machines of pmcalc the
+recording is loaded into NumPy arrays and the callbacks of the summary
+listeners are computed for all events at once:
+
+  - The sequence and ZGT reorder buffers of the host delay the events by a
+    fixed number of events as long as the sequence counter has no gaps and
+    no event is overtaken by more than the size of the reorder buffer. The
+    processed events are the events sorted by ZGT.
+  - The task switches of a core form a chain. The CPU time a task has been
+    running up to an event is a cumulative sum over the switches of the
+    core.
+  - Runnables and drivers of a task are properly nested. The netto runtime
+    of an instance is the CPU time of the task between its start and stop
+    event minus the CPU time of its direct children.
+  - The overhead in front of a runnable is accumulated per runnable between
+    the sync events (task resume, runnable stop) of its task with prefix
+    sums.
+
+The results are passed on to the listeners of the client (merge_state() of
+the runnable and driver listeners, sample updates of the task listeners).
+Recordings for which the vectorised analysis can not guarantee the same
+results as the event driven analysis (sequence gaps, ZGT jumps and
+corrections, state errors, unsupported event types) and configurations with
+listeners which need every single event (trace statistics, plugins, time
+window, checkpoints) raise Unsupported before any listener is modified. The
+client then falls back to the event driven analysis.
+"""
+
+import csv
+import logging
+import itertools
+import collections
+from MotionWise import pm_instrument
+from MotionWise import pcap_reader
+from MotionWise import file_parser as FP
+from MotionWise import pm_measurement as PM
+from MotionWise.pm_instrument.constants import EVENT_MAP
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE_DELAY = 20         # events held back by the sequence buffer
+REORDER_DELAY = 300         # events held back by the ZGT reorder buffer
+ZGT_JUMP = 1000000          # time difference which causes a reset [us]
+INVALID_ZGT = 0xFFFFFFFFFFFF
+IDLE_TASK = 0xFFFFFFFF
+LOG_TYPE = 0xFF
+CHUNK_ROWS = 20000          # rows converted to arrays at once
+
+_T = {v: k for k, v in EVENT_MAP.iteritems()}
+# event types without effect on the summary listeners
+_IGNORED_TYPES = [_T['state_change'], _T['input_signal'], _T['pm_runtime']]
+_SUPPORTED_TYPES = _IGNORED_TYPES + [ _T[k] for k in
+    [ 'start_runnable', 'stop_runnable', 'task_switch', 'start_driver'
+    , 'stop_driver', 'checkpoint', 'pm_stack_peak', 'pm_r_nettime']]
+
+# listeners whose callbacks are computed by the vectorised analysis
+_LISTENERS = (PM.TraceListener, PM.NonOsListener, PM.RunnableListenerSummary,
+              PM.TaskListenerSummary, PM.SwLayerListenerSummary,
+              PM.AggregatedListener, PM.DriverListenerSummary)
+
+
+class Unsupported(Exception):
+    """
+    The recording or the configuration can't be analysed by the vectorised
+    analysis. No listener has been modified.
+    """
+
+
+def _check_config(args, listeners):
+    if numpy is None:
+        raise Unsupported("NumPy is not installed")
+    for k in ['time_from', 'time_to', 'checkpoint', 'resume', 'rerender',
+              'plugins', 'max_lag']:
+        if getattr(args, k, None) is not None:
+            raise Unsupported("option {} is used".format(k))
+    if args.trace_statistics:
+        raise Unsupported("trace statistics are enabled")
+    for k, l in listeners.iteritems():
+        if type(l) not in _LISTENERS:
+            raise Unsupported("listener {} is not supported".format(k))
+
+
+def _bits(data, shift, mask):
+    return ((data >> numpy.uint64(shift)) & numpy.uint64(mask)) \
+        .astype(numpy.int64)
+
+
+def _order(keys):
+    """
+    @brief Stable sort order by several keys like numpy.lexsort (the last key
+           is the primary key). The keys are combined to a single integer key
+           if their value ranges allow it.
+    """
+    if not len(keys[0]):
+        return numpy.zeros(0, dtype=numpy.int64)
+    combined = numpy.zeros(len(keys[0]), dtype=numpy.int64)
+    scale = 1
+    for k in keys:
+        lo = int(k.min())
+        span = int(k.max()) - lo + 1
+        if scale * span >= 2**62:
+            return numpy.lexsort(keys)
+        combined += (k - lo) * scale
+        scale *= span
+    return numpy.argsort(combined, kind='mergesort')
+
+
+def _run_starts(keys):
+    """
+    @brief Marks the first element of every run of equal keys
+    """
+    first = numpy.ones(len(keys), dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+    return first
+
+
+def _run_index(first):
+    """
+    @brief Returns the index of the first element of the run of every element
+    """
+    return numpy.maximum.accumulate(
+        numpy.where(first, numpy.arange(len(first)), 0))
+
+
+def _run_cumsum(values, first):
+    """
+    @brief Exclusive cumulative sum of the values within every run
+    """
+    cs = numpy.cumsum(values) - values
+    return cs - cs[_run_index(first)]
+
+
+class _Recording(object):
+    """
+    Trace events of the monitored host in the order of their arrival and the
+    log events (task mapping) together with their position in the recording
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.logs = []
+        self._chunks = []
+
+    def add(self, rows, zgt, count, core, typ, swc, data):
+        self._chunks.append((rows, zgt, count, core, typ, swc, data))
+
+    def finish(self):
+        names = ['row', 'zgt', 'count', 'core', 'type', 'swc', 'data']
+        types = [ numpy.int64, numpy.int64, numpy.int64, numpy.int64
+                , numpy.int64, numpy.int64, numpy.uint64]
+        for i, (name, t) in enumerate(zip(names, types)):
+            setattr(self, name, numpy.concatenate(
+                [numpy.array(c[i], dtype=t) for c in self._chunks] or
+                [numpy.zeros(0, dtype=t)]))
+        self._chunks = []
+        return self
+
+
+def _add_events(rec, events, host_id):
+    """
+    @brief Adds event dictionaries as sent by the proxy to the recording
+    """
+    rows, zgt, count, core, typ, swc, data = [], [], [], [], [], [], []
+    for ev in events:
+        if ev['host'] != host_id:
+            raise Unsupported("events of host {} recorded".format(ev['host']))
+        if ev['type'] == LOG_TYPE:
+            rec.logs.append((rec.rows, ev))
+        else:
+            rows.append(rec.rows)
+            zgt.append(ev['zgt'])
+            count.append(ev['count'])
+            core.append(ev['core'])
+            typ.append(ev['type'])
+            swc.append(ev['swc'])
+            data.append(ev['data'])
+        rec.rows += 1
+    rec.add(rows, zgt, count, core, typ, swc, data)
+
+
+def _ints(column, csv_file):
+    """
+    @brief Converts a column of decimal numbers at once
+    """
+    values = numpy.fromstring(' '.join(column), dtype=numpy.int64, sep=' ')
+    if len(values) != len(column):
+        raise Unsupported("invalid value in {}".format(csv_file))
+    return values
+
+
+def _load_csv(csv_file, host_id):
+    sep, fields, offset = FP.parse_trace_csv_layout(csv_file)
+    try:
+        idx = [fields.index(k) for k in
+               ['zgt', 'count', 'host', 'core', 'type', 'swc', 'data']]
+    except ValueError:
+        raise Unsupported("unknown layout of {}".format(csv_file))
+    rec = _Recording()
+    with open(csv_file, 'rb') as f:
+        f.seek(offset)
+        reader = csv.reader(f, delimiter=sep, quotechar=FP.TRACE_CSV_QUOTE)
+        while True:
+            chunk = list(itertools.islice(reader, CHUNK_ROWS))
+            if not chunk:
+                break
+            try:
+                cols = [[r[i] for r in chunk if r] for i in idx]
+            except IndexError:
+                raise Unsupported("incomplete row in {}".format(csv_file))
+            zgt, count, host, core, typ, swc = [_ints(c, csv_file)
+                                                for c in cols[:6]]
+            data = cols[6]
+            if numpy.any(host != host_id):
+                raise Unsupported("events of other hosts recorded")
+            rows = numpy.arange(rec.rows, rec.rows + len(typ))
+            rec.rows += len(typ)
+            is_trace = typ != LOG_TYPE
+            for i in numpy.flatnonzero(~is_trace).tolist():
+                rec.logs.append((rows[i],
+                    { 'host': host_id, 'swc': swc[i], 'zgt': zgt[i]
+                    , 'count': count[i], 'core': core[i], 'type': LOG_TYPE
+                    , 'data': data[i]}))
+            try:
+                data = [int(d, 0) for d in
+                        itertools.compress(data, is_trace.tolist())]
+            except ValueError:
+                raise Unsupported("invalid value in {}".format(csv_file))
+            rec.add( rows[is_trace], zgt[is_trace], count[is_trace]
+                   , core[is_trace], typ[is_trace], swc[is_trace], data)
+    return rec.finish()
+
+
+def _load_pcap(pcap_file, host_id):
+    rec = _Recording()
+    events = pcap_reader.read_events(pcap_file, host_id)
+    while True:
+        chunk = list(itertools.islice(events, CHUNK_ROWS))
+        if not chunk:
+            break
+        _add_events(rec, chunk, host_id)
+    return rec.finish()
+
+
+class _Stream(object):
+    """
+    Trace events in the order in which the host passes them on to the
+    callbacks. pos is the position of an event in the stream of all events
+    which are passed on to the listeners (including log events).
+    """
+
+    def __init__(self, rec):
+        n = len(rec.zgt)
+        if len(rec.count) and (rec.count.max() > 255 or rec.count.min() < 0
+                or numpy.any(numpy.diff(rec.count) % 256 != 1)):
+            raise Unsupported("sequence counter gaps")
+        if not numpy.all(numpy.in1d(rec.type, EVENT_MAP.keys())):
+            raise Unsupported("unknown event types")
+        m = max(0, n - SEQUENCE_DELAY)          # events in the reorder buffer
+        e = max(0, m - REORDER_DELAY)           # processed events
+        if numpy.any(rec.zgt[:m] == INVALID_ZGT):
+            raise Unsupported("invalid ZGT")
+        if numpy.any(rec.type[:m] == _T['zgt_correction']):
+            raise Unsupported("ZGT correction")
+        order = numpy.argsort(rec.zgt[:m], kind='mergesort')[:e]
+        if numpy.any(order >= numpy.arange(e) + REORDER_DELAY):
+            raise Unsupported("events overtaken by more than the reorder "
+                              "buffer")
+        self.zgt = rec.zgt[order]
+        if numpy.any(numpy.diff(self.zgt) > ZGT_JUMP):
+            raise Unsupported("ZGT jump")
+        self.type = rec.type[order]
+        if not numpy.all(numpy.in1d(self.type, _SUPPORTED_TYPES)):
+            raise Unsupported("unsupported event types")
+        self.count = rec.count[order]
+        self.core = rec.core[order]
+        self.swc = rec.swc[order]
+        self.data = rec.data[order]
+        self.size = e
+
+        # an event is passed on when the event REORDER_DELAY + SEQUENCE_DELAY
+        # positions later arrives, log events are passed on immediately
+        emitted = rec.row[SEQUENCE_DELAY + REORDER_DELAY:]
+        log_rows = numpy.array([r for r, _ in rec.logs], dtype=numpy.int64)
+        self.logs = [ev for _, ev in rec.logs]
+        self.pos = numpy.arange(e) + numpy.searchsorted(log_rows, emitted)
+        self.log_pos = numpy.arange(len(log_rows)) + \
+            numpy.searchsorted(emitted, log_rows)
+        self.log_zgt = numpy.array([int(ev['zgt']) for ev in self.logs],
+                                   dtype=numpy.int64)
+        self.length = e + len(self.logs)
+        self.stream_zgt = numpy.zeros(self.length, dtype=numpy.int64)
+        self.stream_zgt[self.pos] = self.zgt
+        self.stream_zgt[self.log_pos] = self.log_zgt
+
+
+class _Callbacks(object):
+    """
+    Columns of the values passed to one kind of callback
+    """
+
+    def __init__(self, pos, sub, **columns):
+        # callbacks of one event are ordered by sub
+        order = _order((sub, pos))
+        self.key = (pos * 2 + sub)[order]
+        self.pos = pos[order]
+        self.columns = sorted(columns)
+        for k, v in columns.iteritems():
+            setattr(self, k, v[order])
+
+    def __len__(self):
+        return len(self.key)
+
+
+def _state_error(stream, i, info):
+    raise Unsupported("state error ({}) @{}".format(info, stream.zgt[i]))
+
+
+def _analyse(stream, host_str):
+    """
+    @brief Computes the callbacks of the runnable, driver and task state
+           machines of all cores.
+
+    @return: dictionary of _Callbacks
+    """
+    s = stream
+    n = s.size
+    idx = numpy.arange(n)
+    t = s.zgt
+    core = s.core
+    big = n + 1
+    if n and (core.min() < 0 or core.max() >= PM.HOSTS[host_str]['cores']):
+        raise Unsupported("invalid core")
+
+    # task switches ordered by core
+    sw = numpy.flatnonzero(s.type == _T['task_switch'])
+    sw = sw[numpy.argsort(core[sw], kind='mergesort')]
+    sw_core = core[sw]
+    sw_t = t[sw]
+    sw_new = _bits(s.data[sw], 0, 0xFFFFFFFF)
+    sw_old = _bits(s.data[sw], 32, 0xFFFFFFFF)
+    sw_first = _run_starts(sw_core)
+    broken = numpy.flatnonzero(~sw_first[1:] & (sw_old[1:] != sw_new[:-1]))
+    if len(broken):
+        _state_error(s, sw[broken[0] + 1], 'task switch')
+    sw_key = sw_core * big + sw
+    # CPU time of the resumed task before a switch
+    seg = numpy.zeros(len(sw), dtype=numpy.int64)
+    seg[:-1] = sw_t[1:] - sw_t[:-1]
+    seg[numpy.append(sw_first[1:], True)] = 0
+    o = _order((sw_new, sw_core))
+    cum = numpy.zeros(len(sw), dtype=numpy.int64)
+    cum[o] = _run_cumsum(seg[o], _run_starts(sw_core[o] * 2**32 + sw_new[o]))
+
+    def active(i):
+        """
+        @return: index of the last task switch on the core of the events i
+                 and whether there is such switch
+        """
+        k = numpy.searchsorted(sw_key, core[i] * big + i) - 1
+        kc = numpy.maximum(k, 0)
+        valid = (k >= 0) & (sw_core[kc] == core[i]) if len(sw) else \
+            numpy.zeros(len(i), dtype=bool)
+        return kc, valid
+
+    def cpu(i, k):
+        return cum[k] + t[i] - sw_t[k]
+
+    # runnable and driver events grouped by (core, kind, id)
+    em = numpy.flatnonzero(numpy.in1d(s.type, [ _T['start_runnable']
+        , _T['stop_runnable'], _T['start_driver'], _T['stop_driver']]))
+    is_drv = (s.type[em] == _T['start_driver']) | \
+             (s.type[em] == _T['stop_driver'])
+    eid = numpy.where(is_drv, _bits(s.data[em], 56, 0xFF),
+                      _bits(s.data[em], 48, 0xFFFF))
+    is_start = (s.type[em] == _T['start_runnable']) | \
+               (s.type[em] == _T['start_driver'])
+    ekey = (core[em] * 2 + is_drv) * 65536 + eid
+    o = numpy.argsort(ekey, kind='mergesort')
+    em, is_drv, eid, is_start, ekey = em[o], is_drv[o], eid[o], is_start[o], \
+        ekey[o]
+    efirst = _run_starts(ekey)
+    # the SW-C of an entity is the one of the event which created it
+    eswc = s.swc[em][_run_index(efirst)]
+    # stop events in front of the first start are ignored
+    started = (_run_cumsum(is_start, efirst) + is_start) > 0
+    em, is_drv, eid, is_start, ekey, eswc = [a[started] for a in
+        [em, is_drv, eid, is_start, ekey, eswc]]
+    efirst = _run_starts(ekey)
+    rank = numpy.arange(len(em)) - _run_index(efirst)
+    wrong = numpy.flatnonzero(is_start != (rank % 2 == 0))
+    if len(wrong):
+        _state_error(s, em[wrong[0]], 'runnable/driver start/stop')
+
+    # instances of runnables and drivers
+    st = numpy.flatnonzero(is_start)
+    nxt = numpy.minimum(st + 1, max(len(em) - 1, 0))
+    closed = (st + 1 < len(em)) & (ekey[nxt] == ekey[st])
+    i_s = em[st]
+    i_e = numpy.where(closed, em[nxt], 0)
+    i_key = ekey[st]
+    i_drv = is_drv[st]
+    i_id = eid[st]
+    i_swc = eswc[st]
+    i_core = core[i_s]
+    i_prev = numpy.where(rank[st] > 0, em[numpy.maximum(st - 2, 0)], -1)
+    ks, bound = active(i_s)
+    i_task = numpy.where(bound, sw_new[ks], -1)
+    ke, _ = active(i_e)
+    wrong = numpy.flatnonzero(bound & closed & (sw_new[ke] != i_task))
+    if len(wrong):
+        _state_error(s, i_e[wrong[0]], 'task context')
+    b = numpy.flatnonzero(bound)
+    if len(b):
+        first = _run_starts(i_key[b])
+        starts = numpy.flatnonzero(first)
+        lo = numpy.minimum.reduceat(i_task[b], starts)
+        hi = numpy.maximum.reduceat(i_task[b], starts)
+        if numpy.any(lo != hi):
+            _state_error(s, i_s[b[starts[numpy.flatnonzero(lo != hi)[0]]]],
+                         'task context')
+
+    # nesting of the bound instances per (core, task)
+    bc = numpy.flatnonzero(bound & closed)
+    ct = i_core * 2**32 + i_task
+    ev_inst = numpy.concatenate([b, bc])
+    ev_pos = numpy.concatenate([i_s[b], i_e[bc]])
+    ev_delta = numpy.concatenate([numpy.ones(len(b), dtype=numpy.int64),
+                                  -numpy.ones(len(bc), dtype=numpy.int64)])
+    o = _order((ev_pos, ct[ev_inst]))
+    ev_inst, ev_pos, ev_delta = ev_inst[o], ev_pos[o], ev_delta[o]
+    ev_first = _run_starts(ct[ev_inst])
+    depth = _run_cumsum(ev_delta, ev_first) + ev_delta
+    if len(depth) and depth.min() < 0:
+        _state_error(s, ev_pos[numpy.argmin(depth)], 'nesting')
+    level = numpy.where(ev_delta > 0, depth - 1, depth)
+    levels = int(level.max()) + 2 if len(level) else 1
+    o = _order((ev_pos, level, ct[ev_inst]))
+    ev_inst, ev_pos, ev_delta, level = ev_inst[o], ev_pos[o], ev_delta[o], \
+        level[o]
+    group = ct[ev_inst] * levels + level
+    stops = numpy.flatnonzero(ev_delta < 0)
+    pred = numpy.maximum(stops - 1, 0)
+    wrong = numpy.flatnonzero((stops == 0) | (ev_inst[pred] != ev_inst[stops])
+        | (ev_delta[pred] < 0) | (group[pred] != group[stops]))
+    if len(wrong):
+        _state_error(s, ev_pos[stops[wrong[0]]], 'nesting')
+    i_level = numpy.zeros(len(i_s), dtype=numpy.int64)
+    starts = numpy.flatnonzero(ev_delta > 0)
+    i_level[ev_inst[starts]] = level[starts]
+    # parent: last start one level up in the same task
+    start_key = group[starts] * big + ev_pos[starts]
+    child = b[i_level[b] > 0]
+    q = (ct[child] * levels + i_level[child] - 1) * big + i_s[child]
+    p = numpy.searchsorted(start_key, q) - 1
+    parent = ev_inst[starts][numpy.maximum(p, 0)]
+
+    # runtimes
+    gross = numpy.where(closed, t[i_e] - t[i_s], 0)
+    work = numpy.zeros(len(i_s), dtype=numpy.int64)
+    work[bc] = cpu(i_e[bc], ke[bc]) - cpu(i_s[bc], ks[bc])
+    child_work = numpy.zeros(len(i_s), dtype=numpy.int64)
+    numpy.add.at(child_work, parent, numpy.where(closed[child],
+                                                 work[child], 0))
+    netto = numpy.where(bound, work - child_work, gross)
+    period = numpy.where(i_prev >= 0, t[i_s] - t[numpy.maximum(i_prev, 0)], 0)
+
+    # overhead in front of runnables: sync events are task resumes and stops
+    # of runnables, consumers are task pauses and repeated runnable starts
+    rb = numpy.flatnonzero(bound & ~i_drv)
+    rbc = numpy.flatnonzero(bound & ~i_drv & closed)
+    pk = numpy.flatnonzero(~sw_first)
+    it_ct = numpy.concatenate([ sw_core * 2**32 + sw_new
+                              , sw_core[pk] * 2**32 + sw_old[pk]
+                              , ct[rb], ct[rbc]])
+    it_key = numpy.concatenate([sw * 2 + 1, sw[pk] * 2, i_s[rb] * 2,
+                                i_e[rbc] * 2])
+    it_t = numpy.concatenate([sw_t, sw_t[pk], t[i_s[rb]], t[i_e[rbc]]])
+    it_ent = numpy.concatenate([ -numpy.ones(len(sw) + len(pk),
+                                             dtype=numpy.int64)
+                               , i_key[rb], i_key[rbc]])
+    it_kind = numpy.concatenate([ numpy.zeros(len(sw), dtype=numpy.int8)
+                                , numpy.ones(len(pk), dtype=numpy.int8)
+                                , numpy.full(len(rb), 2, dtype=numpy.int8)
+                                , numpy.full(len(rbc), 3, dtype=numpy.int8)])
+    it_inst = numpy.concatenate([ -numpy.ones(len(sw) + len(pk),
+                                              dtype=numpy.int64), rb, rbc])
+    o = _order((it_key, it_ct))
+    it_ct, it_key, it_t, it_ent, it_kind, it_inst = [a[o] for a in
+        [it_ct, it_key, it_t, it_ent, it_kind, it_inst]]
+    setter = (it_kind == 0) | (it_kind == 3)
+    if len(setter) and not numpy.all(setter[_run_starts(it_ct)]):
+        raise Unsupported("task without resume event")
+    last = numpy.maximum.accumulate(
+        numpy.where(setter, numpy.arange(len(setter)), 0))
+    sync_ent = it_ent[last]
+    sync_t = it_t[last]
+    eligible = (it_kind == 2) & (i_prev[numpy.maximum(it_inst, 0)] >= 0)
+    consumer = (it_kind == 1) | eligible
+    span = 2 * n + 4
+    # repeated starts of runnables, their overhead is appended to the
+    # overhead of the runnable
+    es = numpy.flatnonzero(eligible)
+    es = es[_order((it_key[es], it_ent[es]))]
+    es_key = it_ent[es] * span + it_key[es]
+    # consumers which refer to the overhead of a runnable
+    cr = numpy.flatnonzero(consumer & (sync_ent >= 0))
+    cr = cr[_order((it_key[cr], sync_ent[cr]))]
+    cr_first = _run_starts(sync_ent[cr])
+    # previous consumer which referred to the same runnable
+    prev = numpy.full(len(cr), -1, dtype=numpy.int64)
+    if len(cr):
+        prev[1:] = numpy.where(cr_first[1:], -1, it_key[cr[:-1]])
+    lo = numpy.searchsorted(es_key, sync_ent[cr] * span + prev)
+    hi = numpy.searchsorted(es_key, sync_ent[cr] * span + it_key[cr])
+    nonempty = hi > lo
+    dt = (it_t - sync_t).astype(numpy.float64)
+    halved = numpy.zeros(len(it_t), dtype=bool)
+    halved[cr[nonempty]] = True
+    dt = numpy.where(halved & (it_kind == 2), dt / 2.0, dt)
+    acc = numpy.concatenate([[0.0], numpy.cumsum(dt[es])])
+    ov = cr[nonempty]
+    ov_value = numpy.ceil(acc[hi[nonempty]] - acc[lo[nonempty]] + dt[ov])
+    ov_ent = sync_ent[ov]
+
+    # callbacks
+    cb = {}
+    rn = ~i_drv
+    rp = numpy.flatnonzero(rn & (i_prev >= 0))
+    rc = numpy.flatnonzero(rn & closed)
+    nt = numpy.flatnonzero(s.type == _T['pm_r_nettime'])
+    cb['rnbl_period'] = _Callbacks(s.pos[i_s[rp]], numpy.ones(len(rp), int),
+        id=i_id[rp], value=period[rp])
+    cb['rnbl_gross'] = _Callbacks(s.pos[i_e[rc]], numpy.zeros(len(rc), int),
+        id=i_id[rc], value=gross[rc], swc=i_swc[rc], core=i_core[rc])
+    cb['rnbl_netto'] = _Callbacks(
+        numpy.concatenate([s.pos[i_e[rc]], s.pos[nt]]),
+        numpy.concatenate([numpy.ones(len(rc), int), numpy.zeros(len(nt),
+                                                                 int)]),
+        id=numpy.concatenate([i_id[rc], _bits(s.data[nt], 48, 0xFFFF)]),
+        value=numpy.concatenate([netto[rc], _bits(s.data[nt], 16,
+                                                  0xFFFFFFFF)]))
+    cb['rnbl_overhead'] = _Callbacks(s.pos[it_key[ov] // 2],
+        numpy.zeros(len(ov), int), id=ov_ent % 65536, value=ov_value,
+        task=it_ct[ov] % 2**32)
+    dv = i_drv
+    dp = numpy.flatnonzero(dv & (i_prev >= 0))
+    dc = numpy.flatnonzero(dv & closed)
+    dn = numpy.flatnonzero(dv & closed & bound)
+    cb['drv_period'] = _Callbacks(s.pos[i_s[dp]], numpy.zeros(len(dp), int),
+        id=i_id[dp], value=period[dp])
+    cb['drv_gross'] = _Callbacks(s.pos[i_e[dc]], numpy.zeros(len(dc), int),
+        id=i_id[dc], value=gross[dc], core=i_core[dc])
+    cb['drv_netto'] = _Callbacks(s.pos[i_e[dn]], numpy.ones(len(dn), int),
+        id=i_id[dn], value=netto[dn])
+    task_id = numpy.where(sw_old[pk] == IDLE_TASK, IDLE_TASK + sw_core[pk],
+                          sw_old[pk])
+    cb['task_switch'] = _Callbacks(s.pos[sw[pk]], numpy.ones(len(pk), int),
+        id=task_id, value=sw_t[pk] - sw_t[pk - 1], core=sw_core[pk])
+    sp = numpy.flatnonzero(s.type == _T['pm_stack_peak'])
+    cb['stack_peak'] = _Callbacks(s.pos[sp], numpy.zeros(len(sp), int),
+        id=_bits(s.data[sp], 32, 0xFFFFFFFF),
+        value=_bits(s.data[sp], 0, 0xFFFFFFFF), core=core[sp])
+    cp = numpy.flatnonzero(s.type == _T['checkpoint'])
+    cb['checkpoint'] = _Callbacks(s.pos[cp], numpy.zeros(len(cp), int),
+        id=_bits(s.data[cp], 48, 0xFFFF), value=_bits(s.data[cp], 16, 0xFFFF),
+        zgt=t[cp])
+    return cb
+
+
+def _stats(ids, values):
+    """
+    @return: dictionary id -> accumulator (cnt, min, max, sum) of the values
+    """
+    if not len(ids):
+        return {}
+    o = numpy.argsort(ids, kind='mergesort')
+    k, v = ids[o], values[o]
+    first = numpy.flatnonzero(_run_starts(k))
+    cnt = numpy.diff(numpy.append(first, len(k)))
+    return {i: {'cnt': c, 'min': lo, 'max': hi, 'sum': sm}
+            for i, c, lo, hi, sm in zip( k[first].tolist(), cnt.tolist()
+                                       , numpy.minimum.reduceat(v, first).tolist()
+                                       , numpy.maximum.reduceat(v, first).tolist()
+                                       , numpy.add.reduceat(v, first).tolist())}
+
+
+def _first(ids, keys):
+    """
+    @return: ids in the order of their first occurrence and the key of the
+             first occurrence
+    """
+    o = numpy.argsort(keys, kind='mergesort')
+    u, i = numpy.unique(ids[o], return_index=True)
+    j = numpy.argsort(i)
+    return u[j], keys[o][i[j]]
+
+
+def _entities(kinds, meas):
+    """
+    @brief Accumulates the measurements of runnables or drivers in the form
+           used by the summary listeners (see get_state()).
+
+    @param kinds: dictionary measurement -> _Callbacks
+    @param meas: names of all measurements
+    """
+    ids = numpy.concatenate([c.id for c in kinds.itervalues()])
+    keys = numpy.concatenate([c.key for c in kinds.itervalues()])
+    stats = {m: _stats(c.id, c.value) for m, c in kinds.iteritems()}
+    state = collections.OrderedDict()
+    for k in _first(ids, keys)[0].tolist():
+        state[k] = {m: stats.get(m, {}).get(k, {'cnt': 0, 'max': '',
+                                                'min': '', 'sum': ''})
+                    for m in meas}
+    gross = kinds['gross']
+    u, i = numpy.unique(gross.id, return_index=True)
+    for k, j in zip(u.tolist(), i.tolist()):
+        for c in gross.columns:
+            if c not in ['id', 'value']:
+                state[k][c] = getattr(gross, c)[j].item()
+    for k, v in state.iteritems():
+        v.setdefault('swc', '')
+        v.setdefault('core', '')
+    return state
+
+
+def _log_runnable_limits(l, cb, stream):
+    """
+    @brief Logs activations and runtimes of runnables which exceed the
+           scheduled period or budget like RunnableListenerSummary does
+    """
+    for c, limits, fmt in [ (cb['rnbl_period'], l._periods,
+        "time between periodic activation of runnable {} is greater than two "
+        "times the scheduled period @{}"), (cb['rnbl_netto'], l._budget,
+        "runtime of runnable {} exceeded the budget by {}us @{}")]:
+        u = numpy.unique(c.id)
+        names = {k: l._ra.get_runnable_name_of_runnable_id(k)
+                 for k in u.tolist()}
+        limit = numpy.array([limits.get(names[k], -1) for k in u.tolist()],
+                            dtype=numpy.float64)[numpy.searchsorted(u, c.id)]
+        if c is cb['rnbl_period']:
+            hit = numpy.flatnonzero((limit > 0) & (c.value / limit > 2))
+        else:
+            hit = numpy.flatnonzero((limit >= 0) &
+                                    ((c.value - limit).astype(int) > 0))
+        for j in hit.tolist():
+            name = names[c.id[j]]
+            zgt = stream.stream_zgt[c.pos[j]]
+            if c is cb['rnbl_period']:
+                logger.info(fmt.format(name, zgt))
+            else:
+                logger.info(fmt.format(name, int(c.value[j] - limit[j]), zgt))
+
+
+def _find(zgt, start, threshold):
+    """
+    @return: index of the first time stamp >= threshold from start on
+    """
+    step = 4096
+    while start < len(zgt):
+        hit = numpy.flatnonzero(zgt[start:start + step] >= threshold)
+        if len(hit):
+            return start + hit[0]
+        start += step
+        step *= 2
+    return None
+
+
+def _sample_boundaries(zgt, rate):
+    """
+    @brief Determines the positions at which a Sampler triggers the update of
+           the measurements
+
+    @return: list of (position, last update time, dt), last update time
+    """
+    out = []
+    if not len(zgt):
+        return out, None
+    last = zgt[0]
+    i = 0
+    while True:
+        i = _find(zgt, i + 1, last + rate)
+        if i is None:
+            break
+        out.append((i, int(last), int(zgt[i] - last)))
+        last = zgt[i]
+    return out, int(last)
+
+
+def _group(interval, cb, columns):
+    """
+    @return: list per interval of (id, sum of values, last value of the
+             columns) per task
+    """
+    out = collections.defaultdict(list)
+    if not len(cb):
+        return out
+    o = _order((cb.key, cb.id, interval))
+    iv, ids, values = interval[o], cb.id[o], cb.value[o]
+    first = numpy.flatnonzero(_run_starts(iv * 2**34 + ids))
+    last = numpy.append(first[1:], len(o)) - 1
+    rows = zip( iv[first].tolist(), ids[first].tolist()
+              , numpy.add.reduceat(values, first).tolist()
+              , *[getattr(cb, c)[o][last].tolist() for c in columns])
+    for r in rows:
+        out[r[0]].append(r[1:])
+    return out
+
+
+def _apply_tasks(listeners, cb, stream, host_str):
+    """
+    @brief Passes the task runtimes, overheads and stack peaks on to the task
+           listeners sample by sample
+    """
+    if not listeners:
+        return
+    rates = set(l._sampler._sample_rate for l in listeners)
+    if len(rates) > 1:
+        raise Unsupported("different sample rates")
+    bounds, last = _sample_boundaries(stream.stream_zgt, rates.pop())
+    b_pos = numpy.array([p for p, _, _ in bounds], dtype=numpy.int64)
+    sw, ov, sp = cb['task_switch'], cb['rnbl_overhead'], cb['stack_peak']
+
+    iv = lambda c: numpy.searchsorted(b_pos, c.pos, 'right')
+    ids = numpy.concatenate([sw.id, ov.task, sp.id])
+    keys = numpy.concatenate([sw.key, ov.key, sp.key])
+    created = collections.defaultdict(list)
+    first, first_key = _first(ids, keys)
+    for k, j in zip(first.tolist(), numpy.searchsorted(
+            b_pos, first_key // 2, 'right').tolist()):
+        created[j].append(k)
+    switches = _group(iv(sw), sw, ['core'])
+    ov_task = _Callbacks(ov.pos, ov.key % 2, id=ov.task, value=ov.value)
+    overheads = _group(iv(ov_task), ov_task, [])
+    peaks = collections.defaultdict(list)
+    for j, k, v, c, z in zip(iv(sp).tolist(), sp.id.tolist(),
+            sp.value.tolist(), sp.core.tolist(),
+            stream.stream_zgt[sp.pos].tolist()):
+        peaks[j].append((k, v, c, z))
+    logs = collections.defaultdict(list)
+    for j, ev in zip(numpy.searchsorted(b_pos, stream.log_pos, 'left')
+                     .tolist(), stream.logs):
+        logs[j].append(ev)
+
+    for j in xrange(len(bounds) + 1):
+        for ev in logs[j]:
+            pm_instrument.receive_task_map(ev)
+        for l in listeners:
+            for k in created[j]:
+                l._get_task(k)
+            for k, rt, c in switches[j]:
+                m = l._task_measurements[k]
+                m['runtime']['sample'] += rt
+                m['core'] = c
+            for k, v in overheads[j]:
+                l._task_measurements[k]['overhead']['sample'] += v
+            for k, v, c, z in peaks[j]:
+                l._pm_stack_peak_cb(host=host_str, id=k, peak=v, core=c,
+                                    zgt=z)
+            if j < len(bounds):
+                l._update_measurement(*bounds[j][1:])
+    for l in listeners:
+        l._sampler._last_update_time = last
+
+
+def _write_trace(l, stream, host_id):
+    """
+    @brief Writes the passed on events to the trace event output
+    """
+    s = stream
+    rid = numpy.in1d(s.type, [ _T['start_runnable'], _T['stop_runnable']
+                             , _T['pm_runtime'], _T['pm_r_nettime']])
+    rids = numpy.where(rid, _bits(s.data, 48, 0xFFFF), -1).tolist()
+    lines = [None] * s.length
+    fmt = l.pattern.format
+    for p, z, c, co, ty, sw, r, d in zip( s.pos.tolist(), s.zgt.tolist()
+            , s.count.tolist(), s.core.tolist(), s.type.tolist()
+            , s.swc.tolist(), rids, s.data.tolist()):
+        lines[p] = fmt(zgt=z, count=c, host=host_id, core=co, type=ty, swc=sw,
+                       rid='' if r < 0 else r, data='0x{:x}'.format(d))
+    for p, ev in zip(s.log_pos.tolist(), s.logs):
+        lines[p] = fmt(zgt=int(ev['zgt']), count=0, host=host_id,
+                       core=int(ev['core']), type=LOG_TYPE,
+                       swc=int(ev['swc']), rid='', data=ev['data'])
+    with l._lock:
+        if not l._file_handler.closed:
+            l._file_handler.writelines(lines)
+
+
+def _apply(listeners, cb, stream, host_str):
+    host_id = PM.HOSTS[host_str]['id']
+    tasks = []
+    for l in listeners.itervalues():
+        if type(l) is PM.TraceListener:
+            _write_trace(l, stream, host_id)
+        elif type(l) is PM.NonOsListener:
+            c = cb['checkpoint']
+            for k, v, z in zip(c.id.tolist(), c.value.tolist(),
+                               c.zgt.tolist()):
+                l._checkpoint_cb(host=host_str, id=k, zgt=z, data=v)
+        elif type(l) is PM.RunnableListenerSummary:
+            l.merge_state({'runnables': _entities(
+                { 'period': cb['rnbl_period'], 'gross': cb['rnbl_gross']
+                , 'netto': cb['rnbl_netto'], 'overhead': cb['rnbl_overhead']}
+                , ['period', 'netto', 'gross', 'overhead'])})
+            _log_runnable_limits(l, cb, stream)
+        elif type(l) is PM.DriverListenerSummary:
+            l.merge_state({'drivers': _entities(
+                { 'period': cb['drv_period'], 'gross': cb['drv_gross']
+                , 'netto': cb['drv_netto']}, ['period', 'netto', 'gross'])})
+        else:
+            tasks.append(l)
+        if type(l) is PM.AggregatedListener:
+            z = stream.stream_zgt
+            l._event_cnt += stream.length
+            nz = numpy.flatnonzero(z)
+            if l._start_time == 0 and len(nz):
+                l._start_time = int(z[nz[0]])
+            if len(z):
+                l._current_time = int(z[-1])
+    _apply_tasks(tasks, cb, stream, host_str)
+
+
+def replay(args, listeners):
+    """
+    @brief Analyses the recording args.csv_file or args.pcap_file and passes
+           the results on to the listeners.
+
+    @param args: command line arguments of MotionWise_Perf
+    @param listeners: listeners as returned by Client._create_listeners()
+    @raise Unsupported: if the recording or the configuration can't be
+                        analysed. The listeners are not modified in this case.
+    @return: number of events read from the recording
+    """
+    _check_config(args, listeners)
+    host_str = args.host.upper()
+    host_id = PM.HOSTS[host_str]['id']
+    if args.csv_file:
+        rec = _load_csv(args.csv_file, host_id)
+    else:
+        rec = _load_pcap(args.pcap_file, host_id)
+    stream = _Stream(rec)
+    cb = _analyse(stream, host_str)
+    _apply(listeners, cb, stream, host_str)
+    logger.debug("vectorised analysis of {} events ({} processed)"
+                 .format(rec.rows, stream.size))
+    return rec.rows
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'replay'
+          , 'Unsupported']
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,387 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    ra_asyncio.py
+#
+# Purpose
+#    asyncio interface of the RA wrapper
+#
+# Revision Dates
+# --
+
+"""
+asyncio interface of the RA wrapper (Python 3).
+
+AsyncRA wraps an initialised RA object:
+
+  calls          the config_*, bdl_* and replay_* functions of RA are
+                 available with the same arguments and return awaitables,
+                 they are executed by a thread pool, e.g.
+                     await ara.config_trace(1, host)
+                     data = await ara.bdl_upload(swc_id)
+                 call(function, *args) executes any other function
+  subscriptions  trace(), log(), profiling() and port(id) register a
+                 callback at the RA library and return asynchronous
+                 iterators of the received records
+                     async with ara.trace() as records:
+                         async for record in records:
+                             ...
+                 batches() iterates over the lists of the records which
+                 arrived since the last iteration
+
+The callbacks are called by the receive thread of the RA library. They copy
+the data (the pointers of the library are only valid during the callback)
+and hand the records to the event loop with loop.call_soon_threadsafe(),
+one call per batch of records which arrived while the loop was busy. With
+ring > 0 the callback of the library only copies the frame into a ring
+buffer (see ra_ring), the records are created by the thread of the ring.
+If more than max_queue records are waiting the new ones are dropped and
+counted.
+
+Leaving the async with block, aclose() or the cancellation of the task in
+the async with block removes the callback (callback_remove() etc.), the
+records received until then are still delivered. The calls of the thread
+pool cannot be interrupted, a cancelled call finishes in the background.
+
+The module does not use the async/await syntax, it returns futures, so the
+package can still be compiled by Python 2.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import ctypes
+import functools
+import logging
+from MotionWise import RA
+
+logger = logging.getLogger(__name__)
+
+ASYNC_PREFIXES = ('config_', 'bdl_', 'replay_')
+ASYNC_CALLS = ('init', 'inject_frames')
+MAX_WORKERS = 4           # threads executing RA calls
+MAX_QUEUE = 65536         # records waiting for the consumer
+
+TraceLogRecord = collections.namedtuple('TraceLogRecord',
+    'entry_type host_id component_id zgt_stamp msg_count data')
+
+
+def tracelog_record(address):
+    """
+    @return: TraceLogRecord of a Ra_TraceLog_Message, data is a copy of the
+             Ra_TraceLog_TraceData for trace messages, the reconstructed
+             string for log messages and None otherwise
+    """
+    msg = RA.Ra_TraceLog_Message.from_address(address)
+    data = None
+    spec = RA.RA_TRACELOG_DATA.get(msg.entry_type)
+    if spec is not None and msg.data:
+        d = ctypes.cast(msg.data, ctypes.POINTER(spec[0]))[0]
+        if msg.entry_type == 3:
+            data = spec[0].from_buffer_copy(d)
+        else:
+            data = d.reconstructed_string
+    return TraceLogRecord(msg.entry_type, msg.host_id, msg.component_id,
+                          msg.zgt_stamp, msg.msg_count, data)
+
+
+def copy_data(data_type, pointer):
+    """
+    @return: copy of the data_type instance at pointer
+    """
+    data = data_type()
+    ctypes.memmove(ctypes.addressof(data), pointer, ctypes.sizeof(data_type))
+    return data
+
+
+def _done(loop, result):
+    future = loop.create_future()
+    future.set_result(result)
+    return future
+
+
+class Subscription(object):
+    """
+    Asynchronous iterator of the records of a callback of the RA library
+    """
+
+    def __init__(self, aio, convert, remove, max_queue):
+        self._aio = aio
+        self._loop = aio.loop
+        self._convert = convert
+        self._remove = remove
+        self._callback = None
+        self.max_queue = max_queue
+        self.received = 0
+        self.dropped = 0
+        self.errors = 0
+        self.batch_count = 0
+        self._pending = collections.deque()   # receive thread -> loop
+        self._scheduled = False
+        self._items = collections.deque()     # loop -> consumer
+        self._waiter = None
+        self._registered = False
+        self._closed = False
+
+    # --- receive thread
+
+    def _put(self, items):
+        if self._closed:
+            return
+        room = self.max_queue - len(self._pending) - len(self._items)
+        if room < len(items):
+            self.dropped += len(items) - max(room, 0)
+            items = items[:max(room, 0)]
+        if not items:
+            return
+        self._pending.extend(items)
+        self.received += len(items)
+        if not self._scheduled:
+            self._scheduled = True
+            try:
+                self._loop.call_soon_threadsafe(self._flush)
+            except RuntimeError:
+                # event loop closed
+                self._closed = True
+
+    def _on_frame(self, argument):
+        try:
+            record = self._convert(argument)
+        except Exception:
+            self.errors += 1
+            logger.exception("RA record conversion failed")
+            return
+        self._put([record])
+
+    def _on_batch(self, arguments):
+        records = []
+        for argument in arguments:
+            try:
+                records.append(self._convert(argument))
+            except Exception:
+                self.errors += 1
+                logger.exception("RA record conversion failed")
+        self._put(records)
+
+    # --- event loop
+
+    def _flush(self):
+        self._scheduled = False
+        n = len(self._pending)
+        if n:
+            self.batch_count += 1
+            for _ in range(n):
+                self._items.append(self._pending.popleft())
+        self._wakeup()
+
+    def _wakeup(self):
+        if self._waiter is None:
+            return
+        future, batch = self._waiter
+        if future.done():
+            # cancelled by the consumer
+            self._waiter = None
+        elif self._items:
+            self._waiter = None
+            if batch:
+                records = list(self._items)
+                self._items.clear()
+                future.set_result(records)
+            else:
+                future.set_result(self._items.popleft())
+        elif self._closed:
+            self._waiter = None
+            future.set_exception(StopAsyncIteration())
+
+    def _next(self, batch):
+        if self._waiter is not None and not self._waiter[0].done():
+            raise RuntimeError("subscription is already awaited")
+        self._waiter = (self._loop.create_future(), batch)
+        future = self._waiter[0]
+        self._wakeup()
+        return future
+
+    def _register(self, add, ring):
+        self._callback = self._on_batch if ring else self._on_frame
+        add(self._callback)
+        self._registered = True
+
+    def _unregister(self):
+        if self._registered:
+            self._registered = False
+            self._remove(self._callback)
+
+    def _finish(self, _=None):
+        self._closed = True
+        self._flush()
+        self._aio._subscriptions.discard(self)
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        return self._next(False)
+
+    def batches(self):
+        """
+        @return: asynchronous iterator of the lists of records
+        """
+        return _Batches(self)
+
+    def aclose(self):
+        """
+        @brief Removes the callback of the RA library (in the thread pool)
+        @return: awaitable
+        """
+        future = self._loop.run_in_executor(self._aio.executor,
+                                            self._unregister)
+        future.add_done_callback(self._finish)
+        return future
+
+    def close(self):
+        """
+        @brief Removes the callback of the RA library (in the thread of the
+               event loop)
+        """
+        self._unregister()
+        self._finish()
+
+    def __aenter__(self):
+        return _done(self._loop, self)
+
+    def __aexit__(self, *exc_info):
+        return self.aclose()
+
+    def stats(self):
+        return { 'received': self.received
+               , 'queued': len(self._pending) + len(self._items)
+               , 'dropped': self.dropped
+               , 'errors': self.errors
+               , 'batches': self.batch_count}
+
+
+class _Batches(object):
+
+    def __init__(self, subscription):
+        self._subscription = subscription
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        return self._subscription._next(True)
+
+
+class AsyncRA(object):
+    """
+    asyncio interface of an RA object
+
+    @param ra: initialised RA object
+    @param loop: event loop, default the current one
+    """
+
+    def __init__(self, ra, loop=None, max_workers=MAX_WORKERS):
+        self.ra = ra
+        self.loop = loop or asyncio.get_event_loop()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers)
+        self._subscriptions = set()
+
+    def call(self, function, *args, **kwargs):
+        """
+        @brief Executes function(*args, **kwargs) in the thread pool
+        @return: awaitable of the result
+        """
+        return self.loop.run_in_executor(
+            self.executor, functools.partial(function, *args, **kwargs))
+
+    def __getattr__(self, name):
+        if name.startswith(ASYNC_PREFIXES) or name in ASYNC_CALLS:
+            function = getattr(self.ra, name)
+            if callable(function):
+                return functools.partial(self.call, function)
+        raise AttributeError(name)
+
+    def _subscribe(self, convert, add, remove, ring, max_queue):
+        subscription = Subscription(self, convert, remove, max_queue)
+        subscription._register(add, ring)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def trace(self, ring=0, max_queue=MAX_QUEUE):
+        """
+        @return: Subscription of the TraceLogRecords of
+                 tracelog_callback_add()
+        """
+        ra = self.ra
+        return self._subscribe(tracelog_record,
+            lambda cb: ra.tracelog_callback_add(cb, ring=ring,
+                                                batch=bool(ring)),
+            ra.tracelog_callback_remove, ring, max_queue)
+
+    def log(self, ring=0, max_queue=MAX_QUEUE):
+        """
+        @return: Subscription of the TraceLogRecords of log_callback_add()
+        """
+        ra = self.ra
+        return self._subscribe(tracelog_record,
+            lambda cb: ra.log_callback_add(cb, ring=ring, batch=bool(ring)),
+            lambda cb: ra.log_callback_remove(), ring, max_queue)
+
+    def profiling(self, data_type=RA.Ra_ProfilingData.ctype,
+                  max_queue=MAX_QUEUE):
+        """
+        @return: Subscription of the copies of the data_type instances of
+                 profiling_callback_add()
+        """
+        ra = self.ra
+        return self._subscribe(functools.partial(copy_data, data_type),
+            ra.profiling_callback_add,
+            lambda cb: ra.profiling_callback_remove(), 0, max_queue)
+
+    def port(self, id, type=None, kind=0, ring=0, max_queue=MAX_QUEUE):
+        """
+        @param id: data element ID or name (see RA.callback_add())
+        @return: Subscription of the copies of the received data elements
+        """
+        ra = self.ra
+        if isinstance(id, str):
+            id = ra.get_element_id(id)
+        if type is None:
+            type = ra.ra_model.ID2Type_Map.get(id, type)
+        if isinstance(type, str):
+            type = ra.TYPES.get(type, type)
+        return self._subscribe(functools.partial(copy_data, type),
+            lambda cb: ra.callback_add(id, cb, type, kind, ring=ring,
+                                       batch=bool(ring)),
+            lambda cb: ra.callback_remove(id, cb, kind), ring, max_queue)
+
+    def aclose(self):
+        """
+        @brief Removes all callbacks and shuts the thread pool down
+        @return: awaitable
+        """
+        futures = [s.aclose() for s in list(self._subscriptions)]
+        future = asyncio.gather(*futures)
+        future.add_done_callback(
+            lambda _: self.executor.shutdown(wait=False))
+        return future
+
+    def __aenter__(self):
+        return _done(self.loop, self)
+
+    def __aexit__(self, *exc_info):
+        return self.aclose()
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'AsyncRA'
+          , 'Subscription'
+          , 'TraceLogRecord'
+          , 'tracelog_record'
+          , 'copy_data']
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,536 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    ra_bdl.py
+#
+# Purpose
+#    Concurrent Block Data Load (BDL) transfers of the RA library
+#
+# Revision Dates
+# --
+
+"""
+Concurrent Block Data Load (BDL) transfers of the RA library.
+
+The RA library transfers one data block per request: Ra_Config_BDLDownload()
+sends a block from the PC to a SWC, Ra_Config_BDLTriggerUpload() reads the
+block of a SWC, and a callback reports the end of the transfer. The
+TransferManager queues any number of transfers:
+
+  - transfers to different SWCs run concurrently (at most max_parallel SWCs),
+    the transfers of one SWC are executed one after the other
+  - the data of a download is read from a file-like object in chunks of
+    CHUNK_SIZE bytes directly into the ctypes buffer passed to the library,
+    the data of an upload is written to a file-like object in chunks, i.e.
+    the block is never converted to Python integers
+  - every transfer is repeated up to retries times if the library reports an
+    error or the callback is not called within timeout seconds
+  - a download is verified by uploading the block again and comparing the
+    CRC-32, an upload is verified against an expected CRC-32 if given
+  - the progress of every transfer (state, bytes, attempt) is available as
+    Transfer attributes and reported to an optional progress callback
+
+The library reports no partial progress of a block, so the bytes of a
+transfer are the bytes read from the source (download) or written to the
+sink (upload).
+
+The manager talks to a port, RaPort for an RA instance or FakePeer, an
+in-process peer which stores the blocks in memory and answers the requests
+from a timer thread, optionally with delays, lost requests, errors and
+corrupted blocks:
+
+    peer = FakePeer(delay=0.01)
+    with TransferManager(peer) as manager:
+        transfers = [manager.download(swc, open(path, 'rb'))
+                     for swc, path in blocks]
+        manager.wait()
+"""
+
+import os
+import time
+import zlib
+import ctypes
+import logging
+import threading
+import collections
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024    # bytes read or written at once
+TIMEOUT = 3.0             # seconds until a transfer attempt is repeated
+RETRIES = 2               # repetitions of a failed transfer
+MAX_PARALLEL = 4          # SWCs with concurrent transfers
+
+QUEUED = 'queued'
+READING = 'reading'
+TRANSFERRING = 'transferring'
+VERIFYING = 'verifying'
+WRITING = 'writing'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class TransferError(Exception):
+    pass
+
+
+def _crc32(data, crc=0):
+    return zlib.crc32(data, crc) & 0xFFFFFFFF
+
+
+class RaPort(object):
+    """
+    BDL requests of an RA instance
+    """
+
+    def __init__(self, ra):
+        self.ra = ra
+
+    def download(self, swc_id, buffer, callback):
+        """
+        @param buffer: ctypes c_uint8 array with the data block
+        @param callback: called with the return value of the library
+        @raise TransferError: if the library rejects the request
+        """
+        ret = self.ra.config_bdl_download(swc_id, buffer, callback)
+        if ret:
+            raise TransferError("download request rejected ({})".format(ret))
+
+    def upload(self, swc_id, callback):
+        """
+        @param callback: called with the return value of the library, the
+                         address and the length of the data block, which
+                         is only valid during the call
+        @raise TransferError: if the library rejects the request
+        """
+        ret = self.ra.config_bdl_upload(swc_id, callback)
+        if ret:
+            raise TransferError("upload request rejected ({})".format(ret))
+
+
+class FakePeer(object):
+    """
+    In-process BDL peer with the interface of RaPort
+
+    @param delay: seconds until a request is answered
+    @param rate: bytes per second added to the delay, None for no limit
+    @param lost: {swc_id: number of the next requests which are not answered}
+    @param errors: {swc_id: number of the next requests answered with 1}
+    @param corrupt: {swc_id: number of the next downloads stored with an
+                    inverted first byte}
+    """
+
+    def __init__(self, delay=0.0, rate=None, lost=None, errors=None,
+                 corrupt=None, blocks=None):
+        self.delay = delay
+        self.rate = rate
+        self.lost = dict(lost or {})
+        self.errors = dict(errors or {})
+        self.corrupt = dict(corrupt or {})
+        self.blocks = dict(blocks or {})
+        self.requests = collections.Counter()
+        self.max_concurrent = 0
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def _take(self, faults, swc_id):
+        n = faults.get(swc_id, 0)
+        if n:
+            faults[swc_id] = n - 1
+        return bool(n)
+
+    def _schedule(self, swc_id, size, answer):
+        with self._lock:
+            self.requests[swc_id] += 1
+            if self._take(self.lost, swc_id):
+                return
+            failed = self._take(self.errors, swc_id)
+            self._active += 1
+            self.max_concurrent = max(self.max_concurrent, self._active)
+
+        def _answer():
+            with self._lock:
+                self._active -= 1
+            answer(failed)
+
+        delay = self.delay + (float(size) / self.rate if self.rate else 0.0)
+        timer = threading.Timer(delay, _answer)
+        timer.daemon = True
+        timer.start()
+
+    def download(self, swc_id, buffer, callback):
+        def _answer(failed):
+            if not failed:
+                block = bytearray(ctypes.string_at(buffer, len(buffer)))
+                with self._lock:
+                    if block and self._take(self.corrupt, swc_id):
+                        block[0] ^= 0xFF
+                    self.blocks[swc_id] = bytes(block)
+            callback(1 if failed else 0)
+        self._schedule(swc_id, len(buffer), _answer)
+
+    def upload(self, swc_id, callback):
+        block = self.blocks.get(swc_id)
+
+        def _answer(failed):
+            if failed or block is None:
+                callback(1, None, 0)
+            else:
+                data = ctypes.create_string_buffer(block, len(block))
+                callback(0, ctypes.addressof(data), len(block))
+        self._schedule(swc_id, len(block or b''), _answer)
+
+
+class Transfer(object):
+    """
+    State of one transfer
+
+    @ivar kind: 'download' (PC -> SWC) or 'upload' (SWC -> PC)
+    @ivar state: QUEUED, READING, TRANSFERRING, VERIFYING, WRITING, DONE or
+                 FAILED
+    @ivar size: size of the data block [bytes], None until it is known
+    @ivar bytes: bytes read from the source or written to the sink
+    @ivar attempt: number of the current attempt
+    @ivar crc: CRC-32 of the data block
+    @ivar data: data block of an upload without sink (bytes)
+    @ivar error: reason of the last failed attempt
+    """
+
+    def __init__(self, kind, swc_id, stream, size=None, crc=None):
+        self.kind = kind
+        self.swc_id = swc_id
+        self.stream = stream
+        self.size = size
+        self.expected_crc = crc
+        self.state = QUEUED
+        self.bytes = 0
+        self.attempt = 0
+        self.crc = None
+        self.data = None
+        self.error = None
+        self.started = None
+        self.finished = None
+        self._done = threading.Event()
+
+    @property
+    def ok(self):
+        return self.state == DONE
+
+    @property
+    def progress(self):
+        """
+        @return: fraction of the bytes read or written, None if the size is
+                 not known
+        """
+        if self.state == DONE:
+            return 1.0
+        if not self.size:
+            return None
+        return min(1.0, float(self.bytes) / self.size)
+
+    @property
+    def duration(self):
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+    def wait(self, timeout=None):
+        """
+        @return: True if the transfer has finished
+        """
+        self._done.wait(timeout)
+        return self._done.is_set()
+
+    def __repr__(self):
+        return '<Transfer {} swc {} {} {}/{} bytes, attempt {}>'.format(
+            self.kind, self.swc_id, self.state, self.bytes, self.size,
+            self.attempt)
+
+
+class TransferManager(object):
+    """
+    Executes BDL transfers, one worker thread per SWC with queued transfers
+
+    @param port: RaPort, FakePeer or an RA instance
+    @param max_parallel: maximum number of SWCs with concurrent transfers
+    @param timeout: seconds until an attempt is considered lost
+    @param retries: repetitions of a failed attempt
+    @param verify: verify downloads by uploading the block again
+    @param progress: called with the Transfer at every change of its state
+    """
+
+    def __init__(self, port, max_parallel=MAX_PARALLEL, timeout=TIMEOUT,
+                 retries=RETRIES, verify=True, chunk_size=CHUNK_SIZE,
+                 progress=None):
+        if not hasattr(port, 'download'):
+            port = RaPort(port)
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self.verify = verify
+        self.chunk_size = chunk_size
+        self.transfers = []
+        self._progress = progress
+        self._slots = threading.BoundedSemaphore(max_parallel)
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.wait()
+
+    def download(self, swc_id, source, size=None):
+        """
+        @brief Queues the download of a data block to a SWC
+
+        @param source: file-like object, bytes, bytearray or ctypes array
+        @param size: bytes to read from a file-like object, by default up to
+                     its end
+        @return: Transfer
+        """
+        return self._submit(Transfer('download', swc_id, source, size))
+
+    def upload(self, swc_id, sink=None, crc=None):
+        """
+        @brief Queues the upload of the data block of a SWC
+
+        @param sink: file-like object the block is written to, by default it
+                     is stored as Transfer.data
+        @param crc: expected CRC-32 of the block
+        @return: Transfer
+        """
+        return self._submit(Transfer('upload', swc_id, sink, crc=crc))
+
+    def wait(self, timeout=None):
+        """
+        @brief Waits for the end of all queued transfers
+
+        @return: True if all transfers have been successful
+        """
+        end = None if timeout is None else time.time() + timeout
+        for t in list(self.transfers):
+            if not t.wait(None if end is None else max(0, end - time.time())):
+                return False
+        return all(t.ok for t in self.transfers)
+
+    def _submit(self, transfer):
+        with self._lock:
+            self.transfers.append(transfer)
+            pending = self._queues.get(transfer.swc_id)
+            if pending is not None:
+                pending.append(transfer)
+                return transfer
+            self._queues[transfer.swc_id] = collections.deque([transfer])
+        worker = threading.Thread(target=self._worker, args=(transfer.swc_id,),
+                                  name='bdl-{}'.format(transfer.swc_id))
+        worker.daemon = True
+        worker.start()
+        return transfer
+
+    def _worker(self, swc_id):
+        with self._slots:
+            while True:
+                with self._lock:
+                    pending = self._queues[swc_id]
+                    if not pending:
+                        del self._queues[swc_id]
+                        return
+                    transfer = pending.popleft()
+                self._execute(transfer)
+
+    def _set_state(self, transfer, state):
+        transfer.state = state
+        if self._progress is not None:
+            try:
+                self._progress(transfer)
+            except Exception:
+                logger.exception("BDL progress callback failed")
+
+    def _execute(self, transfer):
+        transfer.started = time.time()
+        try:
+            if transfer.kind == 'download':
+                self._download(transfer)
+            else:
+                self._upload(transfer)
+        except Exception as e:
+            transfer.error = '{}'.format(e)
+            self._set_state(transfer, FAILED)
+            logger.error("BDL {} of SWC {} failed: {}".format(
+                transfer.kind, transfer.swc_id, transfer.error))
+        else:
+            self._set_state(transfer, DONE)
+            logger.debug("BDL {} of SWC {}: {} bytes in {:.3f}s".format(
+                transfer.kind, transfer.swc_id, transfer.size,
+                transfer.duration))
+        finally:
+            transfer.finished = time.time()
+            transfer._done.set()
+
+    def _read(self, transfer):
+        """
+        @return: ctypes c_uint8 array with the data block of a download
+        """
+        self._set_state(transfer, READING)
+        source = transfer.stream
+        if not hasattr(source, 'read'):
+            if isinstance(source, memoryview):
+                source = source.tobytes()
+            if isinstance(source, ctypes.Array):
+                size = ctypes.sizeof(source)
+                buffer = source if ctypes.sizeof(source._type_) == 1 else \
+                    (ctypes.c_uint8 * size).from_buffer_copy(source)
+            else:
+                size = len(source)
+                buffer = (ctypes.c_uint8 * size).from_buffer_copy(source)
+            transfer.size = transfer.bytes = size
+            transfer.crc = _crc32(buffer)
+            return buffer
+        size = transfer.size
+        if size is None:
+            try:
+                size = os.fstat(source.fileno()).st_size - source.tell()
+            except (AttributeError, EnvironmentError, ValueError):
+                pass
+        chunks = None
+        if size is None:
+            # unknown size, the chunks are copied into the buffer at the end
+            chunks = []
+            size = 0
+            buffer = None
+        else:
+            buffer = (ctypes.c_uint8 * size)()
+        transfer.size = size if chunks is None else None
+        crc = 0
+        offset = 0
+        while chunks is not None or offset < size:
+            n = self.chunk_size if chunks is not None else \
+                min(self.chunk_size, size - offset)
+            chunk = source.read(n)
+            if not chunk:
+                break
+            crc = _crc32(chunk, crc)
+            if chunks is not None:
+                chunks.append(chunk)
+            else:
+                ctypes.memmove(ctypes.addressof(buffer) + offset, chunk,
+                               len(chunk))
+            offset += len(chunk)
+            transfer.bytes = offset
+        if chunks is not None:
+            buffer = (ctypes.c_uint8 * offset)()
+            position = 0
+            for chunk in chunks:
+                ctypes.memmove(ctypes.addressof(buffer) + position, chunk,
+                               len(chunk))
+                position += len(chunk)
+        elif offset < size:
+            raise TransferError("source ended after {} of {} bytes".format(
+                offset, size))
+        transfer.size = offset
+        transfer.crc = crc
+        return buffer
+
+    def _request(self, start):
+        """
+        @brief Sends a request and waits for its callback
+
+        @param start: function which sends the request with the callback
+        @return: arguments of the callback
+        @raise TransferError: if the callback is not called in time
+        """
+        answered = threading.Event()
+        result = []
+
+        def _callback(ret, address=None, length=0):
+            # the uploaded block is only valid during the callback
+            data = ctypes.string_at(address, length) \
+                if ret == 0 and address else b''
+            result.append((ret, data))
+            answered.set()
+
+        start(_callback)
+        if not answered.wait(self.timeout):
+            raise TransferError("no answer within {}s".format(self.timeout))
+        return result[0]
+
+    def _attempts(self, transfer, attempt):
+        """
+        @brief Calls attempt() until it succeeds or the retries are used up
+        """
+        last = None
+        for i in xrange(self.retries + 1):
+            transfer.attempt = i + 1
+            try:
+                return attempt()
+            except TransferError as e:
+                last = e
+                transfer.error = '{}'.format(e)
+                logger.warning("BDL {} of SWC {}, attempt {}: {}".format(
+                    transfer.kind, transfer.swc_id, i + 1, e))
+        raise last
+
+    def _fetch(self, swc_id):
+        ret, data = self._request(lambda cb: self.port.upload(swc_id, cb))
+        if ret != 0:
+            raise TransferError("upload failed ({})".format(ret))
+        return data
+
+    def _download(self, transfer):
+        buffer = self._read(transfer)
+
+        def _attempt():
+            self._set_state(transfer, TRANSFERRING)
+            ret, _ = self._request(lambda cb: self.port.download(
+                transfer.swc_id, buffer, cb))
+            if ret != 0:
+                raise TransferError("download failed ({})".format(ret))
+            if self.verify:
+                self._set_state(transfer, VERIFYING)
+                data = self._fetch(transfer.swc_id)
+                if len(data) != transfer.size or _crc32(data) != transfer.crc:
+                    raise TransferError("verification failed: {} bytes, CRC "
+                        "{:08x} instead of {} bytes, CRC {:08x}".format(
+                            len(data), _crc32(data), transfer.size,
+                            transfer.crc))
+
+        self._attempts(transfer, _attempt)
+
+    def _upload(self, transfer):
+        def _attempt():
+            self._set_state(transfer, TRANSFERRING)
+            data = self._fetch(transfer.swc_id)
+            crc = _crc32(data)
+            if transfer.expected_crc is not None and \
+                    crc != transfer.expected_crc:
+                raise TransferError("CRC {:08x} instead of {:08x}".format(
+                    crc, transfer.expected_crc))
+            return data, crc
+
+        data, transfer.crc = self._attempts(transfer, _attempt)
+        transfer.size = len(data)
+        if transfer.stream is None:
+            transfer.data = data
+            transfer.bytes = len(data)
+            return
+        self._set_state(transfer, WRITING)
+        view = memoryview(data)
+        for offset in xrange(0, len(data), self.chunk_size):
+            transfer.stream.write(view[offset:offset + self.chunk_size])
+            transfer.bytes = min(len(data), offset + self.chunk_size)
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'TransferManager'
+          , 'Transfer'
+          , 'TransferError'
+          , 'RaPort'
+          , 'FakePeer']
+
+if __name__ == '__main__':
+    pass
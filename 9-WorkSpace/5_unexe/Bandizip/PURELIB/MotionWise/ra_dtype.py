@@ -0,0 +1,379 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    ra_dtype.py
+#
+# Purpose
+#    NumPy structured dtypes of the ctypes structures of the RA library
+#
+# Revision Dates
+# --
+
+"""
+NumPy structured dtypes of the ctypes structures of the RA library.
+
+dtype_of() derives a structured dtype with the same memory layout from a
+ctypes structure, union, array or fundamental type, e.g. Ra_TraceLog_TraceData
+of RA.py or the data element types of the contract headers (Ra_Type.py). The
+field offsets and the size are taken from ctypes, i.e. the packing (_pack_)
+and the alignment of the structure are respected:
+
+  structure, union   fields with the ctypes offsets (overlapping for unions)
+  array              sub-array, nested arrays are multi-dimensional
+  integer, float     integer/float of the same size and byte order
+  c_bool, c_char     bool, 1 byte string
+  pointer            unsigned integer of the pointer size (the address)
+
+Bit fields are not supported. A buffer with many records is converted with
+one call of frombuffer() instead of a ctypes attribute access per field and
+record, view() returns an array which shares the memory of a ctypes instance.
+
+verify() checks the dtype of a type against ctypes: the fields of records
+with random content are compared in both directions (ctypes memory read
+with NumPy, NumPy records read with ctypes). verify_contract_headers()
+verifies every structure of the RA.py module and of the contract headers:
+
+    python -m MotionWise.ra_dtype [CONTRACT_DIR]
+"""
+
+import os
+import sys
+import ctypes
+import random
+import logging
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+VERIFY_RECORDS = 3        # records compared by verify()
+_POINTER_CODES = 'zZPO'   # fundamental pointer types (c_char_p, ...)
+_dtypes = {}
+
+
+def _byte_order(t):
+    if getattr(t, '__ctype_be__', None) is t:
+        return '>'
+    if getattr(t, '__ctype_le__', None) is t:
+        return '<'
+    return '='
+
+
+def _fields(t):
+    fields = []
+    for f in t._fields_:
+        if len(f) != 2:
+            raise TypeError("{}.{}: bit fields are not supported".format(
+                t.__name__, f[0]))
+        fields.append(f)
+    return fields
+
+
+def _is_pointer(t):
+    return issubclass(t, (ctypes._Pointer, ctypes._CFuncPtr)) or \
+        (issubclass(t, ctypes._SimpleCData) and t._type_ in _POINTER_CODES)
+
+
+def _build(t):
+    size = ctypes.sizeof(t)
+    if issubclass(t, (ctypes.Structure, ctypes.Union)):
+        fields = _fields(t)
+        return numpy.dtype({ 'names': [str(fn) for fn, _ in fields]
+                           , 'formats': [dtype_of(ft) for _, ft in fields]
+                           , 'offsets': [getattr(t, fn).offset
+                                         for fn, _ in fields]
+                           , 'itemsize': size})
+    if issubclass(t, ctypes.Array):
+        return numpy.dtype((dtype_of(t._type_), (t._length_,)))
+    if _is_pointer(t):
+        return numpy.dtype('=u{}'.format(size))
+    if not issubclass(t, ctypes._SimpleCData):
+        raise TypeError("{} is not a ctypes type".format(t))
+    code = t._type_
+    if code == '?':
+        return numpy.dtype(numpy.bool_)
+    if code == 'c':
+        return numpy.dtype('S1')
+    if code in 'fdg':
+        kind = 'f'
+    elif code in 'bhilq':
+        kind = 'i'
+    elif code in 'BHILQ':
+        kind = 'u'
+    else:
+        raise TypeError("{}: ctypes type code {} is not supported".format(
+            t.__name__, code))
+    if kind == 'f' and code == 'g':
+        if numpy.dtype(numpy.longdouble).itemsize != size:
+            raise TypeError("{}: long double of {} bytes is not supported"
+                            .format(t.__name__, size))
+        return numpy.dtype(numpy.longdouble).newbyteorder(_byte_order(t))
+    return numpy.dtype('{}{}{}'.format(_byte_order(t), kind, size))
+
+
+def dtype_of(t):
+    """
+    @brief Returns the NumPy dtype with the memory layout of the ctypes type
+
+    @raise TypeError: if the type contains bit fields or unsupported types
+    """
+    dt = _dtypes.get(t)
+    if dt is None:
+        if numpy is None:
+            raise ImportError("ra_dtype requires NumPy")
+        dt = _dtypes[t] = _build(t)
+    return dt
+
+
+def frombuffer(t, buf, count=-1, offset=0):
+    """
+    @brief Interprets a buffer with consecutive records of the ctypes type t
+
+    @return: structured NumPy array which shares the memory of the buffer
+    """
+    return numpy.frombuffer(buf, dtype_of(t), count, offset)
+
+
+def view(instance):
+    """
+    @brief Returns an array which shares the memory of the ctypes instance,
+           an array of records for ctypes arrays of structures
+    """
+    t = type(instance)
+    if issubclass(t, ctypes.Array) and \
+            issubclass(t._type_, (ctypes.Structure, ctypes.Union)):
+        t, count = t._type_, t._length_
+    else:
+        count = 1
+    buf = (ctypes.c_char * ctypes.sizeof(instance)).from_buffer(instance)
+    return frombuffer(t, buf, count)
+
+
+def _leaves(t, path=()):
+    """
+    @brief Yields (path, type) of the fields which are compared by verify():
+           fundamental types and arrays of them. A path is a tuple of field
+           names and array indices.
+    """
+    if issubclass(t, (ctypes.Structure, ctypes.Union)):
+        for fn, ft in _fields(t):
+            for leaf in _leaves(ft, path + (fn,)):
+                yield leaf
+        return
+    elem = t
+    while issubclass(elem, ctypes.Array):
+        elem = elem._type_
+    if elem is not t and issubclass(elem, (ctypes.Structure, ctypes.Union)):
+        for i in xrange(t._length_):
+            for leaf in _leaves(t._type_, path + (i,)):
+                yield leaf
+        return
+    yield path, t
+
+
+def _ctypes_value(parent, name, t):
+    """
+    @brief Reads a leaf from a ctypes instance as Python value
+    """
+    if _is_pointer(t):
+        # do not dereference c_char_p and friends
+        addr = ctypes.addressof(parent) + getattr(type(parent), name).offset \
+            if isinstance(name, basestring) else \
+            ctypes.addressof(parent) + name * ctypes.sizeof(t)
+        return ctypes.c_size_t.from_address(addr).value
+    if issubclass(t, ctypes.Array) and t._type_ is ctypes.c_char:
+        # ctypes returns character arrays as strings up to the first zero
+        offset = getattr(type(parent), name).offset \
+            if isinstance(name, basestring) else name * ctypes.sizeof(t)
+        raw = ctypes.string_at(ctypes.addressof(parent) + offset,
+                               ctypes.sizeof(t))
+        return [c.rstrip(b'\0') for c in raw]
+    v = getattr(parent, name) if isinstance(name, basestring) else parent[name]
+    return _python(v, t)
+
+
+def _python(v, t):
+    if issubclass(t, ctypes.Array):
+        return [_python(e, t._type_) for e in v]
+    if isinstance(v, ctypes._SimpleCData):
+        v = v.value
+    if isinstance(v, bytes):
+        return v.rstrip(b'\0')
+    return v
+
+
+def _numpy_value(v):
+    v = v.tolist() if hasattr(v, 'tolist') else v
+    if isinstance(v, bytes):
+        return v.rstrip(b'\0')
+    return v
+
+
+def _equal(a, b):
+    if isinstance(b, numpy.floating):
+        # ctypes returns long doubles as float
+        b = float(b)
+    if isinstance(a, list):
+        return isinstance(b, list) and len(a) == len(b) and \
+            all(_equal(x, y) for x, y in zip(a, b))
+    if isinstance(a, float) or isinstance(b, float):
+        return a == b or (a != a and b != b)
+    if isinstance(a, bool) or isinstance(b, bool):
+        return bool(a) == bool(b)
+    return a == b
+
+
+def _ctypes_leaf(record, path, t):
+    v = record
+    for step in path[:-1]:
+        v = getattr(v, step) if isinstance(step, basestring) else v[step]
+    return _ctypes_value(v, path[-1], t)
+
+
+def _numpy_leaf(records, path):
+    v = records
+    for step in path:
+        v = v[str(step)] if isinstance(step, basestring) else v[:, step]
+    return v
+
+
+def verify(t, records=VERIFY_RECORDS, seed=0):
+    """
+    @brief Compares the dtype of the ctypes structure t with ctypes
+
+    Records with random content are read with ctypes and NumPy and every
+    field is compared. Then NumPy records are written field by field and
+    read with ctypes.
+
+    @return: list of differences, empty if the dtype is correct
+    """
+    errors = []
+    dt = dtype_of(t)
+    if dt.itemsize != ctypes.sizeof(t):
+        return ["{}: size {} != {}".format(t.__name__, dt.itemsize,
+                                           ctypes.sizeof(t))]
+    r = random.Random(seed)
+    size = ctypes.sizeof(t) * records
+    source = (t * records).from_buffer_copy(
+        bytearray(r.getrandbits(8) for _ in xrange(size)))
+    arr = view(source) if issubclass(t, (ctypes.Structure, ctypes.Union)) \
+        else frombuffer(t, (ctypes.c_char * size).from_buffer(source))
+    written = numpy.zeros(records, dt)
+    if not issubclass(t, (ctypes.Structure, ctypes.Union)):
+        leaves = [((), t)]
+    else:
+        leaves = list(_leaves(t))
+    for path, lt in leaves:
+        name = '.'.join(str(p) for p in path) or t.__name__
+        got = _numpy_value(_numpy_leaf(arr, path))
+        for i in xrange(records):
+            expected = _ctypes_value(source, i, lt) if not path else \
+                _ctypes_leaf(source[i], path, lt)
+            if not _equal(expected, got[i]):
+                errors.append("{}[{}].{}: ctypes {!r}, numpy {!r}".format(
+                    t.__name__, i, name, expected, got[i]))
+        if path:
+            target = _numpy_leaf(written, path)
+            target[...] = _numpy_leaf(arr, path)
+        else:
+            written[...] = arr
+    back = (t * records).from_buffer_copy(written.tobytes())
+    for path, lt in leaves:
+        name = '.'.join(str(p) for p in path) or t.__name__
+        for i in xrange(records):
+            if path:
+                expected = _ctypes_leaf(source[i], path, lt)
+                got = _ctypes_leaf(back[i], path, lt)
+            else:
+                expected = _ctypes_value(source, i, lt)
+                got = _ctypes_value(back, i, lt)
+            if not _equal(expected, got):
+                errors.append("{}[{}].{}: written {!r}, read {!r}".format(
+                    t.__name__, i, name, expected, got))
+    return errors
+
+
+def structures(module):
+    """
+    @brief Returns the ctypes structures and unions defined in a module,
+           including the nested classes
+    """
+    out = []
+    todo = list(vars(module).values())
+    while todo:
+        v = todo.pop()
+        if isinstance(v, type) and \
+                issubclass(v, (ctypes.Structure, ctypes.Union)) and \
+                v not in (ctypes.Structure, ctypes.Union) and \
+                hasattr(v, '_fields_') and v not in out:
+            out.append(v)
+            todo.extend(vars(v).values())
+    return sorted(out, key=lambda v: v.__name__)
+
+
+def verify_types(types):
+    """
+    @brief Verifies the dtypes of the types
+
+    @return: {type name: list of differences or the error}
+    """
+    result = {}
+    for t in types:
+        try:
+            result[t.__name__] = verify(t)
+        except TypeError as e:
+            result[t.__name__] = ['{}'.format(e)]
+    return result
+
+
+def verify_contract_headers(contract_dir=None):
+    """
+    @brief Verifies the structures of RA.py and of all contract headers
+           <contract_dir>/<SWC>/Ra_Type.py
+
+    @return: {module: {type name: list of differences}}
+    """
+    from MotionWise import RA
+    result = {'RA': verify_types(structures(RA))}
+    if contract_dir is None or not os.path.isdir(contract_dir):
+        return result
+    for swc in sorted(os.listdir(contract_dir)):
+        path = os.path.join(contract_dir, swc, 'Ra_Type.py')
+        module = RA._load_module(path)
+        if module is None:
+            continue
+        try:
+            result[swc] = verify_types(structures(module))
+        finally:
+            sys.path.remove(os.path.dirname(path))
+            sys.modules.pop('Ra_Type', None)
+    return result
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'dtype_of'
+          , 'frombuffer'
+          , 'view'
+          , 'verify'
+          , 'verify_types'
+          , 'verify_contract_headers'
+          , 'structures']
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    failed = 0
+    for module, types in sorted(verify_contract_headers(
+            sys.argv[1] if len(sys.argv) > 1 else None).iteritems()):
+        for name, errors in sorted(types.iteritems()):
+            if errors:
+                failed += 1
+                logger.error("{}.{}: {}".format(module, name, errors[0]))
+            else:
+                logger.info("{}.{}: ok".format(module, name))
+    sys.exit(1 if failed else 0)
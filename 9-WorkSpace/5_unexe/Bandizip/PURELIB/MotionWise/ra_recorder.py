@@ -0,0 +1,501 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    ra_recorder.py
+#
+# Purpose
+#    Columnar recording of data elements received with RA callbacks
+#
+# Revision Dates
+# --
+
+"""
+Columnar recording of data elements received with RA callbacks.
+
+A Recorder registers a callback (RA.callback_add()) for every recorded data
+element. The ctypes structure of the element (Ra_Type.py) is flattened once
+into columns with ra_dtype: one column per field of a fundamental type,
+arrays of fundamental types are one column with the shape of the array,
+arrays of structures are expanded per index, padding gaps are skipped. The
+columns are named like the C expression of the field, e.g.
+Position.x or Objects[3].Speed.
+
+The callback copies the received element with one memmove() into the next
+row of a chunk (NumPy structured array with CHUNK_ROWS rows) and stores the
+receive time. Full chunks are handed to a writer thread which splits them
+into the columns and writes them into the recording, a ZIP file with
+deflate compression:
+
+  meta.json                    ports, columns, chunks and statistics
+  <element>/time/<chunk>.npy   receive time [s since the epoch]
+  <element>/<column>/<chunk>.npy
+
+If the writer cannot keep up (more than QUEUE_CHUNKS chunks waiting) the
+samples of the chunk are dropped and counted as overflows. Lost samples are
+detected with a counter field of the element (e.g. an alive or sequence
+counter, found by COUNTER_PATTERN or given explicitly): the gaps of the
+counter (modulo its range) are counted per element.
+
+Recording reads a recording: the columns of an element, optionally
+restricted to a time range (only the chunks of the range are read), and
+exports them as CSV. See SCRIPTS/MotionWise_Record.py.
+"""
+
+import io
+import re
+import json
+import time
+import ctypes
+import fnmatch
+import logging
+import zipfile
+import threading
+import collections
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from MotionWise import ra_dtype
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ROWS = 4096         # samples per chunk and element
+QUEUE_CHUNKS = 64         # full chunks waiting for the writer
+META = 'meta.json'
+FORMAT = 'MotionWise recording'
+FORMAT_VERSION = 1
+TIME = 'time'
+PADDING = 'PaddingGap'
+COUNTER_PATTERN = re.compile(
+    r'(?i)(alive|seq|sequence|msg|message)_?(counter|cnt|ctr)$')
+
+Column = collections.namedtuple('Column', 'name path dtype shape')
+
+
+def _flatten(dt, path=(), name=''):
+    if dt.names:
+        for n in dt.names:
+            if n.startswith(PADDING):
+                continue
+            for c in _flatten(dt.fields[n][0], path + (n,),
+                              '{}.{}'.format(name, n) if name else n):
+                yield c
+        return
+    if dt.subdtype is not None:
+        base, shape = dt.subdtype
+        if base.names:
+            for index in numpy.ndindex(*shape):
+                for c in _flatten(base, path + (index,), name + ''.join(
+                        '[{}]'.format(i) for i in index)):
+                    yield c
+            return
+        if base.kind == 'S' and len(shape) == 1:
+            # character array: one string column
+            yield Column(name, path, numpy.dtype('S{}'.format(shape[0])), ())
+            return
+        yield Column(name, path, base, shape)
+        return
+    yield Column(name, path, dt, ())
+
+
+def flatten(data_type):
+    """
+    @brief Returns the columns of a ctypes type
+
+    @return: list of Column, path is the sequence of field names and
+             indices (tuples) of the column in the structured dtype
+    """
+    return [c if c.name else c._replace(name='value')
+            for c in _flatten(ra_dtype.dtype_of(data_type))]
+
+
+def column_values(rows, column):
+    """
+    @brief Returns the values of a column of a structured array
+    """
+    values = rows
+    for p in column.path:
+        if isinstance(p, tuple):
+            values = values[(slice(None),) + p]
+        else:
+            values = values[p]
+    if values.ndim == 2 and column.dtype.kind == 'S':
+        values = numpy.ascontiguousarray(values).view(column.dtype)[:, 0]
+    return values
+
+
+def find_counter(columns):
+    """
+    @return: the first scalar integer column which matches COUNTER_PATTERN
+    """
+    for c in columns:
+        if not c.shape and c.dtype.kind in 'iu' and \
+                COUNTER_PATTERN.search(c.name.split('.')[-1]):
+            return c
+    return None
+
+
+class Port(object):
+    """
+    Recording of one data element
+    """
+
+    def __init__(self, recorder, name, element_id, data_type, counter=None,
+                 modulus=None):
+        self.recorder = recorder
+        self.name = name
+        self.element_id = element_id
+        self.data_type = data_type
+        self.dtype = ra_dtype.dtype_of(data_type)
+        self.columns = flatten(data_type)
+        if counter is None:
+            self.counter = find_counter(self.columns)
+        else:
+            self.counter = dict((c.name, c) for c in self.columns)[counter]
+        if modulus is None and self.counter is not None:
+            modulus = 1 << (8 * self.counter.dtype.itemsize)
+        self.modulus = modulus
+        self.received = 0
+        self.written = 0
+        self.overflows = 0
+        self.lost = 0
+        self.chunks = []
+        self._last_counter = None
+        self._overflowed = False
+        self._size = self.dtype.itemsize
+        self._new_chunk()
+
+    def _new_chunk(self):
+        self._rows = numpy.empty(self.recorder.chunk_rows, self.dtype)
+        self._times = numpy.empty(self.recorder.chunk_rows, numpy.float64)
+        self._address = self._rows.ctypes.data
+        self._row = 0
+
+    def _swap(self):
+        n = self._row
+        if n:
+            try:
+                self.recorder._queue.put_nowait(
+                    (self, self._rows, self._times, n, self._overflowed))
+                self._overflowed = False
+            except queue.Full:
+                # the counter gap is not counted as lost
+                self.overflows += n
+                self._overflowed = True
+            self._new_chunk()
+
+    def callback(self, pointer):
+        """
+        @brief Callback of RA.callback_add(), called by the receive thread
+        """
+        i = self._row
+        if i == self.recorder.chunk_rows:
+            self._swap()
+            i = 0
+        ctypes.memmove(self._address + i * self._size, pointer, self._size)
+        self._times[i] = time.time()
+        self._row = i + 1
+        self.received += 1
+
+    def _count_lost(self, rows, overflowed):
+        c = self.counter
+        if c is None:
+            return
+        if overflowed:
+            self._last_counter = None
+        values = column_values(rows, c).astype(numpy.int64)
+        if self._last_counter is not None:
+            values = numpy.concatenate(([self._last_counter], values))
+        if len(values):
+            self._last_counter = values[-1]
+        steps = numpy.diff(values) % self.modulus
+        self.lost += int(numpy.sum(steps[steps > 1] - 1))
+
+    def stats(self):
+        return { 'element_id': self.element_id
+               , 'received': self.received
+               , 'written': self.written
+               , 'overflows': self.overflows
+               , 'lost': self.lost if self.counter is not None else None
+               , 'counter': self.counter.name if self.counter else None}
+
+    def meta(self):
+        meta = self.stats()
+        meta.update(
+            { 'type': self.data_type.__name__
+            , 'columns': [ { 'name': c.name, 'dtype': c.dtype.str
+                           , 'shape': list(c.shape)} for c in self.columns]
+            , 'chunks': self.chunks
+            , 'modulus': self.modulus})
+        return meta
+
+
+class Recorder(object):
+    """
+    Records data elements into a columnar file
+
+    @param path: file name of the recording
+    @param compression: zlib level of the ZIP file (Python 3.7 or newer)
+    """
+
+    def __init__(self, path, chunk_rows=CHUNK_ROWS, queue_chunks=QUEUE_CHUNKS,
+                 compression=None):
+        if numpy is None:
+            raise ImportError("ra_recorder requires NumPy")
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.ports = collections.OrderedDict()
+        self._queue = queue.Queue(queue_chunks)
+        kwargs = {} if compression is None else {'compresslevel': compression}
+        self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED,
+                                    allowZip64=True, **kwargs)
+        self._start = time.time()
+        self._registered = []
+        self._thread = threading.Thread(target=self._write, name='ra-recorder')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def add(self, name, element_id, data_type, counter=None, modulus=None):
+        """
+        @brief Adds a data element
+
+        @param counter: name of the counter column for the detection of lost
+                        samples, default the column matching COUNTER_PATTERN
+        @param modulus: range of the counter, default 2^bits
+        @return: Port, its callback has to be registered with callback_add()
+        """
+        if name in self.ports:
+            raise ValueError("data element {} is already recorded"
+                             .format(name))
+        port = self.ports[name] = Port(self, name, element_id, data_type,
+                                       counter, modulus)
+        logger.info("record {} ({}): {} columns, counter {}".format(
+            name, data_type.__name__, len(port.columns),
+            port.counter.name if port.counter else None))
+        return port
+
+    def attach(self, ra, names, counters=None, kind=0):
+        """
+        @brief Adds and registers the data elements or all elements of ports
+
+        @param names: names <SWC>_Pp<Port>_De<Element> or <SWC>_Pp<Port>
+        @param counters: {element name: counter column[:modulus]}
+        @return: list of the added Ports
+        """
+        counters = counters or {}
+        ports = []
+        for name in names:
+            elements = [name] if ra.get_element_id('RA_' + name) is not None \
+                else sorted(e[3:] for e in ra._element_to_id
+                            if e.startswith('RA_{}_De'.format(name)))
+            if not elements:
+                raise ValueError("unknown data element or port {}"
+                                 .format(name))
+            for e in elements:
+                element_id = ra.get_element_id('RA_' + e)
+                data_type = ra.ra_model.ID2Type_Map.get(element_id)
+                if data_type is None:
+                    raise ValueError("no type of data element {}".format(e))
+                counter, _, modulus = counters.get(e, '').partition(':')
+                port = self.add(e, element_id, data_type, counter or None,
+                                int(modulus) if modulus else None)
+                ra.callback_add(element_id, port.callback, data_type, kind)
+                self._registered.append((ra, element_id, port.callback, kind))
+                ports.append(port)
+        return ports
+
+    def detach(self):
+        """
+        @brief Removes the callbacks registered by attach()
+        """
+        while self._registered:
+            ra, element_id, callback, kind = self._registered.pop()
+            ra.callback_remove(element_id, callback, kind)
+
+    def _write_array(self, name, values):
+        buf = io.BytesIO()
+        numpy.lib.format.write_array(buf, numpy.ascontiguousarray(values),
+                                     allow_pickle=False)
+        self._zip.writestr(name, buf.getvalue())
+
+    def _write(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            port, rows, times, n, overflowed = item
+            try:
+                rows = rows[:n]
+                times = times[:n]
+                chunk = len(port.chunks)
+                self._write_array('{}/{}/{:06d}.npy'.format(
+                    port.name, TIME, chunk), times)
+                for c in port.columns:
+                    self._write_array('{}/{}/{:06d}.npy'.format(
+                        port.name, c.name, chunk), column_values(rows, c))
+                port._count_lost(rows, overflowed)
+                port.chunks.append([n, float(times[0]), float(times[-1])])
+                port.written += n
+            except Exception:
+                logger.exception("writing {} failed".format(port.name))
+
+    def stats(self):
+        """
+        @return: {element name: {received, written, overflows, lost,
+                 counter}}, lost is None if the element has no counter
+        """
+        return collections.OrderedDict(
+            (name, port.stats()) for name, port in self.ports.items())
+
+    def close(self):
+        """
+        @brief Writes the remaining samples and the meta data
+
+        The callbacks must not be called anymore (detach() or
+        RA.receiving_stop()).
+        """
+        self.detach()
+        for port in self.ports.values():
+            port._swap()
+        self._queue.put(None)
+        self._thread.join()
+        meta = { 'format': FORMAT
+               , 'version': FORMAT_VERSION
+               , 'start': self._start
+               , 'stop': time.time()
+               , 'chunk_rows': self.chunk_rows
+               , 'ports': collections.OrderedDict(
+                   (name, port.meta()) for name, port in self.ports.items())}
+        self._zip.writestr(META, json.dumps(meta, indent=1))
+        self._zip.close()
+        return self.stats()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Recording(object):
+    """
+    Reads a recording of a Recorder
+    """
+
+    def __init__(self, path):
+        if numpy is None:
+            raise ImportError("ra_recorder requires NumPy")
+        self.path = path
+        self._zip = zipfile.ZipFile(path)
+        self.meta = json.loads(self._zip.read(META).decode('utf-8'))
+        if self.meta.get('format') != FORMAT:
+            raise ValueError("{} is not a recording".format(path))
+        self.ports = self.meta['ports']
+
+    def columns(self, port, patterns=None):
+        """
+        @param patterns: column names or shell-style patterns (fnmatch) of
+                         column names. A pattern which equals a column name
+                         only selects this column, i.e. brackets of names
+                         like a[1] are not treated as character class.
+        @return: names of the columns of an element
+        @raise ValueError: if a pattern matches no column
+        """
+        names = [c['name'] for c in self.ports[port]['columns']]
+        if not patterns:
+            return names
+        selected = set()
+        for p in patterns:
+            if p in names:
+                selected.add(p)
+                continue
+            matched = [n for n in names if fnmatch.fnmatchcase(n, p)]
+            if not matched:
+                raise ValueError("no column of {} matches {}".format(port, p))
+            selected.update(matched)
+        return [n for n in names if n in selected]
+
+    def _read_array(self, name):
+        return numpy.lib.format.read_array(io.BytesIO(self._zip.read(name)),
+                                           allow_pickle=False)
+
+    def read(self, port, columns=None, start=None, end=None):
+        """
+        @brief Reads columns of an element
+
+        @param columns: patterns of the column names, default all
+        @param start, end: receive time range [s since the epoch]
+        @return: OrderedDict {'time': times, column: values}
+        """
+        names = self.columns(port, columns)
+        chunks = [i for i, (n, first, last)
+                  in enumerate(self.ports[port]['chunks'])
+                  if (start is None or last >= start) and
+                     (end is None or first <= end)]
+        result = collections.OrderedDict()
+        for name in [TIME] + names:
+            parts = [self._read_array('{}/{}/{:06d}.npy'.format(
+                port, name, i)) for i in chunks]
+            result[name] = numpy.concatenate(parts) if parts else \
+                numpy.empty(0)
+        times = result[TIME]
+        if len(times) and (start is not None or end is not None):
+            mask = numpy.ones(len(times), bool)
+            if start is not None:
+                mask &= times >= start
+            if end is not None:
+                mask &= times <= end
+            for name in result:
+                result[name] = result[name][mask]
+        return result
+
+    def export_csv(self, port, file_handler, columns=None, start=None,
+                   end=None, delimiter=','):
+        """
+        @brief Writes columns of an element as CSV, array columns are
+               written as one column per element (name[i])
+
+        @return: number of rows
+        """
+        data = self.read(port, columns, start, end)
+        header = []
+        values = []
+        for name, v in data.items():
+            if v.ndim == 1:
+                header.append(name)
+                values.append(v)
+            else:
+                for index in numpy.ndindex(*v.shape[1:]):
+                    header.append(name + ''.join('[{}]'.format(i)
+                                                 for i in index))
+                    values.append(v[(slice(None),) + index])
+        file_handler.write(delimiter.join(header) + '\n')
+        fmt = lambda x: repr(float(x)) if isinstance(x, numpy.floating) \
+            else (x.decode('latin-1') if isinstance(x, bytes) else str(x))
+        for row in zip(*values):
+            file_handler.write(delimiter.join(fmt(x) for x in row) + '\n')
+        return len(data[TIME])
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'Recorder'
+          , 'Recording'
+          , 'Port'
+          , 'Column'
+          , 'flatten'
+          , 'column_values'
+          , 'find_counter'
+          , 'CHUNK_ROWS']
+
+if __name__ == '__main__':
+    pass
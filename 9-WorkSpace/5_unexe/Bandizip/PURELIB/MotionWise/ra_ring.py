@@ -0,0 +1,320 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    ra_ring.py
+#
+# Purpose
+#    Batched delivery of RA library callbacks through a ring buffer
+#
+# Revision Dates
+# --
+
+"""
+Batched delivery of RA library callbacks through a ring buffer.
+
+The RA library calls the registered Python callbacks from its receive
+thread, i.e. a slow callback stalls the reception of frames. With a
+Delivery the ctypes callback only copies the frame into the next slot of a
+preallocated ring buffer and wakes up a consumer thread, which calls the
+user callback for all frames in the ring, one after the other or as one
+batch:
+
+  DataDelivery      frames of callback_add(), the data element of the
+                    registered type is copied with one memmove()
+  TraceLogDelivery  messages of tracelog_callback_add()/log_callback_add(),
+                    the Ra_TraceLog_Message, the data it points to and the
+                    strings of log messages are copied and the pointers of
+                    the copy are redirected into the slot. Strings with a
+                    length field get room for the maximum length, NUL
+                    terminated strings (reconstructed_string) STRING_SIZE
+                    bytes; longer strings are truncated and counted
+
+The user callback gets the same argument as a directly registered callback
+(a pointer to the data element, the address of the Ra_TraceLog_Message),
+which is valid until the callback returns. The slots are only reused after
+the callback has returned.
+
+The ring has a single producer (the receive thread of the library) and a
+single consumer, both only write their own position, so no lock is needed.
+If the ring is full the frame is dropped and counted as overflow. stats()
+reports the occupancy, its maximum, the overflows and the batches.
+"""
+
+import ctypes
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+RING_SLOTS = 4096         # frames buffered between the threads
+BATCH_SIZE = 256          # maximum frames delivered at once
+STRING_SIZE = 1024        # bytes per NUL terminated string of a log
+                          # message (incl. NUL)
+
+
+class _Ring(object):
+    """
+    Single-producer single-consumer ring of fixed size slots in one ctypes
+    buffer
+    """
+
+    def __init__(self, slot_size, slots):
+        # slots are aligned for any field type
+        self.slot_size = (slot_size + 7) & ~7
+        self.slots = slots
+        self.buffer = (ctypes.c_uint8 * (self.slot_size * slots))()
+        self.base = ctypes.addressof(self.buffer)
+        self.addresses = [self.base + i * self.slot_size
+                          for i in range(slots)]
+        self.head = 0             # written by the producer
+        self.tail = 0             # written by the consumer
+        self.overflows = 0
+        self.max_occupancy = 0
+
+
+class Delivery(object):
+    """
+    Consumer thread of a ring which calls the user callback
+
+    @param callback: called with the argument of every frame, or with the
+                     list of arguments of a batch if batch is True
+    @param slot_size: bytes per slot
+    @param slots: number of slots
+    @param max_batch: maximum number of frames per batch
+    """
+
+    def __init__(self, callback, slot_size, slots=RING_SLOTS, batch=False,
+                 max_batch=BATCH_SIZE, name='ra-delivery'):
+        self.callback = callback
+        self.batch = batch
+        self.max_batch = max_batch
+        self.errors = 0
+        self.batches = 0
+        self.delivered = 0
+        self._ring = _Ring(slot_size, slots)
+        self._args = [None] * slots
+        self._event = threading.Event()
+        self._waiting = False
+        self._running = True
+        self._thread = threading.Thread(target=self._consume, name=name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _publish(self, head):
+        ring = self._ring
+        ring.head = head + 1
+        occupancy = head + 1 - ring.tail
+        if occupancy > ring.max_occupancy:
+            ring.max_occupancy = occupancy
+        if self._waiting:
+            self._event.set()
+
+    def _consume(self):
+        ring = self._ring
+        slots = ring.slots
+        args = self._args
+        while True:
+            tail = ring.tail
+            n = ring.head - tail
+            if not n:
+                if not self._running:
+                    return
+                self._event.clear()
+                self._waiting = True
+                if ring.head == tail and self._running:
+                    self._event.wait()
+                self._waiting = False
+                continue
+            n = min(n, self.max_batch)
+            batch = [args[(tail + i) % slots] for i in range(n)]
+            try:
+                if self.batch:
+                    self.callback(batch)
+                else:
+                    for a in batch:
+                        self.callback(a)
+            except Exception:
+                self.errors += 1
+                logger.exception("RA callback failed")
+            self.batches += 1
+            self.delivered += n
+            # the slots are released after the callback
+            ring.tail = tail + n
+
+    def stop(self, timeout=None):
+        """
+        @brief Delivers the remaining frames and stops the consumer thread
+        """
+        self._running = False
+        self._event.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def stats(self):
+        """
+        @return: dictionary with the size and occupancy of the ring, the
+                 received, delivered and dropped frames and the batches
+        """
+        ring = self._ring
+        return { 'slots': ring.slots
+               , 'slot_size': ring.slot_size
+               , 'occupancy': ring.head - ring.tail
+               , 'max_occupancy': ring.max_occupancy
+               , 'received': ring.head
+               , 'delivered': self.delivered
+               , 'overflows': ring.overflows
+               , 'batches': self.batches
+               , 'mean_batch': round(float(self.delivered) / self.batches, 1)
+                               if self.batches else None
+               , 'errors': self.errors}
+
+
+class DataDelivery(Delivery):
+    """
+    Delivery of the data elements of callback_add()
+
+    @param data_type: ctypes type of the data element, the callback gets a
+                      pointer to it
+    """
+
+    def __init__(self, data_type, callback, **kwargs):
+        self._size = ctypes.sizeof(data_type)
+        Delivery.__init__(self, callback, self._size, **kwargs)
+        ring = self._ring
+        for i in range(ring.slots):
+            self._args[i] = ctypes.pointer(data_type.from_buffer(
+                ring.buffer, i * ring.slot_size))
+
+    def produce(self, pointer):
+        """
+        @brief ctypes callback of the library
+        """
+        ring = self._ring
+        head = ring.head
+        if head - ring.tail >= ring.slots:
+            ring.overflows += 1
+            return
+        ctypes.memmove(ring.addresses[head % ring.slots], pointer, self._size)
+        self._publish(head)
+
+
+class TraceLogDelivery(Delivery):
+    """
+    Delivery of the Ra_TraceLog_Message of tracelog_callback_add() and
+    log_callback_add()
+
+    @param message_type: Ra_TraceLog_Message
+    @param data_types: {entry type: (ctypes type of the data, [(name of a
+                       c_char_p field, name of its length field or None if
+                       it is NUL terminated)])}, the data of other entry
+                       types is not copied (NULL pointer)
+    @param string_size: bytes per NUL terminated string (incl. NUL)
+    """
+
+    def __init__(self, message_type, data_types, callback,
+                 string_size=STRING_SIZE, **kwargs):
+        self._message_size = ctypes.sizeof(message_type)
+        self._data_offset = message_type.data.offset
+        data_size = max([ctypes.sizeof(t) for t, _ in data_types.values()]
+                        or [0])
+        self._data_start = (self._message_size + 7) & ~7
+        self._string_start = (self._data_start + data_size + 7) & ~7
+        # entry type -> (size, [(pointer offset, length offset, length type,
+        #                        bytes)])
+        self._types = {}
+        strings_size = 0
+        for entry_type, (t, fields) in data_types.items():
+            spec = []
+            for name, length in fields:
+                if length is None:
+                    spec.append((getattr(t, name).offset, None, None,
+                                 string_size))
+                    continue
+                field = getattr(t, length)
+                length_type = dict(t._fields_)[length]
+                # maximum length of the field and the NUL
+                spec.append((getattr(t, name).offset, field.offset,
+                             length_type, 1 << (8 * field.size)))
+            self._types[entry_type] = (ctypes.sizeof(t), spec)
+            strings_size = max(strings_size, sum(f[3] for f in spec))
+        self.truncated = 0
+        Delivery.__init__(self, callback, self._string_start + strings_size,
+                          **kwargs)
+        ring = self._ring
+        self._entry = [ctypes.c_uint8.from_buffer(ring.buffer,
+                       i * ring.slot_size + message_type.entry_type.offset)
+                       for i in range(ring.slots)]
+        self._pointer = [ctypes.c_void_p.from_buffer(ring.buffer,
+                         i * ring.slot_size + self._data_offset)
+                         for i in range(ring.slots)]
+        self._args[:] = ring.addresses
+
+    def _copy_strings(self, slot, data, fields):
+        """
+        @brief Copies the strings of a log message into the slot and
+               redirects their pointers
+        """
+        target = slot + self._string_start
+        for pointer_offset, length_offset, length_type, size in fields:
+            pointer = ctypes.c_void_p.from_address(data + pointer_offset)
+            if not pointer.value:
+                target += size
+                continue
+            if length_offset is None:
+                n = len(ctypes.string_at(pointer.value))
+                if n >= size:
+                    n = size - 1
+                    self.truncated += 1
+            else:
+                n = length_type.from_address(data + length_offset).value
+            ctypes.memmove(target, pointer.value, n)
+            ctypes.memset(target + n, 0, 1)
+            pointer.value = target
+            target += size
+
+    def produce(self, address):
+        """
+        @brief ctypes callback of the library
+        """
+        ring = self._ring
+        head = ring.head
+        if head - ring.tail >= ring.slots:
+            ring.overflows += 1
+            return
+        i = head % ring.slots
+        slot = ring.addresses[i]
+        ctypes.memmove(slot, address, self._message_size)
+        pointer = self._pointer[i]
+        spec = self._types.get(self._entry[i].value)
+        if spec is None or not pointer.value:
+            pointer.value = None
+        else:
+            data = slot + self._data_start
+            ctypes.memmove(data, pointer.value, spec[0])
+            pointer.value = data
+            if spec[1]:
+                self._copy_strings(slot, data, spec[1])
+        self._publish(head)
+
+    def stats(self):
+        """
+        @return: Delivery.stats() and the number of truncated strings
+        """
+        out = Delivery.stats(self)
+        out['truncated'] = self.truncated
+        return out
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'Delivery'
+          , 'DataDelivery'
+          , 'TraceLogDelivery'
+          , 'RING_SLOTS'
+          , 'BATCH_SIZE'
+          , 'STRING_SIZE']
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,741 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    ra_sim.py
+#
+# Purpose
+#    Simulation of the RA shared library for tests without hardware
+#
+# Revision Dates
+# --
+
+"""
+Simulation of the RA shared library for tests without hardware.
+
+SimLib replaces the ctypes.CDLL of the RA library (option --ra-sim of
+RA_Args or the environment variable RA_SIM), the RA wrapper and the tools
+based on it run unchanged:
+
+  callbacks  Ra_Callback_Add/Remove, Ra_TraceLog/Log/Profiling_Callback_*
+             register the ctypes callbacks, the receive thread of the
+             simulation (started by Ra_Receiving_Start) calls them with the
+             ctypes structures of the library (Ra_TraceLog_Message, the data
+             element types of the registered callbacks)
+  config     all Ra_Config_* calls are recorded (calls, counts), disabled
+             traces (Ra_Config_Trace) suppress the trace events of the host
+  BDL        a downloaded block is stored per SW-C and returned by the next
+             upload (or the block of the scenario), the callbacks are called
+             by a timer thread after bdl_delay
+  gPTP       Ra_gPTP_GetZGT returns the ZGT of the simulation clock
+  log        Ra_Log_Config/Start/Stop write the emitted trace and log events
+             as pcap file (pcap_reader), Ra_Replay_* replay a pcap file into
+             the trace log callbacks
+  frames     injected and distributed frames are recorded, with loopback
+             they are delivered to the callbacks of their kind and ID
+
+The events are defined by a scenario, a JSON file (or a pcap/pcapng file or
+a trace event CSV file of pm_synth, which are replayed):
+
+  { "speed": 1.0,             # time scale, 0: as fast as possible
+    "loop": false,            # restart at the end
+    "zgt_start": 1000000,     # ZGT at time 0 [us]
+    "version": "...",         # Ra_Get_Version
+    "loopback": false,
+    "bdl_delay": 0.01,        # [s]
+    "bdl": {"<swc_id>": "<hex data for the upload>"},
+    "return_codes": {"Ra_Config_Trace": 1},
+    "events":
+      [ {"time": 0.1, "type": "trace", "host": 2, "swc": 0, "core": 0,
+         "event": 2, "data": 5}
+      , {"time": 0.2, "type": "log", "host": 2, "swc": 3, "text": "..."}
+      , {"time": 0.3, "type": "profiling", "exe_time": 120, "stack": 512}
+      , {"time": 0.4, "type": "port", "element": "RA_<SWC>_Pp<>_De<>",
+         "kind": 0, "value": {...} or "hex": "..."}
+      ],
+    "periodic":               # port events every period [s]
+      [ {"element": ..., "period": 0.01, "count": 100, "value": {...},
+         "counter": "AliveCounter"} ],
+    "trace_file": "<pcap or pm_synth CSV file>",
+    "synthetic": {"host": "SSH", "gen_info": "<schedule generation info>",
+                  "task_map": ["<Os_Types_Lcfg.h>", "<Os ecuc arxml>"],
+                  "options": {"seconds": 10, "seed": 1}}
+  }
+
+The times of the trace events of trace files and of the synthetic generator
+(pm_synth) are derived from their ZGTs. The values of port events are
+converted with RA.as_ctype_instance() to the type of the registered
+callback. emit_trace(), emit_log(), emit_profiling() and emit_port() emit
+events directly, e.g. in tests.
+"""
+
+import os
+import sys
+import json
+import heapq
+import time
+import ctypes
+import atexit
+import logging
+import binascii
+import threading
+import collections
+
+from MotionWise import RA
+from MotionWise import pcap_reader
+
+logger = logging.getLogger(__name__)
+
+RA_E_OK = 0
+RA_E_NOT_OK = 1
+VERSION = "RA simulation"
+CALL_LOG = 10000          # recorded calls
+DEFAULTS = { 'speed': 1.0
+           , 'loop': False
+           , 'zgt_start': 1000000
+           , 'version': VERSION
+           , 'loopback': False
+           , 'bdl_delay': 0.01
+           , 'bdl': {}
+           , 'return_codes': {}
+           , 'events': []
+           , 'periodic': []
+           , 'trace_file': None
+           , 'synthetic': None}
+_LOG = 0xFF               # event type of log messages (pm_synth)
+
+if sys.version_info.major == 3:
+    basestring = str
+    long = int
+
+
+def _value(a):
+    """
+    @brief Python value of a ctypes argument for the call log
+    """
+    v = getattr(a, 'value', a)
+    if v is None or isinstance(v, (int, long, float, basestring, bytes)):
+        return v
+    return type(a).__name__
+
+
+def _bytes(text):
+    return text if isinstance(text, bytes) else text.encode('latin-1')
+
+
+def load_scenario(path=None):
+    """
+    @brief Reads a scenario file, pcap/pcapng and CSV files are trace files
+
+    @return: scenario dictionary with the defaults of all keys
+    """
+    scenario = dict(DEFAULTS)
+    if path:
+        base = os.path.dirname(os.path.abspath(path))
+        if path.lower().endswith(('.pcap', '.pcapng', '.csv')):
+            scenario['trace_file'] = path
+        else:
+            with open(path) as f:
+                scenario.update(json.load(f))
+            for key in ('trace_file',):
+                if scenario[key] and not os.path.isabs(scenario[key]):
+                    scenario[key] = os.path.join(base, scenario[key])
+            synthetic = scenario['synthetic']
+            if synthetic:
+                synthetic['gen_info'] = os.path.join(base,
+                                                     synthetic['gen_info'])
+                if synthetic.get('task_map'):
+                    synthetic['task_map'] = [os.path.join(base, p) for p in
+                                             synthetic['task_map']]
+    return scenario
+
+
+def read_trace_csv(path):
+    """
+    @brief Yields the events of a trace event CSV file (pm_synth.write_csv)
+    """
+    from MotionWise.pm_measurement import DELIMITER
+    names = None
+    with open(path) as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line.startswith('#HEADER '):
+                names = line[8:].split(DELIMITER)
+                continue
+            if not line or line.startswith('#') or names is None:
+                continue
+            e = dict(zip(names, line.split(DELIMITER, len(names) - 1)))
+            for k in ('zgt', 'host', 'core', 'type', 'swc'):
+                e[k] = int(e[k], 0)
+            e['count'] = int(e['count'], 0) if e['count'] else 0
+            if e['type'] != _LOG:
+                e['data'] = int(e['data'], 0)
+            yield e
+
+
+class SimFunction(object):
+    """
+    Function of the simulated library, with the attributes of a ctypes
+    function (restype, argtypes and errcheck, which is applied)
+
+    The RA wrapper binds the library functions once per process (see
+    RA_API), like the real library the simulation is a singleton: the
+    functions call the last created SimLib (SimLib.active).
+    """
+
+    def __init__(self, name):
+        self.__name__ = name
+        self.restype = None
+        self.argtypes = None
+        self.errcheck = None
+
+    def __call__(self, *args):
+        lib = SimLib.active
+        name = self.__name__
+        lib.counts[name] += 1
+        lib.calls.append((name, [_value(a) for a in args]))
+        # configuration and transmit functions are only recorded
+        implementation = getattr(lib, '_' + name, None)
+        result = implementation(*args) if implementation else RA_E_OK
+        code = lib.return_codes.get(name)
+        if code is not None:
+            result = code
+        if self.errcheck is not None:
+            return self.errcheck(result, self, args)
+        return result
+
+
+class SimLib(object):
+    """
+    Simulated RA shared library
+
+    @param ra: RA object (element IDs of port events)
+    @param scenario: scenario dictionary or file name (see load_scenario())
+    """
+
+    active = None             # SimLib called by the SimFunctions
+
+    def __init__(self, ra=None, scenario=None):
+        if scenario is None or isinstance(scenario, basestring):
+            scenario = load_scenario(scenario)
+        else:
+            scenario = dict(DEFAULTS, **scenario)
+        self.ra = ra
+        self.scenario = scenario
+        self.return_codes = dict(scenario['return_codes'])
+        self.calls = collections.deque(maxlen=CALL_LOG)
+        self.counts = collections.defaultdict(int)
+        self.initialized = False
+        self.readers = collections.defaultdict(list)
+        self.tracelog_callbacks = []
+        self.log_callbacks = []
+        self.profiling_callbacks = []
+        self.trace_enabled = {}
+        self.routing = {}
+        self.bdl = dict((int(k), binascii.unhexlify(v))
+                        for k, v in scenario['bdl'].items())
+        self.frames = collections.deque(maxlen=CALL_LOG)
+        self.emitted = collections.defaultdict(int)
+        self._functions = {}
+        self._lock = threading.RLock()
+        self._timers = []
+        self._receiver = None
+        self._replay = None
+        self._log_file = None
+        self._log_events = None
+        self._clock_start = time.time()
+        # the pointers of the messages are only valid during the callback
+        self._message = RA.Ra_TraceLog_Message()
+        self._trace = RA.Ra_TraceLog_TraceData()
+        previous, SimLib.active = SimLib.active, self
+        if previous is not None:
+            previous._Ra_Shutdown()
+
+    # --- ctypes.CDLL interface
+
+    def __getattr__(self, name):
+        if not name.startswith('Ra_'):
+            raise AttributeError(name)
+        function = self._functions.get(name)
+        if function is None:
+            function = self._functions[name] = SimFunction(name)
+        return function
+
+    # --- simulation clock
+
+    def zgt(self):
+        """
+        @return: current ZGT of the simulation [us]
+        """
+        speed = self.scenario['speed'] or 1.0
+        return int(self.scenario['zgt_start'] +
+                   (time.time() - self._clock_start) * speed * 1e6)
+
+    # --- emission
+
+    def _call(self, callbacks, argument):
+        for c_fct in list(callbacks):
+            try:
+                c_fct(argument)
+            except Exception:
+                logger.exception("simulated callback failed")
+
+    def emit_trace(self, host, core, event, data, swc=0, zgt=None, count=0):
+        """
+        @brief Calls the trace log callbacks with a trace message
+        """
+        if not self.trace_enabled.get(host, True):
+            return
+        with self._lock:
+            zgt = self.zgt() if zgt is None else zgt
+            m = self._message
+            t = self._trace
+            t.core_id, t.event_type, t.event_data = core, event, data
+            m.entry_type, m.host_id, m.component_id = 3, host, swc
+            m.zgt_stamp, m.msg_count = zgt, count & 0xFF
+            m.data = ctypes.cast(ctypes.pointer(t),
+                                 ctypes.POINTER(ctypes.c_uint8))
+            self._call(self.tracelog_callbacks, ctypes.addressof(m))
+            self.emitted['trace'] += 1
+            if self._log_events is not None:
+                self._log_events.append(
+                    { 'zgt': zgt, 'count': count & 0xFF, 'host': host
+                    , 'core': core, 'type': event, 'swc': swc, 'data': data})
+
+    def emit_log(self, host, text, swc=0, zgt=None, code=None):
+        """
+        @brief Calls the trace log and log callbacks with a log message, a
+               coded one if code is given
+        """
+        text = _bytes(text)
+        with self._lock:
+            zgt = self.zgt() if zgt is None else zgt
+            string = ctypes.create_string_buffer(text)
+            if code is None:
+                d = RA.Ra_TraceLog_LogNotCodedData(
+                    0, min(len(text), 255), ctypes.cast(string,
+                    ctypes.c_char_p), 0, None, ctypes.cast(string,
+                    ctypes.c_char_p))
+                entry_type = 1
+            else:
+                d = RA.Ra_TraceLog_LogCodedData(0, code, 0, None,
+                    ctypes.cast(string, ctypes.c_char_p))
+                entry_type = 2
+            m = RA.Ra_TraceLog_Message(entry_type, host, swc, zgt, 0,
+                ctypes.cast(ctypes.pointer(d), ctypes.POINTER(ctypes.c_uint8)))
+            self._call(self.tracelog_callbacks + self.log_callbacks,
+                       ctypes.addressof(m))
+            self.emitted['log'] += 1
+            if self._log_events is not None and code is None:
+                self._log_events.append(
+                    { 'zgt': zgt, 'count': 0, 'host': host, 'core': 0
+                    , 'type': _LOG, 'swc': swc, 'data': text})
+
+    def emit_profiling(self, exe_time, stack=-1):
+        """
+        @brief Calls the profiling callbacks with a Ra_ProfilingData
+        """
+        with self._lock:
+            p = RA.Ra_ProfilingData.ctype(exe_time, stack)
+            self._call(self.profiling_callbacks, ctypes.addressof(p))
+            self.emitted['profiling'] += 1
+
+    def _element_id(self, element):
+        if isinstance(element, basestring):
+            element_id = self.ra.get_element_id(element) \
+                if self.ra is not None else None
+            if element_id is None:
+                raise ValueError("unknown data element {}".format(element))
+            return element_id
+        return element
+
+    def emit_port(self, element, value=None, kind=0, raw=None):
+        """
+        @brief Calls the callbacks of a data element
+
+        @param element: data element name (RA_<SWC>_Pp<>_De<>) or ID
+        @param value: value as accepted by RA.as_ctype_instance()
+        @param raw: bytes of the data element instead of value
+        """
+        element_id = self._element_id(element)
+        with self._lock:
+            for c_fct in list(self.readers[(kind, element_id)]):
+                data_type = c_fct._argtypes_[0]._type_
+                if raw is not None:
+                    data = data_type()
+                    ctypes.memmove(ctypes.addressof(data), raw,
+                                   min(len(raw), ctypes.sizeof(data)))
+                else:
+                    data = RA.RA.as_ctype_instance(data_type, value)
+                try:
+                    c_fct(ctypes.pointer(data))
+                except Exception:
+                    logger.exception("simulated callback failed")
+            self.emitted['port'] += 1
+
+    def _emit(self, event):
+        kind = event.get('type')
+        if kind == 'trace':
+            self.emit_trace(event['host'], event.get('core', 0),
+                            event['event'], event.get('data', 0),
+                            event.get('swc', 0), event.get('zgt'),
+                            event.get('count', 0))
+        elif kind == 'log':
+            self.emit_log(event['host'], event['text'], event.get('swc', 0),
+                          event.get('zgt'), event.get('code'))
+        elif kind == 'profiling':
+            self.emit_profiling(event['exe_time'], event.get('stack', -1))
+        elif kind == 'port':
+            raw = event.get('hex')
+            self.emit_port(event['element'], event.get('value'),
+                           event.get('kind', 0),
+                           binascii.unhexlify(raw) if raw else None)
+        else:
+            raise ValueError("unknown event type {}".format(kind))
+
+    # --- event sources, (time, sequence, event) in the order of time
+
+    def _trace_events(self, events, zgt_start=None):
+        for i, e in enumerate(events):
+            if zgt_start is None:
+                zgt_start = e['zgt']
+            if e['type'] == _LOG:
+                event = { 'type': 'log', 'host': e['host'], 'swc': e['swc']
+                        , 'zgt': e['zgt'], 'text': e['data']}
+            else:
+                event = { 'type': 'trace', 'host': e['host'], 'swc': e['swc']
+                        , 'core': e['core'], 'event': e['type']
+                        , 'data': e['data'], 'zgt': e['zgt']
+                        , 'count': e['count'] or 0}
+            yield (e['zgt'] - zgt_start) / 1e6, i, event
+
+    def _periodic(self, p):
+        counter = p.get('counter')
+        value = dict(p.get('value') or {})
+        for i in range(p.get('count', 1 << 62)):
+            if counter:
+                value[counter] = i & 0xFF
+            yield (p.get('start', 0.0) + i * p['period'], i,
+                   dict(p, type='port', value=dict(value)))
+
+    def _sources(self):
+        s = self.scenario
+        zgt_start = s['zgt_start']
+        sources = []
+        events = []
+        for i, e in enumerate(s['events']):
+            e = dict(e)
+            if e['type'] in ('trace', 'log') and 'zgt' not in e:
+                e['zgt'] = zgt_start + int(e['time'] * 1e6)
+            events.append((e['time'], i, e))
+        sources.append(sorted(events, key=lambda e: e[:2]))
+        for p in s['periodic']:
+            sources.append(self._periodic(p))
+        if s['trace_file']:
+            path = s['trace_file']
+            if path.lower().endswith('.csv'):
+                sources.append(self._trace_events(read_trace_csv(path)))
+            else:
+                sources.append(self._trace_events(
+                    pcap_reader.read_events(path)))
+        if s['synthetic']:
+            sources.append(self._trace_events(self._synthetic(
+                s['synthetic'])))
+        return heapq.merge(*sources)
+
+    def _synthetic(self, config):
+        from MotionWise import pm_synth, file_parser
+        if self.ra is None or self.ra.ra_model is None:
+            raise ValueError("the synthetic generator requires the RA model")
+        task_map = config.get('task_map')
+        if task_map:
+            task_map = file_parser.load_aph_task_map(*task_map)
+        workload = pm_synth.Workload(
+            config['host'], self.ra.ra_model,
+            file_parser.parse_schedule_generation_info_file(
+                config['gen_info']), task_map,
+            drivers=config.get('options', {}).get('drivers', 0))
+        return pm_synth.Generator(workload,
+                                  **config.get('options', {})).events()
+
+    def _play(self, sources, stop, speed, loop):
+        try:
+            self._play_sources(sources, stop, speed, loop)
+        except (IOError, pcap_reader.PcapError) as e:
+            logger.error("simulation: {}".format(e))
+        except Exception:
+            logger.exception("simulation stopped")
+
+    def _play_sources(self, sources, stop, speed, loop):
+        while not stop.is_set():
+            start = time.time()
+            for t, _, event in sources():
+                if stop.is_set():
+                    return
+                if speed:
+                    wait = start + t / speed - time.time()
+                    if wait > 0 and stop.wait(wait):
+                        return
+                try:
+                    self._emit(event)
+                except ValueError as e:
+                    logger.error("simulation: {}".format(e))
+            if not loop:
+                return
+
+    def _start(self, name, sources, speed, loop):
+        stop = threading.Event()
+        thread = threading.Thread(target=self._play,
+                                  args=(sources, stop, speed, loop),
+                                  name=name)
+        thread.daemon = True
+        thread.start()
+        return thread, stop
+
+    @staticmethod
+    def _stop(player):
+        if player is not None:
+            thread, stop = player
+            stop.set()
+            if thread is not threading.current_thread():
+                thread.join()
+
+    # --- library functions
+
+    def _Ra_Get_Version(self):
+        return _bytes(self.scenario['version'])
+
+    def _Ra_Init(self):
+        self.initialized = True
+        return RA_E_OK
+
+    @classmethod
+    def _shutdown_active(cls):
+        """
+        @brief Stops the players of the active simulation at the exit of the
+               interpreter, i.e. before the modules are torn down
+        """
+        active = cls.active
+        if active is not None:
+            active._Ra_Shutdown()
+
+    def _Ra_Shutdown(self):
+        self._Ra_Receiving_Stop()
+        self._Ra_Replay_Abort()
+        self._Ra_Config_BDLReset()
+        self.initialized = False
+        return RA_E_OK
+
+    def _Ra_Receiving_Start(self):
+        if self._receiver is None:
+            s = self.scenario
+            self._clock_start = time.time()
+            self._receiver = self._start('ra-sim-receive', self._sources,
+                                         s['speed'], s['loop'])
+        return RA_E_OK
+
+    def _Ra_Receiving_Stop(self):
+        self._stop(self._receiver)
+        self._receiver = None
+        return RA_E_OK
+
+    def _Ra_Callback_Add(self, kind, id, c_fct):
+        self.readers[(_value(kind), _value(id))].append(c_fct)
+        return RA_E_OK
+
+    def _Ra_Callback_Remove(self, kind, id, c_fct):
+        readers = self.readers[(_value(kind), _value(id))]
+        if c_fct in readers:
+            readers.remove(c_fct)
+        return RA_E_OK
+
+    _Ra_Add_Reader = _Ra_Callback_Add
+    _Ra_Remove_Reader = _Ra_Callback_Remove
+
+    def _Ra_TraceLog_Callback_Add(self, c_fct):
+        self.tracelog_callbacks.append(c_fct)
+        return RA_E_OK
+
+    def _Ra_TraceLog_Callback_Remove(self, c_fct):
+        if c_fct in self.tracelog_callbacks:
+            self.tracelog_callbacks.remove(c_fct)
+        return RA_E_OK
+
+    def _Ra_Log_Callback_Add(self, c_fct):
+        self.log_callbacks.append(c_fct)
+        return RA_E_OK
+
+    def _Ra_Log_Callback_Remove(self):
+        del self.log_callbacks[:]
+        return RA_E_OK
+
+    def _Ra_Profiling_Callback_Add(self, c_fct):
+        self.profiling_callbacks.append(c_fct)
+        return RA_E_OK
+
+    def _Ra_Profiling_Callback_Remove(self):
+        del self.profiling_callbacks[:]
+        return RA_E_OK
+
+    def _Ra_Config_Trace(self, enable, host):
+        self.trace_enabled[_value(host)] = bool(_value(enable))
+        return RA_E_OK
+
+    def _Ra_Config_RoutingPort(self, port_id, mode):
+        self.routing[('port', _value(port_id))] = _value(mode)
+        return RA_E_OK
+
+    def _Ra_Config_RoutingSWC(self, swc_id, mode):
+        self.routing[('swc', _value(swc_id))] = _value(mode)
+        return RA_E_OK
+
+    def _Ra_Config_RoutingFrame(self, frame_id, mode):
+        self.routing[('frame', _value(frame_id))] = _value(mode)
+        return RA_E_OK
+
+    def _Ra_Config_RoutingReset(self):
+        self.routing.clear()
+        return RA_E_OK
+
+    def _Ra_gPTP_GetZGT(self, time_stamp):
+        time_stamp[0] = self.zgt()
+        return RA_E_OK
+
+    def _timer(self, function, *args):
+        timer = threading.Timer(self.scenario['bdl_delay'], function, args)
+        timer.daemon = True
+        self._timers = [t for t in self._timers if t.is_alive()] + [timer]
+        timer.start()
+
+    def _Ra_Config_BDLDownload(self, swc_id, data, length, c_fct):
+        swc_id, length = _value(swc_id), _value(length)
+        address = ctypes.cast(data, ctypes.c_void_p).value
+        self.bdl[swc_id] = ctypes.string_at(address, length) if length \
+            else b''
+        self._timer(c_fct, RA_E_OK)
+        return RA_E_OK
+
+    def _Ra_Config_BDLTriggerUpload(self, swc_id, c_fct):
+        block = self.bdl.get(_value(swc_id))
+
+        def upload():
+            if block is None:
+                c_fct(RA_E_NOT_OK, None, 0)
+            else:
+                buf = ctypes.create_string_buffer(block, max(len(block), 1))
+                c_fct(RA_E_OK, ctypes.addressof(buf), len(block))
+        self._timer(upload)
+        return RA_E_OK
+
+    def _Ra_Config_BDLReset(self):
+        for t in self._timers:
+            t.cancel()
+        self._timers = []
+        return RA_E_OK
+
+    def _Ra_Log_Config(self, log_file):
+        self._log_file = _value(log_file)
+        return RA_E_OK
+
+    def _Ra_Log_Start(self):
+        self._log_events = []
+        return RA_E_OK
+
+    def _Ra_Log_Stop(self, timeout=0):
+        events, self._log_events = self._log_events, None
+        if events is None or not self._log_file:
+            return RA_E_OK
+        path = self._log_file
+        if isinstance(path, bytes):
+            path = path.decode('latin-1')
+        frames = []
+        for i in range(0, len(events), 40):
+            batch = events[i:i + 40]
+            frames.append((batch[-1]['zgt'] / 1e6,
+                           pcap_reader.pack_frame(batch, i // 40)))
+        pcap_reader.write_pcap(path, frames)
+        return RA_E_OK
+
+    def _Ra_Replay_Config(self, replay_file, mode):
+        self._replay_file = _value(replay_file)
+        if isinstance(self._replay_file, bytes):
+            self._replay_file = self._replay_file.decode('latin-1')
+        return RA_E_OK
+
+    def _Ra_Replay_Start(self, leap_time):
+        self._Ra_Replay_Abort()
+        path = self._replay_file
+        s = self.scenario
+        self._replay = self._start(
+            'ra-sim-replay',
+            lambda: self._trace_events(pcap_reader.read_events(path)),
+            s['speed'], False)
+        return RA_E_OK
+
+    def _Ra_Replay_Wait(self, timeout_ms):
+        if self._replay is None:
+            return RA_E_OK
+        thread = self._replay[0]
+        thread.join(_value(timeout_ms) / 1000.0)
+        if thread.is_alive():
+            return RA_E_NOT_OK
+        self._replay = None
+        return RA_E_OK
+
+    def _Ra_Replay_Abort(self):
+        self._stop(self._replay)
+        self._replay = None
+        return RA_E_OK
+
+    def _loopback(self, kind, frame_id, address, length):
+        if not self.scenario['loopback']:
+            return
+        raw = ctypes.string_at(address, length) if length else b''
+        if kind == pcap_reader.TRACELOG_KIND and \
+                frame_id == pcap_reader.TRACELOG_ID:
+            header = pcap_reader.FRAME_HEADER.pack(
+                (kind << 20) | frame_id)
+            for e in pcap_reader.parse_frame(header + raw):
+                for _, _, event in self._trace_events([e], e['zgt']):
+                    self._emit(event)
+        elif self.readers.get((kind, frame_id)):
+            self.emit_port(frame_id, kind=kind, raw=raw)
+
+    def _Ra_Inject_Frame(self, frame_id, kind, data, length):
+        frame_id, kind, length = _value(frame_id), _value(kind), \
+            _value(length)
+        address = ctypes.cast(data, ctypes.c_void_p).value
+        self.frames.append(('inject', kind, frame_id,
+                            ctypes.string_at(address, length)))
+        self._loopback(kind, frame_id, address, length)
+        return RA_E_OK
+
+    def _Ra_Distribute_Frame(self, data):
+        address = ctypes.cast(data, ctypes.c_void_p).value
+        header = ctypes.c_uint32.from_address(address).value
+        kind, frame_id = (header >> 20) & 0x0F, header & 0xFFFFF
+        readers = self.readers.get((kind, frame_id))
+        # the frame size is known from the type of the registered reader
+        length = ctypes.sizeof(readers[0]._argtypes_[0]._type_) \
+            if readers else 0
+        self.frames.append(('distribute', kind, frame_id, header))
+        if readers:
+            self._loopback(kind, frame_id, address + 4, length)
+        return RA_E_OK
+
+
+# the players are daemon threads, which would otherwise run into the torn
+# down modules at the exit of the interpreter
+atexit.register(SimLib._shutdown_active)
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'SimLib'
+          , 'SimFunction'
+          , 'load_scenario'
+          , 'read_trace_csv']
+
+if __name__ == '__main__':
+    pass
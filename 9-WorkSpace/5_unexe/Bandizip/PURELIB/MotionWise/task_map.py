@@ -0,0 +1,210 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    task_map.py
+#
+# Purpose
+#    Request of the task ID to name mapping of a MotionWise host
+#
+# Revision Dates
+# --
+
+import os
+import re
+import time
+import json
+import logging
+import threading
+from MotionWise import pm_instrument
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT = 2.0       # max. time to wait for a complete mapping [s]
+RETRIES = 2         # number of repeated requests if the mapping is incomplete
+REQUEST_TRIGGER = 0x01
+
+
+class TaskMapHandshake(object):
+    """
+    Collects the task ID to name mapping messages of a host.
+
+    Every reply to a request starts with an announcement of the number of
+    entries (msg_expected). The entries are counted from the announcement on
+    (msg_counter), so a counter which does not increase marks a new
+    announcement. The entries are stored by task ID. Entries of repeated
+    requests with the same announced number are merged, i.e. a repeated
+    request only has to provide the entries which are still missing. The
+    mapping is complete if the number of different task IDs equals the
+    announced number. wait() blocks until the mapping is complete or the
+    deadline has passed. close() stops the collection of the messages.
+    """
+
+    def __init__(self, host_str):
+        self._host = host_str
+        self._cond = threading.Condition()
+        self._entries = {}  # task ID -> task name
+        self._expected = 0
+        self._counter = 0
+        pm_instrument.task_map_callback_add(self._task_map_cb)
+
+    def _task_map_cb(self, host, task_id, task_name, msg_counter, msg_expected,
+                     **signal):
+        if host != self._host: return
+        logger.debug("{} - {} ({}/{})".format(task_id, task_name, msg_counter,
+                                              msg_expected))
+        with self._cond:
+            if msg_counter <= self._counter and \
+                    msg_expected != self._expected:
+                # new announcement with a different number of entries
+                self._entries = {}
+            self._counter = msg_counter
+            self._expected = msg_expected
+            self._entries[task_id] = task_name
+            self._cond.notify_all()
+
+    def close(self):
+        """
+        @brief Removes the task map callback, later messages are ignored
+        """
+        pm_instrument.task_map_callback_remove(self._task_map_cb)
+
+    def expected(self):
+        """
+        @brief Returns the announced number of entries (0: not known yet)
+        """
+        with self._cond:
+            return self._expected
+
+    def missing(self):
+        """
+        @brief Returns the number of entries which have not been received yet.
+               If the number of expected entries is not known yet None is
+               returned.
+        """
+        with self._cond:
+            if self._expected <= 0:
+                return None
+            return max(0, self._expected - len(self._entries))
+
+    def complete(self):
+        """
+        @brief Returns True if the number of received task IDs equals the
+               announced number
+        """
+        with self._cond:
+            return self._expected > 0 and \
+                len(self._entries) == self._expected
+
+    def wait(self, timeout=TIMEOUT):
+        """
+        @brief Waits until the mapping is complete or timeout seconds have
+               passed.
+
+        @return: True if the mapping is complete
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            while not self.complete():
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def mapping(self):
+        """
+        @brief Returns the received mapping as dictionary task name -> task ID
+        """
+        with self._cond:
+            return dict((v, k) for k, v in self._entries.iteritems())
+
+
+def request(proxy, host_str, host_cfg_id, timeout=TIMEOUT, retries=RETRIES):
+    """
+    @brief Requests the task ID to name mapping from a host.
+
+    The request is repeated if the mapping is not complete after timeout
+    seconds. The RA lib only allows to request the complete mapping, entries
+    which have already been received are kept.
+
+    @return: (mapping task name -> task ID, True if the mapping contains the
+             announced number of tasks)
+    """
+    handshake = TaskMapHandshake(host_str)
+    proxy.config_log_sink('eth')
+    proxy.config_log_level(["info"])
+    proxy.config_log(0xfe, 1, 'info')
+    proxy.log_callback_add(pm_instrument.receive_event)
+    proxy.receiving_start()
+    try:
+        for attempt in xrange(0, retries + 1):
+            proxy.config_trace_set_trigger(REQUEST_TRIGGER, host_cfg_id)
+            if handshake.wait(timeout):
+                break
+            missing = handshake.missing()
+            logger.warning("task mapping of {} incomplete ({} entries missing)"
+                           ", attempt {}/{}".format(host_str,
+                           'unknown' if missing is None else missing,
+                           attempt + 1, retries + 1))
+    finally:
+        # reset logging
+        proxy.config_log_sink('uart')
+        proxy.config_log_level(["error", "warning", "info"])
+        proxy.log_callback_remove()
+        handshake.close()
+    mapping = handshake.mapping()
+    # a task name received for several task IDs makes the mapping incomplete
+    return mapping, handshake.complete() and \
+        len(mapping) == handshake.expected()
+
+
+class TaskMapCache(object):
+    """
+    Stores the last complete task mapping per host and IF-Set as JSON file.
+    """
+
+    def __init__(self, cache_dir):
+        self._dir = cache_dir
+
+    def _path(self, host_str, ifset):
+        name = re.sub(r'[^\w.-]', '_', 'task_map_{}_{}'.format(host_str, ifset))
+        return os.path.join(self._dir, name + '.json')
+
+    def load(self, host_str, ifset):
+        """
+        @return: cached mapping task name -> task ID or None
+        """
+        try:
+            with open(self._path(host_str, ifset), 'rb') as f:
+                d = json.load(f)
+        except (IOError, ValueError):
+            return None
+        if d.get('host') != host_str or d.get('ifset') != '{}'.format(ifset):
+            return None
+        return {str(k): int(v) for k, v in d['tasks'].iteritems()}
+
+    def save(self, host_str, ifset, mapping):
+        try:
+            if not os.path.isdir(self._dir):
+                os.makedirs(self._dir)
+            with open(self._path(host_str, ifset), 'wb') as f:
+                json.dump({ 'host': host_str
+                          , 'ifset': '{}'.format(ifset)
+                          , 'created': time.strftime('%Y-%m-%d %H:%M:%S')
+                          , 'tasks': mapping}
+                          , f, indent=1, sort_keys=True)
+        except (IOError, OSError):
+            logger.warning("task mapping cache could not be written to {}"
+                           .format(self._dir))
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'TaskMapHandshake'
+          , 'TaskMapCache'
+          , 'request']
+
+if __name__ == '__main__':
+    pass
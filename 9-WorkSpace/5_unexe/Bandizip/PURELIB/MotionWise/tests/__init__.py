@@ -0,0 +1,41 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    tests/__init__.py
+#
+# Purpose
+#    Unit tests of the MotionWise package
+#
+# Revision Dates
+# --
+
+"""
+Unit tests of the MotionWise package. Run them from the directory which
+contains the MotionWise package with
+
+    python -m unittest discover -s MotionWise/tests -t .
+"""
+
+import os
+
+_here = os.path.dirname(os.path.abspath(__file__))
+
+# data files of the installed package, the repository contains only a part
+DATA_DIRS = [ os.path.join(_here, '..', 'data')
+            , os.path.join(_here, '..', '..', '..', 'data', 'Lib',
+                           'site-packages', 'MotionWise', 'data')]
+
+
+def data_file(name):
+    """
+    @brief Returns the path of a data file of the package or None if it is
+           not available
+    """
+    for d in DATA_DIRS:
+        path = os.path.normpath(os.path.join(d, name))
+        if os.path.isfile(path):
+            return path
+    return None
@@ -0,0 +1,121 @@
+# -*- coding: iso-8859-15 -*-
+"""
+Persistent index of the contract headers (RA.ContractHeaders).
+"""
+
+import os
+import json
+import stat
+import shutil
+import cPickle
+import tempfile
+import unittest
+from MotionWise import RA
+
+RA_TYPE = """
+import ctypes
+
+class Frame_t(ctypes.Structure):
+    _fields_ = [('value', ctypes.c_uint8)]
+
+_SWC_functions = [('send_frame', [(Frame_t, 'frame')], ['frame_alias'])]
+SWC_swc_host_name = 'SSH'
+SWC_swc_to_frames = {1: (set([10]), set([11]))}
+SWC_frame_to_swcs = {10: (set([(1, 'rx')]), set()), 11: (set(), set([(1, 'tx')]))}
+ID2Type_Map = {7: Frame_t}
+element_to_id = {'frame': 7}
+"""
+
+
+class _RA(object):
+
+    def _verbose(self, message, *args, **kwargs):
+        pass
+
+    def _register_contract_header(self, swc, result, id_owner):
+        pass
+
+
+class ContractIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.dir = os.path.join(self.tmp, 'contract')
+        os.makedirs(os.path.join(self.dir, 'SWC'))
+        with open(os.path.join(self.dir, 'SWC', 'Ra_Type.py'), 'w') as f:
+            f.write(RA_TYPE)
+        self.env = dict((k, os.environ.get(k)) for k in ['HOME',
+                                                         'LOCALAPPDATA'])
+        os.environ.pop('LOCALAPPDATA', None)
+        os.environ['HOME'] = os.path.join(self.tmp, 'home')
+
+    def tearDown(self):
+        for k, v in self.env.iteritems():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        shutil.rmtree(self.tmp)
+
+    def _scan(self):
+        headers = RA.ContractHeaders(_RA(), self.dir, ['SWC'])
+        return headers, headers.scan()
+
+    def test_json_round_trip(self):
+        first, indexed = self._scan()
+        self.assertEqual(indexed, 1)
+        with open(first.index_file, 'rb') as f:
+            self.assertEqual(json.load(f)['version'],
+                             RA.RA_CONTRACT_INDEX_VERSION)
+        second, indexed = self._scan()
+        self.assertEqual(indexed, 0)
+        self.assertEqual(second.entries, first.entries)
+        entry = second.entries['SWC']
+        self.assertEqual(entry['frame_to_swcs'][10], (set([(1, 'rx')]), set()))
+        self.assertEqual(entry['functions'], [('send_frame', ['frame_alias'])])
+        self.assertEqual(second.function_owner['frame_alias'], 'SWC')
+
+    def test_pickle_is_not_loaded(self):
+        with open(os.path.join(self.dir, RA.RA_CONTRACT_INDEX), 'wb') as f:
+            cPickle.dump({'version': RA.RA_CONTRACT_INDEX_VERSION,
+                          'entries': {}}, f)
+        _, indexed = self._scan()
+        self.assertEqual(indexed, 1)
+
+    def test_invalid_entries_ignored(self):
+        headers, _ = self._scan()
+        with open(headers.index_file, 'rb') as f:
+            index = json.load(f)
+        entries = RA._index_decode(index['entries'])
+        # entry which refers to a file outside of the SW-C folder
+        entries['SWC']['path'] = os.path.join(self.tmp, 'evil.py')
+        entries['OTHER'] = {'path': 1}
+        index['entries'] = RA._index_encode(entries)
+        with open(headers.index_file, 'wb') as f:
+            json.dump(index, f)
+        headers, indexed = self._scan()
+        self.assertEqual(indexed, 1)
+        self.assertEqual(headers.entries['SWC']['path'],
+                         os.path.join(self.dir, 'SWC', 'Ra_Type.py'))
+        self.assertRaises(ValueError, RA._index_decode, {'object': []})
+
+    def test_fallback_in_user_folder(self):
+        # the index cannot be written to the contract header folder
+        os.mkdir(os.path.join(self.dir, RA.RA_CONTRACT_INDEX))
+        headers, _ = self._scan()
+        user_dir = os.path.join(self.tmp, 'home', '.cache', 'MotionWise')
+        self.assertEqual(os.path.dirname(headers.index_file), user_dir)
+        if hasattr(os, 'getuid'):
+            self.assertEqual(stat.S_IMODE(os.stat(user_dir).st_mode), 0o700)
+        _, indexed = self._scan()
+        self.assertEqual(indexed, 0)
+
+    def test_insecure_user_folder_not_used(self):
+        user_dir = os.path.join(self.tmp, 'home', '.cache', 'MotionWise')
+        os.makedirs(user_dir)
+        os.chmod(user_dir, 0o777)
+        self.assertEqual(RA._user_cache_dir() is None, hasattr(os, 'getuid'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+# -*- coding: iso-8859-15 -*-
+"""
+Buffering and filtering of the log records sent to the log process.
+"""
+
+import time
+import logging
+import unittest
+from MotionWise import log_proc
+
+
+class _Queue(object):
+
+    def __init__(self):
+        self.items = []
+
+    def put_nowait(self, item):
+        self.items.append(item)
+
+
+class _Arg(object):
+    formatted = 0
+
+    def __str__(self):
+        _Arg.formatted += 1
+        return 'arg'
+
+
+def _record(level, msg, *args):
+    return logging.LogRecord('test', level, __file__, 1, msg, args, None)
+
+
+class QueueHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = _Queue()
+        self.handler = log_proc.QueueHandler(self.queue, logging.WARNING,
+                                             flush_interval=0.1)
+
+    def tearDown(self):
+        self.handler.close()
+
+    def test_below_level_not_formatted(self):
+        _Arg.formatted = 0
+        self.handler.handle(_record(logging.INFO, 'info %s', _Arg()))
+        self.assertEqual(_Arg.formatted, 0)
+        self.handler.handle(_record(logging.INFO, '$cconsole %s', _Arg()))
+        self.assertEqual(_Arg.formatted, 1)
+        self.assertEqual([r.msg for b in self.queue.items for r in b],
+                         ['$cconsole arg'])
+
+    def test_flush_timer(self):
+        self.handler.handle(_record(logging.WARNING, 'warning %d', 1))
+        self.assertEqual(self.queue.items, [])
+        deadline = time.time() + 2.0
+        while not self.queue.items and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual([r.msg for b in self.queue.items for r in b],
+                         ['warning 1'])
+
+    def test_errors_sent_immediately(self):
+        self.handler.handle(_record(logging.WARNING, 'warning'))
+        self.handler.handle(_record(logging.ERROR, 'error'))
+        self.assertEqual([[r.msg for r in b] for b in self.queue.items],
+                         [['warning', 'error']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+# -*- coding: iso-8859-15 -*-
+"""
+Native reader of recorded trace pcaps, tested with synthetic recordings.
+"""
+
+import os
+import struct
+import shutil
+import tempfile
+import unittest
+from MotionWise import pcap_reader as PR
+
+TRACE = [ {'host': 2, 'swc': 7, 'zgt': 1000 + i, 'count': i, 'core': i % 2,
+           'type': i % 4, 'data': (i << 48) | 0x1234}
+          for i in xrange(10)]
+TASK_MAP = { 'host': 2, 'swc': 7, 'zgt': 999, 'count': '', 'core': 0
+           , 'type': 0xFF, 'data': b'$SSH_TM|1|Task_A|2|Task_B'}
+
+
+def _log_frame(string, parameters=b'', host=2):
+    return b''.join([ PR.FRAME_HEADER.pack((PR.TRACELOG_KIND << 20)
+                                           | PR.TRACELOG_ID)
+                    , PR.TRACELOG_MESSAGE.pack(PR.ENTRY_TYPE_LOG_TEXT, host,
+                                               7, 999, 0)
+                    , PR.LOG_NOT_CODED.pack(0, len(string)), string
+                    , chr(len(parameters)), parameters])
+
+
+def _pcapng(frames, tsresol=None):
+    """
+    @brief Converts a classic pcap file written by write_pcap() to pcapng
+
+    @param tsresol: value of the if_tsresol option (None: option not written,
+                    microseconds)
+    """
+    def block(block_type, body):
+        body += b'\0' * (-len(body) % 4)
+        return struct.pack(b"<II", block_type, len(body) + 12) + body + \
+            struct.pack(b"<I", len(body) + 12)
+    idb = struct.pack(b"<HHI", PR.LINKTYPE_ETHERNET, 0, 65535)
+    ticks = 1e6
+    if tsresol is not None:
+        idb += struct.pack(b"<HHB3xHH", PR.PCAPNG_IF_TSRESOL, 1, tsresol,
+                           PR.PCAPNG_OPT_ENDOFOPT, 0)
+        ticks = 2.0 ** (tsresol & 0x7F) if tsresol & 0x80 else 10.0 ** tsresol
+    out = [ block(PR.PCAPNG_SHB, struct.pack(b"<IHHq",
+                  PR.PCAPNG_BYTE_ORDER_MAGIC, 1, 0, -1))
+          , block(PR.PCAPNG_IDB, idb)]
+    for position, ts, link_type, data in frames:
+        us = int(round(ts * ticks))
+        out.append(block(PR.PCAPNG_EPB, struct.pack(b"<IIIII", 0, us >> 32,
+                         us & 0xFFFFFFFF, len(data), len(data)) + data))
+    return b''.join(out)
+
+
+class PcapReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.pcap = os.path.join(self.tmp, 'trace.pcap')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _write(self, batches):
+        PR.write_pcap(self.pcap, ((10.0 + i, PR.pack_frame(b, i))
+                                  for i, b in enumerate(batches)))
+
+    def test_frame_round_trip(self):
+        frame = PR.pack_frame([TASK_MAP] + TRACE, 5)
+        self.assertEqual(PR.parse_frame(frame), [TASK_MAP] + TRACE)
+        self.assertEqual(PR.FRAME_HEADER.unpack_from(frame)[0] >> 24, 5)
+
+    def test_host_filter(self):
+        other = dict(TRACE[0], host=3)
+        frame = PR.pack_frame([other, TRACE[1]])
+        self.assertEqual(PR.parse_frame(frame, 2), [TRACE[1]])
+        self.assertEqual(PR.parse_frame(frame, 3), [other])
+
+    def test_other_frames_ignored(self):
+        frame = PR.pack_frame(TRACE)
+        header = PR.FRAME_HEADER.unpack_from(frame)[0]
+        for h in (header + 1, header ^ (1 << 20)):
+            self.assertEqual(PR.parse_frame(PR.FRAME_HEADER.pack(h) +
+                                            frame[4:]), [])
+
+    def test_log_string_reconstructed(self):
+        # text behind a NUL is not part of reconstructed_string
+        events = PR.parse_frame(_log_frame(b'$SSH_TM|1|Task_A\0junk'))
+        self.assertEqual([e['data'] for e in events], [b'$SSH_TM|1|Task_A'])
+        # other log texts and texts with parameters are ignored
+        self.assertEqual(PR.parse_frame(_log_frame(b'hello')), [])
+        self.assertEqual(PR.parse_frame(_log_frame(b'$SSH_TM|%d',
+                                                   b'\x01\0\0\0')), [])
+
+    def test_entries_behind_log_entry(self):
+        frame = _log_frame(b'other', b'\x01\x02') + PR.pack_frame(TRACE)[4:]
+        self.assertEqual(PR.parse_frame(frame), TRACE)
+
+    def test_pcap_round_trip(self):
+        self._write([[TASK_MAP] + TRACE[:4], TRACE[4:]])
+        self.assertEqual(list(PR.read_events(self.pcap)), [TASK_MAP] + TRACE)
+        frames = list(PR.read_frames(self.pcap, 2))
+        self.assertEqual([f[1] for f in frames], [10.0, 11.0])
+        # reading from a position continues at that packet
+        self.assertEqual(list(PR.read_frames(self.pcap, 2, frames[1][0]))[0][3],
+                         TRACE[4:])
+
+    def test_pcapng(self):
+        self._write([TRACE[:4], TRACE[4:]])
+        pcapng = os.path.join(self.tmp, 'trace.pcapng')
+        with open(pcapng, 'wb') as f:
+            f.write(_pcapng(PR.read_packets(self.pcap)))
+        self.assertEqual(list(PR.read_events(pcapng)), TRACE)
+        frames = list(PR.read_frames(pcapng))
+        self.assertAlmostEqual(frames[1][1], 11.0)
+        self.assertEqual(list(PR.read_frames(pcapng, None, frames[1][0]))[0][3],
+                         TRACE[4:])
+
+    def test_pcapng_tsresol(self):
+        self._write([TRACE[:4], TRACE[4:]])
+        pcapng = os.path.join(self.tmp, 'trace.pcapng')
+        for tsresol in (9, 3, 0x80 | 20):
+            with open(pcapng, 'wb') as f:
+                f.write(_pcapng(PR.read_packets(self.pcap), tsresol))
+            frames = list(PR.read_frames(pcapng))
+            self.assertEqual([round(f[1], 3) for f in frames], [10.0, 11.0])
+            self.assertEqual(frames[1][3], TRACE[4:])
+
+    def test_not_a_pcap(self):
+        with open(self.pcap, 'wb') as f:
+            f.write(b'\0' * 32)
+        self.assertRaises(PR.PcapError, list, PR.read_events(self.pcap))
+
+    def test_truncated_packet(self):
+        self._write([TRACE[:4], TRACE[4:]])
+        with open(self.pcap, 'rb+') as f:
+            f.truncate(os.path.getsize(self.pcap) - 3)
+        self.assertEqual(list(PR.read_events(self.pcap)), TRACE[:4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# -*- coding: iso-8859-15 -*-
+"""
+Comparison report of a batch analysis.
+"""
+
+import os
+import csv
+import glob
+import shutil
+import argparse
+import tempfile
+import unittest
+from MotionWise import pm_batch
+from MotionWise import pm_measurement as PM
+
+
+class BatchReportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _summary(self, label, rows):
+        out = os.path.join(self.tmp, label)
+        os.makedirs(os.path.join(out, 'output'))
+        path = os.path.join(out, 'output', '2020-01-01_00-00-00_MotionWise-'
+                            'PMT_statistical-analysis-summary_task.csv')
+        with open(path, 'wb') as f:
+            f.write("#HEADER {}\n".format(PM.DELIMITER.join(
+                ['core', 'name', 'max'])))
+            for r in rows:
+                f.write(PM.DELIMITER.join(r) + '\n')
+        return label, out
+
+    def _report(self, results, baseline, failed=None):
+        files = pm_batch.report(results, baseline, self.tmp, failed=failed)
+        self.assertEqual(len(files), 1)
+        with open(files[0], 'rb') as f:
+            lines = list(f)
+        header = [l for l in lines if l.startswith('#HEADER')][0]
+        rows = list(csv.reader([l for l in lines if not l.startswith('#')],
+                               delimiter=PM.DELIMITER))
+        return lines, header[len('#HEADER'):].strip().split(PM.DELIMITER), rows
+
+    def test_deltas(self):
+        results = [self._summary('a', [['0', 'T1', '10']]),
+                   self._summary('b', [['0', 'T1', '12']])]
+        _, header, rows = self._report(results, 'a')
+        self.assertEqual(header, ['core', 'name', 'measurement', 'a', 'b',
+                                  'delta_b'])
+        self.assertEqual(rows, [['0', 'T1', 'max', '10', '12', '2.000000']])
+
+    def test_failed_recording(self):
+        results = [self._summary('a', [['0', 'T1', '10']]),
+                   self._summary('b', [['0', 'T1', '12']]),
+                   ('c', os.path.join(self.tmp, 'c'))]
+        lines, _, rows = self._report(results, 'a', {'c': 'broken'})
+        self.assertIn('#failed c: broken\n', lines)
+        self.assertEqual(rows, [['0', 'T1', 'max', '10', '12', pm_batch.FAILED,
+                                 '2.000000', pm_batch.FAILED]])
+
+    def test_failed_baseline(self):
+        # partial output of a failed recording is not used
+        results = [self._summary('a', [['0', 'T1', '10']]),
+                   self._summary('b', [['0', 'T1', '12']])]
+        lines, _, rows = self._report(results, 'a', {'a': 'broken'})
+        self.assertIn('#failed a: broken\n', lines)
+        self.assertEqual(rows, [['0', 'T1', 'max', pm_batch.FAILED, '12',
+                                 pm_batch.FAILED]])
+
+
+class BatchRunTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_find_recordings(self):
+        for fn in ('x.csv', 'y.pcap', 'z.txt'):
+            open(os.path.join(self.tmp, fn), 'wb').close()
+        manifest = os.path.join(self.tmp, 'batch.txt')
+        with open(manifest, 'wb') as f:
+            f.write("# comment\nref = x.csv\ny.pcap\nref = y.pcap\n")
+        self.assertEqual([l for l, _ in pm_batch.find_recordings(self.tmp)],
+                         ['x', 'y'])
+        self.assertEqual(pm_batch.find_recordings(manifest),
+                         [('ref', os.path.join(self.tmp, 'x.csv')),
+                          ('y', os.path.join(self.tmp, 'y.pcap')),
+                          ('ref_1', os.path.join(self.tmp, 'y.pcap'))])
+
+    def test_pcap_reader_respected(self):
+        open(os.path.join(self.tmp, 'y.pcap'), 'wb').close()
+        args = argparse.Namespace(batch=self.tmp, baseline=None,
+                                  pcap_reader='ra', host='SSH',
+                                  out_path=self.tmp)
+        self.assertEqual(pm_batch.run(args, None), [])
+        self.assertFalse(glob.glob(os.path.join(self.tmp, 'output')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+# -*- coding: iso-8859-15 -*-
+"""
+Statistics of the RA capture path: histograms, arrival latency, drop reasons
+and the written statistics.
+"""
+
+import unittest
+from StringIO import StringIO
+from MotionWise import pm_capture
+from MotionWise.tests.test_pm_profile import _Clock
+
+TRACE = 3
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_buckets(self):
+        h = pm_capture.Histogram()
+        for us in (-5, 0, 0.9, 1, 1.5, 2, 3, 4, 1023, 1024, 1 << 40):
+            h.add(us)
+        expected = [0] * pm_capture.HISTOGRAM_BUCKETS
+        expected[0] = 3     # [0, 1)
+        expected[1] = 2     # [1, 2)
+        expected[2] = 2     # [2, 4)
+        expected[3] = 1     # [4, 8)
+        expected[10] = 1    # [512, 1024)
+        expected[11] = 1    # [1024, 2048)
+        expected[-1] = 1    # the last bucket has no upper limit
+        self.assertEqual(h.buckets, expected)
+        self.assertEqual(h.count, 11)
+        self.assertEqual(h.max, 1 << 40)
+
+    def test_percentile(self):
+        h = pm_capture.Histogram()
+        self.assertIsNone(h.percentile(50))
+        self.assertIsNone(h.snapshot()['mean'])
+        for us in (1, 3, 100):
+            h.add(us)
+        # upper limit of the bucket, at most the maximum
+        self.assertEqual(h.percentile(30), 2)
+        self.assertEqual(h.percentile(50), 4)
+        self.assertEqual(h.percentile(99), 100)
+        s = h.snapshot()
+        self.assertEqual((s['count'], s['mean'], s['p50'], s['p99'],
+                          s['max']), (3, 34.667, 4, 100, 100))
+
+
+class CaptureStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.wall = _Clock(10.0)
+        self.timer = _Clock()
+        self._time, self._timer = pm_capture.time, pm_capture._clock
+        pm_capture.time, pm_capture._clock = self.wall, self.timer
+        self.stats = pm_capture.CaptureStats()
+
+    def tearDown(self):
+        pm_capture.time, pm_capture._clock = self._time, self._timer
+
+    def _add(self, host, status=pm_capture.FORWARDED, zgt=0, entry_type=TRACE,
+             event_type=0, callback_us=0):
+        self.timer.now = callback_us / 1e6
+        self.stats.add(host, entry_type, event_type, status, zgt, 0.0)
+
+    def test_latency_per_host(self):
+        self.wall.now = 12.0
+        self._add(1, zgt=11000000)
+        # the ZGT of host 2 is 4s behind the one of host 1
+        self._add(2, zgt=7000000)
+        self._add(1, zgt=11000100)  # new minimum of host 1
+        self._add(1, zgt=10999000)
+        self._add(2, zgt=6999990)
+        self._add(1)                # no ZGT, not accounted
+        lat = self.stats.snapshot()['latency']
+        self.assertEqual(lat['count'], 5)
+        self.assertEqual(lat['max'], 1100)
+        self.assertEqual(lat['buckets'][0], 3)
+        self.assertEqual(lat['buckets'][4], 1)      # 10us
+        self.assertEqual(lat['buckets'][11], 1)     # 1100us
+
+    def test_dropped(self):
+        self._add(2, callback_us=5)
+        self._add(2, pm_capture.DISCARDED, entry_type=1, event_type=None)
+        self._add(1, pm_capture.OTHER_HOST)
+        self._add(2, pm_capture.SHED)
+        self._add(2, pm_capture.SHED)
+        self._add(2, pm_capture.CLOSED)
+        s = self.stats.snapshot()
+        self.assertEqual(s['records'], 6)
+        self.assertEqual(s['forwarded'], 1)
+        self.assertEqual(s['dropped'], { pm_capture.OTHER_HOST: 1
+                                       , pm_capture.DISCARDED: 1
+                                       , pm_capture.CLOSED: 1
+                                       , pm_capture.SHED: 2})
+        self.assertEqual([(r['host'], r['entry_type'], r['event_type'],
+                           r['records'], r['forwarded'])
+                          for r in s['per_type']],
+                         [(1, TRACE, 0, 1, 0), (2, 1, None, 1, 0),
+                          (2, TRACE, 0, 4, 1)])
+        self.assertEqual(s['callback']['count'], 6)
+        self.assertEqual(s['callback']['buckets'][3], 1)    # 5us
+
+    def test_write_and_summary(self):
+        self.wall.now = 12.0
+        for i in xrange(3):
+            self._add(2, zgt=11000000 - 100 * i, callback_us=2)
+        self._add(1, pm_capture.OTHER_HOST, event_type=4, callback_us=2)
+        s = self.stats.snapshot()
+        self.assertEqual(s['duration'], 2.0)
+        self.assertEqual(s['records_per_s'], 2.0)
+
+        out = StringIO()
+        pm_capture.write(s, out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], '#HEADER host,entry_type,event_type,'
+                                   'records,forwarded,records_per_s')
+        self.assertEqual(lines[1:3], ['1,3,4,1,0,0.5', '2,3,0,3,3,1.5'])
+        self.assertEqual(lines[3], '#dropped closed=0,discarded=0,host=1,'
+                                   'shed=0')
+        header = lines[4][len('#HEADER '):].split(',')
+        self.assertEqual(header[:7], ['histogram', 'count', 'mean', 'p50',
+                                      'p90', 'p99', 'max'])
+        self.assertEqual(header[7:10], ['<1us', '<2us', '<4us'])
+        self.assertEqual(len(header), 7 + pm_capture.HISTOGRAM_BUCKETS)
+        callback = dict(zip(header, lines[5].split(',')))
+        latency = dict(zip(header, lines[6].split(',')))
+        self.assertEqual(callback['histogram'], 'callback[us]')
+        self.assertEqual((callback['count'], callback['<4us']), ('4', '4'))
+        self.assertEqual(latency['histogram'], 'latency[us]')
+        self.assertEqual((latency['count'], latency['mean'], latency['max'],
+                          latency['<1us'], latency['<128us'],
+                          latency['<256us']),
+                         ('3', '100.0', '200', '1', '1', '1'))
+        self.assertEqual(len(lines), 7)
+
+        self.assertEqual(pm_capture.summary(s),
+                         "capture: 4 records (2/s), forwarded 3, dropped "
+                         "closed 0, discarded 0, host 1, shed 0, callback "
+                         "mean 2.0us p99 2us max 2us, latency p99 200us max "
+                         "200us")
+        empty = pm_capture.CaptureStats().snapshot()
+        self.assertIn('callback mean n/a', pm_capture.summary(empty))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+# -*- coding: iso-8859-15 -*-
+"""
+Checkpoints of the analysis state: a replay resumed from a checkpoint must
+produce the same output as an uninterrupted replay.
+"""
+
+import os
+import glob
+import shutil
+import argparse
+import tempfile
+import unittest
+from MotionWise import pm_synth
+from MotionWise import pm_checkpoint
+from MotionWise import pm_instrument
+from MotionWise import RA_Model
+from MotionWise import file_parser as FP
+from MotionWise.pm_measurement import HOSTS
+from MotionWise.tests.test_pm_parallel import DATA, _Names
+from MotionWise.MotionWise_perf_proxy import _Model, _CsvConnection
+from MotionWise.MotionWise_perf_client import Client
+
+
+class _Listener(object):
+
+    def __init__(self, value=0):
+        self.value = value
+
+    def get_state(self):
+        return self.value
+
+    def merge_state(self, state):
+        self.value += state
+
+
+@unittest.skipIf(None in DATA.values(), "data files of the package missing")
+class CheckpointTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.csv = os.path.join(cls.tmp, 'trace.csv')
+        pm_synth.generate(cls.csv, 'SSH', _Model(RA_Model),
+                          FP.parse_schedule_generation_info_file(
+                              DATA['sched']),
+                          None, seconds=6, seed=7)
+        # the interrupted replay ends after the first part of the recording
+        with open(cls.csv, 'rb') as f:
+            lines = f.readlines()
+        cls.part = os.path.join(cls.tmp, 'part.csv')
+        with open(cls.part, 'wb') as f:
+            f.writelines(lines[:len(lines) * 2 // 5])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def tearDown(self):
+        pm_instrument.detach_callbacks()
+        pm_instrument.reset()
+
+    def _replay(self, name, csv_file, **options):
+        pm_instrument.detach_callbacks()
+        pm_instrument.reset()
+        out = os.path.join(self.tmp, name)
+        os.makedirs(out)
+        args = argparse.Namespace(
+            host='SSH', csv_file=csv_file, pcap_file=None, out_path=out,
+            ssh_sched_info=DATA['sched'], sw_layers=DATA['layers'],
+            aph_taskmap1=DATA['tm1'], aph_taskmap2=DATA['tm2'],
+            aph_driver_ids=DATA['drivers'], msexcel_compat=False,
+            version='test', output_trace_events_off=False,
+            trace_statistics=True, trace_drivers=False, parallel=None,
+            startup=False, pcap_reader='ra', checkpoint=None, resume=None)
+        vars(args).update(options)
+        Client(_Names(), _CsvConnection(csv_file), args, None).start()
+        return out
+
+    def _contents(self, out):
+        files = {}
+        for path in glob.glob(os.path.join(out, 'output', '*.csv')):
+            # the file names start with the time of the replay
+            name = os.path.basename(path).split('_', 2)[2]
+            with open(path, 'rb') as f:
+                files[name] = [l for l in f if not l.startswith('#')]
+        return files
+
+    def test_save_load_restore(self):
+        path = os.path.join(self.tmp, 'test' + pm_checkpoint.CHECKPOINT_SUFFIX)
+        host_id = HOSTS['SSH']['id']
+        pm_instrument.receive_event({ 'host': host_id, 'swc': 0, 'zgt': 1000
+                                    , 'count': 0, 'core': 0, 'type': 2
+                                    , 'data': 0})
+        state = pm_checkpoint.collect({'a': _Listener(3), 'b': object()},
+                                      host_id, events=1)
+        pm_checkpoint.save(path, state)
+        self.assertFalse(os.path.exists(path + '.tmp'))
+        loaded = pm_checkpoint.load(path)
+        self.assertEqual(loaded['meta']['events'], 1)
+        self.assertEqual(loaded['listeners'], {'a': 3})
+
+        # the event is kept in the sequence buffer of the host
+        pm_instrument.reset()
+        hosts = pm_instrument.interface.hosts
+        listeners = {'a': _Listener(2)}
+        pm_checkpoint.restore(loaded, listeners)
+        self.assertEqual(listeners['a'].value, 5)
+        self.assertIsNone(hosts[host_id]._sequence_cnt_buffer[0])
+        pm_checkpoint.restore(loaded, listeners, host_id)
+        self.assertEqual(hosts[host_id]._sequence_cnt_buffer[0].time, 1000)
+
+        for content in (b'', b'no checkpoint', b'\x80\x02}q\x01.'):
+            with open(path, 'wb') as f:
+                f.write(content)
+            self.assertRaises(ValueError, pm_checkpoint.load, path)
+
+    def test_resume_same_output(self):
+        full = self._contents(self._replay('uninterrupted', self.csv))
+        out = self._replay('interrupted', self.part, checkpoint=3600)
+        checkpoint, = glob.glob(os.path.join(out, 'checkpoint', '*' +
+                                             pm_checkpoint.CHECKPOINT_SUFFIX))
+        meta = pm_checkpoint.load(checkpoint)['meta']
+        self.assertTrue(meta['offline'])
+        self.assertEqual((meta['time_from'], meta['time_to']), (None, None))
+        self.assertGreater(meta['events'], 0)
+        interrupted = self._contents(out)
+        resumed = self._contents(self._replay('resumed', self.csv,
+                                              resume=checkpoint))
+        self.assertTrue(full)
+        self.assertEqual(sorted(full), sorted(resumed))
+        for name in full:
+            if 'trace' in name:
+                # rows of the sampling periods are written during the replay
+                self.assertTrue(interrupted[name])
+                self.assertEqual(full[name],
+                                 interrupted[name] + resumed[name], name)
+            else:
+                self.assertEqual(full[name], resumed[name], name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+# -*- coding: iso-8859-15 -*-
+"""
+Time index of recordings: building, the sidecar file, time windows and the
+extraction of sub-recordings.
+"""
+
+import os
+import json
+import time
+import shutil
+import base64
+import cPickle
+import tempfile
+import unittest
+from MotionWise import pm_synth
+from MotionWise import pm_index
+from MotionWise import pm_instrument
+from MotionWise import RA_Model
+from MotionWise import file_parser as FP
+from MotionWise.pm_measurement import HOSTS
+from MotionWise.tests import data_file
+from MotionWise.MotionWise_perf_proxy import _Model
+
+SCHED = data_file('generation_info_schedule_SSH.csv')
+HOST_ID = HOSTS['SSH']['id']
+INTERVAL = 1000000
+WALL_CLOCK_DELTA = 5000  # the frames of the generator span a few ms
+
+
+class _Exploit(object):
+    """
+    Pickled object which creates a file when it is unpickled
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return (open, (self.path, 'w'))
+
+
+@unittest.skipIf(SCHED is None, "data files of the package missing")
+class IndexTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        gen_info = FP.parse_schedule_generation_info_file(SCHED)
+        cls.recordings = {}
+        for suffix in ('csv', 'pcap'):
+            path = os.path.join(cls.tmp, 'trace.' + suffix)
+            pm_synth.generate(path, 'SSH', _Model(RA_Model), gen_info, None,
+                              seconds=4, seed=5)
+            cls.recordings[suffix] = path
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def setUp(self):
+        # private cache folder with the key of the index files
+        self._env = os.environ.get('LOCALAPPDATA')
+        os.environ['LOCALAPPDATA'] = os.path.join(self.tmp, 'cache')
+
+    def tearDown(self):
+        if self._env is None:
+            del os.environ['LOCALAPPDATA']
+        else:
+            os.environ['LOCALAPPDATA'] = self._env
+        for path in self.recordings.values():
+            if os.path.exists(path + pm_index.INDEX_SUFFIX):
+                os.remove(path + pm_index.INDEX_SUFFIX)
+        pm_instrument.set_window()
+        pm_instrument.reset()
+
+    def _index(self, suffix='csv'):
+        index = pm_index.Index(self.recordings[suffix], HOST_ID)
+        index.build(INTERVAL)
+        self.assertTrue(index.save())
+        return index
+
+    def _load(self, suffix='csv'):
+        return pm_index.Index(self.recordings[suffix], HOST_ID).load()
+
+    def _edit(self, fun, suffix='csv'):
+        path = self.recordings[suffix] + pm_index.INDEX_SUFFIX
+        with open(path, 'rb') as f:
+            d = json.load(f)
+        fun(d)
+        with open(path, 'wb') as f:
+            json.dump(d, f)
+
+    def test_build_and_load(self):
+        for suffix in ('csv', 'pcap'):
+            index = self._index(suffix)
+            self.assertGreater(len(index.checkpoints), 3)
+            self.assertEqual([c[0] for c in index.checkpoints[2:]],
+                             sorted(c[0] for c in index.checkpoints[2:]))
+            loaded = pm_index.Index(self.recordings[suffix], HOST_ID)
+            self.assertTrue(loaded.load())
+            self.assertEqual(loaded.checkpoints, index.checkpoints)
+            self.assertEqual(loaded.task_map, index.task_map)
+            self.assertEqual((loaded.start, loaded.end),
+                             (index.start, index.end))
+
+    def test_find(self):
+        index = self._index()
+        lo = index.start + 2500000
+        cp = index.find(lo)
+        self.assertLess(cp[0], lo)
+        self.assertGreaterEqual(cp[0], lo - INTERVAL)
+        self.assertEqual(index.find(index.start)[0], -1)
+
+    def test_parse_time(self):
+        index = self._index()
+        self.assertEqual(index.parse_time('2s'), index.start + 2000000)
+        self.assertEqual(index.parse_time(' 12345 '), 12345)
+        self.assertIsNone(index.parse_time(None))
+        self.assertRaises(ValueError, index.parse_time, 'x')
+        # wall-clock times need the time stamps of a pcap file
+        self.assertRaises(ValueError, index.parse_time, '@10')
+        self.assertRaises(ValueError, pm_index.check_time, '@x')
+
+    def test_wall_clock(self):
+        # the generator records the packets at their ZGT [s]
+        index = self._index('pcap')
+        for zgt in (index.start, index.start + 200000, index.start + 1500000,
+                    index.end):
+            self.assertAlmostEqual(index.parse_time('@{}'.format(zgt / 1e6)),
+                                   zgt, delta=WALL_CLOCK_DELTA)
+        loaded = pm_index.Index(index.path, HOST_ID)
+        self.assertTrue(loaded.load())
+        self.assertEqual(loaded.wall_clock, index.wall_clock)
+        local = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(1357000000))
+        self.assertEqual(pm_index.parse_wall_clock(local + '.25'),
+                         1357000000.25)
+        self.assertIsNone(pm_index.parse_wall_clock('2820s'))
+
+    def test_invalid_files_rebuilt(self):
+        index = self._index()
+        path = index.path + pm_index.INDEX_SUFFIX
+        with open(path, 'rb') as f:
+            content = f.read()
+        for data in (content[:len(content) // 2], b'[]', b'{"version": 3}',
+                     cPickle.dumps({'version': 3}), b''):
+            with open(path, 'wb') as f:
+                f.write(data)
+            self.assertFalse(self._load())
+        os.remove(path)
+        self.assertFalse(self._load())
+        index = pm_index.open_index(index.path, HOST_ID)
+        self.assertTrue(self._load())
+
+    def test_planted_index(self):
+        self._index()
+        marker = os.path.join(self.tmp, 'exploited')
+        state = base64.b64encode(cPickle.dumps(_Exploit(marker)))
+
+        def plant(d):
+            d['index']['checkpoints'][1][3] = state
+        self._edit(plant)
+        self.assertFalse(self._load())
+        conn = pm_index.WindowConnection(self.recordings['csv'], HOST_ID,
+                                         '2s', '3s')
+        while conn.poll():
+            conn.recv()
+        conn.close()
+        self.assertFalse(os.path.exists(marker))
+        # an index written by another user has been written with another key
+        os.remove(os.path.join(self.tmp, 'cache', 'MotionWise',
+                               pm_index.INDEX_KEY))
+        self.assertFalse(self._load())
+
+    def test_stale_index(self):
+        self._index()
+
+        def stale(d):
+            d['index']['stamp'][0] += 1
+        self._edit(stale)
+        self.assertFalse(self._load())
+
+    def test_window_connection(self):
+        index = self._index()
+        lo, hi = index.start + 2000000, index.start + 3000000
+        conn = pm_index.WindowConnection(index.path, HOST_ID, '2s', '3s')
+        events = []
+        while conn.poll():
+            events.append(conn.recv())
+        conn.close()
+        self.assertRaises(EOFError, conn.recv)
+        n = len(index.task_map)
+        self.assertEqual(events[:n], index.task_map)
+        zgt = [int(e['zgt']) for e in events[n:]]
+        self.assertTrue(all(int(e['type']) != 0xFF for e in events[n:]))
+        # the replay continues behind the events in the snapshot of the
+        # checkpoint in front of the window
+        self.assertGreaterEqual(min(zgt), index.find(lo)[0])
+        self.assertEqual(events[n:], [e for _, e in index.events(lo, hi)
+                                      if int(e['type']) != 0xFF])
+        self.assertGreaterEqual(max(zgt), hi)
+        self.assertEqual(len([z for z in zgt if z >= hi]),
+                         pm_index.LOOKAHEAD_EVENTS)
+
+    def test_extract(self):
+        for suffix in ('csv', 'pcap'):
+            index = self._index(suffix)
+            out = os.path.join(self.tmp, 'window.' + suffix)
+            n = pm_index.extract(index.path, HOST_ID, out, '1s', '2s')
+            events = [e for _, _, e in
+                      pm_index.open_source(out, HOST_ID).events()]
+            self.assertEqual(len(events), n)
+            expected = list(index.task_map) + \
+                [e for _, e in index.events(index.start + 1000000,
+                                            index.start + 2000000)
+                 if int(e['type']) != 0xFF]
+            self.assertEqual([(int(e['zgt']), int(e['type'] or 0))
+                              for e in events],
+                             [(int(e['zgt']), int(e['type'] or 0))
+                              for e in expected])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+# -*- coding: iso-8859-15 -*-
+"""
+Adaptive load shedding: controller, dropping of runnable events in front of
+the analysis and marking of partial output.
+"""
+
+import unittest
+from StringIO import StringIO
+from MotionWise import pm_load
+from MotionWise import pm_instrument
+
+SSH = 2
+
+
+def _events(n):
+    """
+    @brief Start and stop events of runnables 0..7 on core 0
+    """
+    out = []
+    for i in xrange(n):
+        rid = (i // 2) % 8
+        out.append({ 'host': SSH, 'swc': 1, 'zgt': 1000 + 10 * i
+                   , 'count': i % 256, 'core': 0, 'type': i % 2
+                   , 'data': rid << 48})
+    return out
+
+
+class LoadControllerTest(unittest.TestCase):
+
+    def test_escalate_and_recover(self):
+        c = pm_load.LoadController(1.0)
+        self.assertEqual(c.update(0.0, 2.0), None)
+        self.assertEqual(c.update(pm_load.ESCALATE_AFTER, 2.0), 1)
+        self.assertEqual(c.update(2 * pm_load.ESCALATE_AFTER, 2.0), 2)
+        t = 10.0
+        self.assertEqual(c.update(t, 0.0), None)
+        self.assertEqual(c.update(t + pm_load.RECOVER_AFTER, 0.0), 1)
+
+    def test_max_level(self):
+        c = pm_load.LoadController(1.0, max_level=1)
+        for t in xrange(10):
+            c.update(float(t), 2.0)
+        self.assertEqual(c.level, 1)
+
+
+class RunnableShedderTest(unittest.TestCase):
+
+    def test_drop(self):
+        s = pm_load.RunnableShedder()
+        self.assertFalse(s.drop(0, 0, 1 << 48, 0))
+        s.set_sampling(2, 0)
+        # running runnable 1 is completed
+        self.assertFalse(s.drop(0, 1, 1 << 48, 1))
+        self.assertTrue(s.drop(0, 0, 1 << 48, 2))
+        self.assertFalse(s.drop(0, 0, 2 << 48, 3))
+        self.assertFalse(s.drop(0, 2, 1 << 48, 4))  # task events pass
+        s.set_sampling()
+        # the stop event of a dropped start event is dropped
+        self.assertTrue(s.drop(0, 1, 1 << 48, 5))
+        self.assertFalse(s.drop(0, 1, 1 << 48, 6))
+        self.assertEqual(s.take(), [2, 5])
+        self.assertEqual(s.take(), [])
+
+
+class SequenceCheckTest(unittest.TestCase):
+
+    def setUp(self):
+        pm_instrument.detach_callbacks()
+        pm_instrument.reset()
+        self.missing = []
+        self.received = []
+        pm_instrument.sequence_error_callback_add(
+            lambda missing, **signal: self.missing.append(missing))
+        pm_instrument.receive_event_callback_add(
+            lambda **signal: self.received.append(signal))
+
+    def tearDown(self):
+        pm_instrument.detach_callbacks()
+        pm_instrument.reset()
+
+    def _replay(self, piggyback):
+        shedder = pm_load.RunnableShedder()
+        shedder.set_sampling(2, 0)
+        sent = 0
+        for e in _events(3000):
+            if shedder.drop(e['core'], e['type'], e['data'], e['count']):
+                continue
+            if piggyback and shedder.shed:
+                e['shed'] = shedder.take()
+            pm_instrument.receive_event(e)
+            sent += 1
+        return sent
+
+    def test_shed_events_not_lost(self):
+        sent = self._replay(True)
+        self.assertEqual(self.missing, [])
+        # events in the sequence and ZGT reorder buffers are not delivered
+        self.assertTrue(0 < sent - len(self.received) <= 320)
+        self.assertTrue(all((e['data'] >> 48) % 2 == 0
+                            for e in self.received))
+
+    def test_dropped_events_without_counters_are_lost(self):
+        self._replay(False)
+        self.assertTrue(self.missing)
+
+
+class LoadSheddingListenerTest(unittest.TestCase):
+
+    def setUp(self):
+        pm_instrument.reset()
+        self.sampling = []
+        self.summary = StringIO()
+        self.out = StringIO()
+        self.listener = pm_load.LoadSheddingListener(
+            'SSH', 1.0, file_handler=self.out,
+            sampling=lambda *args: self.sampling.append(args),
+            partial_files=[self.summary])
+
+    def _overload(self, start, end):
+        for t in xrange(start, end):
+            self.listener.marker(float(t) - 5.0, 1000 * t, now=float(t))
+
+    def test_partial_marked_when_sampled(self):
+        self._overload(0, 2)
+        # level 1 suspends the trace event output only
+        self.assertEqual(self.sampling, [(1, 0)])
+        self.assertEqual(self.summary.getvalue(), '')
+        self._overload(2, 3)
+        self.assertEqual(self.sampling[-1][0], 2)
+        self.assertEqual(self.summary.getvalue(), pm_load.PARTIAL_NOTE)
+        self._overload(3, 8)
+        # the note is written once
+        self.assertEqual(self.summary.getvalue(), pm_load.PARTIAL_NOTE)
+        self.listener.write()
+        self.assertEqual(self.sampling[-1], ())
+        rows = [l for l in self.out.getvalue().splitlines()
+                if not l.startswith('#')]
+        self.assertEqual([r.split(',')[0] for r in rows],
+                         ['1', '2', '3', '4'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+# -*- coding: iso-8859-15 -*-
+"""
+Parallel replay of a recording must produce the same output as the
+sequential replay.
+"""
+
+import os
+import glob
+import shutil
+import argparse
+import tempfile
+import unittest
+from MotionWise import pm_synth
+from MotionWise import pm_parallel
+from MotionWise import RA_Model
+from MotionWise import file_parser as FP
+from MotionWise.tests import data_file
+from MotionWise.MotionWise_perf_proxy import _Model, _CsvConnection
+from MotionWise.MotionWise_perf_client import Client
+
+
+class _Names(object):
+    def get_runnable_name_of_runnable_id(self, rid):
+        return 'R{}'.format(rid)
+
+    def get_swc_name_of_swc_id(self, swc):
+        return 'S{}'.format(swc)
+
+    def get_IFSET(self):
+        return 'test'
+
+
+DATA = dict((k, data_file(v)) for k, v in
+            [ ('sched', 'generation_info_schedule_SSH.csv')
+            , ('layers', 'entity_sw_layers.csv')
+            , ('tm1', 'Os_Types_Lcfg.h')
+            , ('tm2', 'ApplicationHost_Os_ecuc.arxml')
+            , ('drivers', 'PerfMeas_DriverIDs.h')])
+
+
+@unittest.skipIf(None in DATA.values(), "data files of the package missing")
+class ParallelReplayTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.csv = os.path.join(cls.tmp, 'trace.csv')
+        pm_synth.generate(cls.csv, 'SSH', _Model(RA_Model),
+                          FP.parse_schedule_generation_info_file(
+                              DATA['sched']),
+                          None, seconds=8, seed=3)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def setUp(self):
+        self._limits = pm_parallel.MIN_CHUNK_ROWS, pm_parallel.WARMUP_ROWS
+        pm_parallel.MIN_CHUNK_ROWS = 5000
+        pm_parallel.WARMUP_ROWS = 5000
+
+    def tearDown(self):
+        pm_parallel.MIN_CHUNK_ROWS, pm_parallel.WARMUP_ROWS = self._limits
+
+    def _replay(self, name, parallel):
+        out = os.path.join(self.tmp, name)
+        os.makedirs(out)
+        args = argparse.Namespace(
+            host='SSH', csv_file=self.csv, pcap_file=None, out_path=out,
+            ssh_sched_info=DATA['sched'], sw_layers=DATA['layers'],
+            aph_taskmap1=DATA['tm1'], aph_taskmap2=DATA['tm2'],
+            aph_driver_ids=DATA['drivers'], msexcel_compat=False,
+            version='test', output_trace_events_off=False,
+            trace_statistics=True, trace_drivers=False, parallel=parallel,
+            startup=False, pcap_reader='ra')
+        conn = _CsvConnection(self.csv if parallel is None else None)
+        Client(_Names(), conn, args, None).start()
+        return out
+
+    def _contents(self, out):
+        files = {}
+        for path in glob.glob(os.path.join(out, 'output', '*.csv')):
+            # the file names start with the time of the replay
+            name = os.path.basename(path).split('_', 2)[2]
+            with open(path, 'rb') as f:
+                files[name] = [l for l in f if not l.startswith('#')]
+        return files
+
+    def test_same_output(self):
+        seq = self._contents(self._replay('sequential', None))
+        par = self._contents(self._replay('parallel', 2))
+        self.assertTrue(seq)
+        self.assertEqual(sorted(seq), sorted(par))
+        for name in seq:
+            self.assertEqual(seq[name], par[name], name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+# -*- coding: iso-8859-15 -*-
+"""
+The pipeline analysis of a recording must produce the same output as the
+single process analysis, also if it has to fall back to it.
+"""
+
+import os
+import glob
+import shutil
+import argparse
+import tempfile
+import unittest
+from MotionWise import pm_synth
+from MotionWise import pm_pipeline
+from MotionWise import pm_instrument
+from MotionWise import RA_Model
+from MotionWise import file_parser as FP
+from MotionWise.tests.test_pm_parallel import DATA, _Names
+from MotionWise.MotionWise_perf_proxy import _Model, _CsvConnection
+from MotionWise.MotionWise_perf_client import Client
+
+TASK_SWITCH = '2'
+
+
+def _inject_state_error(csv_file, out_file):
+    """
+    @brief Copies a recording and changes the previous task of a task switch
+           in the middle of it, which causes a state error
+    """
+    with open(csv_file, 'rb') as f:
+        lines = f.readlines()
+    for i in xrange(len(lines) // 2, len(lines)):
+        fields = lines[i].rstrip('\n').split(',')
+        if fields[4] == TASK_SWITCH:
+            fields[7] = '0x{:x}'.format(int(fields[7], 16) ^ (1 << 32))
+            lines[i] = ','.join(fields) + '\n'
+            break
+    with open(out_file, 'wb') as f:
+        f.writelines(lines)
+
+
+@unittest.skipIf(None in DATA.values(), "data files of the package missing")
+class PipelineReplayTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.csv = os.path.join(cls.tmp, 'trace.csv')
+        pm_synth.generate(cls.csv, 'SSH', _Model(RA_Model),
+                          FP.parse_schedule_generation_info_file(
+                              DATA['sched']),
+                          None, seconds=6, seed=13, drivers=4)
+        cls.broken = os.path.join(cls.tmp, 'broken.csv')
+        _inject_state_error(cls.csv, cls.broken)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def setUp(self):
+        self.results = []
+        self._replay_fun = pm_pipeline.replay
+
+        def replay(*args):
+            try:
+                n = self._replay_fun(*args)
+            except pm_pipeline.Unsupported as e:
+                self.results.append(e)
+                raise
+            self.results.append(n)
+            return n
+        pm_pipeline.replay = replay
+
+    def tearDown(self):
+        pm_pipeline.replay = self._replay_fun
+        pm_instrument.detach_callbacks()
+        pm_instrument.reset()
+
+    def _replay(self, name, csv_file, pipeline):
+        pm_instrument.detach_callbacks()
+        pm_instrument.reset()
+        out = os.path.join(self.tmp, name)
+        os.makedirs(out)
+        args = argparse.Namespace(
+            host='SSH', csv_file=csv_file, pcap_file=None, out_path=out,
+            ssh_sched_info=DATA['sched'], sw_layers=DATA['layers'],
+            aph_taskmap1=DATA['tm1'], aph_taskmap2=DATA['tm2'],
+            aph_driver_ids=DATA['drivers'], msexcel_compat=False,
+            version='test', output_trace_events_off=False,
+            trace_statistics=False, trace_drivers=True, parallel=None,
+            startup=False, pcap_reader='ra', pipeline=pipeline)
+        Client(_Names(), _CsvConnection(csv_file), args, None).start()
+        return out
+
+    def _contents(self, out):
+        files = {}
+        for path in glob.glob(os.path.join(out, 'output', '*.csv')):
+            # the file names start with the time of the replay
+            name = os.path.basename(path).split('_', 2)[2]
+            with open(path, 'rb') as f:
+                files[name] = [l for l in f if not l.startswith('#')]
+        return files
+
+    def _compare(self, csv_file):
+        name = os.path.splitext(os.path.basename(csv_file))[0]
+        single = self._contents(self._replay(name + '_single', csv_file,
+                                             None))
+        pipeline = self._contents(self._replay(name + '_pipeline', csv_file,
+                                               2))
+        self.assertTrue(single)
+        self.assertEqual(sorted(single), sorted(pipeline))
+        for k in single:
+            self.assertEqual(single[k], pipeline[k], k)
+
+    def test_same_output(self):
+        self._compare(self.csv)
+        self.assertEqual(len(self.results), 1)
+        self.assertGreater(self.results[0], 0)
+
+    def test_fallback_after_state_error(self):
+        # the listeners which have been fed by the pipeline up to the state
+        # error are replaced, otherwise the events would be counted twice
+        self._compare(self.broken)
+        self.assertEqual(len(self.results), 1)
+        self.assertIsInstance(self.results[0], pm_pipeline.Unsupported)
+        self.assertIn('state error', str(self.results[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
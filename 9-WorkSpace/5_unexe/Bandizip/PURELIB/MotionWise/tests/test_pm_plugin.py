@@ -0,0 +1,101 @@
+# -*- coding: iso-8859-15 -*-
+"""
+Batches and intervals of the plugin interface.
+"""
+
+import shutil
+import tempfile
+import unittest
+from MotionWise import pm_plugin
+from MotionWise import pm_instrument
+from MotionWise.pm_instrument import callback
+
+SSH = 2
+
+
+def _replay(n):
+    for i in xrange(n):
+        rid = (i // 2) % 8
+        pm_instrument.receive_event(
+            { 'host': SSH, 'swc': 1, 'zgt': 1000 + 10 * i, 'count': i % 256
+            , 'core': 0, 'type': i % 2, 'data': rid << 48})
+
+
+class Batches(pm_plugin.Plugin):
+    event_types = ['start_runnable']
+    batch_size = 100
+    interval = 1000
+
+    def __init__(self):
+        self.batches = []
+        self.intervals = []
+
+    def on_batch(self, columns):
+        self.batches.append(columns)
+
+    def on_interval(self, start, length):
+        self.intervals.append((start, length, sum(len(b['zgt'])
+                                                  for b in self.batches)))
+
+
+class Failing(pm_plugin.Plugin):
+
+    def on_batch(self, columns):
+        raise ValueError('failing plugin')
+
+
+class PluginListenerTest(unittest.TestCase):
+
+    def setUp(self):
+        pm_instrument.detach_callbacks()
+        pm_instrument.reset()
+        self.out = tempfile.mkdtemp()
+
+    def tearDown(self):
+        pm_instrument.detach_callbacks()
+        pm_instrument.reset()
+        shutil.rmtree(self.out)
+
+    def _listener(self, *classes):
+        return pm_plugin.PluginListener('SSH', classes, None, self.out,
+                                        'test', '')
+
+    def test_batches(self):
+        listener = self._listener(Batches, Failing)
+        plugin, = [p for p in listener._plugins if isinstance(p, Batches)]
+        # no Python callback per event
+        self.assertEqual(callback.Callback.event_received_callback_fun, [])
+        _replay(1000)
+        listener.write()
+        self.assertEqual(len(listener._plugins), 1)
+        zgt = [z for b in plugin.batches for z in b['zgt']]
+        # the sequence and ZGT reorder buffers keep the newest events
+        self.assertTrue(300 < len(zgt) < 500)
+        self.assertEqual(zgt, range(1000, 1000 + 20 * len(zgt), 20))
+        self.assertTrue(all(set(b['type']) == set([0])
+                            for b in plugin.batches))
+        self.assertEqual(list(plugin.batches[0]['rid'][:4]), [0, 1, 2, 3])
+        self.assertTrue(all(len(b['zgt']) <= Batches.batch_size
+                            for b in plugin.batches))
+        # batches are split at the end of every interval
+        self.assertTrue(plugin.intervals)
+        for start, length, cnt in plugin.intervals:
+            self.assertEqual(length, 1000)
+            self.assertEqual(zgt[cnt - 1] < start + length <= zgt[cnt], True)
+
+    def test_interval_only(self):
+        class Intervals(pm_plugin.Plugin):
+            interval = 5000
+            calls = []
+
+            def on_interval(self, start, length):
+                self.calls.append(start)
+
+        listener = self._listener(Intervals)
+        _replay(3000)
+        listener.write()
+        self.assertEqual(Intervals.calls[:3], [1000, 6000, 11000])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+# -*- coding: iso-8859-15 -*-
+"""
+Stage profiler: extrapolation of the timed events, lag of the analysis,
+markers of the proxy and rows of the intervals.
+"""
+
+import unittest
+from StringIO import StringIO
+from MotionWise import pm_profile
+from MotionWise import pm_instrument
+
+
+class _Clock(object):
+    """
+    Replaces the wall-clock time and the timer of pm_profile
+    """
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+class _SlowFile(object):
+
+    def __init__(self, clock, duration):
+        self._clock = clock
+        self._duration = duration
+
+    def write(self, string):
+        self._clock.now += self._duration
+
+
+class _Host(object):
+
+    def queue_depths(self):
+        return 3, 5
+
+
+class StageProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.wall = _Clock(1000.0)
+        self.timer = _Clock()
+        self._time, self._timer = pm_profile.time, pm_profile._clock
+        pm_profile.time, pm_profile._clock = self.wall, self.timer
+        self.out = StringIO()
+
+    def tearDown(self):
+        pm_profile.time, pm_profile._clock = self._time, self._timer
+        pm_instrument.set_profiler(None)
+
+    def _profiler(self, **kw):
+        return pm_profile.StageProfiler(file_handler=self.out, **kw)
+
+    def _rows(self):
+        lines = self.out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('#HEADER '))
+        header = lines[0][len('#HEADER '):].split(',')
+        return [dict(zip(header, l.split(','))) for l in lines[1:]]
+
+    def test_extrapolation(self):
+        p = self._profiler(sample_interval=4, interval=100.0)
+        output = pm_profile.TimedFile(_SlowFile(self.timer, 0.001), p)
+        for _ in xrange(8):
+            self.wall.now += 0.01
+            output.write('not timed')
+            if p.sample():
+                p.switch('decode')
+                self.timer.now += 0.001
+                p.switch('cores')
+                self.timer.now += 0.002
+                output.write('timed')
+                p.stop(None)
+        self.wall.now = 1000.1
+        p.write()
+        row, total = self._rows()
+        self.assertEqual(row['interval'], '1')
+        self.assertEqual(total['interval'], 'total')
+        for r in (row, total):
+            self.assertEqual(r['events'], '8')
+            self.assertEqual(r['events_per_s'], '80.0')
+            # 2 of 8 events are timed, the times are multiplied by 4
+            self.assertEqual(r['decode[us/event]'], '1000.00')
+            self.assertEqual(r['cores[us/event]'], '2000.00')
+            self.assertEqual(r['output[us/event]'], '1000.00')
+            self.assertEqual(r['reorder[us/event]'], '0.00')
+            self.assertEqual(r['receive[us/event]'], '8500.00')
+            self.assertEqual(r['decode[%]'], '8.00')
+            self.assertEqual(r['receive[%]'], '68.00')
+
+    def test_lag(self):
+        p = self._profiler(sample_interval=1, interval=100.0)
+        for wall, zgt in ((100.0, 1000000), (100.5, 1200000),
+                          (101.0, 2000000), (101.5, 2900000),
+                          (102.0, 3000000)):
+            self.wall.now = wall
+            self.assertTrue(p.sample())
+            p.stop(zgt, _Host())
+        p.write()
+        total = self._rows()[-1]
+        # the minimum of the offset decreases to 98.6 s at the 4th event
+        self.assertEqual(total['zgt_lag_max[ms]'], '400.000')
+        self.assertEqual(total['zgt'], '3000000')
+        self.assertEqual(total['sequence_buffer'], '3')
+        self.assertEqual(total['reorder_buffer'], '5')
+
+    def test_marker(self):
+        p = self._profiler(interval=100.0)
+        p.write()
+        total = self._rows()[-1]
+        self.assertEqual(total['pipe_lag_max[ms]'], '')
+        self.assertEqual(total['ra_callback[us/event]'], '')
+
+        self.out = StringIO()
+        p = self._profiler(interval=100.0)
+        p.marker(10.0, 1000, 0.01, 1000, now=10.2)
+        # 2000 events in 1.3 s, i.e. 769 events are sent within the lag
+        p.marker(11.0, 3000, 0.03, 3000, now=11.5)
+        p.marker(12.0, 3000, 0.03, 3000, now=12.0)
+        p.write()
+        total = self._rows()[-1]
+        self.assertEqual(total['pipe_lag_max[ms]'], '500.000')
+        self.assertEqual(total['pipe_depth_max'], '769')
+        self.assertEqual(total['ra_callback[us/event]'], '10.00')
+
+    def test_interval_rows(self):
+        p = self._profiler(sample_interval=1, interval=10.0)
+        for wall in (1002.0, 1011.0, 1050.0):
+            self.wall.now = wall
+            p.sample()
+            p.stop(None)
+        # the interval after the last event has no events and no row
+        self.wall.now = 1055.0
+        p.write()
+        rows = self._rows()
+        self.assertEqual([r['interval'] for r in rows], ['1', '2', 'total'])
+        self.assertEqual([r['events'] for r in rows], ['2', '1', '3'])
+        self.assertEqual([r['wall_time[s]'] for r in rows],
+                         ['11.000', '50.000', '55.000'])
+        self.assertEqual([r['events_per_s'] for r in rows],
+                         ['0.2', '0.0', '0.1'])
+
+    def test_close(self):
+        p = self._profiler()
+        self.assertIs(pm_instrument.interface._profiler, p)
+        p.close()
+        self.assertIsNone(pm_instrument.interface._profiler)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+# -*- coding: iso-8859-15 -*-
+"""
+Synthetic recordings are deterministic and contain the requested lost and
+reordered events.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from MotionWise import pm_synth
+from MotionWise import pcap_reader
+from MotionWise import RA_Model
+from MotionWise import file_parser as FP
+from MotionWise.tests import data_file
+from MotionWise.MotionWise_perf_proxy import _Model
+
+SCHED = data_file('generation_info_schedule_SSH.csv')
+OPTIONS = {'seconds': 1.5, 'seed': 17, 'loss': 0.002, 'reorder': 200,
+           'drivers': 3}
+
+
+@unittest.skipIf(SCHED is None, "data files of the package missing")
+class SynthTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.gen_info = FP.parse_schedule_generation_info_file(SCHED)
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _generate(self, name, **options):
+        path = os.path.join(self.tmp, name)
+        n = pm_synth.generate(path, 'SSH', _Model(RA_Model), self.gen_info,
+                              None, **options)
+        with open(path, 'rb') as f:
+            return n, f.read()
+
+    def _trace(self, **options):
+        workload = pm_synth.Workload('SSH', _Model(RA_Model), self.gen_info,
+                                     drivers=options['drivers'])
+        return [e for e in pm_synth.Generator(workload, **options).events()
+                if e['type'] != 0xFF]
+
+    def test_deterministic(self):
+        for suffix in ('csv', 'pcap'):
+            first = self._generate('a.' + suffix, **OPTIONS)
+            second = self._generate('b.' + suffix, **OPTIONS)
+            self.assertGreater(first[0], 0)
+            self.assertEqual(first, second)
+            other = self._generate('c.' + suffix,
+                                   **dict(OPTIONS, seed=OPTIONS['seed'] + 1))
+            self.assertNotEqual(first[1], other[1])
+
+    def test_workload_unchanged(self):
+        # a workload can be used by several generators
+        workload = pm_synth.Workload('SSH', _Model(RA_Model), self.gen_info,
+                                     drivers=3)
+        first = list(pm_synth.Generator(workload, **OPTIONS).events())
+        self.assertEqual(first,
+                         list(pm_synth.Generator(workload, **OPTIONS).events()))
+
+    def test_pcap_contains_events(self):
+        path = os.path.join(self.tmp, 'trace.pcap')
+        pm_synth.generate(path, 'SSH', _Model(RA_Model), self.gen_info,
+                          None, **OPTIONS)
+        events = [e for e in pcap_reader.read_events(path)
+                  if e['type'] != 0xFF]
+        self.assertEqual([(e['zgt'], e['count'], e['type'], e['data'])
+                          for e in events],
+                         [(e['zgt'], e['count'], e['type'], e['data'])
+                          for e in self._trace(**OPTIONS)])
+
+    def test_loss(self):
+        def gaps(events):
+            return sum(1 for a, b in zip(events, events[1:])
+                       if (b['count'] - a['count']) & 0xFF != 1)
+        self.assertEqual(gaps(self._trace(**dict(OPTIONS, loss=0.0))), 0)
+        self.assertGreater(gaps(self._trace(**OPTIONS)), 0)
+
+    def test_reorder(self):
+        def overtaken(events):
+            return sum(1 for a, b in zip(events, events[1:])
+                       if b['zgt'] < a['zgt'])
+        self.assertEqual(overtaken(self._trace(**dict(OPTIONS, reorder=0))),
+                         0)
+        self.assertGreater(overtaken(self._trace(**OPTIONS)), 0)
+        # the sequence counter follows the order of arrival
+        events = self._trace(**dict(OPTIONS, loss=0.0))
+        self.assertEqual([e['count'] for e in events[:300]],
+                         [i & 0xFF for i in xrange(1, 301)])
+
+
+if __name__ == '__main__':
+    unittest.main()
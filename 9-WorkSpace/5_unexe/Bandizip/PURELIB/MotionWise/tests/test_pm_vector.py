@@ -0,0 +1,111 @@
+# -*- coding: iso-8859-15 -*-
+"""
+The vectorised analysis of a recording must produce the same output as the
+event driven analysis. Recordings it can't analyse are analysed event by
+event.
+"""
+
+import os
+import glob
+import shutil
+import argparse
+import tempfile
+import unittest
+from MotionWise import pm_synth
+from MotionWise import pm_vector
+from MotionWise import pm_instrument
+from MotionWise import RA_Model
+from MotionWise import file_parser as FP
+from MotionWise.tests.test_pm_parallel import DATA, _Names
+from MotionWise.MotionWise_perf_proxy import _Model, _CsvConnection
+from MotionWise.MotionWise_perf_client import Client
+
+
+@unittest.skipIf(None in DATA.values() or pm_vector.numpy is None,
+                 "data files of the package or NumPy missing")
+class VectorisedReplayTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        gen_info = FP.parse_schedule_generation_info_file(DATA['sched'])
+        cls.csv = os.path.join(cls.tmp, 'trace.csv')
+        pm_synth.generate(cls.csv, 'SSH', _Model(RA_Model), gen_info, None,
+                          seconds=6, seed=11, drivers=4)
+        cls.lossy = os.path.join(cls.tmp, 'lossy.csv')
+        pm_synth.generate(cls.lossy, 'SSH', _Model(RA_Model), gen_info, None,
+                          seconds=3, seed=11, loss=0.001)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def setUp(self):
+        self.results = []
+        self._replay_fun = pm_vector.replay
+
+        def replay(args, listeners):
+            try:
+                n = self._replay_fun(args, listeners)
+            except pm_vector.Unsupported as e:
+                self.results.append(e)
+                raise
+            self.results.append(n)
+            return n
+        pm_vector.replay = replay
+
+    def tearDown(self):
+        pm_vector.replay = self._replay_fun
+        pm_instrument.detach_callbacks()
+        pm_instrument.reset()
+
+    def _replay(self, name, csv_file, vectorised):
+        pm_instrument.detach_callbacks()
+        pm_instrument.reset()
+        out = os.path.join(self.tmp, name)
+        os.makedirs(out)
+        args = argparse.Namespace(
+            host='SSH', csv_file=csv_file, pcap_file=None, out_path=out,
+            ssh_sched_info=DATA['sched'], sw_layers=DATA['layers'],
+            aph_taskmap1=DATA['tm1'], aph_taskmap2=DATA['tm2'],
+            aph_driver_ids=DATA['drivers'], msexcel_compat=False,
+            version='test', output_trace_events_off=False,
+            trace_statistics=False, trace_drivers=True, parallel=None,
+            startup=False, pcap_reader='ra', vectorised=vectorised)
+        Client(_Names(), _CsvConnection(csv_file), args, None).start()
+        return out
+
+    def _contents(self, out):
+        files = {}
+        for path in glob.glob(os.path.join(out, 'output', '*.csv')):
+            # the file names start with the time of the replay
+            name = os.path.basename(path).split('_', 2)[2]
+            with open(path, 'rb') as f:
+                files[name] = [l for l in f if not l.startswith('#')]
+        return files
+
+    def _compare(self, csv_file):
+        name = os.path.splitext(os.path.basename(csv_file))[0]
+        events = self._contents(self._replay(name + '_events', csv_file,
+                                             False))
+        vectorised = self._contents(self._replay(name + '_vectorised',
+                                                 csv_file, True))
+        self.assertTrue(events)
+        self.assertEqual(sorted(events), sorted(vectorised))
+        for k in events:
+            self.assertEqual(events[k], vectorised[k], k)
+
+    def test_same_output(self):
+        self._compare(self.csv)
+        self.assertEqual(len(self.results), 1)
+        self.assertGreater(self.results[0], 0)
+
+    def test_fallback_with_lost_events(self):
+        self._compare(self.lossy)
+        self.assertEqual(len(self.results), 1)
+        self.assertIsInstance(self.results[0], pm_vector.Unsupported)
+        self.assertIn('sequence', str(self.results[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
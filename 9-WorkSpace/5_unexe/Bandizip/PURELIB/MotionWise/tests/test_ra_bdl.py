@@ -0,0 +1,218 @@
+# -*- coding: iso-8859-15 -*-
+"""
+Concurrent BDL transfers against the in-process peer: scheduling, retries of
+lost, failed and corrupted transfers, streams and CRC verification.
+"""
+
+import io
+import os
+import zlib
+import random
+import shutil
+import tempfile
+import unittest
+import threading
+from MotionWise import ra_bdl
+
+
+def _block(n, seed=0):
+    r = random.Random(seed)
+    return bytes(bytearray(r.getrandbits(8) for _ in xrange(n)))
+
+
+def _crc(data):
+    return zlib.crc32(data) & 0xFFFFFFFF
+
+
+class _Ra(object):
+    """
+    BDL functions of an RA instance which reject the first requests
+    """
+
+    def __init__(self, peer, rejected):
+        self.peer = peer
+        self.rejected = rejected
+
+    def _reject(self):
+        if self.rejected:
+            self.rejected -= 1
+            return 1
+        return 0
+
+    def config_bdl_download(self, swc_id, buffer, callback):
+        ret = self._reject()
+        if not ret:
+            self.peer.download(swc_id, buffer, callback)
+        return ret
+
+    def config_bdl_upload(self, swc_id, callback):
+        ret = self._reject()
+        if not ret:
+            self.peer.upload(swc_id, callback)
+        return ret
+
+
+class TransferManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self._threads = set(threading.enumerate())
+
+    def tearDown(self):
+        # the workers and the timers of the peer end after the transfers
+        for t in set(threading.enumerate()) - self._threads:
+            t.join(1.0)
+
+    def _manager(self, peer, **kw):
+        kw.setdefault('timeout', 1.0)
+        return ra_bdl.TransferManager(peer, **kw)
+
+    def test_download(self):
+        data = _block(1000)
+        states = []
+        peer = ra_bdl.FakePeer()
+        with self._manager(peer, progress=lambda t: states.append(t.state)) \
+                as manager:
+            t = manager.download(1, data)
+        self.assertTrue(manager.wait())
+        self.assertEqual(t.state, ra_bdl.DONE)
+        self.assertEqual((t.size, t.bytes, t.attempt, t.progress),
+                         (1000, 1000, 1, 1.0))
+        self.assertEqual(t.crc, _crc(data))
+        self.assertEqual(peer.blocks[1], data)
+        # the block is uploaded again for the verification
+        self.assertEqual(peer.requests[1], 2)
+        self.assertEqual(states, [ ra_bdl.READING, ra_bdl.TRANSFERRING
+                                 , ra_bdl.VERIFYING, ra_bdl.DONE])
+
+    def test_concurrency(self):
+        peer = ra_bdl.FakePeer(delay=0.05)
+        with self._manager(peer, max_parallel=2, verify=False) as manager:
+            transfers = [manager.download(swc, _block(100, swc))
+                         for swc in xrange(5) for _ in xrange(2)]
+        self.assertTrue(manager.wait())
+        self.assertEqual(peer.max_concurrent, 2)
+        for swc in xrange(5):
+            first, second = [t for t in transfers if t.swc_id == swc]
+            # the transfers of a SWC are executed one after the other
+            self.assertGreaterEqual(second.started, first.finished)
+            self.assertEqual(peer.blocks[swc], _block(100, swc))
+
+        peer = ra_bdl.FakePeer(delay=0.05)
+        with self._manager(peer, max_parallel=4, verify=False) as manager:
+            for swc in xrange(3):
+                manager.download(swc, b'x')
+        self.assertEqual(peer.max_concurrent, 3)
+
+    def test_lost(self):
+        peer = ra_bdl.FakePeer(lost={1: 1})
+        with self._manager(peer, timeout=0.1) as manager:
+            t = manager.download(1, b'data')
+        self.assertTrue(manager.wait())
+        self.assertEqual(t.attempt, 2)
+        self.assertIn('no answer', t.error)
+        self.assertEqual(peer.requests[1], 3)
+
+    def test_error(self):
+        peer = ra_bdl.FakePeer(errors={1: 1, 2: 10})
+        with self._manager(peer, retries=2) as manager:
+            ok = manager.download(1, b'data')
+            failed = manager.download(2, b'data')
+        self.assertFalse(manager.wait())
+        self.assertEqual((ok.state, ok.attempt), (ra_bdl.DONE, 2))
+        self.assertEqual(ok.error, 'download failed (1)')
+        self.assertEqual((failed.state, failed.attempt), (ra_bdl.FAILED, 3))
+        self.assertEqual(failed.error, 'download failed (1)')
+        self.assertEqual(peer.requests[2], 3)
+
+    def test_corrupt(self):
+        data = _block(64)
+        peer = ra_bdl.FakePeer(corrupt={1: 1, 2: 1})
+        with self._manager(peer) as manager:
+            verified = manager.download(1, data)
+        with self._manager(peer, verify=False) as manager:
+            unverified = manager.download(2, data)
+        self.assertTrue(manager.wait())
+        self.assertEqual(verified.attempt, 2)
+        self.assertIn('verification failed', verified.error)
+        self.assertEqual(peer.blocks[1], data)
+        self.assertEqual(unverified.attempt, 1)
+        # the first byte of the stored block is inverted
+        self.assertEqual(peer.blocks[2], chr(ord(data[0]) ^ 0xFF) + data[1:])
+
+    def test_rejected(self):
+        peer = ra_bdl.FakePeer()
+        with self._manager(_Ra(peer, 1)) as manager:
+            t = manager.download(1, b'data')
+        self.assertTrue(manager.wait())
+        self.assertIsInstance(manager.port, ra_bdl.RaPort)
+        self.assertEqual(t.attempt, 2)
+        self.assertEqual(t.error, 'download request rejected (1)')
+
+        with self._manager(_Ra(peer, 3), retries=2) as manager:
+            t = manager.upload(1)
+        self.assertFalse(manager.wait())
+        self.assertEqual(t.error, 'upload request rejected (1)')
+        self.assertRaises(ra_bdl.TransferError,
+                          ra_bdl.RaPort(_Ra(peer, 1)).upload, 1, None)
+
+    def test_streams(self):
+        data = _block(10000)
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'block.bin')
+            with open(path, 'wb') as f:
+                f.write(data)
+            peer = ra_bdl.FakePeer()
+            with open(path, 'rb') as f, \
+                    self._manager(peer, chunk_size=3000) as manager:
+                # size of the file
+                from_file = manager.download(1, f)
+                manager.wait()
+            with self._manager(peer, chunk_size=3000) as manager:
+                # unknown size
+                from_stream = manager.download(2, io.BytesIO(data))
+                part = manager.download(3, io.BytesIO(data), size=100)
+                short = manager.download(4, io.BytesIO(data[:10]), size=100)
+        finally:
+            shutil.rmtree(tmp)
+        for t, swc, expected in ((from_file, 1, data),
+                                 (from_stream, 2, data),
+                                 (part, 3, data[:100])):
+            self.assertEqual(t.state, ra_bdl.DONE, t.error)
+            self.assertEqual((t.size, t.bytes), (len(expected),) * 2)
+            self.assertEqual(t.crc, _crc(expected))
+            self.assertEqual(peer.blocks[swc], expected)
+        self.assertEqual(short.state, ra_bdl.FAILED)
+        self.assertEqual(short.error, 'source ended after 10 of 100 bytes')
+        self.assertNotIn(4, peer.blocks)
+
+        sink = io.BytesIO()
+        with self._manager(peer, chunk_size=3000) as manager:
+            streamed = manager.upload(1, sink)
+            stored = manager.upload(3)
+        self.assertTrue(manager.wait())
+        self.assertEqual(sink.getvalue(), data)
+        self.assertEqual((streamed.size, streamed.bytes), (10000, 10000))
+        self.assertIsNone(streamed.data)
+        self.assertEqual(stored.data, data[:100])
+        self.assertEqual(stored.crc, _crc(data[:100]))
+
+    def test_upload_crc(self):
+        data = _block(256)
+        peer = ra_bdl.FakePeer(blocks={1: data})
+        with self._manager(peer, retries=1) as manager:
+            ok = manager.upload(1, crc=_crc(data))
+            wrong = manager.upload(1, crc=_crc(data) ^ 1)
+            missing = manager.upload(2)
+        self.assertFalse(manager.wait())
+        self.assertEqual(ok.state, ra_bdl.DONE)
+        self.assertEqual(ok.data, data)
+        self.assertEqual((wrong.state, wrong.attempt), (ra_bdl.FAILED, 2))
+        self.assertEqual(wrong.error, 'CRC {:08x} instead of {:08x}'.format(
+            _crc(data), _crc(data) ^ 1))
+        self.assertEqual(missing.state, ra_bdl.FAILED)
+        self.assertEqual(missing.error, 'upload failed (1)')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,298 @@
+# -*- coding: iso-8859-15 -*-
+"""
+Compiled ctypes converters of RA: the results of _converter() are compared
+with the recursive conversions they replace (Function._factory,
+RA.as_ctype_instance and RA.as_python_instance), including the exceptions
+they raise.
+"""
+
+import ctypes
+import unittest
+from MotionWise import RA
+
+_INT_TYPES = RA._INT_TYPES
+_FLOAT_TYPES = RA._FLOAT_TYPES
+
+
+def _old_factory(t, v):
+    default = 0
+    result = t()
+    if issubclass(t, ctypes.Structure):
+        for fn, ft in t._fields_:
+            if isinstance(v, dict) and fn in v:
+                x = _old_factory(ft, v[fn])
+            else:
+                x = _old_factory(ft, default)
+            setattr(result, fn, x)
+    elif issubclass(t, ctypes.Array):
+        for i in xrange(t._length_):
+            if isinstance(v, list) and i < len(v):
+                x = _old_factory(t._type_, v[i])
+            else:
+                x = _old_factory(t._type_, default)
+            result[i] = x
+    elif issubclass(t, _INT_TYPES + (ctypes.c_float, )):
+        if isinstance(v, basestring) and v.endswith(".0"):
+            v = v[:-2]
+        x = v
+        if x is None:
+            x = default
+        result = t(x)
+    else:
+        assert(0)
+    return result
+
+
+def _old_ctype(t, v):
+    if issubclass(t, ctypes.Structure):
+        if v is None:
+            v = t()
+        values = []
+        for fn, ft in t._fields_:
+            if hasattr(v, "get"):
+                values.append(_old_ctype(ft, v.get(fn)))
+            else:
+                values.append(_old_ctype(ft, None))
+        return t(*values)
+    elif issubclass(t, ctypes.Array):
+        if v is None:
+            v = t()
+        result = []
+        for i in xrange(t._length_):
+            try:
+                vi = v[i]
+            except IndexError:
+                vi = None
+            result.append(_old_ctype(t._type_, vi))
+        return t(*result)
+    elif issubclass(t, _FLOAT_TYPES):
+        if isinstance(v, basestring) and v.endswith(".0"):
+            v = v[:-2]
+        return t(float(v) or 0.0)
+    elif issubclass(t, _INT_TYPES):
+        if isinstance(v, basestring) and v.endswith(".0"):
+            v = v[:-2]
+        if v is None or not isinstance(v, int):
+            return t(0)
+        return t(v)
+    return t(v or 0)
+
+
+def _old_python(v):
+    if isinstance(v, ctypes._Pointer):
+        v = v.contents
+    if isinstance(v, ctypes.Structure):
+        return dict((fn, _old_python(getattr(v, fn)))
+                    for fn, ft in v._fields_)
+    if isinstance(v, ctypes.Array):
+        return [_old_python(vi) for vi in v]
+    if not isinstance(v, ctypes._SimpleCData):
+        # value of a fundamental field or element
+        return v
+    return v.value
+
+
+class _Inner(ctypes.Structure):
+    _fields_ = [ ('a', ctypes.c_ubyte)
+               , ('b', ctypes.c_ushort * 3)
+               , ('f', ctypes.c_float)]
+
+
+class _BigEndian(ctypes.BigEndianStructure):
+    _fields_ = [ ('a', ctypes.c_uint16)
+               , ('b', ctypes.c_int32 * 2)
+               , ('f', ctypes.c_float)]
+
+
+class _Outer(ctypes.Structure):
+    _fields_ = [ ('x', ctypes.c_int)
+               , ('inner', _Inner)
+               , ('inners', _Inner * 2)
+               , ('matrix', (ctypes.c_short * 2) * 2)
+               , ('floats', ctypes.c_float * 3)
+               , ('q', ctypes.c_ulonglong)]
+
+
+class _Doubles(ctypes.Structure):
+    _fields_ = [ ('outer', _Outer)
+               , ('d', ctypes.c_double * 3)
+               , ('e', ctypes.c_double)
+               , ('flag', ctypes.c_bool)
+               , ('char', ctypes.c_char)
+               , ('big', _BigEndian)]
+
+
+class _Pointer(ctypes.Structure):
+    _fields_ = [ ('n', ctypes.c_int)
+               , ('inner', ctypes.POINTER(_Inner))]
+
+
+# values for _Outer
+OUTER_VALUES = [
+    None, 0, 5, [], {}, {'x': 5}, {'x': -1, 'q': -1}, {'x': 5L},
+    {'x': True}, {'x': '5.0'}, {'x': '5'}, {'x': 1 << 40}, {'q': 1 << 64},
+    {'x': 1.5},
+    {'inner': {'a': 300, 'b': [1, 70000], 'f': 1.5}},
+    {'inner': {'a': None, 'b': [None, 2], 'f': None}},
+    {'inner': {'b': (1, 2, 3)}},
+    {'inner': {'b': [1.5, 2]}},
+    {'inner': {'b': ['5.0', 3]}},
+    {'inner': {'b': [1, 2, 3, 4, 5]}},
+    {'inner': {'f': '2.0'}},
+    {'inner': None},
+    {'inner': [1, 2]},
+    {'inners': [{'a': 1}]},
+    {'inners': [{'a': 1}, {'a': 2}, {'a': 3}]},
+    {'inners': [None, {'b': [7]}]},
+    {'matrix': [[1, 2], [3]]},
+    {'matrix': [[True, 5L], [-40000, 1 << 20]]},
+    {'matrix': [[1, 2], None]},
+    {'floats': []},
+    {'floats': [1, 2.5]},
+    {'floats': [1.0, 2.0, 3.0]},
+    {'floats': [1e40, -0.0, 3]},
+    {'floats': [1.0, None, 3.0]},
+    {'floats': [1.0, '2.0', 3.0]},
+    {'floats': [1.0, 2.0, 3.0, 4.0]},
+]
+
+# the ctype conversion of missing float values raises a TypeError, the values
+# above are also converted as part of a complete value
+FULL_OUTER = { 'x': 1, 'inner': {'a': 1, 'b': [1, 2, 3], 'f': 1.0}
+             , 'inners': [{'f': 1.0}, {'f': 2.0}], 'matrix': [[1, 2], [3, 4]]
+             , 'floats': [1.0, 2.0, 3.0], 'q': 1}
+
+# values for the ctype conversion of _Doubles
+DOUBLES_VALUES = [
+    None, {}, {'e': 1.0}, {'d': [1.0, 2.0, 3.0], 'e': 0},
+    {'d': [1.0, 2.0]},
+    {'d': [1, 2, 3], 'e': 5L},
+    {'d': [1, '2.0', 3], 'e': '5.0'},
+    {'d': (1.5, 2.5, 3.5, 4.5), 'e': -1},
+    {'d': [1.0, None, 3.0]},
+    {'d': None},
+    {'flag': 2, 'char': 'a'},
+    {'flag': None, 'char': None},
+    {'outer': {}},
+    {'outer': dict(FULL_OUTER, floats=[1.0, 2.0])},
+    {'outer': dict(FULL_OUTER, inner={'b': [1 << 17, 2L], 'f': '2.0'})},
+    {'big': {}},
+    {'big': {'a': 0x1234, 'b': [1, -2], 'f': 0.5}},
+    {'big': {'a': None, 'b': [1 << 40], 'f': 1}},
+]
+FULL_DOUBLES = { 'outer': FULL_OUTER, 'd': [1.0, 2.0, 3.0], 'e': 1.0
+               , 'flag': 1, 'char': 'x', 'big': {'a': 1, 'b': [2], 'f': 3.0}}
+
+
+def _values(values, full):
+    return values + [dict(full, **v) for v in values if isinstance(v, dict)]
+
+# array types and values
+ARRAYS = [
+    (ctypes.c_ubyte * 4, [None, [], [1, 2], [255, 256, -1], [1, 2, 3, 4, 5],
+                          ['1.0', 2], (1, 2), [1L, 2]]),
+    (ctypes.c_float * 4, [None, [], [1, 2.5], [1.0, 2.0, 3.0, 4.0],
+                          [1, None, 3, 4], (1, 2, 3, 4)]),
+    (ctypes.c_double * 2, [None, [], [1.5], [1.5, 2.5], [1, 2]]),
+    (ctypes.c_longlong * 2, [None, [1 << 62, -(1 << 62)], [1 << 64, 1]]),
+    (_Inner * 2, [None, [], [{'a': 1}], [{'b': [1, 2, 3]}, {'f': 1.0}]]),
+]
+
+
+def _result(fun, *args):
+    """
+    @return: memory of the returned ctypes instance or type of the raised
+             exception
+    """
+    try:
+        r = fun(*args)
+    except Exception as e:
+        return type(e)
+    if isinstance(r, ctypes.c_longdouble):
+        # the padding of long double is not initialised
+        return r.value
+    return ctypes.string_at(ctypes.addressof(r), ctypes.sizeof(r))
+
+
+class ConverterTest(unittest.TestCase):
+
+    def _compare(self, kind, old, t, values):
+        """
+        @return: number of values which are converted without an exception
+        """
+        converted = 0
+        for v in values:
+            expected = _result(old, t, v)
+            self.assertEqual(_result(RA._converter(kind, t), v), expected,
+                             '{} {} {!r}'.format(kind, t.__name__, v))
+            converted += isinstance(expected, str)
+        return converted
+
+    def test_factory(self):
+        values = _values(OUTER_VALUES, FULL_OUTER)
+        self.assertGreater(self._compare('factory', _old_factory, _Outer,
+                                         values), len(values) // 4)
+        for t, values in ARRAYS:
+            if t._type_ not in (ctypes.c_double, ):
+                self._compare('factory', _old_factory, t, values)
+        # the conversion of big endian fields is not supported
+        self.assertEqual(self._compare('factory', _old_factory, _BigEndian,
+                                       [None, {'a': 1}]), 0)
+
+    def test_ctype(self):
+        values = _values(OUTER_VALUES, FULL_OUTER)
+        self.assertGreater(self._compare('ctype', _old_ctype, _Outer,
+                                         values), len(values) // 4)
+        values = _values(DOUBLES_VALUES, FULL_DOUBLES)
+        self.assertGreater(self._compare('ctype', _old_ctype, _Doubles,
+                                         values), len(values) // 4)
+        for t, values in ARRAYS:
+            self._compare('ctype', _old_ctype, t, values)
+
+    def test_primitives(self):
+        values = [None, 0, 5, -1, 300, 1 << 40, 5L, True, 1.5, '5.0', '5',
+                  '2.5']
+        for t in _INT_TYPES + (ctypes.c_float, ):
+            self._compare('factory', _old_factory, t, values)
+        for t in _INT_TYPES + _FLOAT_TYPES:
+            self._compare('ctype', _old_ctype, t, values)
+        self._compare('ctype', _old_ctype, ctypes.c_bool, [None, 0, 2])
+
+    def test_exceptions(self):
+        # the comparison covers the errors of the old conversions
+        self.assertIs(_result(RA._converter('factory', _Outer),
+                              {'x': '5.0'}), TypeError)
+        self.assertIs(_result(RA._converter('ctype', _Doubles), None),
+                      TypeError)
+        self.assertIs(_result(RA._converter('ctype', ctypes.c_float * 4),
+                              [1, 2.5]), TypeError)
+        self.assertIsNot(_result(RA._converter('ctype', ctypes.c_float * 4),
+                                 None), TypeError)
+
+    def test_python(self):
+        instances = []
+        for t, values in ARRAYS + [
+                (_Outer, _values(OUTER_VALUES, FULL_OUTER)),
+                (_Doubles, _values(DOUBLES_VALUES, FULL_DOUBLES))]:
+            for v in values:
+                try:
+                    instances.append(_old_ctype(t, v))
+                except Exception:
+                    pass
+        o = _Outer()
+        ctypes.memset(ctypes.addressof(o), 0xA5, ctypes.sizeof(o))
+        instances.append(o)
+        inner = _Inner(7, (ctypes.c_ushort * 3)(1, 2, 3), 0.25)
+        instances.append(_Pointer(3, ctypes.pointer(inner)))
+        instances.append(ctypes.pointer(inner))
+        self.assertGreater(len(instances), 40)
+        for i in instances:
+            new = RA._converter('python', type(i))(i) \
+                if not isinstance(i, ctypes._Pointer) \
+                else RA._as_python_value(i)
+            self.assertEqual(new, _old_python(i), repr(_old_python(i)))
+            self.assertEqual(new, RA.RA.as_python_instance(i))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+# -*- coding: iso-8859-15 -*-
+"""
+NumPy dtypes of the ctypes structures: instances populated with ctypes are
+read through the generated dtype and compared field by field.
+"""
+
+import ctypes
+import unittest
+from MotionWise import RA
+from MotionWise import ra_dtype
+
+
+class _Packed(ctypes.Structure):
+    _pack_ = 1
+    _fields_ = [ ('a', ctypes.c_uint8)
+               , ('b', ctypes.c_uint32)
+               , ('c', ctypes.c_int16)
+               , ('d', ctypes.c_double)]
+
+
+class _Union(ctypes.Union):
+    _fields_ = [ ('u64', ctypes.c_uint64)
+               , ('u8', ctypes.c_uint8 * 8)]
+
+
+class _BigEndian(ctypes.BigEndianStructure):
+    _fields_ = [ ('a', ctypes.c_uint16)
+               , ('b', ctypes.c_int32)
+               , ('c', ctypes.c_float)]
+
+
+class _Nested(ctypes.Structure):
+    _fields_ = [ ('flag', ctypes.c_bool)
+               , ('char', ctypes.c_char)
+               , ('name', ctypes.c_char * 7)
+               , ('matrix', (ctypes.c_int32 * 3) * 2)
+               , ('packed', _Packed * 2)
+               , ('big', _BigEndian)
+               , ('text', ctypes.c_char_p)
+               , ('ptr', ctypes.POINTER(ctypes.c_uint8))
+               , ('addr', ctypes.c_void_p)
+               , ('value', ctypes.c_longlong)]
+
+
+_KEEP = []
+
+
+def _is_record(t):
+    return issubclass(t, (ctypes.Structure, ctypes.Union))
+
+
+def _value(t, n):
+    """
+    @brief Returns the n-th test value of a fundamental ctypes type as
+           (value set with ctypes, expected value of the dtype). Pointers are
+           expected as address.
+    """
+    if issubclass(t, ctypes._Pointer):
+        target = t._type_(n % 256)
+        _KEEP.append(target)
+        return ctypes.pointer(target), ctypes.addressof(target)
+    code = t._type_
+    if code == 'z':
+        buf = ctypes.create_string_buffer(b'text {}'.format(n))
+        _KEEP.append(buf)
+        return ctypes.cast(buf, ctypes.c_char_p), ctypes.addressof(buf)
+    if code == 'P':
+        v = 0x1000 + n
+    elif code == '?':
+        v = bool(n % 2)
+    elif code == 'c':
+        v = chr(ord('A') + n % 26)
+    elif code in 'fdg':
+        v = n + 0.5
+    else:
+        bits = ctypes.sizeof(t) * 8
+        if code in 'bhilq':
+            v = (n * 37) % (1 << (bits - 1)) - (1 << (bits - 2))
+        else:
+            v = (n * 0x9E3779B1) % (1 << bits)
+    return v, v
+
+
+def _populate(obj, counter):
+    """
+    @brief Sets every field of a ctypes instance with ctypes, returns the
+           expected values as {path: value}
+    """
+    expected = {}
+    t = type(obj)
+    for fn, ft in (t._fields_ if _is_record(t) else []):
+        if _is_record(ft):
+            sub = _populate(getattr(obj, fn), counter)
+            expected.update(((fn,) + k, v) for k, v in sub.iteritems())
+        elif issubclass(ft, ctypes.Array):
+            if ft._type_ is ctypes.c_char:
+                v = b'n{}'.format(counter[0])[:ft._length_ - 1]
+                setattr(obj, fn, v)
+                expected[(fn,)] = v
+            else:
+                expected.update(((fn,) + k, v) for k, v in
+                                _populate_array(getattr(obj, fn), counter))
+        else:
+            counter[0] += 1
+            v, expected[(fn,)] = _value(ft, counter[0])
+            setattr(obj, fn, v)
+        if issubclass(t, ctypes.Union):
+            # the other members overlap the first one
+            break
+    return expected
+
+
+def _populate_array(arr, counter):
+    t = type(arr)
+    for i in xrange(t._length_):
+        if _is_record(t._type_):
+            for k, v in _populate(arr[i], counter).iteritems():
+                yield (i,) + k, v
+        elif issubclass(t._type_, ctypes.Array):
+            for k, v in _populate_array(arr[i], counter):
+                yield (i,) + k, v
+        else:
+            counter[0] += 1
+            arr[i], v = _value(t._type_, counter[0])
+            yield (i,), v
+
+
+class DtypeTest(unittest.TestCase):
+
+    def _check(self, t):
+        records = (t * 2)()
+        expected = [_populate(records[i], [i * 1000]) for i in xrange(2)]
+        arr = ra_dtype.view(records)
+        self.assertEqual(arr.dtype.itemsize, ctypes.sizeof(t))
+        self.assertEqual(len(arr), 2)
+        for i, fields in enumerate(expected):
+            for path, v in sorted(fields.iteritems()):
+                got = arr[i]
+                for step in path:
+                    got = got[step]
+                got = got.tolist() if hasattr(got, 'tolist') else got
+                msg = '{}[{}].{}'.format(t.__name__, i, path)
+                if isinstance(v, float):
+                    self.assertAlmostEqual(got, v, 5, msg)
+                elif isinstance(v, bytes):
+                    if isinstance(got, list):
+                        # character array
+                        got = b''.join(got)
+                    self.assertEqual(got.rstrip(b'\0'), v, msg)
+                else:
+                    self.assertEqual(got, v, msg)
+        self.assertEqual(ra_dtype.verify(t), [])
+
+    def test_ra_structures(self):
+        types = ra_dtype.structures(RA)
+        self.assertTrue(RA.Ra_TraceLog_Message in types)
+        for t in types:
+            self._check(t)
+
+    def test_layouts(self):
+        for t in [_Packed, _Union, _BigEndian, _Nested]:
+            self._check(t)
+
+    def test_union_overlap(self):
+        u = _Union()
+        u.u64 = 0x0102030405060708
+        arr = ra_dtype.view(u)
+        self.assertEqual(arr['u64'][0], 0x0102030405060708)
+        self.assertEqual(list(arr['u8'][0]), list(bytearray(
+            ctypes.string_at(ctypes.addressof(u), 8))))
+
+    def test_view_shares_memory(self):
+        m = RA.Ra_TraceLog_TraceData()
+        arr = ra_dtype.view(m)
+        arr['event_data'][0] = 42
+        self.assertEqual(m.event_data, 42)
+
+    def test_verify_detects_wrong_layout(self):
+        class _Wrong(ctypes.Structure):
+            _fields_ = [('a', ctypes.c_uint8), ('b', ctypes.c_uint32)]
+        ra_dtype._dtypes[_Wrong] = ra_dtype.numpy.dtype(
+            {'names': ['a', 'b'], 'formats': ['u1', '<u4'],
+             'offsets': [0, 1], 'itemsize': 8})
+        self.assertTrue(ra_dtype.verify(_Wrong))
+
+    def test_bit_fields_rejected(self):
+        class _Bits(ctypes.Structure):
+            _fields_ = [('a', ctypes.c_uint8, 3)]
+        self.assertRaises(TypeError, ra_dtype.dtype_of, _Bits)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# -*- coding: iso-8859-15 -*-
+"""
+Selection of the columns of a recording.
+"""
+
+import os
+import ctypes
+import shutil
+import tempfile
+import unittest
+from MotionWise import ra_recorder
+
+
+class _Point(ctypes.Structure):
+    _fields_ = [('x', ctypes.c_int32), ('y', ctypes.c_int32)]
+
+
+class _Sample(ctypes.Structure):
+    _fields_ = [ ('counter', ctypes.c_uint8)
+               , ('p', _Point * 2)
+               , ('p1', ctypes.c_int16)]
+
+
+class RecordingColumnsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        path = os.path.join(self.tmp, 'test.rec')
+        with ra_recorder.Recorder(path, chunk_rows=4) as recorder:
+            port = recorder.add('Swc_PpOut_DeSample', 1, _Sample)
+            for i in xrange(6):
+                s = _Sample(i)
+                s.p[1].x = 10 * i
+                s.p1 = -i
+                port.callback(ctypes.addressof(s))
+        self.rec = ra_recorder.Recording(path)
+
+    def tearDown(self):
+        self.rec._zip.close()
+        shutil.rmtree(self.tmp)
+
+    def test_exact_names(self):
+        port = 'Swc_PpOut_DeSample'
+        self.assertEqual(self.rec.columns(port, ['p[1].x']), ['p[1].x'])
+        data = self.rec.read(port, ['p[1].x'])
+        self.assertEqual(list(data), ['time', 'p[1].x'])
+        self.assertEqual(list(data['p[1].x']), [0, 10, 20, 30, 40, 50])
+
+    def test_patterns(self):
+        port = 'Swc_PpOut_DeSample'
+        self.assertEqual(self.rec.columns(port, ['p[[]0]*', 'counter']),
+                         ['counter', 'p[0].x', 'p[0].y'])
+        self.assertEqual(self.rec.columns(port, ['p1*']), ['p1'])
+
+    def test_no_match(self):
+        port = 'Swc_PpOut_DeSample'
+        self.assertRaises(ValueError, self.rec.columns, port, ['q*'])
+        self.assertRaises(ValueError, self.rec.read, port, ['p[2].x'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+# -*- coding: iso-8859-15 -*-
+"""
+Batched delivery of the trace/log messages of the RA library.
+"""
+
+import ctypes
+import threading
+import unittest
+import collections
+from MotionWise import RA
+from MotionWise import ra_ring
+
+
+def _log_message(string, reconstructed):
+    data = RA.Ra_TraceLog_LogNotCodedData()
+    data.string_length = len(string)
+    data.string = string
+    data.reconstructed_string = reconstructed
+    msg = RA.Ra_TraceLog_Message()
+    msg.entry_type = 1
+    msg.host_id = 2
+    msg.data = ctypes.cast(ctypes.pointer(data), ctypes.POINTER(ctypes.c_uint8))
+    return msg, data
+
+
+class TraceLogDeliveryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.received = []
+        self.done = threading.Event()
+
+    def _callback(self, address):
+        msg = ctypes.cast(address, ctypes.POINTER(RA.Ra_TraceLog_Message))[0]
+        data = ctypes.cast(msg.data,
+                           ctypes.POINTER(RA.Ra_TraceLog_LogNotCodedData))[0]
+        self.received.append((data.string[:data.string_length],
+                              data.reconstructed_string))
+
+    def _deliver(self, messages, **kwargs):
+        delivery = ra_ring.TraceLogDelivery(RA.Ra_TraceLog_Message,
+            RA.RA_TRACELOG_DATA, self._callback, slots=8, **kwargs)
+        for msg, _ in messages:
+            delivery.produce(ctypes.addressof(msg))
+        delivery.stop(5.0)
+        return delivery
+
+    def test_long_strings(self):
+        string = b's' * 255
+        reconstructed = b'r' * (ra_ring.STRING_SIZE - 1)
+        delivery = self._deliver([_log_message(string, reconstructed)])
+        self.assertEqual(self.received, [(string, reconstructed)])
+        self.assertEqual(delivery.stats()['truncated'], 0)
+
+    def test_truncation_counted(self):
+        delivery = self._deliver([_log_message(b'$SSH_TM', b'x' * 100),
+                                  _log_message(b'$SSH_TM', b'y' * 10)],
+                                 string_size=50)
+        self.assertEqual(self.received, [(b'$SSH_TM', b'x' * 49),
+                                         (b'$SSH_TM', b'y' * 10)])
+        self.assertEqual(delivery.stats()['truncated'], 1)
+
+
+class DeliveryStatsTest(unittest.TestCase):
+
+    def test_callbacks_not_merged(self):
+        ra = RA.RA.__new__(RA.RA)
+        ra.verbose = -1
+        ra.deliveries = collections.OrderedDict()
+
+        def first(address):
+            pass
+
+        def second(address):
+            pass
+
+        try:
+            ra._delivery_add(('tracelog', first), first, 4, False)
+            ra._delivery_add(('tracelog', second), second, 4, False)
+            ra._delivery_add(('tracelog', lambda a: None), None, 4, False)
+            ra._delivery_add(('tracelog', lambda a: None), None, 4, False)
+            self.assertEqual(sorted(ra.get_delivery_stats()),
+                             [ ('tracelog', '<lambda>')
+                             , ('tracelog', '<lambda>#2')
+                             , ('tracelog', 'first')
+                             , ('tracelog', 'second')])
+        finally:
+            for key in list(ra.deliveries):
+                ra._delivery_remove(key)
+
+
+if __name__ == '__main__':
+    unittest.main()
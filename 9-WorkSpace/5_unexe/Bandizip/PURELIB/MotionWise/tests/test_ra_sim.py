@@ -0,0 +1,79 @@
+# -*- coding: iso-8859-15 -*-
+"""
+Selection of the simulated RA library and shutdown of its players.
+"""
+
+import os
+import sys
+import argparse
+import unittest
+import subprocess
+from MotionWise import RA
+from MotionWise import ra_sim
+
+PURELIB = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+SCENARIO = { 'loop': True
+           , 'events': [ { 'type': 'trace', 'time': 0.01 * i, 'host': 2
+                         , 'core': 0, 'event': 0, 'data': 0}
+                         for i in range(100)]}
+
+PLAYER = """
+import time
+from MotionWise import ra_sim
+sim = ra_sim.SimLib(None, {!r})
+sim._Ra_Receiving_Start()
+time.sleep(0.2)
+"""
+
+
+class RaSimArgsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.env = os.environ.get('RA_SIM')
+
+    def tearDown(self):
+        if self.env is None:
+            os.environ.pop('RA_SIM', None)
+        else:
+            os.environ['RA_SIM'] = self.env
+
+    def _parse(self, *argv):
+        parser = argparse.ArgumentParser()
+        RA.RA_Args(parser)
+        return parser.parse_args(list(argv))
+
+    def test_empty_environment_ignored(self):
+        os.environ['RA_SIM'] = ''
+        self.assertEqual(self._parse().ra_sim, None)
+
+    def test_environment(self):
+        os.environ['RA_SIM'] = 'scenario.json'
+        self.assertEqual(self._parse().ra_sim, 'scenario.json')
+        os.environ.pop('RA_SIM')
+        self.assertEqual(self._parse().ra_sim, None)
+        self.assertEqual(self._parse('--ra-sim').ra_sim, '')
+
+
+class SimShutdownTest(unittest.TestCase):
+
+    def test_shutdown_active(self):
+        sim = ra_sim.SimLib(None, SCENARIO)
+        sim._Ra_Receiving_Start()
+        thread = sim._receiver[0]
+        ra_sim.SimLib._shutdown_active()
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(sim._receiver, None)
+
+    def test_players_stopped_at_exit(self):
+        p = subprocess.Popen([sys.executable, '-c', PLAYER.format(SCENARIO)],
+                             cwd=PURELIB, stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE)
+        out, err = p.communicate()
+        self.assertEqual(p.returncode, 0, err)
+        self.assertFalse(err.strip(), err)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+# -*- coding: iso-8859-15 -*-
+"""
+Telemetry of the RA shared library calls: histogram buckets, percentiles,
+error codes and skipped calls, also of an RA instance with the simulated
+library.
+"""
+
+import os
+import json
+import shutil
+import argparse
+import tempfile
+import unittest
+from StringIO import StringIO
+import MotionWise
+from MotionWise import RA
+from MotionWise import ra_sim
+
+RA_MODEL = os.path.join(os.path.dirname(MotionWise.__file__), 'RA_Model.py')
+
+
+class TelemetryTest(unittest.TestCase):
+
+    def test_buckets(self):
+        t = RA.RA_API_Telemetry()
+        for seconds in (0.0, 0.0000004, 0.001, 0.25, 100.0):
+            t.record('f', 'Ra_F', seconds)
+        s = t.snapshot()['f']
+        expected = [0] * RA.RA_API_TELEMETRY_BUCKETS
+        expected[0] = 2     # [0, 1) us
+        expected[10] = 1    # [512, 1024) us
+        expected[18] = 1    # [131072, 262144) us
+        expected[-1] = 1    # the last bucket has no upper limit
+        self.assertEqual(s['buckets'], expected)
+        self.assertEqual((s['function'], s['calls'], s['errors']),
+                         ('Ra_F', 5, 0))
+        self.assertEqual(s['max'], 100e6)
+
+    def test_percentiles(self):
+        t = RA.RA_API_Telemetry()
+        for _ in xrange(99):
+            t.record('fast', 'Ra_Fast', 0.001)
+        t.record('fast', 'Ra_Fast', 0.25)
+        for _ in xrange(98):
+            t.record('slow', 'Ra_Slow', 0.001)
+        for _ in xrange(2):
+            t.record('slow', 'Ra_Slow', 0.25)
+        s = t.snapshot()
+        # upper limit of the bucket, at most the maximum
+        self.assertEqual((s['fast']['p50'], s['fast']['p99']), (1024, 1024))
+        self.assertEqual((s['slow']['p50'], s['slow']['p99']),
+                         (1024, 250000))
+        self.assertAlmostEqual(s['slow']['mean'], 5980.0)
+
+    def test_codes(self):
+        t = RA.RA_API_Telemetry()
+        t.record('f', 'Ra_F', 0.0, RA.RA_E_OK)
+        t.record('f', 'Ra_F', 0.0, 1)
+        t.record('f', 'Ra_F', 0.0, 1)
+        t.record('f', 'Ra_F', 0.0, 77)
+        t.record('f', 'Ra_F', 0.0, error='ValueError')
+        s = t.snapshot()['f']
+        self.assertEqual(s['codes'], {'NOK': 2, '77': 1, 'ValueError': 1})
+        self.assertEqual((s['calls'], s['errors']), (5, 4))
+
+    def test_skipped(self):
+        t = RA.RA_API_Telemetry()
+        t.skipped('g', 'Ra_G')
+        t.skipped('g', 'Ra_G')
+        s = t.snapshot()['g']
+        self.assertEqual((s['function'], s['calls'], s['skipped']),
+                         ('Ra_G', 0, 2))
+        self.assertEqual((s['mean'], s['p50'], s['p99']), (None, None, None))
+
+    def test_dump(self):
+        t = RA.RA_API_Telemetry()
+        t.record('f', 'Ra_F', 0.001, 1)
+        t.skipped('g', 'Ra_G')
+        out = StringIO()
+        t.dump(out)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('RA API telemetry'))
+        self.assertEqual(lines[1].split()[:4],
+                         ['function', 'calls', 'skipped', 'errors'])
+        self.assertEqual(lines[2].split(),
+                         ['f', '1', '0', '1', '1000.0', '1000.0', '1000.0',
+                          '1000.0', 'NOK=1'])
+        self.assertEqual(lines[3].split(),
+                         ['g', '0', '1', '0', '-', '-', '-', '0.0'])
+
+
+@unittest.skipIf(not os.path.isfile(RA_MODEL), "RA model missing")
+class SimTelemetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self._telemetry = RA.telemetry_disable()
+        self.tmp = tempfile.mkdtemp()
+        scenario = os.path.join(self.tmp, 'scenario.json')
+        with open(scenario, 'w') as f:
+            json.dump({'return_codes': {'Ra_Config_Trace': 1}}, f)
+        parser = argparse.ArgumentParser()
+        RA.RA_Args(parser)
+        args = parser.parse_args(['--ra-sim', scenario,
+                                  '--ra-model', RA_MODEL])
+        self.telemetry = RA.telemetry_enable()
+        self.ra = RA.RA(parser, args)
+
+    def tearDown(self):
+        ra_sim.SimLib._shutdown_active()
+        RA.telemetry_disable()
+        if self._telemetry is not None:
+            RA._telemetry = self._telemetry
+        shutil.rmtree(self.tmp)
+
+    def test_calls(self):
+        self.ra.config_trace(1, 2)
+        self.ra.replay_wait(100)
+        result = self.ra.inject_frames([(1, 0, b'abc')] * 5)
+        self.assertEqual(result['frames'], 5)
+        s = self.telemetry.snapshot()
+        self.assertEqual(s['init']['calls'], 1)
+        self.assertEqual(s['config_trace']['function'], 'Ra_Config_Trace')
+        self.assertEqual(s['config_trace']['codes'], {'NOK': 1})
+        # replay_wait() without a replay does not call the library
+        self.assertEqual((s['replay_wait']['calls'],
+                          s['replay_wait']['skipped']), (0, 1))
+        # the frames after the first are passed to the library directly
+        self.assertEqual(s['_inject_frame_buffer']['calls'], 5)
+        self.assertEqual(s['_inject_frame_buffer']['function'],
+                         'Ra_Inject_Frame')
+        self.assertEqual(sum(s['_inject_frame_buffer']['buckets']), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+# -*- coding: iso-8859-15 -*-
+"""
+Handshake of the task ID to name mapping request.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from MotionWise import task_map
+from MotionWise import pm_instrument
+
+SSH = 2
+
+
+def _tm(data):
+    return { 'host': SSH, 'swc': 0, 'zgt': 0, 'count': '', 'core': 0
+           , 'type': 0xFF, 'data': data}
+
+
+class _Proxy(object):
+    """
+    Replies to every request with the next list of log messages
+    """
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+
+    def config_trace_set_trigger(self, trigger, host_cfg_id):
+        if self.replies:
+            for data in self.replies.pop(0):
+                pm_instrument.receive_task_map(_tm(data))
+
+    def __getattr__(self, name):
+        return lambda *args: None
+
+
+class TaskMapTest(unittest.TestCase):
+
+    def setUp(self):
+        pm_instrument.detach_callbacks()
+        pm_instrument.reset()
+
+    def tearDown(self):
+        pm_instrument.detach_callbacks()
+        pm_instrument.reset()
+
+    def _request(self, *replies):
+        return task_map.request(_Proxy(replies), 'SSH', 0, timeout=0.01,
+                                retries=len(replies) - 1)
+
+    def test_complete(self):
+        mapping, complete = self._request(
+            ['$SSH_TMPRE|3', '$SSH_TM|1|A|2|B', '$SSH_TM|3|C'])
+        self.assertTrue(complete)
+        self.assertEqual(mapping, {'A': 1, 'B': 2, 'C': 3})
+
+    def test_retry_merged_by_task_id(self):
+        # the first reply misses C, the second one misses A
+        mapping, complete = self._request(
+            ['$SSH_TMPRE|3', '$SSH_TM|1|A|2|B'],
+            ['$SSH_TMPRE|3', '$SSH_TM|2|B|3|C'])
+        self.assertTrue(complete)
+        self.assertEqual(mapping, {'A': 1, 'B': 2, 'C': 3})
+
+    def test_retry_with_same_entries_incomplete(self):
+        # the announcement of the retry is lost: three entries are counted,
+        # but only two different tasks have been received
+        mapping, complete = self._request(
+            ['$SSH_TMPRE|3', '$SSH_TM|1|A|2|B'],
+            ['$SSH_TM|1|A'])
+        self.assertFalse(complete)
+        self.assertEqual(mapping, {'A': 1, 'B': 2})
+
+    def test_new_announcement_discards_entries(self):
+        mapping, complete = self._request(
+            ['$SSH_TMPRE|3', '$SSH_TM|1|A|2|B'],
+            ['$SSH_TMPRE|2', '$SSH_TM|4|D'])
+        self.assertFalse(complete)
+        self.assertEqual(mapping, {'D': 4})
+
+    def test_duplicate_name_incomplete(self):
+        mapping, complete = self._request(
+            ['$SSH_TMPRE|2', '$SSH_TM|1|A|2|A'])
+        self.assertFalse(complete)
+
+    def test_callback_removed(self):
+        self._request(['$SSH_TMPRE|1', '$SSH_TM|1|A'])
+        self.assertEqual(pm_instrument.callback.Callback
+                         .task_id_name_callback_fun, [])
+        handshake = task_map.TaskMapHandshake('SSH')
+        handshake.close()
+        pm_instrument.receive_task_map(_tm('$SSH_TMPRE|1'))
+        self.assertEqual(handshake.expected(), 0)
+
+    def test_other_host_ignored(self):
+        handshake = task_map.TaskMapHandshake('SRH')
+        pm_instrument.receive_task_map(_tm('$SSH_TMPRE|1'))
+        pm_instrument.receive_task_map(_tm('$SSH_TM|1|A'))
+        self.assertEqual(handshake.missing(), None)
+        self.assertEqual(handshake.mapping(), {})
+        handshake.close()
+
+
+class TaskMapCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_round_trip(self):
+        cache = task_map.TaskMapCache(os.path.join(self.tmp, 'cache'))
+        self.assertEqual(cache.load('SSH', 'X 1'), None)
+        cache.save('SSH', 'X 1', {'A': 1})
+        self.assertEqual(cache.load('SSH', 'X 1'), {'A': 1})
+        self.assertEqual(cache.load('SSH', 'X 2'), None)
+        self.assertEqual(cache.load('SRH', 'X 1'), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+# -*- coding: iso-8859-15 -*-
+"""
+Declarative trace configuration applied to a stubbed RA.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from MotionWise import trace_config as TC
+
+HOST = 2
+
+
+class _RA(object):
+    """
+    Keeps the trace configuration of a host like the MotionWise does. The
+    state is lost with power_cycle().
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.power_cycle()
+
+    def power_cycle(self):
+        self.events = {}
+        self.filters = dict((k, {}) for k in TC.FILTERS)
+
+    def get_IFSET(self):
+        return 'IFSET 1.0'
+
+    def _config(self, kind, _id, enable, host):
+        assert host == HOST
+        self.calls.append((kind, _id, enable))
+        if kind == 'event':
+            self.events[_id] = enable
+        elif _id == TC.ALL_IDS[kind]:
+            self.filters[kind] = {None: enable}
+        else:
+            self.filters[kind][_id] = enable
+
+    def enabled(self, kind, _id):
+        f = self.filters[kind]
+        return f.get(_id, f.get(None))
+
+    def __getattr__(self, name):
+        for kind, call in TC.RA_CALLS.iteritems():
+            if call == name:
+                return lambda *args: self._config(kind, *args)
+        raise AttributeError(name)
+
+
+DESIRED = TC.TraceConfig({0: True, 1: True, 13: True},
+                         driver=(False, ()), task=(False, (1, 2)),
+                         runnable=(False, (10, 11, 12)))
+
+
+class TraceConfigTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.ra = _RA()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _cache(self, reuse=False):
+        return TC.TraceConfigCache(self.tmp, reuse)
+
+    def _check(self, config):
+        for t, v in config.events.iteritems():
+            self.assertEqual(self.ra.events.get(t), v, t)
+        for kind, (default, ids) in config.filters.iteritems():
+            for i in range(20):
+                self.assertEqual(self.ra.enabled(kind, i),
+                                 default != (i in ids), (kind, i))
+
+    def test_first_configuration_complete(self):
+        n = TC.configure(self.ra, 'SSH', HOST, DESIRED, self._cache())
+        self.assertEqual(n, len(self.ra.calls))
+        self._check(DESIRED)
+
+    def test_diff_within_session(self):
+        cache = self._cache()
+        TC.configure(self.ra, 'SSH', HOST, DESIRED, cache)
+        self.assertEqual(TC.configure(self.ra, 'SSH', HOST, DESIRED, cache), 0)
+        other = TC.TraceConfig(runnable=(False, (10, 13)))
+        self.ra.calls = []
+        self.assertEqual(TC.configure(self.ra, 'SSH', HOST, other, cache), 3)
+        self.assertEqual(len(self.ra.calls), 3)
+        self._check(DESIRED.updated(other))
+        TC.configure(self.ra, 'SSH', HOST, TC.RESET, cache)
+        self._check(TC.RESET)
+
+    def test_power_cycle_between_sessions(self):
+        TC.configure(self.ra, 'SSH', HOST, DESIRED, self._cache())
+        self.ra.power_cycle()
+        # a new session applies the complete configuration again
+        self.assertTrue(TC.configure(self.ra, 'SSH', HOST, DESIRED,
+                                     self._cache()))
+        self._check(DESIRED)
+
+    def test_reuse_of_earlier_session(self):
+        TC.configure(self.ra, 'SSH', HOST, DESIRED, self._cache())
+        self.assertEqual(TC.configure(self.ra, 'SSH', HOST, DESIRED,
+                                      self._cache(reuse=True)), 0)
+
+    def test_refresh(self):
+        cache = self._cache()
+        n = TC.configure(self.ra, 'SSH', HOST, DESIRED, cache)
+        self.assertEqual(TC.configure(self.ra, 'SSH', HOST, DESIRED, cache,
+                                      refresh=True), n)
+
+    def test_interrupted_configuration(self):
+        cache = self._cache(reuse=True)
+        TC.configure(self.ra, 'SSH', HOST, DESIRED, cache)
+        other = TC.TraceConfig(runnable=(True, ()))
+
+        def fail(*args):
+            raise KeyboardInterrupt
+        self.ra._config = fail
+        self.assertRaises(KeyboardInterrupt, TC.configure, self.ra, 'SSH',
+                          HOST, other, cache)
+        self.assertEqual(cache.load('SSH', self.ra.get_IFSET()), None)
+
+    def test_cache_keyed_by_host_and_ifset(self):
+        cache = self._cache()
+        cache.save('SSH', 'IFSET 1.0', DESIRED)
+        self.assertEqual(cache.load('SSH', 'IFSET 1.0'), DESIRED)
+        self.assertEqual(cache.load('SRH', 'IFSET 1.0'), None)
+        self.assertEqual(cache.load('SSH', 'IFSET 2.0'), None)
+        self.assertTrue(os.listdir(self.tmp))
+
+    def test_diff_uses_wildcard_if_shorter(self):
+        current = TC.TraceConfig(runnable=(False, range(10)))
+        desired = TC.TraceConfig(runnable=(False, (20,)))
+        self.assertEqual(TC.diff(current, desired),
+                         [('runnable', 0xFFFF, False), ('runnable', 20, True)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,242 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2012 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+# ++
+# Name
+#    trace_config.py
+#
+# Purpose
+#    Declarative trace configuration of a MotionWise host
+#
+# Revision Dates
+# --
+
+"""
+Declarative trace configuration of a MotionWise host.
+
+A TraceConfig describes the state of the trace filters (drivers, tasks and
+runnables) and of the trace event types of one host. The RA calls which are
+required to get from the current state to a desired state are computed by
+diff(). As the RA lib provides no read back of the trace configuration, the
+last applied state is kept in a cache file per host and IF-Set together with
+the session which has written it. The host loses its configuration when it is
+reset or power cycled, which can not be detected. Therefore a cached state is
+only used within the session which has applied it, e.g. to reset the
+configuration at the end of a measurement, unless the cache is told to reuse
+the states of earlier sessions. The cache is removed while a configuration is
+applied, i.e. an interrupted configuration results in a complete
+configuration with the next start.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+FILTERS = ('driver', 'task', 'runnable')
+ALL_IDS = {'driver': 0xFFFF, 'task': 0xFFFFFFFF, 'runnable': 0xFFFF}
+RA_CALLS = { 'event': 'config_trace_event'
+           , 'driver': 'config_trace_driver'
+           , 'task': 'config_trace_task'
+           , 'runnable': 'config_trace_runnable'}
+
+
+class TraceConfig(object):
+    """
+    Trace configuration of a host.
+
+    A filter is described by the state which is set with the wildcard ID and
+    the set of IDs whose state differs from it. Event types are described by
+    a dictionary event type -> state. Filters and event types which are not
+    contained are not touched.
+    """
+
+    def __init__(self, events=None, **filters):
+        self.events = dict(events or {})
+        self.filters = {}
+        for k, (default, ids) in filters.iteritems():
+            self.set_filter(k, default, ids)
+
+    def set_event(self, event_type, enable):
+        self.events[event_type] = bool(enable)
+
+    def set_filter(self, kind, default, ids=()):
+        """
+        @brief Sets the state of all IDs of a filter to default except the
+               given IDs which are set to the opposite state.
+        """
+        if kind not in FILTERS:
+            raise ValueError("invalid trace filter '{}'".format(kind))
+        self.filters[kind] = (bool(default), frozenset(ids))
+
+    def updated(self, other):
+        """
+        @brief Returns the state after other has been applied to self
+        """
+        out = TraceConfig(self.events, **self.filters)
+        out.events.update(other.events)
+        out.filters.update(other.filters)
+        return out
+
+    def to_dict(self):
+        return { 'events': {'{}'.format(k): v for k, v in self.events.iteritems()}
+               , 'filters': {k: [d, sorted(ids)]
+                             for k, (d, ids) in self.filters.iteritems()}}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls({int(k): v for k, v in d['events'].iteritems()},
+                   **{str(k): v for k, v in d['filters'].iteritems()})
+
+    def __eq__(self, other):
+        return isinstance(other, TraceConfig) and \
+            self.events == other.events and self.filters == other.filters
+
+    def __ne__(self, other):
+        return not self == other
+
+
+# state of the trace configuration after a measurement
+RESET = TraceConfig({13: False, 7: False, 8: False, 2: False, 0: True, 1: True},
+                    driver=(False, ()), task=(False, ()), runnable=(True, ()))
+
+
+def diff(current, desired):
+    """
+    @brief Computes the RA calls which change the trace configuration from
+           current to desired. If current is None the state of the host is
+           unknown and all settings of desired are applied.
+
+    Filters are either changed ID by ID or reset with the wildcard ID and
+    set again, depending on which requires less calls. Event types are
+    disabled before and enabled after the filters are changed.
+
+    @return: list of (kind, ID, enable)
+    """
+    current = current or TraceConfig()
+    disable, calls, enable = [], [], []
+    for t, v in sorted(desired.events.iteritems()):
+        if current.events.get(t) != v:
+            (enable if v else disable).append(('event', t, v))
+
+    for kind in FILTERS:
+        if kind not in desired.filters:
+            continue
+        default, ids = desired.filters[kind]
+        out = [(kind, ALL_IDS[kind], default)] + \
+              [(kind, i, not default) for i in sorted(ids)]
+        if kind in current.filters and current.filters[kind][0] == default:
+            cur_ids = current.filters[kind][1]
+            step = [(kind, i, not default) for i in sorted(ids - cur_ids)] + \
+                   [(kind, i, default) for i in sorted(cur_ids - ids)]
+            if len(step) < len(out):
+                out = step
+        calls.extend(out)
+    return disable + calls + enable
+
+
+def apply(ra, host_cfg_id, calls):
+    """
+    @brief Executes the calls returned by diff()
+    """
+    for kind, _id, enable in calls:
+        logger.debug("{}({}, {}, {})".format(RA_CALLS[kind], _id, enable,
+                                              host_cfg_id))
+        getattr(ra, RA_CALLS[kind])(_id, enable, host_cfg_id)
+    return len(calls)
+
+
+class TraceConfigCache(object):
+    """
+    Stores the last applied trace configuration per host and IF-Set as JSON
+    file.
+    """
+
+    def __init__(self, cache_dir, reuse=False):
+        """
+        @param reuse: use states cached by earlier sessions, i.e. the host has
+                      not been reset since then
+        """
+        self._dir = cache_dir
+        self._reuse = reuse
+        self.session = uuid.uuid4().hex
+
+    def _path(self, host_str, ifset):
+        name = re.sub(r'[^\w.-]', '_',
+                      'trace_config_{}_{}'.format(host_str, ifset))
+        return os.path.join(self._dir, name + '.json')
+
+    def load(self, host_str, ifset):
+        """
+        @return: cached TraceConfig or None
+        """
+        try:
+            with open(self._path(host_str, ifset), 'rb') as f:
+                d = json.load(f)
+            if d.get('host') != host_str or d.get('ifset') != '{}'.format(ifset):
+                return None
+            if not self._reuse and d.get('session') != self.session:
+                logger.debug("trace configuration of an earlier session "
+                             "ignored")
+                return None
+            return TraceConfig.from_dict(d['config'])
+        except (IOError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, host_str, ifset, config):
+        try:
+            if not os.path.isdir(self._dir):
+                os.makedirs(self._dir)
+            with open(self._path(host_str, ifset), 'wb') as f:
+                json.dump({ 'host': host_str
+                          , 'ifset': '{}'.format(ifset)
+                          , 'session': self.session
+                          , 'created': time.strftime('%Y-%m-%d %H:%M:%S')
+                          , 'config': config.to_dict()}
+                          , f, indent=1, sort_keys=True)
+        except (IOError, OSError):
+            logger.warning("trace configuration cache could not be written "
+                           "to {}".format(self._dir))
+
+    def invalidate(self, host_str, ifset):
+        try:
+            os.remove(self._path(host_str, ifset))
+        except OSError:
+            pass
+
+
+def configure(ra, host_str, host_cfg_id, desired, cache, refresh=False):
+    """
+    @brief Applies the desired trace configuration to a host. Only the
+           settings which differ from the cached state are changed. Without
+           a usable cached state (see TraceConfigCache) all settings are
+           applied.
+
+    @param refresh: ignore the cached state and apply all settings
+    @return: number of RA calls
+    """
+    ifset = ra.get_IFSET()
+    current = None if refresh else cache.load(host_str, ifset)
+    calls = diff(current, desired)
+    if calls:
+        cache.invalidate(host_str, ifset)
+        apply(ra, host_cfg_id, calls)
+    cache.save(host_str, ifset, (current or TraceConfig()).updated(desired))
+    return len(calls)
+
+
+__version__ = "$Revision: 80204 $".split()[1]
+__all__ = [ 'TraceConfig'
+          , 'TraceConfigCache'
+          , 'RESET'
+          , 'diff'
+          , 'apply'
+          , 'configure']
+
+if __name__ == '__main__':
+    pass
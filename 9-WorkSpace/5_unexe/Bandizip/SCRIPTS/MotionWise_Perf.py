@@ -86,12 +86,21 @@ from MotionWise import file_parser as FP
 from MotionWise.MotionWise_perf_proxy import Proxy 
 from MotionWise.RA import __version__ as ra_ver
 from MotionWise import pm_measurement
-from MotionWise.log_proc import QueueHandler, log_listener
+from MotionWise import pm_index
+from MotionWise import pm_batch
+from MotionWise import pm_checkpoint
+from MotionWise import pm_synth
+from MotionWise import pm_bench
+from MotionWise import pm_capture
+from MotionWise import pm_load
+from MotionWise import task_map
+from MotionWise import trace_config
+from MotionWise.log_proc import configure_process, log_listener, log_level
+from MotionWise.log_proc import LOG_FORMATS
 from MotionWise.MotionWise_perf_client import Client, TIME_STAMP
 
 HOST_CFG_ID = {"APH" : 0, "SSH" : 0x40, "SRH" : 0x80}
 logger      = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
 
 
 def version():
@@ -146,11 +155,11 @@ def _get_trace_config(ra_model, enabled_rnbls, rnbl_to_task_mapping):
     return config
 
 
-def _app_trace_config(proxy, host_str, config, meas_driver):
-    # disable tracing for all except monitored host
-    for k,v in HOST_CFG_ID.iteritems():
-        if k != host_str: proxy.config_trace(False, v)
-
+def _get_host_trace_config(ra_model, host_str, config, meas_driver):
+    """
+    @brief Creates the desired trace configuration of the monitored host
+    """
+    desired = trace_config.TraceConfig()
     if config['task_name_id']:
         # get name of idle tasks
         idle_tasks = [name for name in config['task_name_id'].iterkeys() 
@@ -165,120 +174,115 @@ def _app_trace_config(proxy, host_str, config, meas_driver):
         logger.warning("no task name to task ID mapping available")
     
     # enable stack peak event
-    proxy.config_trace_event(10, True, HOST_CFG_ID[host_str])
+    desired.set_event(10, True)
     
     # enable driver start stop events    
     if meas_driver:
-        proxy.config_trace_driver(0xFFFF, True, HOST_CFG_ID[host_str])
+        desired.set_filter('driver', True)
         config['tasks'].extend([name for name in 
                       config['task_name_id'].iterkeys() 
                       if 'TASK_SCHM_' in name.upper()])
-        proxy.config_trace_event(7, True, HOST_CFG_ID[host_str])
-        proxy.config_trace_event(8, True, HOST_CFG_ID[host_str])
+        desired.set_event(7, True)
+        desired.set_event(8, True)
         
     # enable task switch events for traced tasks
     if 'all' in config['tasks']:
-        proxy.config_trace_task(0xFFFFFFFF, True, HOST_CFG_ID[host_str])
+        desired.set_filter('task', True)
         logger.info('tracing enabled for all task')
     else:
-        proxy.config_trace_task(0xFFFFFFFF, False, HOST_CFG_ID[host_str])
+        tids = set()
         for task in config['tasks']:
-            tid = config['task_name_id'][task]
-            proxy.config_trace_task(tid, True, HOST_CFG_ID[host_str])
+            tids.add(config['task_name_id'][task])
             logger.info('tracing enabled for task {}'.format(task))
-    proxy.config_trace_event(2, True, HOST_CFG_ID[host_str])
+        desired.set_filter('task', False, tids)
+    desired.set_event(2, True)
     
     # enable runnable start stop events
     if 'all' in config['runnables']:
-        proxy.config_trace_runnable(0xFFFF, True, HOST_CFG_ID[host_str])
+        desired.set_filter('runnable', True)
         logger.info('tracing enabled for all runnables')
     else:
-        proxy.config_trace_runnable(0xFFFF, False, HOST_CFG_ID[host_str])
-        for rid,rname in proxy.ra_model.id_to_runnable.iteritems():
+        rids = set()
+        for rid,rname in ra_model.id_to_runnable.iteritems():
             if rname in config['runnables']:
-                proxy.config_trace_runnable(rid, True, HOST_CFG_ID[host_str])
+                rids.add(rid)
                 logger.info('tracing enabled for runnable {}'.format(rname))
-    proxy.config_trace_event(0, True, HOST_CFG_ID[host_str])
-    proxy.config_trace_event(1, True, HOST_CFG_ID[host_str])
-    proxy.config_trace_event(13, True, HOST_CFG_ID[host_str])
-    
-    
-def _req_task_name_id_mapping(proxy, host_str):
-    out = {}
-    
-    def _task_map_cb(host, task_id, task_name, **signal):
-        if not host_str == host: return
-        out[task_name] = task_id
-        logger.debug("{} - {}".format(task_id, task_name))
-
-    proxy.config_log_sink('eth') 
-    proxy.config_log_level(["info"])
-    proxy.config_log(0xfe, 1, 'info')
-    proxy.log_callback_add(pm_instrument.receive_event)
-    pm_instrument.task_map_callback_add(_task_map_cb)
-    proxy.receiving_start()
-    proxy.config_trace_set_trigger(0x01, HOST_CFG_ID[host_str])
+        desired.set_filter('runnable', False, rids)
+    desired.set_event(0, True)
+    desired.set_event(1, True)
+    desired.set_event(13, True)
+    return desired
+
+
+def _app_trace_config(proxy, host_str, config, meas_driver, cache, refresh):
+    # disable tracing for all except monitored host
+    for k,v in HOST_CFG_ID.iteritems():
+        if k != host_str: proxy.config_trace(False, v)
+
+    desired = _get_host_trace_config(proxy.ra_model, host_str, config, 
+                                     meas_driver)
+    n = trace_config.configure(proxy, host_str, HOST_CFG_ID[host_str], 
+                               desired, cache, refresh)
+    if n:
+        logger.info("$ctrace configuration applied ({} changes)".format(n))
+    else:
+        logger.info("$ctrace configuration unchanged")
     
-    # XXX wait here until all whole mapping is received 
-    time.sleep(2)
     
-    # reset logging
-    proxy.config_log_sink('uart') 
-    proxy.config_log_level(["error", "warning", "info"])
-    proxy.log_callback_remove()
+def _req_task_name_id_mapping(proxy, host_str, cache):
+    out, complete = task_map.request(proxy, host_str, HOST_CFG_ID[host_str])
+    if complete:
+        cache.save(host_str, proxy.get_IFSET(), out)
+    else: 
+        logger.warning("$cincomplete task mapping received from {}: {} tasks"
+                       .format(host_str, len(out)))
     return out
   
 
-def _clean_up(proxy, host_str, csv_file):
+def _clean_up(proxy, host_str, csv_file, cache, keep_config=False):
     signal.signal(signal.SIGINT, signal.SIG_IGN)
     proxy.tracelog_callback_remove()  
     proxy.receiving_stop()
+    stats = proxy.get_capture_stats()
+    if stats is not None:
+        # session summary of the capture path, written by the client
+        proxy.parent_conn.send((pm_capture.MARKER, stats))
     proxy.parent_conn.send("EOF")
     proxy.parent_conn.close()  
     if not csv_file:
         proxy.config_trace(False, HOST_CFG_ID[host_str])
-        proxy.config_trace_event(13, False, HOST_CFG_ID[host_str])
-        proxy.config_trace_driver(0xFFFF, False, HOST_CFG_ID[host_str])
-        proxy.config_trace_event(7, False, HOST_CFG_ID[host_str])
-        proxy.config_trace_event(8, False, HOST_CFG_ID[host_str])
-        proxy.config_trace_task(0xFFFFFFFF, False, HOST_CFG_ID[host_str])
-        proxy.config_trace_event(2, False, HOST_CFG_ID[host_str])
-        proxy.config_trace_runnable(0xFFFF, True, HOST_CFG_ID[host_str])
-        proxy.config_trace_event(0, True, HOST_CFG_ID[host_str])
-        proxy.config_trace_event(1, True, HOST_CFG_ID[host_str])			
+        if not keep_config:
+            # reset trace filters and event types
+            trace_config.configure(proxy, host_str, HOST_CFG_ID[host_str], 
+                                   trace_config.RESET, cache)
         for v in HOST_CFG_ID.itervalues():
             proxy.config_trace(True, v)
 
 
-def _configure_logging(queue, root_path):
-    h = QueueHandler(queue) # Just the one handler needed
-    root = logging.getLogger()
-    root.addHandler(h)
-    root.setLevel(logging.DEBUG)     
+def _configure_logging(queue, root_path, level, log_format):
+    h = configure_process(queue, level) # Just the one handler needed
     log_path = os.path.join(root_path, 'log')
     
     try: 
         if not os.path.isdir(log_path): 
             os.mkdir(log_path)
         log_file_path = log_path + "\\" + TIME_STAMP + "_MotionWise-PMT-log"
+        if log_format == 'jsonl':
+            log_file_path += '.jsonl'
     except:    
         log_file_path = None # invalid path
     
-    return log_file_path
+    return h, log_file_path
 
     
 def main(args):
     try:
-        try:
-            pred = lambda x: 'log' in x and args.__getattribute__(x)
-            log_level = [a[4:].upper() for a in args.__dict__ if pred(a)][0]
-        except IndexError: 
-            log_level = 'WARN'
-        log_level = getattr(logging, log_level)
+        level = log_level(args)
         queue = multiprocessing.Queue(-1)
-        log_file_path = _configure_logging(queue, args.out_path)
+        log_handler, log_file_path = _configure_logging(queue, args.out_path,
+                                                        level, args.log_format)
         log_proc = multiprocessing.Process(target=log_listener, 
-                    args=(queue, log_level, log_file_path,))
+                    args=(queue, level, log_file_path, args.log_format,))
         log_proc.start()
         if not os.path.isdir(args.out_path): 
             logger.error("$output folder is not a valid directory\n")
@@ -286,9 +290,134 @@ def main(args):
         if args.pcap_file and not os.path.isfile(args.pcap_file): 
             logger.error('$pcap file not found')
             return
+        if args.batch and (args.csv_file or args.pcap_file or args.time_from
+                           or args.time_to or args.extract):
+            logger.error('$c--batch cannot be combined with a single '
+                         'recording, --from, --to or --extract')
+            return
+        if args.rerender and (args.csv_file or args.pcap_file or args.batch 
+                              or args.resume):
+            logger.error('$c--rerender cannot be combined with a recording, '
+                         '--batch or --resume')
+            return
+        for path in filter(None, [args.rerender, args.resume]):
+            try:
+                meta = pm_checkpoint.load(path)['meta']
+            except (IOError, ValueError) as e:
+                logger.error('$c{}'.format(e))
+                return
+            if meta['host'] != args.host.upper():
+                logger.error('$ccheckpoint {} has been taken for host {}'
+                             .format(path, meta['host']))
+                return
+            if path == args.resume and \
+                    (meta.get('time_from'), meta.get('time_to')) != \
+                    (args.time_from, args.time_to):
+                logger.error('$ccheckpoint {} has been taken for the time '
+                             'window --from {} --to {}'.format(path, 
+                             meta.get('time_from'), meta.get('time_to')))
+                return
+        if args.max_lag and (args.csv_file or args.pcap_file or args.batch):
+            logger.error('$c--max-lag is only supported for live measurements')
+            return
+        if args.plugins is not None and args.parallel is not None and \
+                not args.batch:
+            logger.error('$cplugins are not supported with --parallel')
+            return
+        if args.vectorised and not (args.csv_file or args.batch or 
+                                    (args.pcap_file and 
+                                     args.pcap_reader == 'native')):
+            logger.error('$c--vectorised requires a trace event file or a '
+                         'pcap-file read by the native reader')
+            return
+        if args.vectorised and args.parallel is not None and not args.batch:
+            logger.error('$c--vectorised cannot be combined with --parallel')
+            return
+        if args.pipeline is not None and not (args.csv_file or 
+                                              (args.pcap_file and 
+                                               args.pcap_reader == 'native')):
+            logger.error('$c--pipeline requires a trace event file or a '
+                         'pcap-file read by the native reader')
+            return
+        if args.pipeline is not None and (args.parallel is not None or 
+                args.vectorised or args.trace_statistics or 
+                args.plugins is not None or args.checkpoint is not None or
+                args.resume or args.time_from or args.time_to):
+            logger.error('$c--pipeline cannot be combined with --parallel, '
+                         '--vectorised, --trace-statistics, --plugin, '
+                         '--checkpoint, --resume, --from or --to')
+            return
+        if args.resume and (args.parallel is not None or args.batch):
+            # the restored state would be merged with a replay of the
+            # complete recording, resp. with every recording of the batch
+            logger.error('$c--resume cannot be combined with --parallel or '
+                         '--batch')
+            return
+        if args.parallel is not None and not (args.csv_file or args.batch or
+                (args.pcap_file and args.pcap_reader == 'native')):
+            logger.error('$cparallel processing requires a trace event file '
+                         'or a pcap-file read by the native reader '
+                         '(--pcap-reader native)')
+            return
+        if args.profile and (args.parallel is not None or args.vectorised or
+                             args.pipeline is not None or args.batch or 
+                             args.rerender or args.benchmark):
+            logger.error('$c--profile cannot be combined with --parallel, '
+                         '--vectorised, --pipeline, --batch, --rerender or '
+                         '--benchmark')
+            return
+        if args.synthesize and (args.csv_file or args.pcap_file or 
+                                args.batch or args.rerender):
+            logger.error('$c--synthesize cannot be combined with a recording, '
+                         '--batch or --rerender')
+            return
+        try:
+            synth_options = pm_synth.parse_options((args.synthesize or [])[1:])
+        except ValueError as e:
+            logger.error('$c{}'.format(e))
+            return
+        if args.benchmark and not (args.synthesize or args.csv_file or 
+                                   (args.pcap_file and 
+                                    args.pcap_reader == 'native')):
+            logger.error('$c--benchmark requires a trace event file, a '
+                         'pcap-file read by the native reader or --synthesize')
+            return
+        if args.benchmark and (args.batch or args.time_from or args.time_to 
+                               or args.extract):
+            logger.error('$c--benchmark cannot be combined with --batch, '
+                         '--from, --to or --extract')
+            return
         
         host_str = args.host.upper()
+        offline = args.csv_file or args.batch or args.rerender or \
+                  args.synthesize or \
+                  (args.pcap_file and args.pcap_reader == 'native')
+        if (args.time_from or args.time_to or args.extract) and not offline:
+            logger.error('$c--from, --to and --extract require a trace event '
+                         'file or a pcap-file read by the native reader')
+            return
+        if (args.time_from or args.time_to) and args.parallel is not None:
+            logger.error('$cparallel processing of a time window is not '
+                         'supported')
+            return
+        for spec in filter(None, [args.time_from, args.time_to]):
+            try:
+                pm_index.check_time(spec)
+            except ValueError as e:
+                logger.error('$c{}'.format(e))
+                return
+            if not args.pcap_file and \
+                    pm_index.parse_wall_clock(spec.strip()) is not None:
+                logger.error('$cwall-clock times require a pcap-file')
+                return
+        if args.extract:
+            pm_index.extract(args.csv_file or args.pcap_file
+                            , pm_measurement.HOSTS[host_str]['id']
+                            , args.extract, args.time_from, args.time_to)
+            return
         proxy  = Proxy(args)
+        cfg_cache = trace_config.TraceConfigCache(
+            os.path.join(args.out_path, 'cache'), args.reuse_trace_config)
         logger.info("$cv{}, IF-Set {}".format(args.version, proxy.get_IFSET()))
         logger.info("$f{}".format(' '.join(sys.argv)))
         if args.list_runnables:
@@ -298,9 +427,43 @@ def main(args):
                      m.swc_to_host.get(m.runnable_to_swc[k],'') == host_full]
             for r in sorted(rnbls): print (r)
             return
+        if args.batch:
+            pm_batch.run(args, proxy.get_ra_model(), queue)
+            return
+        if args.synthesize:
+            path = args.synthesize[0]
+            n = pm_synth.generate(path, host_str, proxy.get_ra_model(), 
+                FP.parse_schedule_generation_info_file(
+                    args.__dict__["{}_sched_info".format(host_str.lower())]),
+                FP.load_aph_task_map(args.aph_taskmap1, args.aph_taskmap2) 
+                if host_str == 'APH' else None,
+                "#generated with MotionWise_Perf.py v{}, IF-Set {}\n".format(
+                    args.version, proxy.get_IFSET()), **synth_options)
+            logger.info("$c{} synthetic trace events written to {}".format(
+                n, path))
+            if path.lower().endswith('.csv'):
+                args.csv_file = path
+            else:
+                args.pcap_file = path
+                args.pcap_reader = 'native'
+        if args.benchmark:
+            try:
+                pm_bench.run(args, proxy.get_ra_model(), args.benchmark, 
+                             args.bench_repeat, args.bench_baseline, queue, 
+                             synth_options if args.synthesize else None)
+            except (IOError, ValueError) as e:
+                logger.error('$c{}'.format(e))
+            return
+        if args.synthesize:
+            return
               
         ra_model = proxy.get_ra_model()
-        client = Client(ra_model, proxy.child_conn, args, queue)
+        cache = task_map.TaskMapCache(os.path.join(args.out_path, 'cache'))
+        cached_task_map = None
+        if not (offline or args.pcap_file or args.refresh_task_map):
+            cached_task_map = cache.load(host_str, proxy.get_IFSET())
+        client = Client(ra_model, proxy.child_conn, args, queue, 
+                        task_map=cached_task_map)
         rnbl_task_map = FP.parse_schedule_generation_info_file \
             (args.__dict__["{}_sched_info".format(host_str.lower())])
         config = _get_trace_config(ra_model, args.runnables, rnbl_task_map)
@@ -309,7 +472,8 @@ def main(args):
             for k, v in FP.load_aph_task_map(args.aph_taskmap1, args.aph_taskmap2).iteritems():
                 config['task_name_id'][v['name']] = k
          
-        if args.csv_file:
+        if offline:
+            # events are streamed from the file by the client
             client.start()
         else:
             proxy.init()
@@ -358,17 +522,27 @@ def main(args):
 
                 client.start()
                  
-                m = _req_task_name_id_mapping(proxy, host_str)
+                if cached_task_map is None:
+                    m = _req_task_name_id_mapping(proxy, host_str, cache)
+                else:
+                    logger.info("$ctask mapping loaded from cache")
+                    m = cached_task_map
                 for k,v in m.iteritems(): 
                     config['task_name_id'][k] = v
  
-                _app_trace_config(proxy, host_str, config, args.trace_drivers)
+                # in startup mode the host has been powered up with its 
+                # default configuration
+                _app_trace_config(proxy, host_str, config, args.trace_drivers,
+                    cfg_cache, args.startup)
                 proxy.config_trace(True, HOST_CFG_ID[host_str])
  
             while True:
                 if proxy.parent_conn.poll():
                     cmd = proxy.parent_conn.recv()
                     if cmd == "EOF": break
+                    if type(cmd) is tuple and cmd[0] == pm_load.MARKER:
+                        # runnable sampling requested by the load shedding
+                        proxy.set_runnable_sampling(*cmd[1:])
                 else:
                     time.sleep(0.1)     
     except KeyboardInterrupt:
@@ -376,12 +550,14 @@ def main(args):
     finally: 
         if 'proxy' in locals():
             if args.store_pcap: proxy.log_stop(1)
-            if args.pcap_file: proxy.replay_abort()
-            _clean_up(proxy, host_str, args.csv_file or args.list_runnables)
+            if args.pcap_file and not offline: proxy.replay_abort()
+            _clean_up(proxy, host_str, offline or args.list_runnables, 
+                      cfg_cache, args.keep_trace_config)
         if 'client' in locals():
             if client.is_alive():
                 client.join()
             logger.info("$clog file written to %s\\log" % args.out_path)
+        log_handler.close()
         queue.put_nowait(None)
         log_proc.join()
 
@@ -481,8 +657,119 @@ following examples outline the basic usage of this script:
         ("--pcap-file" 
         , help="path to pcap-file which shall be replayed. The tool is started "
           "in an offline mode. No connection to the MotionWise is needed")
+    parser.add_argument \
+        ("--pcap-reader"
+        , choices=["native", "ra"]
+        , default="ra"
+        , help="reader used for the replay of a pcap-file: 'native' reads the "
+          "trace events directly from the file (experimental, not yet "
+          "validated against recordings of the MotionWise), 'ra' replays "
+          "the file with the remote-access library. Default value is "
+          "[%(default)s].")
+    parser.add_argument \
+        ("--from"
+        , dest="time_from"
+        , metavar="TIME"
+        , help="offline mode only: start of the analysed time window. TIME is "
+          "an absolute ZGT in us or a number of seconds relative to the start "
+          "of the recording with suffix 's', e.g. 2820s. For pcap-files TIME "
+          "can also be a wall-clock time, either a local time "
+          "YYYY-mm-ddTHH:MM:SS[.ffffff] or seconds since epoch with prefix "
+          "'@', e.g. @1357000000.5. An index of the "
+          "recording is created on first use and stored next to it.")
+    parser.add_argument \
+        ("--to"
+        , dest="time_to"
+        , metavar="TIME"
+        , help="offline mode only: end of the analysed time window (see --from)")
+    parser.add_argument \
+        ("--extract"
+        , metavar="FILE"
+        , help="offline mode only: the time window given by --from and --to is "
+          "written to FILE as a new recording instead of being analysed")
     parser.add_argument("--csv-file"
         , help=argparse.SUPPRESS)
+    parser.add_argument \
+        ("--parallel"
+        , nargs="?"
+        , type=int
+        , const=0
+        , metavar="N"
+        , help="offline mode only: the recording is split into chunks which "
+          "are processed by N worker processes. If N is omitted the number of "
+          "CPUs is used. pcap-files require --pcap-reader native. Recordings "
+          "with less than 400000 events of the host are not split. With "
+          "--batch N recordings are analysed at a time.")
+    parser.add_argument \
+        ("--vectorised"
+        , action="store_true"
+        , help="offline mode only: the runnable, driver and task statistics "
+          "are computed for the whole recording at once with NumPy instead of "
+          "event by event. Recordings with lost events, ZGT jumps or state "
+          "errors and options which require the event by event analysis "
+          "(e.g. --trace-statistics, --plugin, --from, --checkpoint) are "
+          "analysed event by event.")
+    parser.add_argument \
+        ("--pipeline"
+        , nargs="?"
+        , type=int
+        , const=0
+        , metavar="N"
+        , help="offline mode only: sequence check and ZGT reordering are done "
+          "by the main process, the events of the cores are analysed by N "
+          "worker processes. If N is omitted one process per core is used "
+          "(at most the number of CPUs). If a state error is detected the "
+          "recording is analysed by a single process.")
+    parser.add_argument \
+        ("--synthesize"
+        , nargs="+"
+        , metavar=("FILE", "KEY=VALUE")
+        , help="a synthetic recording of the host is written to FILE (trace "
+          "event file if FILE ends with .csv, pcap-file otherwise). The tasks "
+          "and runnables are taken from the schedule generation info. The "
+          "recording is defined by the options (defaults in brackets): "
+          "seconds (60), seed (0), runtime distribution relative to the WCET "
+          "constant|uniform|normal|exponential (normal), jitter of the task "
+          "releases in us (50), reorder delay in us (100), loss probability "
+          "of an event burst (0), burst length (5), drivers (0), driver_rate "
+          "per job (0.5), stack_rate per job (0.01), e.g. --synthesize "
+          "ssh.pcap seconds=600 drivers=8. The same options always produce "
+          "the same recording.")
+    parser.add_argument \
+        ("--benchmark"
+        , metavar="FILE"
+        , help="offline mode only: the throughput and peak memory of the "
+          "analysis stages and output configurations are measured with the "
+          "recording (or the recording given by --synthesize) and written "
+          "as JSON to FILE. No output files are created.")
+    parser.add_argument \
+        ("--bench-baseline"
+        , metavar="FILE"
+        , help="results of a previous --benchmark the new results are "
+          "compared with")
+    parser.add_argument \
+        ("--bench-repeat"
+        , type=int
+        , default=pm_bench.BENCH_REPEAT
+        , metavar="N"
+        , help="number of runs of every benchmark measurement, the fastest "
+          "run is reported. Default value is [%(default)s].")
+    parser.add_argument \
+        ("--batch"
+        , metavar="PATH"
+        , help="offline mode only: all recordings (trace event CSV or pcap "
+          "files, the latter require --pcap-reader native) of the directory "
+          "PATH are analysed. PATH can also be a text "
+          "file listing one recording per line, optionally preceded by a "
+          "label and '=', e.g. 'ref = 0815.pcap'. In addition to the output "
+          "files of every recording one comparison file per summary is "
+          "created.")
+    parser.add_argument \
+        ("--baseline"
+        , metavar="LABEL"
+        , help="recording of a batch the deltas of the comparison files are "
+          "computed against (file name without extension or label). Default "
+          "is the first recording.")
     parser.add_argument \
         ("-o", "--output-dir"
         , dest="out_path"
@@ -546,6 +833,90 @@ following examples outline the basic usage of this script:
         , action="store_true"
         , help="The measurement session is recorded to a pcap file. The "
           "file is stored in the output directory in the subfolder pcap.")
+    parser.add_argument \
+        ("--checkpoint"
+        , nargs="?"
+        , type=float
+        , const=pm_checkpoint.CHECKPOINT_INTERVAL
+        , metavar="SECONDS"
+        , help="the analysis state is written every SECONDS (default "
+          "%(const)s) and at the end of the measurement to a checkpoint file "
+          "in the output directory in the subfolder checkpoint")
+    parser.add_argument \
+        ("--resume"
+        , metavar="FILE"
+        , help="the accumulated measurements of the checkpoint FILE are "
+          "restored. If the checkpoint has been taken in the offline mode and "
+          "the same recording is given, the analysis continues after the "
+          "last analysed event. --from and --to must be the same as for the "
+          "checkpoint. Not supported with --parallel and --batch.")
+    parser.add_argument \
+        ("--rerender"
+        , metavar="FILE"
+        , help="the summary files are created from the measurements stored "
+          "in the checkpoint FILE, e.g. with a different schedule generation "
+          "info (budgets, periods) or SW layer file. No events are analysed.")
+    parser.add_argument \
+        ("--max-lag"
+        , type=float
+        , metavar="SECONDS"
+        , help="enables adaptive load shedding: if the analysis lags behind "
+          "the received trace events by more than SECONDS, the output of the "
+          "trace event file is suspended first and then the runnable events "
+          "are sampled per runnable, while task events are still analysed "
+          "completely. All affected time ranges are listed in the file "
+          "*_load-shedding.csv. Runnable and overhead statistics of these "
+          "ranges are partial.")
+    parser.add_argument \
+        ("--profile"
+        , action="store_true"
+        , help="the time spent in the stages of the analysis (RA callback, "
+          "decoding, sequence check and ZGT reordering, state machines, "
+          "listeners, output files), the lag of the analysis, the queue "
+          "depths and the number of callbacks per event are measured and "
+          "written every 10 seconds to the file *_profile.csv. The stages "
+          "are timed for a sample of the events, i.e. the overhead is low.")
+    parser.add_argument \
+        ("--no-capture-stats"
+        , dest="capture_stats"
+        , action="store_false"
+        , help="the records delivered by the RA library are not accounted "
+          "in live measurements, which saves about 3us per record. The file "
+          "*_capture-statistics.csv is not written.")
+    parser.add_argument \
+        ("--plugin"
+        , dest="plugins"
+        , action="append"
+        , nargs="?"
+        , metavar="PATH"
+        , help="enables the analysis plugins defined in the Python file PATH "
+          "or in all Python files of the directory PATH (see "
+          "MotionWise.pm_plugin) and the plugins installed in the entry point "
+          "group motionwise.pm_plugins. Without PATH only the installed "
+          "plugins are enabled. Can be given multiple times. The time spent "
+          "in each plugin is written to the file *_plugin-timing.csv.")
+    parser.add_argument \
+        ("--refresh-task-map"
+        , action="store_true"
+        , help="The task ID to name mapping is requested from the host even "
+          "if a mapping for the host and IF-Set is cached in the output "
+          "directory in the subfolder cache.")
+    parser.add_argument \
+        ("--reuse-trace-config"
+        , action="store_true"
+        , help="Only the trace filters and event types which differ from the "
+          "configuration applied by the last measurement (cached in the "
+          "output directory in the subfolder cache) are changed. By default "
+          "all settings are applied, as the configuration can not be read "
+          "back from the MotionWise. Use this option only if the MotionWise "
+          "has not been reset or power cycled since the last measurement.")
+    parser.add_argument \
+        ("--keep-trace-config"
+        , action="store_true"
+        , help="The trace configuration of the measurement is not reset "
+          "when the measurement is stopped. A subsequent measurement with "
+          "the same configuration and --reuse-trace-config starts without "
+          "reconfiguration.")
     parser.add_argument \
         ("--list-runnables", "-lr"
         , action="store_true"
@@ -601,6 +972,13 @@ following examples outline the basic usage of this script:
         , help="sets log level to 'debug'. Maximum verbosity to be used for "
           "development and debugging purposes. Note that this option does not "
           "set the log level of the MotionWise logging framework.")
+    parser.add_argument("--log-format"
+        , choices=LOG_FORMATS
+        , default='text'
+        , help="format of the log file: 'text' (default) or 'jsonl', one JSON "
+          "object per record with the fields time, level, name, process, "
+          "message and, for repeated messages, the number of suppressed "
+          "messages.")
     args = parser.parse_args() 
     args.__dict__['version'] = version()
     main(args)
@@ -0,0 +1,334 @@
+# -*- coding: iso-8859-15 -*-
+# Copyright (C) 2014 TTTech Computertechnik AG. All rights reserved
+# Schoenbrunnerstrasse 7, A--1040 Wien, Austria. office@tttech.com
+#
+#++
+# Name
+#    MotionWise_Record.py
+#
+# Purpose
+#    Records data elements received from MotionWise into a columnar file
+#    and queries/exports the recordings
+#
+# Revision Dates
+#
+#--
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+__version__ = "1.0.0"
+__doc__     = """Script for recording data elements routed from MotionWise"""
+
+import sys
+if sys.version_info.major == 3:
+    basestring = str
+    long = int
+
+import os
+import time
+import argparse
+import textwrap
+
+pjoin = os.path.join
+
+pyToolsDir = pjoin \
+   ( os.path.dirname( os.path.abspath( __file__ ) )
+   , ".."
+   )
+
+if not os.path.exists( pjoin( pyToolsDir, "lib", "site-packages" ) ) :
+    sys.path.append ( pyToolsDir )
+
+from MotionWise.RA import RA
+from MotionWise.RA import RA_Args
+from MotionWise.ra_recorder import Recorder
+from MotionWise.ra_recorder import Recording
+from MotionWise.ra_recorder import CHUNK_ROWS
+
+def print_stats( stats, duration ) :
+    """!
+    @internal
+    @brief prints the received, written, dropped and lost samples per element
+    """
+
+    for name, s in stats.items() :
+        print \
+            ( "%-60s received %8d (%8.1f/s) written %8d overflows %6d lost %s"
+            % ( name, s['received'], s['received'] / max( duration, 1e-6 )
+              , s['written'], s['overflows']
+              , "n/a (no counter)" if s['lost'] is None
+                else "%d (%s)" % ( s['lost'], s['counter'] )
+              )
+            )
+# end def print_stats
+
+def record( parser, args ) :
+    """!
+    @internal
+    @brief records the data elements until ctrl-c or the end of the duration
+    """
+
+    counters = dict( c.split( '=', 1 ) for c in args.counter )
+
+    # explicit ra-initialization - we start the rx-thread later by hand
+    ra = RA( parser, args, init = False )
+    ra.init()
+
+    recorder = Recorder( args.output, chunk_rows = args.chunk_rows )
+    try :
+        ports = recorder.attach( ra, args.elements, counters )
+    except ValueError as e :
+        recorder.close()
+        ra.shutdown()
+        parser.error( "%s" % ( e, ) )
+
+    # apply routing configuration if not forbidden by cmd-line
+    routing_ids = set()
+    if not args.no_auto_route :
+        for port in ports :
+            port_id = ra.get_port_id_of_port_name( port.name.split( '_De' )[0] )
+            if port_id is not None :
+                routing_ids.add( port_id )
+        for port_id in routing_ids :
+            ra.config_routing_port( port_id, 'record' )
+        ra.config_routing_sync( )
+
+    start = time.time()
+    ra.receiving_start()
+
+    try :
+        print( "recording %d data elements to %s, press ctrl-c to stop"
+             % ( len( ports ), args.output ) )
+        next_status = start + args.status
+        while args.duration is None or time.time() - start < args.duration :
+            time.sleep( 0.2 )
+            if args.status and time.time() >= next_status :
+                next_status += args.status
+                print_stats( recorder.stats(), time.time() - start )
+    except KeyboardInterrupt :
+        pass
+
+    # stop receive thread
+    ra.receiving_stop()
+    duration = time.time() - start
+    stats = recorder.close()
+
+    if routing_ids :
+        for port_id in routing_ids :
+            ra.config_routing_port( port_id, 'default' )
+        ra.config_routing_sync( )
+
+    # the clean way
+    ra.shutdown()
+
+    print_stats( stats, duration )
+# end def record
+
+def info( parser, args ) :
+    """!
+    @internal
+    @brief prints the elements, samples and columns of a recording
+    """
+
+    recording = Recording( args.recording )
+    meta      = recording.meta
+    duration  = meta['stop'] - meta['start']
+    print \
+        ( "%s: %s, %.1f s"
+        % ( args.recording
+          , time.strftime( "%Y-%m-%d %H:%M:%S", time.localtime( meta['start'] ) )
+          , duration
+          )
+        )
+    print_stats( recording.ports, duration )
+    if args.columns :
+        for name, port in recording.ports.items() :
+            print( "%s (%s):" % ( name, port['type'] ) )
+            for c in port['columns'] :
+                print( "    %-50s %-6s %s" % ( c['name'], c['dtype'], c['shape'] or "" ) )
+# end def info
+
+def export( parser, args ) :
+    """!
+    @internal
+    @brief exports columns of an element as CSV or NPZ file
+    """
+
+    recording = Recording( args.recording )
+    if args.element not in recording.ports :
+        parser.error( "%s is not recorded, see info" % ( args.element, ) )
+    origin = recording.meta['start']
+    start  = None if args.start is None else origin + args.start
+    end    = None if args.end is None else origin + args.end
+    try :
+        recording.columns( args.element, args.columns )
+    except ValueError as e :
+        parser.error( "%s" % ( e, ) )
+
+    if args.format == 'npz' :
+        if args.output is None :
+            parser.error( "the NPZ format requires --output" )
+        import numpy
+        data = recording.read( args.element, args.columns, start, end )
+        numpy.savez_compressed( args.output, **dict( ( str( k ), v ) for k, v in data.items() ) )
+        rows = len( data['time'] )
+    elif args.output in ( None, '-' ) :
+        rows = recording.export_csv( args.element, sys.stdout, args.columns, start, end )
+    else :
+        with open( args.output, 'w' ) as f :
+            rows = recording.export_csv( args.element, f, args.columns, start, end )
+    print( "%d samples exported" % ( rows, ), file = sys.stderr )
+# end def export
+
+def main( parser ) :
+
+    args = parser.parse_args( )
+
+    if args.version :
+        print( "MotionWise_Record.py v%s" % (__version__, ) )
+        sys.exit(0)
+
+    if args.command is None :
+        parser.error( "a command is required" )
+
+    args.function( args.parser, args )
+# end def main
+
+if __name__ == "__main__":
+    description = """\
+    This script records data elements sent by SW-Cs running on the MotionWise
+    into a compressed columnar file (see MotionWise/ra_recorder.py) and
+    queries/exports the recordings:
+
+        record data elements and all data elements of ports until ctrl-c:
+            MotionWise_Record.py record -o drive.rec <SWC>_<Pp>_<De> <SWC>_<Pp>
+
+        record for 60 s, detect lost samples with the counter field
+        Header.Counter (range 0..14) of an element:
+            MotionWise_Record.py record -o drive.rec -d 60 \\
+                -c <SWC>_<Pp>_<De>=Header.Counter:15 <SWC>_<Pp>_<De>
+
+        show the elements, samples, lost samples and columns of a recording:
+            MotionWise_Record.py info --columns drive.rec
+
+        export the position columns of an element from 10 s to 20 s after
+        the start of the recording:
+            MotionWise_Record.py export drive.rec <SWC>_<Pp>_<De> \\
+                -c 'Position.*' --start 10 --end 20 -o position.csv
+    """
+
+    parser = argparse.ArgumentParser\
+        ( formatter_class = argparse.RawDescriptionHelpFormatter
+        , description = textwrap.dedent (description)
+        )
+
+    parser.add_argument \
+            ( "-v", "--version"
+            , action = "store_true"
+            , help = "show program's version number and exit"
+            )
+
+    commands = parser.add_subparsers( dest = "command" )
+
+    record_parser = commands.add_parser \
+        ( "record"
+        , help = "record data elements"
+        )
+    record_parser.add_argument \
+        ( "elements"
+        , nargs = '+'
+        , metavar = "ELEMENT"
+        , help = "data element <SWC>_Pp<>_De<> or port <SWC>_Pp<> (all its data elements)"
+        )
+    record_parser.add_argument \
+        ( "-o", "--output"
+        , required = True
+        , help = "file name of the recording"
+        )
+    record_parser.add_argument \
+        ( "-d", "--duration"
+        , type = float
+        , default = None
+        , help = "stop after DURATION seconds (default: ctrl-c)"
+        )
+    record_parser.add_argument \
+        ( "-c", "--counter"
+        , action = "append"
+        , default = []
+        , metavar = "ELEMENT=COLUMN[:MODULUS]"
+        , help = "counter column of an element for the detection of lost samples "
+                 "(default: a column named like AliveCounter or SequenceCounter)"
+        )
+    record_parser.add_argument \
+        ( "--chunk-rows"
+        , type = int
+        , default = CHUNK_ROWS
+        , help = "samples per chunk (default: %(default)s)"
+        )
+    record_parser.add_argument \
+        ( "--status"
+        , type = float
+        , default = 10.0
+        , help = "print the statistics every STATUS seconds, 0 disables (default: %(default)s)"
+        )
+    record_parser.add_argument \
+        ( "--no-auto-route"
+        , action='store_true'
+        , help='skip automatic routing configuration'
+        )
+    # add ra-specific general arguments to the parser
+    RA_Args( record_parser )
+    record_parser.set_defaults( function = record, parser = record_parser )
+
+    info_parser = commands.add_parser \
+        ( "info"
+        , help = "show the contents of a recording"
+        )
+    info_parser.add_argument( "recording" )
+    info_parser.add_argument \
+        ( "--columns"
+        , action = "store_true"
+        , help = "show the columns of the elements"
+        )
+    info_parser.set_defaults( function = info, parser = info_parser )
+
+    export_parser = commands.add_parser \
+        ( "export"
+        , help = "export columns of a recorded element"
+        )
+    export_parser.add_argument( "recording" )
+    export_parser.add_argument( "element" )
+    export_parser.add_argument \
+        ( "-c", "--columns"
+        , action = "append"
+        , metavar = "PATTERN"
+        , help = "columns to export, column name or shell-style pattern "
+                 "(default: all). A column name like p[1].x selects this "
+                 "column, a pattern which matches no column is an error"
+        )
+    export_parser.add_argument \
+        ( "--start"
+        , type = float
+        , help = "start time [s after the start of the recording]"
+        )
+    export_parser.add_argument \
+        ( "--end"
+        , type = float
+        , help = "end time [s after the start of the recording]"
+        )
+    export_parser.add_argument \
+        ( "-f", "--format"
+        , choices = [ "csv", "npz" ]
+        , default = "csv"
+        )
+    export_parser.add_argument \
+        ( "-o", "--output"
+        , default = None
+        , help = "output file (default: stdout for CSV)"
+        )
+    export_parser.set_defaults( function = export, parser = export_parser )
+
+    # invoke the app
+    main(parser)
+
+# end if